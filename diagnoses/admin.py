@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Case
+from .models import Case, AnalysisJob
 
 
 @admin.register(Case)
@@ -185,3 +185,23 @@ def export_cases_csv(modeladmin, request, queryset):
 
 # Add custom actions to CaseAdmin
 CaseAdmin.actions = [assign_to_doctor, mark_completed, export_cases_csv]
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    """Admin configuration for queued case analysis jobs."""
+    
+    list_display = ['id', 'case', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['case__id', 'last_error', 'locked_by']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'locked_at']
+    raw_id_fields = ['case']
+    actions = ['requeue_jobs']
+    
+    @admin.action(description='Re-queue selected jobs')
+    def requeue_jobs(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.exclude(status='RUNNING').update(
+            status='QUEUED', attempts=0, run_after=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'{updated} job(s) re-queued.')
@@ -4,13 +4,27 @@ Provides intelligent diagnostic suggestions using RAG and rule-based reasoning
 """
 
 import json
+import logging
 import re
+import time
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import requests
 from django.conf import settings
 
 from knowledge.rag_utils import search_medical_knowledge, get_treatment_recommendations, get_diagnostic_guidelines
+from .llm_client import get_llm_client
+from .ollama_pool import get_ollama_pool
+from .llm_cache import get_llm_cache, payload_cache_key
+from .llm_scheduler import get_llm_scheduler, LLMQueueTimeout
+from .llm_routing import resolve_model_route, get_route_config
+from .prompt_budget import build_budgeted_prompt
+from .keyword_engine import scan_symptoms
+from .metrics import timed
+from .patient_context import PatientContext
+from .rule_tables import freeze, compile_condition_rules, compile_symptom_patterns, ConditionRuleMatrix
+
+logger = logging.getLogger(__name__)
 
 
 # Diagnosis Prompt Template
@@ -47,6 +61,316 @@ Format your response as structured JSON with the following fields:
 """
 
 
+# Fused Prompt Template - diagnosis, treatment plan and medications in one generation
+FUSED_ANALYSIS_PROMPT = """
+You are an experienced medical AI assistant helping healthcare workers in rural Zimbabwe.
+
+Patient Information:
+- Age: {age}
+- Gender: {gender}
+- Symptoms: {symptoms}
+- Vital Signs: {vital_signs}
+- Medical History: {medical_history}
+
+Relevant Medical Knowledge:
+{retrieved_context}
+
+Based on the patient information and medical knowledge provided, give a complete
+assessment in a single JSON object with exactly these fields:
+{{
+  "primary_diagnosis": "most likely condition (medical term)",
+  "diagnosis_explanation": "plain-language explanation a nurse can give the patient",
+  "differential_diagnoses": [{{"condition": "name", "confidence": 0.0}}],
+  "confidence_score": 0,
+  "reasoning": "brief diagnostic reasoning",
+  "red_flags": ["warning signs requiring immediate attention"],
+  "treatment_plan": {{
+    "immediate_actions": ["what to do now"],
+    "short_term_actions": ["next hours to days"],
+    "follow_up_actions": ["follow-up care or referral"]
+  }},
+  "medications": [{{"name": "generic name", "dosage": "dose and route", "duration": "how long", "instructions": "how to take"}}],
+  "follow_up_recommendations": "next steps"
+}}
+Use generic medicine names from the WHO Essential Medicines List where possible.
+confidence_score is 0-100; differential confidences are 0-1.
+"""
+
+
+# Explanation Prompt Template - plain-language explanation (small model route)
+EXPLANATION_PROMPT = """
+You are helping a nurse in rural Zimbabwe explain a diagnosis to a patient.
+
+Diagnosis: {diagnosis}
+Patient's symptoms: {symptoms}
+
+Explain in 3-4 short sentences of plain language, avoiding medical jargon, what
+this condition is, what usually causes it and why the symptoms point to it.
+Respond with JSON: {{"diagnosis_explanation": "..."}}
+"""
+
+
+# Triage Prompt Template - one-line urgency note (small model route)
+TRIAGE_PROMPT = """
+You are a triage nurse in a rural clinic in Zimbabwe.
+
+Symptoms: {symptoms}
+
+How urgently does this patient need care? Respond with JSON:
+{{"urgency_level": "critical|high|medium|low", "reason": "one short sentence"}}
+"""
+
+
+# Medical condition patterns and weights
+SYMPTOM_PATTERNS = freeze({
+    'cardiac': {
+        'keywords': ['chest pain', 'shortness of breath', 'palpitations', 'fatigue', 'dizziness', 'sweating'],
+        'severity_indicators': ['severe', 'crushing', 'radiating', 'sudden onset'],
+        'weight': 0.8
+    },
+    'respiratory': {
+        'keywords': ['cough', 'shortness of breath', 'wheezing', 'chest tightness', 'sputum'],
+        'severity_indicators': ['blood', 'persistent', 'worsening', 'fever'],
+        'weight': 0.7
+    },
+    'gastrointestinal': {
+        'keywords': ['nausea', 'vomiting', 'diarrhea', 'abdominal pain', 'constipation', 'bloating'],
+        'severity_indicators': ['blood', 'severe', 'persistent', 'dehydration'],
+        'weight': 0.6
+    },
+    'neurological': {
+        'keywords': ['headache', 'dizziness', 'confusion', 'numbness', 'weakness', 'seizure'],
+        'severity_indicators': ['sudden', 'severe', 'persistent', 'loss of consciousness'],
+        'weight': 0.8
+    },
+    'infectious': {
+        'keywords': ['fever', 'chills', 'fatigue', 'body aches', 'sore throat', 'cough'],
+        'severity_indicators': ['high fever', 'persistent', 'worsening', 'difficulty breathing'],
+        'weight': 0.5
+    }
+})
+
+
+# Common conditions with diagnostic criteria - Expanded for comprehensive diagnosis
+CONDITION_RULES = freeze({
+    # Cardiovascular
+    'acute_coronary_syndrome': {
+        'required_symptoms': ['chest pain'],
+        'supporting_symptoms': ['shortness of breath', 'sweating', 'nausea', 'radiating pain'],
+        'risk_factors': ['diabetes', 'hypertension', 'smoking', 'family history'],
+        'urgency': 'critical',
+        'confidence_boost': 0.3
+    },
+    'hypertensive_crisis': {
+        'required_symptoms': ['headache', 'high blood pressure'],
+        'supporting_symptoms': ['dizziness', 'chest pain', 'shortness of breath', 'blurred vision'],
+        'risk_factors': ['hypertension', 'medication non-compliance'],
+        'urgency': 'critical',
+        'confidence_boost': 0.25
+    },
+    
+    # Infectious Diseases - Common in Sub-Saharan Africa
+    'malaria': {
+        'required_symptoms': ['fever', 'chills'],
+        'supporting_symptoms': ['headache', 'body aches', 'sweating', 'nausea', 'vomiting', 'fatigue'],
+        'risk_factors': ['endemic area', 'travel', 'no prophylaxis', 'mosquito exposure'],
+        'urgency': 'high',
+        'confidence_boost': 0.25
+    },
+    'typhoid_fever': {
+        'required_symptoms': ['fever', 'headache'],
+        'supporting_symptoms': ['abdominal pain', 'weakness', 'loss of appetite', 'constipation', 'diarrhea'],
+        'risk_factors': ['poor sanitation', 'contaminated food', 'contaminated water'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    'tuberculosis': {
+        'required_symptoms': ['cough', 'fever'],
+        'supporting_symptoms': ['night sweats', 'weight loss', 'fatigue', 'chest pain', 'blood in sputum'],
+        'risk_factors': ['hiv', 'immunocompromised', 'contact with tb', 'crowded living'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    'hiv_related_illness': {
+        'required_symptoms': ['fever', 'weight loss'],
+        'supporting_symptoms': ['diarrhea', 'cough', 'fatigue', 'night sweats', 'enlarged lymph nodes'],
+        'risk_factors': ['hiv positive', 'immunosuppressed', 'opportunistic infections'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    'acute_febrile_illness': {
+        'required_symptoms': ['fever'],
+        'supporting_symptoms': ['headache', 'body aches', 'fatigue', 'chills', 'weakness', 'sweating'],
+        'risk_factors': ['recent infection', 'exposure', 'travel', 'season'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.2
+    },
+    
+    # Respiratory Conditions
+    'pneumonia': {
+        'required_symptoms': ['cough', 'fever'],
+        'supporting_symptoms': ['shortness of breath', 'chest pain', 'sputum', 'difficulty breathing'],
+        'risk_factors': ['age', 'immunocompromised', 'chronic disease', 'smoking'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    'upper_respiratory_infection': {
+        'required_symptoms': ['cough'],
+        'supporting_symptoms': ['fever', 'sore throat', 'runny nose', 'congestion', 'fatigue', 'headache'],
+        'risk_factors': ['recent exposure', 'season', 'school', 'daycare'],
+        'urgency': 'low',
+        'confidence_boost': 0.15
+    },
+    'bronchitis': {
+        'required_symptoms': ['cough'],
+        'supporting_symptoms': ['sputum', 'chest discomfort', 'fever', 'fatigue', 'shortness of breath'],
+        'risk_factors': ['smoking', 'recent infection', 'season'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    },
+    'asthma_exacerbation': {
+        'required_symptoms': ['shortness of breath', 'wheezing'],
+        'supporting_symptoms': ['cough', 'chest tightness', 'difficulty breathing', 'anxiety'],
+        'risk_factors': ['asthma history', 'allergies', 'triggers', 'season'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    
+    # Gastrointestinal Conditions
+    'gastroenteritis': {
+        'required_symptoms': ['diarrhea'],
+        'supporting_symptoms': ['nausea', 'vomiting', 'abdominal pain', 'fever', 'dehydration'],
+        'risk_factors': ['recent travel', 'food poisoning', 'contact', 'contaminated water'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    },
+    'appendicitis': {
+        'required_symptoms': ['abdominal pain'],
+        'supporting_symptoms': ['nausea', 'vomiting', 'fever', 'loss of appetite', 'right lower quadrant pain'],
+        'risk_factors': ['age', 'sudden onset'],
+        'urgency': 'critical',
+        'confidence_boost': 0.2
+    },
+    'peptic_ulcer': {
+        'required_symptoms': ['abdominal pain'],
+        'supporting_symptoms': ['nausea', 'vomiting', 'bloating', 'heartburn', 'blood in stool'],
+        'risk_factors': ['h pylori', 'nsaid use', 'stress', 'smoking'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    },
+    
+    # Pediatric Conditions
+    'measles': {
+        'required_symptoms': ['fever', 'rash'],
+        'supporting_symptoms': ['cough', 'runny nose', 'red eyes', 'white spots in mouth'],
+        'risk_factors': ['unvaccinated', 'exposure', 'outbreak'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    'chickenpox': {
+        'required_symptoms': ['rash', 'fever'],
+        'supporting_symptoms': ['itching', 'blisters', 'fatigue', 'loss of appetite'],
+        'risk_factors': ['unvaccinated', 'exposure', 'school age'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.2
+    },
+    'acute_diarrheal_disease': {
+        'required_symptoms': ['diarrhea'],
+        'supporting_symptoms': ['vomiting', 'fever', 'abdominal cramps', 'dehydration'],
+        'risk_factors': ['children', 'contaminated water', 'poor sanitation'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    },
+    'malnutrition': {
+        'required_symptoms': ['weight loss', 'weakness'],
+        'supporting_symptoms': ['fatigue', 'edema', 'hair loss', 'skin changes', 'irritability'],
+        'risk_factors': ['poverty', 'food insecurity', 'chronic disease'],
+        'urgency': 'high',
+        'confidence_boost': 0.15
+    },
+    
+    # Metabolic/Endocrine
+    'diabetes_mellitus': {
+        'required_symptoms': ['excessive thirst', 'frequent urination'],
+        'supporting_symptoms': ['weight loss', 'fatigue', 'blurred vision', 'hunger'],
+        'risk_factors': ['family history', 'obesity', 'sedentary lifestyle'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.2
+    },
+    'diabetic_ketoacidosis': {
+        'required_symptoms': ['nausea', 'vomiting', 'abdominal pain'],
+        'supporting_symptoms': ['confusion', 'rapid breathing', 'fruity breath', 'excessive thirst'],
+        'risk_factors': ['diabetes', 'infection', 'medication non-compliance'],
+        'urgency': 'critical',
+        'confidence_boost': 0.25
+    },
+    
+    # Neurological
+    'migraine': {
+        'required_symptoms': ['headache'],
+        'supporting_symptoms': ['nausea', 'light sensitivity', 'sound sensitivity', 'visual disturbances'],
+        'risk_factors': ['family history', 'stress', 'hormonal changes', 'triggers'],
+        'urgency': 'low',
+        'confidence_boost': 0.1
+    },
+    'meningitis': {
+        'required_symptoms': ['severe headache', 'fever', 'neck stiffness'],
+        'supporting_symptoms': ['confusion', 'sensitivity to light', 'nausea', 'vomiting'],
+        'risk_factors': ['recent infection', 'immunocompromised', 'close contact'],
+        'urgency': 'critical',
+        'confidence_boost': 0.3
+    },
+    'stroke': {
+        'required_symptoms': ['weakness', 'confusion'],
+        'supporting_symptoms': ['slurred speech', 'facial drooping', 'numbness', 'vision changes'],
+        'risk_factors': ['hypertension', 'diabetes', 'smoking', 'age'],
+        'urgency': 'critical',
+        'confidence_boost': 0.3
+    },
+    'seizure_disorder': {
+        'required_symptoms': ['seizure'],
+        'supporting_symptoms': ['loss of consciousness', 'confusion', 'muscle spasms', 'headache'],
+        'risk_factors': ['epilepsy', 'head injury', 'fever', 'medication'],
+        'urgency': 'high',
+        'confidence_boost': 0.2
+    },
+    
+    # Other Common Conditions
+    'anemia': {
+        'required_symptoms': ['fatigue', 'weakness'],
+        'supporting_symptoms': ['pale skin', 'dizziness', 'shortness of breath', 'cold hands'],
+        'risk_factors': ['poor nutrition', 'bleeding', 'chronic disease', 'pregnancy'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    },
+    'urinary_tract_infection': {
+        'required_symptoms': ['frequent urination', 'burning sensation'],
+        'supporting_symptoms': ['cloudy urine', 'blood in urine', 'pelvic pain', 'fever'],
+        'risk_factors': ['female', 'sexual activity', 'poor hygiene'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    },
+    'coeliac_disease': {
+        'required_symptoms': ['abdominal pain', 'diarrhea'],
+        'supporting_symptoms': ['bloating', 'weight loss', 'fatigue', 'nausea', 'constipation'],
+        'risk_factors': ['family history', 'gluten exposure', 'autoimmune'],
+        'urgency': 'low',
+        'confidence_boost': 0.15
+    },
+    'dehydration': {
+        'required_symptoms': ['thirst', 'dry mouth'],
+        'supporting_symptoms': ['dizziness', 'weakness', 'dark urine', 'fatigue', 'confusion'],
+        'risk_factors': ['diarrhea', 'vomiting', 'fever', 'excessive sweating'],
+        'urgency': 'moderate',
+        'confidence_boost': 0.15
+    }
+})
+
+COMPILED_SYMPTOM_PATTERNS = compile_symptom_patterns(SYMPTOM_PATTERNS)
+COMPILED_CONDITION_RULES = compile_condition_rules(CONDITION_RULES)
+CONDITION_RULE_MATRIX = ConditionRuleMatrix(COMPILED_CONDITION_RULES)
+
+
 class MedicalAIDiagnosticEngine:
     """
     AI-powered diagnostic engine combining RAG with rule-based reasoning
@@ -56,249 +380,12 @@ class MedicalAIDiagnosticEngine:
         self.confidence_threshold = 0.4  # Lowered from 0.6 for better sensitivity
         self.max_diagnoses = 3
         
-        # Medical condition patterns and weights
-        self.symptom_patterns = {
-            'cardiac': {
-                'keywords': ['chest pain', 'shortness of breath', 'palpitations', 'fatigue', 'dizziness', 'sweating'],
-                'severity_indicators': ['severe', 'crushing', 'radiating', 'sudden onset'],
-                'weight': 0.8
-            },
-            'respiratory': {
-                'keywords': ['cough', 'shortness of breath', 'wheezing', 'chest tightness', 'sputum'],
-                'severity_indicators': ['blood', 'persistent', 'worsening', 'fever'],
-                'weight': 0.7
-            },
-            'gastrointestinal': {
-                'keywords': ['nausea', 'vomiting', 'diarrhea', 'abdominal pain', 'constipation', 'bloating'],
-                'severity_indicators': ['blood', 'severe', 'persistent', 'dehydration'],
-                'weight': 0.6
-            },
-            'neurological': {
-                'keywords': ['headache', 'dizziness', 'confusion', 'numbness', 'weakness', 'seizure'],
-                'severity_indicators': ['sudden', 'severe', 'persistent', 'loss of consciousness'],
-                'weight': 0.8
-            },
-            'infectious': {
-                'keywords': ['fever', 'chills', 'fatigue', 'body aches', 'sore throat', 'cough'],
-                'severity_indicators': ['high fever', 'persistent', 'worsening', 'difficulty breathing'],
-                'weight': 0.5
-            }
-        }
-        
-        # Common conditions with diagnostic criteria - Expanded for comprehensive diagnosis
-        self.condition_rules = {
-            # Cardiovascular
-            'acute_coronary_syndrome': {
-                'required_symptoms': ['chest pain'],
-                'supporting_symptoms': ['shortness of breath', 'sweating', 'nausea', 'radiating pain'],
-                'risk_factors': ['diabetes', 'hypertension', 'smoking', 'family history'],
-                'urgency': 'critical',
-                'confidence_boost': 0.3
-            },
-            'hypertensive_crisis': {
-                'required_symptoms': ['headache', 'high blood pressure'],
-                'supporting_symptoms': ['dizziness', 'chest pain', 'shortness of breath', 'blurred vision'],
-                'risk_factors': ['hypertension', 'medication non-compliance'],
-                'urgency': 'critical',
-                'confidence_boost': 0.25
-            },
-            
-            # Infectious Diseases - Common in Sub-Saharan Africa
-            'malaria': {
-                'required_symptoms': ['fever', 'chills'],
-                'supporting_symptoms': ['headache', 'body aches', 'sweating', 'nausea', 'vomiting', 'fatigue'],
-                'risk_factors': ['endemic area', 'travel', 'no prophylaxis', 'mosquito exposure'],
-                'urgency': 'high',
-                'confidence_boost': 0.25
-            },
-            'typhoid_fever': {
-                'required_symptoms': ['fever', 'headache'],
-                'supporting_symptoms': ['abdominal pain', 'weakness', 'loss of appetite', 'constipation', 'diarrhea'],
-                'risk_factors': ['poor sanitation', 'contaminated food', 'contaminated water'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            'tuberculosis': {
-                'required_symptoms': ['cough', 'fever'],
-                'supporting_symptoms': ['night sweats', 'weight loss', 'fatigue', 'chest pain', 'blood in sputum'],
-                'risk_factors': ['hiv', 'immunocompromised', 'contact with tb', 'crowded living'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            'hiv_related_illness': {
-                'required_symptoms': ['fever', 'weight loss'],
-                'supporting_symptoms': ['diarrhea', 'cough', 'fatigue', 'night sweats', 'enlarged lymph nodes'],
-                'risk_factors': ['hiv positive', 'immunosuppressed', 'opportunistic infections'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            'acute_febrile_illness': {
-                'required_symptoms': ['fever'],
-                'supporting_symptoms': ['headache', 'body aches', 'fatigue', 'chills', 'weakness', 'sweating'],
-                'risk_factors': ['recent infection', 'exposure', 'travel', 'season'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.2
-            },
-            
-            # Respiratory Conditions
-            'pneumonia': {
-                'required_symptoms': ['cough', 'fever'],
-                'supporting_symptoms': ['shortness of breath', 'chest pain', 'sputum', 'difficulty breathing'],
-                'risk_factors': ['age', 'immunocompromised', 'chronic disease', 'smoking'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            'upper_respiratory_infection': {
-                'required_symptoms': ['cough'],
-                'supporting_symptoms': ['fever', 'sore throat', 'runny nose', 'congestion', 'fatigue', 'headache'],
-                'risk_factors': ['recent exposure', 'season', 'school', 'daycare'],
-                'urgency': 'low',
-                'confidence_boost': 0.15
-            },
-            'bronchitis': {
-                'required_symptoms': ['cough'],
-                'supporting_symptoms': ['sputum', 'chest discomfort', 'fever', 'fatigue', 'shortness of breath'],
-                'risk_factors': ['smoking', 'recent infection', 'season'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            },
-            'asthma_exacerbation': {
-                'required_symptoms': ['shortness of breath', 'wheezing'],
-                'supporting_symptoms': ['cough', 'chest tightness', 'difficulty breathing', 'anxiety'],
-                'risk_factors': ['asthma history', 'allergies', 'triggers', 'season'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            
-            # Gastrointestinal Conditions
-            'gastroenteritis': {
-                'required_symptoms': ['diarrhea'],
-                'supporting_symptoms': ['nausea', 'vomiting', 'abdominal pain', 'fever', 'dehydration'],
-                'risk_factors': ['recent travel', 'food poisoning', 'contact', 'contaminated water'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            },
-            'appendicitis': {
-                'required_symptoms': ['abdominal pain'],
-                'supporting_symptoms': ['nausea', 'vomiting', 'fever', 'loss of appetite', 'right lower quadrant pain'],
-                'risk_factors': ['age', 'sudden onset'],
-                'urgency': 'critical',
-                'confidence_boost': 0.2
-            },
-            'peptic_ulcer': {
-                'required_symptoms': ['abdominal pain'],
-                'supporting_symptoms': ['nausea', 'vomiting', 'bloating', 'heartburn', 'blood in stool'],
-                'risk_factors': ['h pylori', 'nsaid use', 'stress', 'smoking'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            },
-            
-            # Pediatric Conditions
-            'measles': {
-                'required_symptoms': ['fever', 'rash'],
-                'supporting_symptoms': ['cough', 'runny nose', 'red eyes', 'white spots in mouth'],
-                'risk_factors': ['unvaccinated', 'exposure', 'outbreak'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            'chickenpox': {
-                'required_symptoms': ['rash', 'fever'],
-                'supporting_symptoms': ['itching', 'blisters', 'fatigue', 'loss of appetite'],
-                'risk_factors': ['unvaccinated', 'exposure', 'school age'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.2
-            },
-            'acute_diarrheal_disease': {
-                'required_symptoms': ['diarrhea'],
-                'supporting_symptoms': ['vomiting', 'fever', 'abdominal cramps', 'dehydration'],
-                'risk_factors': ['children', 'contaminated water', 'poor sanitation'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            },
-            'malnutrition': {
-                'required_symptoms': ['weight loss', 'weakness'],
-                'supporting_symptoms': ['fatigue', 'edema', 'hair loss', 'skin changes', 'irritability'],
-                'risk_factors': ['poverty', 'food insecurity', 'chronic disease'],
-                'urgency': 'high',
-                'confidence_boost': 0.15
-            },
-            
-            # Metabolic/Endocrine
-            'diabetes_mellitus': {
-                'required_symptoms': ['excessive thirst', 'frequent urination'],
-                'supporting_symptoms': ['weight loss', 'fatigue', 'blurred vision', 'hunger'],
-                'risk_factors': ['family history', 'obesity', 'sedentary lifestyle'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.2
-            },
-            'diabetic_ketoacidosis': {
-                'required_symptoms': ['nausea', 'vomiting', 'abdominal pain'],
-                'supporting_symptoms': ['confusion', 'rapid breathing', 'fruity breath', 'excessive thirst'],
-                'risk_factors': ['diabetes', 'infection', 'medication non-compliance'],
-                'urgency': 'critical',
-                'confidence_boost': 0.25
-            },
-            
-            # Neurological
-            'migraine': {
-                'required_symptoms': ['headache'],
-                'supporting_symptoms': ['nausea', 'light sensitivity', 'sound sensitivity', 'visual disturbances'],
-                'risk_factors': ['family history', 'stress', 'hormonal changes', 'triggers'],
-                'urgency': 'low',
-                'confidence_boost': 0.1
-            },
-            'meningitis': {
-                'required_symptoms': ['severe headache', 'fever', 'neck stiffness'],
-                'supporting_symptoms': ['confusion', 'sensitivity to light', 'nausea', 'vomiting'],
-                'risk_factors': ['recent infection', 'immunocompromised', 'close contact'],
-                'urgency': 'critical',
-                'confidence_boost': 0.3
-            },
-            'stroke': {
-                'required_symptoms': ['weakness', 'confusion'],
-                'supporting_symptoms': ['slurred speech', 'facial drooping', 'numbness', 'vision changes'],
-                'risk_factors': ['hypertension', 'diabetes', 'smoking', 'age'],
-                'urgency': 'critical',
-                'confidence_boost': 0.3
-            },
-            'seizure_disorder': {
-                'required_symptoms': ['seizure'],
-                'supporting_symptoms': ['loss of consciousness', 'confusion', 'muscle spasms', 'headache'],
-                'risk_factors': ['epilepsy', 'head injury', 'fever', 'medication'],
-                'urgency': 'high',
-                'confidence_boost': 0.2
-            },
-            
-            # Other Common Conditions
-            'anemia': {
-                'required_symptoms': ['fatigue', 'weakness'],
-                'supporting_symptoms': ['pale skin', 'dizziness', 'shortness of breath', 'cold hands'],
-                'risk_factors': ['poor nutrition', 'bleeding', 'chronic disease', 'pregnancy'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            },
-            'urinary_tract_infection': {
-                'required_symptoms': ['frequent urination', 'burning sensation'],
-                'supporting_symptoms': ['cloudy urine', 'blood in urine', 'pelvic pain', 'fever'],
-                'risk_factors': ['female', 'sexual activity', 'poor hygiene'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            },
-            'coeliac_disease': {
-                'required_symptoms': ['abdominal pain', 'diarrhea'],
-                'supporting_symptoms': ['bloating', 'weight loss', 'fatigue', 'nausea', 'constipation'],
-                'risk_factors': ['family history', 'gluten exposure', 'autoimmune'],
-                'urgency': 'low',
-                'confidence_boost': 0.15
-            },
-            'dehydration': {
-                'required_symptoms': ['thirst', 'dry mouth'],
-                'supporting_symptoms': ['dizziness', 'weakness', 'dark urine', 'fatigue', 'confusion'],
-                'risk_factors': ['diarrhea', 'vomiting', 'fever', 'excessive sweating'],
-                'urgency': 'moderate',
-                'confidence_boost': 0.15
-            }
-        }
+        # Shared, read-only rule tables (built once per process, see rule_tables.py)
+        self.symptom_patterns = SYMPTOM_PATTERNS
+        self.condition_rules = CONDITION_RULES
+        self._compiled_patterns = COMPILED_SYMPTOM_PATTERNS
+        self._compiled_rules = COMPILED_CONDITION_RULES
+        self._rule_matrix = CONDITION_RULE_MATRIX
     
     def _calculate_symptom_severity(self, symptoms: str) -> float:
         """
@@ -310,27 +397,19 @@ class MedicalAIDiagnosticEngine:
         Returns:
             float: Severity score (0.0 to 1.0)
         """
-        symptoms_lower = symptoms.lower()
+        scan = scan_symptoms(symptoms)
         severity_score = 0.0
         total_weight = 0.0
         
-        for category, data in self.symptom_patterns.items():
-            category_score = 0.0
-            
-            # Check for symptom keywords
-            for keyword in data['keywords']:
-                if keyword in symptoms_lower:
-                    category_score += 0.2
-            
-            # Check for severity indicators
-            for indicator in data['severity_indicators']:
-                if indicator in symptoms_lower:
-                    category_score += 0.3
+        for pattern in self._compiled_patterns:
+            # Symptom keywords and severity indicators of this category present in the text
+            category_score = 0.2 * len(scan.found(('symptom', pattern.category)))
+            category_score += 0.3 * len(scan.found(('severity', pattern.category)))
             
             # Weight the category score
             if category_score > 0:
-                severity_score += category_score * data['weight']
-                total_weight += data['weight']
+                severity_score += category_score * pattern.weight
+                total_weight += pattern.weight
         
         return min(severity_score / max(total_weight, 1.0), 1.0)
     
@@ -340,63 +419,19 @@ class MedicalAIDiagnosticEngine:
         
         Args:
             symptoms (str): Patient symptoms
-            patient_history (Dict): Patient medical history
+            patient_history (Dict): Patient medical history (or a PatientContext)
             
         Returns:
             List[Dict]: Matched conditions with confidence scores
         """
-        symptoms_lower = symptoms.lower()
-        matched_conditions = []
-        
-        for condition, rules in self.condition_rules.items():
-            confidence = 0.0
-            
-            # Check required symptoms - use flexible matching
-            required_count = 0
-            for symptom in rules['required_symptoms']:
-                # Check for partial matches (e.g., "fever" matches "high fever", "febrile")
-                symptom_words = symptom.split()
-                if any(word in symptoms_lower for word in symptom_words):
-                    required_count += 1
-            
-            # Require at least one required symptom
-            if required_count == 0:
-                continue
-            
-            # Scale confidence based on how many required symptoms matched
-            required_ratio = required_count / len(rules['required_symptoms'])
-            confidence += 0.4 * required_ratio  # Base confidence
-            
-            # Check supporting symptoms
-            supporting_count = sum(1 for symptom in rules['supporting_symptoms'] 
-                                 if any(word in symptoms_lower for word in symptom.split()))
-            supporting_ratio = supporting_count / len(rules['supporting_symptoms']) if rules['supporting_symptoms'] else 0
-            confidence += supporting_ratio * 0.3
-            
-            # Check risk factors from patient history
-            risk_factor_count = 0
-            for risk_factor in rules['risk_factors']:
-                if self._check_risk_factor(risk_factor, patient_history):
-                    risk_factor_count += 1
-            
-            if rules['risk_factors']:
-                risk_ratio = risk_factor_count / len(rules['risk_factors'])
-                confidence += risk_ratio * 0.2
-            
-            # Apply confidence boost
-            confidence += rules['confidence_boost']
-            confidence = min(confidence, 1.0)
-            
-            if confidence >= self.confidence_threshold:
-                matched_conditions.append({
-                    'condition': condition.replace('_', ' ').title(),
-                    'confidence': confidence,
-                    'urgency': rules['urgency'],
-                    'supporting_symptoms': supporting_count,
-                    'risk_factors': risk_factor_count
-                })
-        
-        return sorted(matched_conditions, key=lambda x: x['confidence'], reverse=True)
+        # Required/supporting symptom phrases match on any of their words (e.g.
+        # "pain" for "chest pain"); conditions need at least one required symptom.
+        # All conditions are scored at once, see rule_tables.ConditionRuleMatrix.
+        return self._rule_matrix.matches(
+            scan_symptoms(symptoms).keywords,
+            PatientContext.coerce(patient_history).has_risk_factor,
+            self.confidence_threshold,
+        )
     
     def _check_risk_factor(self, risk_factor: str, patient_history: Dict) -> bool:
         """
@@ -404,78 +439,172 @@ class MedicalAIDiagnosticEngine:
         
         Args:
             risk_factor (str): Risk factor to check
-            patient_history (Dict): Patient history data
+            patient_history (Dict): Patient history data (or a PatientContext;
+                pass one when checking several risk factors for the same case)
             
         Returns:
             bool: True if risk factor is present
         """
-        history_text = json.dumps(patient_history).lower()
-        
-        # Simple keyword matching for common risk factors
-        risk_mappings = {
-            'diabetes': ['diabetes', 'diabetic'],
-            'hypertension': ['hypertension', 'high blood pressure'],
-            'smoking': ['smoking', 'smoker', 'tobacco'],
-            'family history': ['family history', 'hereditary'],
-            'age > 65': lambda: patient_history.get('age', 0) > 65,
-            'immunocompromised': ['immunocompromised', 'immune deficiency'],
-            'chronic disease': ['chronic', 'long-term condition']
-        }
-        
-        if risk_factor in risk_mappings:
-            mapping = risk_mappings[risk_factor]
-            if callable(mapping):
-                return mapping()
-            else:
-                return any(keyword in history_text for keyword in mapping)
-        
-        return False
+        # Keywords per risk factor: patient_context.RISK_FACTOR_KEYWORDS
+        return PatientContext.coerce(patient_history).has_risk_factor(risk_factor)
     
-    def _query_ollama_api(self, prompt: str) -> Optional[Dict]:
+    @timed('llm.query_ollama')
+    def _query_ollama_api(self, prompt: str, use_cache: bool = True, task: str = 'diagnosis') -> Optional[Dict]:
         """
         Query Ollama local LLM for AI-powered diagnosis with reasoning
         
         Args:
             prompt (str): Medical prompt for analysis
+            use_cache (bool): Serve/store the answer in the LLM response cache;
+                pass False when a fresh answer is explicitly requested
+            task (str): Model route (see llm_routing): 'diagnosis',
+                'fused_analysis', 'explanation' or 'triage'
             
         Returns:
             Optional[Dict]: Parsed AI response with diagnosis details or None if unavailable
         """
+        route = resolve_model_route(task)
+        payload = self._build_ollama_payload(prompt, route=route)
+        
+        # Identical prompt to the same model -> reuse the stored answer. A call
+        # downgraded under load still prefers a stored answer from the configured model.
+        cache = get_llm_cache()
+        cache_key = payload_cache_key(payload)
+        if cache and use_cache:
+            lookup_keys = [cache_key]
+            if route['downgraded']:
+                lookup_keys.insert(0, payload_cache_key(dict(payload, model=route['configured_model'])))
+            for key in lookup_keys:
+                cached_text = cache.get(key)
+                if cached_text is not None:
+                    return self._parse_ollama_response(cached_text)
+        
+        if route['downgraded']:
+            logger.info(f"LLM busy - {task} call downgraded to {route['model']}")
+        
+        # Wait for a generation slot; higher-priority cases are admitted first
         try:
-            # Ollama API endpoint (default local installation)
-            ollama_url = getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434/api/generate')
-            ollama_model = getattr(settings, 'OLLAMA_MODEL', 'llama3.2')  # or 'mistral', 'meditron', etc.
-            
-            payload = {
-                "model": ollama_model,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json"  # Request JSON output
-            }
+            with get_llm_scheduler().slot(timeout=route['queue_timeout']):
+                return self._post_ollama(payload, cache, cache_key)
+        except LLMQueueTimeout as e:
+            logger.warning(f"{e} - using rule-based diagnosis")
+            return None
+    
+    def _post_ollama(self, payload: Dict, cache, cache_key: str) -> Optional[Dict]:
+        """
+        Send one generate request to an Ollama endpoint (caller holds an LLM scheduler slot)
+        
+        The endpoint comes from the Ollama pool (least outstanding requests,
+        sticky by model). If it cannot be reached, the next available
+        endpoint is tried.
+        
+        Args:
+            payload (Dict): Request body from _build_ollama_payload
+            cache: LLM response cache, or None when disabled
+            cache_key (str): Cache key of the payload
             
-            response = requests.post(ollama_url, json=payload, timeout=120)  # Reduced to 2 minutes
+        Returns:
+            Optional[Dict]: Parsed AI response or None if unavailable
+        """
+        pool = get_ollama_pool()
+        model = payload['model']
+        tried = []
+        
+        while True:
+            # Fail fast while every endpoint is known to be down; callers fall back to rule-based matching
+            endpoint = pool.acquire(model, exclude=tried)
+            if endpoint is None:
+                if not tried:
+                    logger.warning("Ollama circuit open - skipping LLM call and using rule-based diagnosis")
+                return None
+            tried.append(endpoint)
+            breaker = endpoint.breaker
+            start = time.perf_counter()
+            ok = False
             
-            if response.status_code == 200:
-                result = response.json()
-                response_text = result.get('response', '')
+            try:
+                # Pooled keep-alive session; connect/read timeouts come from settings
+                response, _timings = get_llm_client().post_json(endpoint.url, payload, backend='ollama')
                 
-                # Try to parse JSON response
-                try:
-                    diagnosis_data = json.loads(response_text)
-                    return diagnosis_data
-                except json.JSONDecodeError:
-                    # If not valid JSON, return as text
-                    return {'text_response': response_text}
-            else:
-                print(f"Ollama API error: {response.status_code}")
+                if response.status_code == 200:
+                    breaker.record_success()
+                    ok = True
+                    result = response.json()
+                    response_text = result.get('response', '')
+                    if 'prompt_eval_count' in result:
+                        logger.info(
+                            f"Ollama prompt ({endpoint.name}): {result['prompt_eval_count']} tokens evaluated, "
+                            f"{result.get('eval_count', 0)} generated"
+                        )
+                    
+                    # A fresh answer still refreshes the cache for later callers
+                    if cache and response_text:
+                        cache.set(cache_key, model, response_text)
+                    
+                    return self._parse_ollama_response(response_text)
+                else:
+                    breaker.record_failure(f"HTTP {response.status_code}")
+                    logger.error(f"Ollama API error ({endpoint.name}): HTTP {response.status_code}")
+                    return None
+                
+            except requests.exceptions.ConnectionError:
+                breaker.record_failure("connection error")
+                logger.warning(f"Ollama not running at {endpoint.url}. Install Ollama from https://ollama.ai/ and run 'ollama serve'")
+                continue  # try another endpoint
+            except requests.exceptions.Timeout:
+                breaker.record_failure("timeout")
+                logger.warning(f"Ollama request to {endpoint.name} timed out")
+                return None
+            except Exception as e:
+                breaker.record_failure(str(e))
+                logger.error(f"Error querying Ollama API ({endpoint.name}): {e}")
                 return None
+            finally:
+                pool.release(endpoint, model, time.perf_counter() - start, ok, payload.get('keep_alive'))
+    
+    def _build_ollama_payload(
+        self, prompt: str, stream: bool = False, task: str = 'diagnosis', route: Dict = None
+    ) -> Dict:
+        """
+        Build the Ollama generate request body
+        
+        Args:
+            prompt (str): Medical prompt for analysis
+            stream (bool): Ask Ollama to stream tokens
+            task (str): Model route used when no resolved route is given
+            route (Dict): Route from resolve_model_route
             
-        except requests.exceptions.ConnectionError:
-            print("Warning: Ollama not running. Install Ollama from https://ollama.ai/ and run 'ollama serve'")
-            return None
-        except Exception as e:
-            print(f"Error querying Ollama API: {str(e)}")
-            return None
+        Returns:
+            Dict: Request payload
+        """
+        route = route or resolve_model_route(task)
+        payload = {
+            "model": route['model'],  # per-task model from settings.LLM_MODEL_ROUTES
+            "prompt": prompt,
+            "stream": stream,
+            "format": "json",  # Request JSON output
+            "options": dict(route['options']),  # num_ctx (prompt budget) and num_predict
+        }
+        if route['keep_alive'] is not None:
+            # How long Ollama keeps the model loaded after this call
+            payload["keep_alive"] = route['keep_alive']
+        return payload
+    
+    def _parse_ollama_response(self, response_text: str) -> Dict:
+        """
+        Parse the text Ollama generated in JSON mode
+        
+        Args:
+            response_text (str): Raw generated text
+            
+        Returns:
+            Dict: Parsed JSON, or {'text_response': ...} if it is not valid JSON
+        """
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # If not valid JSON, return as text
+            return {'text_response': response_text}
     
     def _query_huggingface_api(self, prompt: str) -> Optional[str]:
         """
@@ -500,7 +629,9 @@ class MedicalAIDiagnosticEngine:
             headers = {"Authorization": f"Bearer {hf_api_key}"}
             payload = {"inputs": prompt}
             
-            response = requests.post(api_url, headers=headers, json=payload, timeout=10)
+            response, _timings = get_llm_client().post_json(
+                api_url, payload, headers=headers, read_timeout=10, backend='huggingface'
+            )
             if response.status_code == 200:
                 result = response.json()
                 if isinstance(result, list) and len(result) > 0:
@@ -511,51 +642,101 @@ class MedicalAIDiagnosticEngine:
         
         return None
     
-    def _format_medical_prompt(self, symptoms: str, patient_history: Dict, knowledge_context: List[Dict]) -> str:
+    def _format_medical_prompt(
+        self, symptoms: str, patient_history: Dict, knowledge_context: List[Dict], fused: bool = False
+    ) -> str:
         """
         Format a structured medical prompt for AI analysis using the DIAGNOSIS_PROMPT template
         
         Args:
             symptoms (str): Patient symptoms
-            patient_history (Dict): Patient medical history
+            patient_history (Dict): Patient medical history (or a PatientContext)
             knowledge_context (List[Dict]): Retrieved medical knowledge
+            fused (bool): Use FUSED_ANALYSIS_PROMPT, which also asks for the
+                treatment plan and medications
             
         Returns:
             str: Formatted medical prompt
         """
-        # Extract key information from knowledge context
-        relevant_info = []
-        for chunk in knowledge_context[:5]:  # Top 5 most relevant
-            relevant_info.append(f"- {chunk['content'][:300]}...")
-        
-        # Extract vital signs if available
-        vital_signs = patient_history.get('vital_signs', 'Not recorded')
-        if isinstance(vital_signs, dict):
-            vital_signs = ', '.join([f"{k}: {v}" for k, v in vital_signs.items()])
-        
-        # Use the DIAGNOSIS_PROMPT template and format with patient data
-        prompt = DIAGNOSIS_PROMPT.format(
-            age=patient_history.get('age', 'Unknown'),
-            gender=patient_history.get('gender', 'Unknown'),
-            symptoms=symptoms,
-            vital_signs=vital_signs,
-            medical_history=patient_history.get('medical_history', 'None reported'),
-            retrieved_context='\n'.join(relevant_info)
+        patient = PatientContext.coerce(patient_history)
+        # Retriever Agent references (if any) compete for the same evidence budget
+        chunks = list(knowledge_context) + list(patient.reference_chunks)
+        
+        # Use the DIAGNOSIS_PROMPT (or fused) template and format with patient data;
+        # the most symptom-relevant sentences are packed into the route's token budget
+        template = FUSED_ANALYSIS_PROMPT if fused else DIAGNOSIS_PROMPT
+        route = get_route_config(self.diagnosis_task(fused))
+        prompt = build_budgeted_prompt(
+            template,
+            {
+                'age': patient.age if patient.age is not None else 'Unknown',
+                'gender': patient.gender or 'Unknown',
+                'symptoms': symptoms,
+                'vital_signs': patient.vital_signs_text or 'Not recorded',
+                'medical_history': patient.history_summary() or 'None reported',
+            },
+            query=symptoms,
+            chunks=chunks,
+            context_tokens=route.get('num_ctx'),
+            reserved_tokens=route.get('num_predict')
         )
         
         return prompt
     
-    def get_ai_diagnosis(self, symptoms: str, patient_history: Dict) -> Dict[str, Any]:
+    def diagnosis_task(self, fused: bool = None) -> str:
+        """
+        Model route of the diagnosis call ('fused_analysis' answers are longer)
+        
+        Args:
+            fused (bool): Fused analysis (defaults to settings.LLM_FUSED_ANALYSIS)
+            
+        Returns:
+            str: Route name for resolve_model_route
+        """
+        if fused is None:
+            fused = getattr(settings, 'LLM_FUSED_ANALYSIS', False)
+        return 'fused_analysis' if fused else 'diagnosis'
+    
+    def build_diagnosis_prompt(self, symptoms: str, patient_history: Dict, fused: bool = None) -> str:
+        """
+        Retrieve medical knowledge for the symptoms and format the diagnosis prompt
+        
+        Args:
+            symptoms (str): Patient symptoms description
+            patient_history (Dict): Patient medical history and demographics
+            fused (bool): Use the fused template, as get_ai_diagnosis does
+                (defaults to settings.LLM_FUSED_ANALYSIS)
+            
+        Returns:
+            str: Formatted medical prompt
+        """
+        if fused is None:
+            fused = getattr(settings, 'LLM_FUSED_ANALYSIS', False)
+        knowledge_results = search_medical_knowledge(symptoms, top_k=5)
+        return self._format_medical_prompt(symptoms, patient_history, knowledge_results, fused=fused)
+    
+    def get_ai_diagnosis(
+        self, symptoms: str, patient_history: Dict, use_cache: bool = True, fused: bool = None
+    ) -> Dict[str, Any]:
         """
         Generate AI-powered diagnosis using RAG and rule-based reasoning
         
         Args:
             symptoms (str): Patient symptoms description
             patient_history (Dict): Patient medical history and demographics
+                (or a PatientContext)
+            use_cache (bool): Allow a cached LLM answer for an identical prompt
+            fused (bool): Ask for treatment plan and medications in the same
+                generation (defaults to settings.LLM_FUSED_ANALYSIS)
             
         Returns:
             Dict: Structured diagnosis with recommendations
         """
+        if fused is None:
+            fused = getattr(settings, 'LLM_FUSED_ANALYSIS', False)
+        # Patient features are extracted once and shared by the rules and the prompt
+        patient_history = PatientContext.coerce(patient_history)
+        
         try:
             # Step 1: Query knowledge base for relevant medical information
             knowledge_results = search_medical_knowledge(symptoms, top_k=5)
@@ -580,12 +761,14 @@ class MedicalAIDiagnosticEngine:
             ollama_confidence = None
             ollama_reasoning = None
             diagnosis_explanation = None
+            fused_sections = {}
+            ai_response = None
             
             if knowledge_results:
-                prompt = self._format_medical_prompt(symptoms, patient_history, knowledge_results)
+                prompt = self._format_medical_prompt(symptoms, patient_history, knowledge_results, fused=fused)
                 
                 # Try Ollama first (local LLM with reasoning)
-                ai_response = self._query_ollama_api(prompt)
+                ai_response = self._query_ollama_api(prompt, use_cache=use_cache, task=self.diagnosis_task(fused))
                 
                 if ai_response and isinstance(ai_response, dict):
                     # Extract structured diagnosis from Ollama
@@ -624,6 +807,10 @@ class MedicalAIDiagnosticEngine:
                     if ai_red_flags and isinstance(ai_red_flags, list):
                         # Store for later use
                         pass
+                    
+                    # Fused answer: treatment plan and medications for the Treatment Agent
+                    if fused:
+                        fused_sections = self._parse_fused_sections(ai_response)
                 
                 # Fallback to HuggingFace if Ollama unavailable
                 if not ai_diagnosis:
@@ -631,6 +818,17 @@ class MedicalAIDiagnosticEngine:
                     if ai_insights:
                         ai_diagnosis = ai_insights
             
+            # Plain-language explanation from the small model when the diagnosis
+            # answer left it out. Skipped when the diagnosis call itself failed
+            # (another call would most likely fail or time out too).
+            llm_answered = isinstance(ai_response, dict) and bool(ai_response)
+            if not diagnosis_explanation and llm_answered and get_ollama_pool().available():
+                explained = ai_diagnosis if isinstance(ai_diagnosis, str) and ai_diagnosis else None
+                if not explained and rule_based_diagnoses:
+                    explained = rule_based_diagnoses[0]['condition']
+                if explained:
+                    diagnosis_explanation = self.explain_diagnosis(explained, symptoms, use_cache=use_cache)
+            
             # Boost confidence if Ollama agrees with rule-based diagnosis
             if rule_based_diagnoses and ai_diagnosis and ollama_confidence:
                 top_rule_diagnosis = rule_based_diagnoses[0]['condition'].lower()
@@ -648,7 +846,7 @@ class MedicalAIDiagnosticEngine:
             # Step 7: Format final diagnosis
             diagnosis_result = {
                 'timestamp': datetime.now().isoformat(),
-                'patient_id': patient_history.get('patient_id'),
+                'patient_id': patient_history.patient_id,
                 'symptoms_analyzed': symptoms,
                 'severity_score': round(severity_score, 2),
                 'urgency_level': urgency_level,
@@ -666,6 +864,8 @@ class MedicalAIDiagnosticEngine:
                 'ai_reasoning': ollama_reasoning,  # Ollama's reasoning
                 'ai_confidence': ollama_confidence,  # Ollama's confidence
                 'diagnosis_explanation': diagnosis_explanation,  # Plain language explanation for nurses
+                'ai_treatment_plan': fused_sections.get('treatment_plan', {}),  # Fused mode only
+                'ai_medications': fused_sections.get('medications', []),  # Fused mode only
                 'recommendations': self._generate_recommendations(
                     severity_score, rule_based_diagnoses, urgency_level
                 ),
@@ -688,6 +888,82 @@ class MedicalAIDiagnosticEngine:
                 'diagnostic_confidence': 0.0
             }
     
+    def _parse_fused_sections(self, ai_response: Dict) -> Dict[str, Any]:
+        """
+        Extract the treatment plan and medications from a fused LLM answer
+        
+        Args:
+            ai_response (Dict): Parsed JSON from FUSED_ANALYSIS_PROMPT
+            
+        Returns:
+            Dict: {'treatment_plan': {immediate/short_term/follow_up_actions: [str]},
+                   'medications': [{name, dosage, duration, instructions}]}
+        """
+        treatment_plan = {}
+        plan = ai_response.get('treatment_plan')
+        if isinstance(plan, dict):
+            for key in ['immediate_actions', 'short_term_actions', 'follow_up_actions']:
+                steps = plan.get(key) or []
+                if isinstance(steps, str):
+                    steps = [steps]
+                treatment_plan[key] = [str(step).strip() for step in steps if str(step).strip()]
+        elif isinstance(plan, (list, str)) and plan:
+            # Unstructured plan - treat it as immediate actions
+            steps = [plan] if isinstance(plan, str) else plan
+            treatment_plan['immediate_actions'] = [str(step).strip() for step in steps if str(step).strip()]
+        
+        medications = []
+        for med in ai_response.get('medications') or []:
+            if isinstance(med, str):
+                med = {'name': med}
+            if not isinstance(med, dict) or not str(med.get('name', '')).strip():
+                continue
+            medications.append({
+                'name': str(med['name']).strip(),
+                'dosage': str(med.get('dosage') or 'As per clinical guidelines'),
+                'duration': str(med.get('duration') or 'As prescribed by healthcare provider'),
+                'instructions': str(med.get('instructions') or 'Follow healthcare provider instructions. Take as directed.'),
+            })
+        
+        return {'treatment_plan': treatment_plan, 'medications': medications}
+    
+    def explain_diagnosis(self, diagnosis: str, symptoms: str, use_cache: bool = True) -> str:
+        """
+        Plain-language explanation of a diagnosis from the small 'explanation' model route
+        
+        Args:
+            diagnosis (str): Condition to explain
+            symptoms (str): Patient symptoms
+            use_cache (bool): Allow a cached LLM answer for an identical prompt
+            
+        Returns:
+            str: Explanation, or '' if the LLM is unavailable
+        """
+        prompt = EXPLANATION_PROMPT.format(diagnosis=diagnosis, symptoms=symptoms)
+        ai_response = self._query_ollama_api(prompt, use_cache=use_cache, task='explanation')
+        if not isinstance(ai_response, dict):
+            return ''
+        explanation = ai_response.get('diagnosis_explanation') or ai_response.get('text_response', '')
+        return str(explanation).strip()
+    
+    def quick_ai_triage(self, symptoms: str) -> Optional[Dict]:
+        """
+        One-line urgency note from the small 'triage' model route
+        
+        Args:
+            symptoms (str): Patient symptoms
+            
+        Returns:
+            Optional[Dict]: {'urgency_level': str, 'reason': str} or None if unavailable
+        """
+        ai_response = self._query_ollama_api(TRIAGE_PROMPT.format(symptoms=symptoms), task='triage')
+        if not isinstance(ai_response, dict) or 'urgency_level' not in ai_response:
+            return None
+        return {
+            'urgency_level': str(ai_response['urgency_level']).lower(),
+            'reason': str(ai_response.get('reason', '')),
+        }
+    
     def _determine_urgency(self, severity_score: float, diagnoses: List[Dict]) -> str:
         """
         Determine urgency level based on severity and diagnoses
@@ -768,18 +1044,23 @@ diagnostic_engine = MedicalAIDiagnosticEngine()
 
 
 # Convenience function for easy integration
-def get_ai_diagnosis(symptoms: str, patient_history: Dict) -> Dict[str, Any]:
+def get_ai_diagnosis(
+    symptoms: str, patient_history: Dict, use_cache: bool = True, fused: bool = None
+) -> Dict[str, Any]:
     """
     Generate AI-powered medical diagnosis
     
     Args:
         symptoms (str): Patient symptoms description
         patient_history (Dict): Patient medical history and demographics
+        use_cache (bool): Allow a cached LLM answer for an identical prompt
+        fused (bool): One generation for diagnosis, treatment plan and
+            medications (defaults to settings.LLM_FUSED_ANALYSIS)
         
     Returns:
         Dict: Comprehensive diagnosis with treatment recommendations
     """
-    return diagnostic_engine.get_ai_diagnosis(symptoms, patient_history)
+    return diagnostic_engine.get_ai_diagnosis(symptoms, patient_history, use_cache=use_cache, fused=fused)
 
 
 def analyze_case_urgency(symptoms: str) -> str:
@@ -0,0 +1,296 @@
+"""
+Multi-agent case analysis pipeline
+
+Runs Coordinator -> Retriever -> Diagnosis -> Treatment for a saved case and
+stores the combined report in case.ai_diagnosis. Used by the analysis job
+worker (and so by CaseCreateView) and by the regenerate-diagnosis endpoint.
+Independent agent steps run concurrently; the wall time of each step, and
+'total' for the whole pipeline, is recorded under 'stage_timings_ms', and
+the time spent per instrumented stage under 'timing_breakdown_ms'.
+
+The report is written in two phases, marked by 'analysis_phase':
+
+- 'preliminary': rule-based triage, urgency, red flags and condition matches,
+  saved by save_preliminary_assessment() when the case is created (no
+  knowledge search or LLM call, so it takes milliseconds)
+- 'final': the full multi-agent report, which replaces the preliminary one
+  in place when analyze_case() finishes
+"""
+
+import json
+from typing import Dict, Any, Optional
+
+from django.utils import timezone
+
+from .ai_utils import diagnostic_engine
+from .keyword_engine import scan_symptoms
+from .llm_scheduler import llm_priority
+from .metrics import collect_timings, span, timed
+from .patient_context import PatientContext
+from .vital_signs import VitalSigns
+from .pipeline import AgentPipeline
+from .services import get_agent
+
+
+def report_phase(case) -> Optional[str]:
+    """
+    Phase of the report stored on a case: 'preliminary', 'final', or None if
+    it has no diagnosis yet. Reports written before the two-phase analysis
+    have no phase marker and are final.
+    """
+    try:
+        report = json.loads(case.ai_diagnosis) if case.ai_diagnosis else {}
+    except ValueError:
+        return None
+    if not isinstance(report, dict) or not report.get('diagnosis'):
+        return None
+    return report.get('analysis_phase', 'final')
+
+
+def build_case_prompt(case) -> str:
+    """
+    The diagnosis prompt analyze_case sends for a case: the same retrieved
+    protocols, patient context and template, so a streamed answer is stored
+    under the LLM cache entry the analysis job reads.
+    """
+    symptoms = case.symptoms
+    symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
+    patient_context = PatientContext.for_patient(case.patient, VitalSigns.coerce(case.vital_signs))
+    protocols = get_agent('retriever').search_protocols(query=symptoms, symptoms=symptom_list, top_k=5)
+    references = get_agent('diagnosis').prompt_references(protocols)
+    return diagnostic_engine.build_diagnosis_prompt(symptoms, patient_context.with_references(references))
+
+
+@timed('analysis.preliminary_assessment')
+def save_preliminary_assessment(case, vital_signs: VitalSigns = None) -> Dict[str, Any]:
+    """
+    Save a rule-based report on the case so nurses can act on urgency and red
+    flags before the LLM answers.
+
+    A case that already has a final report is left alone (e.g. when it is
+    re-analyzed), so the preliminary phase never replaces LLM output.
+
+    Args:
+        case: Saved Case instance
+        vital_signs: The case's parsed vital signs, if the caller already has
+            them (otherwise parsed from case.vital_signs)
+
+    Returns:
+        Dict: The preliminary report (or the existing final report)
+    """
+    if report_phase(case) == 'final':
+        return json.loads(case.ai_diagnosis)
+
+    patient = case.patient
+    symptoms = case.symptoms
+    if vital_signs is None:
+        vital_signs = VitalSigns.coerce(case.vital_signs)
+
+    coordinator = get_agent('coordinator')
+    diagnosis_agent = get_agent('diagnosis')
+    routing_decision = coordinator.route_case(case, symptoms, vital_signs)
+    red_flags = diagnosis_agent._identify_red_flags(symptoms)
+    emergency_conditions = diagnosis_agent._detect_emergency_conditions(symptoms, vital_signs)
+
+    patient_context = PatientContext.for_patient(patient, vital_signs)
+    rule_matches = diagnostic_engine._match_condition_rules(symptoms, patient_context)
+    severity_score = diagnostic_engine._calculate_symptom_severity(symptoms)
+
+    top_match = rule_matches[0] if rule_matches else None
+    preliminary = {
+        'multi_agent_system': 'HealthFlow DMS v1.0',
+        'analysis_phase': 'preliminary',
+        'timestamp': timezone.now().isoformat(),
+        'routing': routing_decision,
+        'diagnosis': {
+            'primary_diagnosis': top_match['condition'] if top_match else 'Awaiting AI analysis',
+            'confidence': round(top_match['confidence'] * 100, 1) if top_match else 0,
+            'explanation': '',
+            'differential_diagnoses': [
+                {'condition': m['condition'], 'confidence': m['confidence'], 'urgency': m['urgency']}
+                for m in rule_matches[:5]
+            ],
+            'red_flags': red_flags,
+            'emergency_conditions': emergency_conditions,
+            'recommended_tests': [],
+            'severity_score': round(severity_score, 2),
+            'urgency_level': diagnostic_engine._determine_urgency(severity_score, rule_matches),
+        },
+    }
+
+    case.ai_diagnosis = json.dumps(preliminary, indent=2)
+    case.priority = routing_decision['priority']
+    case.status = routing_decision['recommended_status']
+    case.save(update_fields=['ai_diagnosis', 'priority', 'status', 'updated_at'])
+
+    return preliminary
+
+
+def analyze_case(case, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Run the multi-agent workflow for a case and save the result on it.
+
+    The agent steps run as a dependency graph (see pipeline.py): protocol
+    search and the cardiac protocol lookup run side by side, and once the
+    diagnosis is in, the treatment plan, medication plan and first aid are
+    prepared concurrently.
+
+    Every timed span of the analysis (agent methods, LLM calls, see
+    metrics.py) is summed per stage under 'timing_breakdown_ms'. Serializing
+    and saving the report are timed too, but only reach the histograms.
+
+    Args:
+        case: Saved Case instance
+        use_cache: Whether a cached LLM answer may be reused
+
+    Returns:
+        Dict: The comprehensive diagnosis stored in case.ai_diagnosis
+    """
+    with collect_timings() as case_timings, span('analysis.total'):
+        comprehensive_diagnosis = _run_agents(case, use_cache)
+    comprehensive_diagnosis['timing_breakdown_ms'] = case_timings.as_dict()
+
+    # Save to case
+    routing_decision = comprehensive_diagnosis['routing']
+    with span('analysis.serialize_report'):
+        case.ai_diagnosis = json.dumps(comprehensive_diagnosis, indent=2)
+    case.priority = routing_decision['priority']
+    case.status = routing_decision['recommended_status']
+    with span('analysis.save_case'):
+        case.save(update_fields=['ai_diagnosis', 'priority', 'status', 'updated_at'])
+
+    return comprehensive_diagnosis
+
+
+def _run_agents(case, use_cache: bool) -> Dict[str, Any]:
+    """Run the agent pipeline for a case; returns the final report (not yet saved)."""
+    patient = case.patient
+    symptoms = case.symptoms
+    # Parsed once; every agent gets the same VitalSigns
+    vital_signs = VitalSigns.coerce(case.vital_signs)
+    symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
+
+    patient_history = {
+        'medical_history': patient.medical_history,
+        'allergies': patient.allergies,
+    }
+    # History, allergies, age and vitals are extracted once for the rules, the agents and the prompt
+    patient_context = PatientContext.for_patient(patient, vital_signs)
+
+    # Shared agent instances (built once per process)
+    coordinator = get_agent('coordinator')
+    retriever = get_agent('retriever')
+    diagnosis_agent = get_agent('diagnosis')
+    treatment_agent = get_agent('treatment')
+
+    def diagnose(results):
+        routing = results['routing']
+        # LLM calls for this case are scheduled at the coordinator's priority
+        with llm_priority(routing['priority'], routing['urgency_score']):
+            return diagnosis_agent.analyze_symptoms(
+                symptoms=symptoms,
+                vital_signs=vital_signs,
+                retriever_context=results['protocols'],
+                use_cache=use_cache,
+                patient_context=patient_context
+            )
+
+    def coordinate(results):
+        retriever_results = dict(results['protocols'])
+        if results['cardiac_protocol'] is not None:
+            retriever_results['cardiac_protocol'] = results['cardiac_protocol']
+        treatment_results = dict(results['treatment_plan'], medications=results['medications'])
+        if results['first_aid'] is not None:
+            treatment_results['first_aid'] = results['first_aid']
+        return {
+            'retriever': retriever_results,
+            'treatment': treatment_results,
+            'coordination': coordinator.coordinate_agents(
+                case, retriever_results, results['diagnosis'], treatment_results
+            ),
+        }
+
+    pipeline = AgentPipeline()
+    # COORDINATOR: Route the case and assess urgency
+    pipeline.add('routing', lambda r: coordinator.route_case(case, symptoms, vital_signs))
+    # RETRIEVER: Search the medical knowledge base, plus the cardiac protocol if needed
+    pipeline.add('protocols', lambda r: retriever.search_protocols(query=symptoms, symptoms=symptom_list, top_k=5))
+    pipeline.add(
+        'cardiac_protocol',
+        lambda r: retriever.retrieve_cardiac_emergency_protocol(),
+        when=lambda r: scan_symptoms(symptoms).any(retriever.CARDIAC_PROTOCOL_TRIGGERS),
+    )
+    # DIAGNOSIS: Analyze symptoms with the retrieved references
+    pipeline.add('diagnosis', diagnose, requires=['routing', 'protocols'])
+    # TREATMENT: Action plan, medications and (if critical) first aid, for all urgency levels
+    pipeline.add(
+        'treatment_plan',
+        lambda r: treatment_agent.create_action_plan(
+            diagnosis=r['diagnosis'],
+            urgency_level=r['routing']['urgency_level'],
+            symptoms=symptom_list,
+            red_flags=r['diagnosis'].get('red_flags', []),
+            emergency_conditions=r['diagnosis'].get('emergency_conditions', [])
+        ),
+        requires=['routing', 'diagnosis'],
+    )
+    pipeline.add(
+        'medications',
+        lambda r: treatment_agent.recommend_medications(
+            diagnosis=r['diagnosis'],
+            symptoms=symptom_list,
+            patient_history=patient_history,
+            allergies=[patient.allergies] if patient.allergies else []
+        ),
+        requires=['diagnosis'],
+    )
+    pipeline.add(
+        'first_aid',
+        lambda r: treatment_agent.provide_first_aid(r['diagnosis']['primary_diagnosis']),
+        requires=['routing', 'diagnosis'],
+        when=lambda r: r['routing']['urgency_level'] == 'critical',
+    )
+    # COORDINATOR: Coordinate all agent results
+    pipeline.add(
+        'coordination',
+        coordinate,
+        requires=['protocols', 'cardiac_protocol', 'diagnosis', 'treatment_plan', 'medications', 'first_aid'],
+    )
+
+    results, stage_timings = pipeline.run()
+    routing_decision = results['routing']
+    retriever_results = results['coordination']['retriever']
+    diagnosis_results = results['diagnosis']
+    treatment_results = results['coordination']['treatment']
+    coordinated_result = results['coordination']['coordination']
+
+    # Compile comprehensive AI diagnosis
+    # Ensure confidence is a percentage (0-100)
+    confidence_percentage = diagnosis_results['confidence_score']
+    if confidence_percentage <= 1.0:
+        confidence_percentage = confidence_percentage * 100
+
+    comprehensive_diagnosis = {
+        'multi_agent_system': 'HealthFlow DMS v1.0',
+        'analysis_phase': 'final',
+        'timestamp': timezone.now().isoformat(),
+        'routing': routing_decision,
+        'retriever': {
+            'knowledge_base_results': retriever_results.get('results', []),
+            'sources': retriever_results.get('sources', []),
+            'total_documents': retriever_results.get('total_found', 0)
+        },
+        'diagnosis': {
+            'primary_diagnosis': diagnosis_results['primary_diagnosis'],
+            'confidence': round(confidence_percentage, 1),  # Ensure percentage format
+            'explanation': diagnosis_results.get('explanation', ''),  # Plain language explanation
+            'differential_diagnoses': diagnosis_results['differential_diagnoses'],
+            'red_flags': diagnosis_results['red_flags'],
+            'emergency_conditions': diagnosis_results['emergency_conditions'],
+            'recommended_tests': diagnosis_results['recommended_tests'],
+        },
+        'treatment': treatment_results,
+        'coordination': coordinated_result,
+        'stage_timings_ms': stage_timings,
+    }
+    return comprehensive_diagnosis
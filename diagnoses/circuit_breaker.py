@@ -0,0 +1,213 @@
+"""
+Circuit breaker and background health probe for the Ollama backend
+
+When Ollama is down (or stuck loading a model) every diagnosis would otherwise
+wait for a connection error or the full read timeout before falling back to
+the rule-based path. The breaker opens after repeated failures so callers fail
+fast, and a cheap probe of Ollama's /api/tags endpoint moves it to half-open
+as soon as the server answers again, letting one trial request through.
+Each Ollama endpoint gets its own breaker and probe (see ollama_pool).
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Any
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Thread-safe three-state circuit breaker.
+
+    CLOSED: requests flow; consecutive failures are counted.
+    OPEN: requests are rejected until recovery_timeout passes or a health
+          probe succeeds.
+    HALF_OPEN: a single trial request is allowed; success closes the
+               circuit, failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock  # Monotonic seconds for the recovery timeout (injectable for tests)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+        self.last_failure = None
+        self.last_failure_at = None
+        self.rejected_count = 0
+        self.open_count = 0
+        self.last_probe_at = None
+        self.last_probe_ok = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _open(self, reason: str):
+        """Move to OPEN (caller holds the lock)."""
+        if self._state != self.OPEN:
+            self.open_count += 1
+            logger.warning(f"Circuit '{self.name}' opened: {reason}")
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Whether a call may be attempted now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.recovery_timeout:
+                    self.rejected_count += 1
+                    return False
+                self._state = self.HALF_OPEN
+                logger.info(f"Circuit '{self.name}' half-open after {self.recovery_timeout}s")
+            # HALF_OPEN: only one trial at a time
+            if self._trial_in_flight:
+                self.rejected_count += 1
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def is_available(self) -> bool:
+        """Whether allow_request would let a call through, without changing state."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                return self._clock() - self._opened_at >= self.recovery_timeout
+            return not self._trial_in_flight
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, reason: str = ''):
+        with self._lock:
+            self._consecutive_failures += 1
+            self.last_failure = reason
+            self.last_failure_at = time.time()
+            if self._state == self.HALF_OPEN:
+                self._open(f"trial request failed ({reason})")
+            elif self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._open(f"{self._consecutive_failures} consecutive failures ({reason})")
+
+    def release_trial(self):
+        """
+        Give back a half-open trial that ended without a verdict (e.g. the
+        client disconnected mid-stream), so the next request can make the trial.
+        Success and failure already release it.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_probe(self, healthy: bool, reason: str = ''):
+        """Apply a health-probe result."""
+        with self._lock:
+            self.last_probe_at = time.time()
+            self.last_probe_ok = healthy
+            if healthy and self._state == self.OPEN:
+                # Server is answering again; let the next request test it
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+                logger.info(f"Circuit '{self.name}' half-open after successful health probe")
+        if not healthy:
+            self.record_failure(reason or 'health probe failed')
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State summary for the UI and metrics."""
+        with self._lock:
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+            return {
+                'name': self.name,
+                'state': self._state,
+                'available': self._state != self.OPEN,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'retry_in_seconds': round(retry_in, 1) if retry_in is not None else None,
+                'rejected_count': self.rejected_count,
+                'open_count': self.open_count,
+                'last_failure': self.last_failure,
+                'last_failure_at': self.last_failure_at,
+                'last_probe_at': self.last_probe_at,
+                'last_probe_ok': self.last_probe_ok,
+            }
+
+
+class HealthProbe(threading.Thread):
+    """Daemon thread that periodically GETs a cheap health endpoint."""
+
+    def __init__(self, breaker: CircuitBreaker, url: str, interval: float, timeout: float = 2.0):
+        super().__init__(name=f'{breaker.name}-health-probe', daemon=True)
+        self.breaker = breaker
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self._stop_event = threading.Event()
+
+    def probe_once(self) -> bool:
+        from .llm_client import get_llm_client
+
+        try:
+            response = get_llm_client().session.get(self.url, timeout=(self.timeout, self.timeout))
+            healthy = response.status_code == 200
+            self.breaker.record_probe(healthy, f'health probe HTTP {response.status_code}')
+        except requests.exceptions.RequestException as e:
+            healthy = False
+            self.breaker.record_probe(False, f'health probe error: {e.__class__.__name__}')
+        return healthy
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.probe_once()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def ollama_tags_url(api_url: str) -> str:
+    """Derive Ollama's /api/tags URL from the configured generate URL."""
+    parts = urlsplit(api_url)
+    return urlunsplit((parts.scheme, parts.netloc, '/api/tags', '', ''))
+
+
+def get_llm_status() -> Dict[str, Any]:
+    """Endpoint breaker state, client latency, cache, scheduler and model routing metrics, for the UI and metrics endpoints."""
+    from .llm_client import get_llm_client
+    from .llm_cache import get_llm_cache
+    from .llm_scheduler import get_llm_scheduler
+    from .llm_routing import get_routing_status
+    from .ollama_pool import get_ollama_pool
+
+    cache = get_llm_cache()
+    return {
+        'ollama': get_ollama_pool().snapshot(),
+        'latency': get_llm_client().metrics(),
+        'cache': cache.stats() if cache else None,
+        'scheduler': get_llm_scheduler().snapshot(),
+        'routing': get_routing_status(),
+    }
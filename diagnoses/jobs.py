@@ -0,0 +1,308 @@
+"""
+Database-backed queue for case analysis jobs
+
+CaseCreateView saves the case and enqueues an AnalysisJob instead of running
+the multi-agent pipeline (and its blocking LLM call) inside the request. One
+or more `python manage.py run_analysis_worker` processes claim queued jobs,
+run the pipeline and retry failures with exponential backoff. No external
+broker is needed: jobs are claimed with a conditional UPDATE, so several
+workers can share the table safely. Due jobs are claimed by case priority
+with the LLM scheduler's aging, and at most LLM_MAX_CONCURRENT jobs run at
+once across all workers. While a job runs, a heartbeat thread
+refreshes its locked_at; a RUNNING job whose heartbeat stopped for
+ANALYSIS_JOB_STALE_TIMEOUT seconds belonged to a worker that died and is
+re-queued.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Exists, F, Q
+from django.utils import timezone
+
+from .analysis import analyze_case, report_phase
+from .llm_scheduler import effective_rank
+from .models import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    """Identify this worker process in AnalysisJob.locked_by."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_case_analysis(case, use_cache: bool = True) -> AnalysisJob:
+    """
+    Queue the multi-agent analysis of a case.
+
+    A case has at most one pending job; enqueueing again returns it. With
+    ANALYSIS_JOBS_INLINE = True the job is processed immediately in the
+    calling thread (useful for development without a worker).
+
+    Args:
+        case: Saved Case instance
+        use_cache: Whether cached LLM answers may be reused
+
+    Returns:
+        AnalysisJob: The pending (or, inline, finished) job
+    """
+    job = case.analysis_jobs.filter(status__in=['QUEUED', 'RUNNING']).first()
+    if job is not None and job.use_cache and not use_cache and job.status == 'QUEUED':
+        # A request for a fresh answer applies to the job still waiting
+        AnalysisJob.objects.filter(pk=job.pk, status='QUEUED').update(use_cache=False)
+        job.use_cache = False
+    if job is None:
+        job = AnalysisJob.objects.create(
+            case=case,
+            use_cache=use_cache,
+            max_attempts=getattr(settings, 'ANALYSIS_JOB_MAX_ATTEMPTS', 3),
+        )
+        logger.info(f"Queued analysis job #{job.id} for case #{case.id}")
+
+    if getattr(settings, 'ANALYSIS_JOBS_INLINE', False):
+        claimed = claim_job(job, 'inline')
+        if claimed:
+            process_job(claimed)
+            job.refresh_from_db()
+    return job
+
+
+def ensure_final_analysis(case) -> Optional[AnalysisJob]:
+    """
+    Queue the analysis of a case that has no final report yet, e.g. once its
+    diagnosis was streamed to the case page (the job then reuses the streamed
+    answer from the LLM cache).
+
+    Returns:
+        The pending job, or None if the case already has a final report
+    """
+    case.refresh_from_db(fields=['ai_diagnosis'])
+    if report_phase(case) == 'final':
+        return None
+    return enqueue_case_analysis(case)
+
+
+def claim_job(job: AnalysisJob, worker_id: str, max_running: int = None) -> Optional[AnalysisJob]:
+    """
+    Atomically move a queued job to RUNNING for this worker.
+
+    Args:
+        job: The queued job
+        worker_id: Recorded in locked_by
+        max_running: Only claim while fewer jobs than this are RUNNING
+            (checked in the same UPDATE); None for no limit
+
+    Returns:
+        The claimed job, or None if another worker got it first or the limit is reached
+    """
+    now = timezone.now()
+    queryset = AnalysisJob.objects.filter(pk=job.pk, status='QUEUED')
+    if max_running:
+        # No max_running-th RUNNING job exists
+        running = AnalysisJob.objects.filter(status='RUNNING').order_by().values('pk')
+        queryset = queryset.filter(~Exists(running[max_running - 1:max_running]))
+    claimed = queryset.update(
+        status='RUNNING',
+        locked_by=worker_id,
+        locked_at=now,
+        started_at=now,
+        finished_at=None,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def claim_next_job(worker_id: str) -> Optional[AnalysisJob]:
+    """
+    Claim the due job whose case is most urgent, or return None if the queue
+    is empty or LLM_MAX_CONCURRENT jobs are already running.
+
+    Jobs are ordered like LLM calls in the scheduler: by case priority, one
+    level better per LLM_SCHEDULER_AGING_SECONDS since the job became due,
+    then oldest first.
+    """
+    aging_seconds = getattr(settings, 'LLM_SCHEDULER_AGING_SECONDS', 30)
+    max_running = getattr(settings, 'LLM_MAX_CONCURRENT', 2)
+    while True:
+        now = timezone.now()
+        due = AnalysisJob.objects.filter(status='QUEUED', run_after__lte=now).values_list(
+            'pk', 'case__priority', 'run_after'
+        )
+        if not due:
+            return None
+        pk, _, _ = min(due, key=lambda row: (
+            effective_rank(row[1], (now - row[2]).total_seconds(), aging_seconds), row[2], row[0]
+        ))
+        claimed = claim_job(AnalysisJob(pk=pk), worker_id, max_running=max_running)
+        if claimed:
+            return claimed
+        if AnalysisJob.objects.filter(status='RUNNING').count() >= max_running:
+            return None
+        # Lost the race to another worker; look for the next one
+
+
+def analysis_backlog() -> int:
+    """Jobs running or due to run, across all workers (each makes its LLM calls one at a time)."""
+    return AnalysisJob.objects.filter(
+        Q(status='RUNNING') | Q(status='QUEUED', run_after__lte=timezone.now())
+    ).count()
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before the next attempt (exponential, capped at 10 minutes)."""
+    base = getattr(settings, 'ANALYSIS_JOB_RETRY_BACKOFF', 30)
+    return min(base * (2 ** max(attempts - 1, 0)), 600)
+
+
+class JobHeartbeat(threading.Thread):
+    """Daemon thread that refreshes a running job's locked_at while it is analyzed."""
+
+    def __init__(self, job: AnalysisJob, interval: float):
+        super().__init__(name=f'analysis-job-{job.pk}-heartbeat', daemon=True)
+        self.job_id = job.pk
+        self.worker_id = job.locked_by
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def beat(self) -> bool:
+        """Returns False once the job is no longer running for this worker."""
+        return AnalysisJob.objects.filter(
+            pk=self.job_id, status='RUNNING', locked_by=self.worker_id
+        ).update(locked_at=timezone.now()) > 0
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                try:
+                    if not self.beat():
+                        break
+                except DatabaseError as e:
+                    logger.warning(f"Heartbeat for analysis job #{self.job_id} failed: {e}")
+        finally:
+            # This thread's own database connection
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def record_analysis_failure(case, error: str):
+    """
+    Write the final failure of a case's analysis to the case for manual review.
+
+    A stored report (the preliminary triage, or the previous final report when
+    a re-analysis failed) is kept and marked with the error; a case without
+    one gets an error report.
+    """
+    if report_phase(case) is not None:
+        report = json.loads(case.ai_diagnosis)
+        report['analysis_error'] = error
+        report['manual_review_required'] = True
+    else:
+        report = {
+            'error': error,
+            'timestamp': timezone.now().isoformat(),
+            'manual_review_required': True
+        }
+    case.ai_diagnosis = json.dumps(report, indent=2)
+    case.save(update_fields=['ai_diagnosis', 'updated_at'])
+
+
+def process_job(job: AnalysisJob) -> bool:
+    """
+    Run the analysis for a claimed job and record the outcome.
+
+    Failed attempts are re-queued with backoff until max_attempts is
+    reached; the final failure is written to the case for manual review.
+
+    Returns:
+        bool: True if the analysis succeeded
+    """
+    case = job.case
+    heartbeat = JobHeartbeat(job, getattr(settings, 'ANALYSIS_JOB_HEARTBEAT_INTERVAL', 30))
+    heartbeat.start()
+    try:
+        analyze_case(case, use_cache=job.use_cache)
+    except Exception as e:
+        now = timezone.now()
+        job.last_error = f"{e.__class__.__name__}: {e}"
+        job.finished_at = now
+        job.locked_by = ''
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = 'QUEUED'
+            job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+            logger.warning(
+                f"Analysis job #{job.id} attempt {job.attempts} failed, retrying at {job.run_after}: {e}"
+            )
+        else:
+            job.status = 'FAILED'
+            logger.error(f"Analysis job #{job.id} failed after {job.attempts} attempts: {e}")
+            record_analysis_failure(case, str(e))
+        job.save()
+        return False
+    finally:
+        heartbeat.stop()
+
+    job.status = 'SUCCEEDED'
+    job.finished_at = timezone.now()
+    job.last_error = ''
+    job.locked_by = ''
+    job.locked_at = None
+    job.save()
+    logger.info(f"Analysis job #{job.id} for case #{case.id} succeeded in {job.duration_seconds:.1f}s")
+    return True
+
+
+def requeue_stale_jobs(timeout: float = None) -> int:
+    """
+    Return jobs left RUNNING by a crashed worker to the queue.
+
+    A job that used up its attempts is failed and the failure is written
+    to its case.
+
+    Args:
+        timeout: Seconds without a heartbeat after which a running job is
+                 considered abandoned (defaults to ANALYSIS_JOB_STALE_TIMEOUT)
+
+    Returns:
+        int: Number of jobs re-queued or failed
+    """
+    timeout = timeout or getattr(settings, 'ANALYSIS_JOB_STALE_TIMEOUT', 180)
+    now = timezone.now()
+    stale = AnalysisJob.objects.filter(
+        status='RUNNING', locked_at__lt=now - timedelta(seconds=timeout)
+    ).select_related('case')
+
+    count = 0
+    for job in stale:
+        status = 'QUEUED' if job.attempts < job.max_attempts else 'FAILED'
+        last_error = f"Worker {job.locked_by} stopped responding for {timeout:.0f}s"
+        # Conditional on the lock we read, so a late heartbeat or another worker wins
+        recovered = AnalysisJob.objects.filter(pk=job.pk, status='RUNNING', locked_at=job.locked_at).update(
+            status=status,
+            last_error=last_error,
+            locked_by='',
+            locked_at=None,
+            run_after=now,
+            finished_at=now if status == 'FAILED' else None,
+        )
+        if not recovered:
+            continue
+        if status == 'FAILED':
+            record_analysis_failure(job.case, last_error)
+        count += 1
+    if count:
+        logger.warning(f"Recovered {count} stale analysis job(s)")
+    return count
@@ -0,0 +1,284 @@
+"""
+Single-pass keyword matching over symptom text
+
+The agents and the diagnostic engine all look for keywords in the same
+symptom text: critical/urgent keywords, red flags, emergency indicators,
+symptom patterns and the words of every condition rule. Instead of one
+substring scan per keyword, one Aho-Corasick automaton is built over all of
+them and the text is scanned once per case (scan_symptoms caches the result
+for recently seen texts).
+
+The automaton runs over words rather than characters: the text is split into
+lower-case word tokens and keywords are sequences of such tokens. Matches
+therefore respect word boundaries ("fever" does not match inside an
+unrelated longer word) and never span punctuation between symptoms. Keyword
+and text words are reduced to the same light stem (plural "s", final "e" and
+"-ing" dropped), so inflections still match: "headaches" matches "headache"
+and "breathing" matches "breath".
+
+Critical, urgent, red-flag and emergency keywords were substring checks
+before, and missing one lowers a case's urgency, so their last word also
+matches as a word prefix: "unconscious" matches "unconsciousness" and
+"overdose" matches "overdosed". A match that only holds as a prefix counts
+for those categories only.
+"""
+
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import FrozenSet, Hashable, Iterable, List, NamedTuple, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Words and phrase breaks; a keyword never spans a break ("vomiting, blood" is not "vomiting blood")
+_SCAN_RE = re.compile(r"[a-z0-9]+|[,;.:!?()\[\]\n/]")
+
+# Keyword categories whose last word also matches as a word prefix
+PREFIX_CATEGORIES = frozenset({'critical', 'urgent', 'red_flag', 'emergency'})
+
+
+@lru_cache(maxsize=4096)
+def stem(word: str) -> str:
+    """Light suffix stripping, applied to keyword and text words alike."""
+    if len(word) > 5 and word.endswith('ing'):
+        word = word[:-3]
+    elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """Stemmed lower-case word tokens of a text or keyword."""
+    return tuple(stem(word) for word in _TOKEN_RE.findall(text.lower()))
+
+
+def token_spans(text: str) -> List[Tuple[int, int]]:
+    """Character (start, end) of every scan token, indexed like KeywordHit.start/end."""
+    return [match.span() for match in _SCAN_RE.finditer(text.lower())]
+
+
+def normalize_keyword(keyword: str) -> str:
+    """The form in which a keyword appears in KeywordScan.keywords and .categories."""
+    return ' '.join(tokenize(keyword))
+
+
+class KeywordHit(NamedTuple):
+    """One occurrence of a keyword in the scanned text."""
+    keyword: str
+    categories: FrozenSet[Hashable]
+    start: int  # Index of the first token (words and phrase breaks)
+    end: int  # Index after the last token
+
+
+class KeywordScan:
+    """
+    Result of scanning one text: which keywords occur, and in which categories.
+
+    `keyword in scan` raises KeyError for a keyword the automaton was not
+    built with, so a call site cannot silently test for an unknown keyword.
+    Hot paths can read the (normalized) keyword sets directly:
+    scan.categories[category] holds the keywords of that category that occur.
+    """
+
+    __slots__ = ('hits', 'keywords', 'categories', '_automaton')
+
+    def __init__(self, hits: Tuple[KeywordHit, ...], automaton: 'KeywordAutomaton'):
+        self.hits = hits
+        self.keywords = frozenset(hit.keyword for hit in hits)
+        categories = {}
+        for hit in hits:
+            for category in hit.categories:
+                categories.setdefault(category, set()).add(hit.keyword)
+        self.categories = {category: frozenset(found) for category, found in categories.items()}
+        self._automaton = automaton
+
+    def __contains__(self, keyword: str) -> bool:
+        return self._automaton.normalize(keyword) in self.keywords
+
+    def count(self, keywords: Iterable[str]) -> int:
+        """Number of the given keywords that occur."""
+        return sum(1 for keyword in keywords if keyword in self)
+
+    def any(self, keywords: Iterable[str]) -> bool:
+        return any(keyword in self for keyword in keywords)
+
+    def all(self, keywords: Iterable[str]) -> bool:
+        return all(keyword in self for keyword in keywords)
+
+    def found(self, category: Hashable) -> FrozenSet[str]:
+        """Keywords of a category that occur."""
+        return self.categories.get(category, frozenset())
+
+    def in_category(self, category: Hashable) -> List[str]:
+        """Keywords of a category that occur, in order of appearance."""
+        seen = []
+        for hit in self.hits:
+            if category in hit.categories and hit.keyword not in seen:
+                seen.append(hit.keyword)
+        return seen
+
+
+def _category_kind(category: Hashable) -> Hashable:
+    """'red_flag' for ('red_flag', 'cardiac'), the category itself otherwise."""
+    return category[0] if isinstance(category, tuple) else category
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over word tokens."""
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]], prefix_categories: Iterable[Hashable] = ()):
+        """
+        Args:
+            keywords: (keyword, category) pairs; a keyword may appear in
+                several categories
+            prefix_categories: Categories (or the first element of tuple
+                categories) whose keywords' last word also matches a longer
+                word starting with it
+        """
+        prefix_categories = frozenset(prefix_categories)
+        self._normalized = {}  # raw keyword -> normalized keyword
+        categories = {}  # normalized keyword -> set of categories
+        for keyword, category in keywords:
+            normalized = normalize_keyword(keyword)
+            if not normalized:
+                raise ValueError(f"Keyword {keyword!r} has no word characters")
+            self._normalized[keyword] = normalized
+            categories.setdefault(normalized, set()).add(category)
+
+        # Trie: node 0 is the root; _goto[node] maps a word to the next node
+        self._goto = [{}]
+        self._output = [()]
+        for normalized, keyword_categories in categories.items():
+            node = 0
+            for word in normalized.split(' '):
+                next_node = self._goto[node].get(word)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][word] = next_node
+                    self._goto.append({})
+                    self._output.append(())
+                node = next_node
+            length = len(normalized.split(' '))
+            self._output[node] = ((normalized, frozenset(keyword_categories), length),)
+
+        # Prefix matches of a keyword's last word, from the node before it:
+        # node -> ((last word, (keyword, prefix categories, length)), ...)
+        self._prefix_edges = {}
+        for normalized, keyword_categories in categories.items():
+            matched = frozenset(c for c in keyword_categories if _category_kind(c) in prefix_categories)
+            if not matched:
+                continue
+            words = normalized.split(' ')
+            node = 0
+            for word in words[:-1]:
+                node = self._goto[node][word]
+            self._prefix_edges.setdefault(node, []).append((words[-1], (normalized, matched, len(words))))
+
+        # Failure links (breadth-first), merging the outputs of suffix matches
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def normalize(self, keyword: str) -> str:
+        """Normalized form of a keyword the automaton was built with."""
+        try:
+            return self._normalized[keyword]
+        except KeyError:
+            raise KeyError(f"Keyword {keyword!r} is not in the keyword automaton") from None
+
+    def scan(self, text: str) -> KeywordScan:
+        """Find every keyword occurrence in one pass over the text."""
+        hits = []
+        node = 0
+        goto, fail, output, prefix_edges = self._goto, self._fail, self._output, self._prefix_edges
+        for index, token in enumerate(_SCAN_RE.findall(text.lower())):
+            if not token[0].isalnum():
+                node = 0
+                continue
+            word = stem(token)
+            if prefix_edges:
+                # Every keyword prefix that ends before this token is on the failure chain
+                state = node
+                while True:
+                    for last_word, (keyword, categories, length) in prefix_edges.get(state, ()):
+                        if word != last_word and token.startswith(last_word):
+                            hits.append(KeywordHit(keyword, categories, index + 1 - length, index + 1))
+                    if not state:
+                        break
+                    state = fail[state]
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            for keyword, categories, length in output[node]:
+                hits.append(KeywordHit(keyword, categories, index + 1 - length, index + 1))
+        return KeywordScan(tuple(hits), self)
+
+
+def _symptom_keywords() -> Iterable[Tuple[str, Hashable]]:
+    """Every keyword set the agents and the diagnostic engine look for, with its category."""
+    # Imported here: the agents and the engine import this module
+    from .ai_utils import SYMPTOM_PATTERNS, CONDITION_RULES
+    from .services.coordinator_agent import CoordinatorAgent
+    from .services.diagnosis_agent import DiagnosisAgent
+    from .services.retriever_agent import RetrieverAgent
+
+    for keyword in CoordinatorAgent.CRITICAL_KEYWORDS:
+        yield keyword, 'critical'
+    for keyword in CoordinatorAgent.URGENT_KEYWORDS:
+        yield keyword, 'urgent'
+    for category, flags in DiagnosisAgent.RED_FLAGS.items():
+        for flag in flags:
+            yield flag, ('red_flag', category)
+    for emergency, indicators in DiagnosisAgent.EMERGENCY_INDICATORS.items():
+        for indicator in indicators:
+            yield indicator, ('emergency', emergency)
+    for pattern, keywords in DiagnosisAgent.PATTERN_KEYWORDS.items():
+        for keyword in keywords:
+            yield keyword, ('pattern', pattern)
+    for keyword in RetrieverAgent.CARDIAC_PROTOCOL_TRIGGERS:
+        yield keyword, 'cardiac_protocol'
+    for category, data in SYMPTOM_PATTERNS.items():
+        for keyword in data['keywords']:
+            yield keyword, ('symptom', category)
+        for indicator in data['severity_indicators']:
+            yield indicator, ('severity', category)
+    # Condition rules match on any single word of a symptom phrase
+    for condition, rules in CONDITION_RULES.items():
+        for symptom in rules['required_symptoms'] + rules['supporting_symptoms']:
+            for word in symptom.split():
+                yield word, ('condition', condition)
+
+
+_symptom_automaton = None
+_symptom_automaton_lock = threading.Lock()
+
+
+def get_symptom_automaton() -> KeywordAutomaton:
+    """Get or build the shared automaton over all symptom keyword sets."""
+    global _symptom_automaton
+    if _symptom_automaton is None:
+        with _symptom_automaton_lock:
+            if _symptom_automaton is None:
+                _symptom_automaton = KeywordAutomaton(_symptom_keywords(), PREFIX_CATEGORIES)
+    return _symptom_automaton
+
+
+@lru_cache(maxsize=256)
+def scan_symptoms(symptoms: str) -> KeywordScan:
+    """
+    Scan symptom text with the shared automaton.
+
+    Results are immutable and cached, so the coordinator, diagnosis agent and
+    engine looking at the same case text share one scan.
+    """
+    return get_symptom_automaton().scan(symptoms or '')
@@ -0,0 +1,181 @@
+"""
+Disk-backed cache for LLM responses
+
+Identical prompts (e.g. regenerating a diagnosis with unchanged symptoms, or
+re-running the test scripts) are answered from a small SQLite file instead of
+waiting on Ollama again. Entries are keyed on a hash of (model, options,
+prompt), expire after a TTL, and the least recently used entries are evicted
+once the cache grows past its size limit. The file survives restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, prompt: str, options: Dict = None) -> str:
+    """Stable hash of everything that affects the model's answer."""
+    material = json.dumps(
+        {'model': model, 'options': options or {}, 'prompt': prompt},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def payload_cache_key(payload: Dict) -> str:
+    """Cache key for an Ollama generate payload (stream mode and keep_alive do not affect the answer)."""
+    options = {
+        key: value for key, value in payload.items()
+        if key not in ('model', 'prompt', 'stream', 'keep_alive')
+    }
+    return make_cache_key(payload['model'], payload['prompt'], options)
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed response cache with TTL and size-bounded LRU eviction.
+
+    Each thread gets its own sqlite3 connection; WAL mode lets readers and
+    the single writer proceed concurrently across threads and processes.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response text, or None if missing or expired."""
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    self._count('hits')
+                    return row[0]
+                if row:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache read failed: {e}")
+        self._count('misses')
+        return None
+
+    def set(self, key: str, model: str, response: str):
+        """Store a response and evict old entries if over the size limit."""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_access)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, size, now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used until under max_bytes."""
+        removed = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall()
+            stale_keys = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale_keys.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale_keys)
+            removed += len(stale_keys)
+        if removed:
+            self._count('evictions', removed)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, total = None, None
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total,
+        }
+
+
+# Lazy process-wide cache instance (None when disabled)
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get or create the shared LLM response cache (None if LLM_CACHE_ENABLED is False)."""
+    global _llm_cache
+    if not getattr(settings, 'LLM_CACHE_ENABLED', True):
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                try:
+                    _llm_cache = LLMResponseCache(
+                        path=str(getattr(settings, 'LLM_CACHE_PATH', 'llm_cache.sqlite3')),
+                        ttl=getattr(settings, 'LLM_CACHE_TTL', 86400),
+                        max_bytes=getattr(settings, 'LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024),
+                    )
+                except (sqlite3.Error, OSError) as e:
+                    logger.error(f"LLM cache unavailable: {e}")
+                    return None
+    return _llm_cache
@@ -0,0 +1,324 @@
+"""
+Shared HTTP client for LLM backends (Ollama, Hugging Face)
+
+Keeps one pooled, keep-alive requests.Session per process so diagnoses do not
+open a fresh TCP connection per call, applies separate connect/read timeouts,
+retries connection failures with jittered backoff, and records per-call
+latency (connect, time-to-first-byte, total).
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Iterator, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ReadTimeoutError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Per-thread scratch space for the connect time of the request in flight
+_connect_timing = threading.local()
+
+
+def _is_read_timeout(error: Exception) -> bool:
+    """Whether a requests ConnectionError was caused by a urllib3 read timeout."""
+    while error is not None:
+        if isinstance(error, ReadTimeoutError) or any(isinstance(arg, ReadTimeoutError) for arg in error.args):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTPConnection that records how long the TCP connect took."""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPSConnection that records how long the TCP/TLS connect took."""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections report their connect time."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class LatencyStats:
+    """Thread-safe running latency statistics for one backend."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.new_connections = 0
+        self.totals = {'connect': 0.0, 'ttfb': 0.0, 'total': 0.0}
+        self.recent = deque(maxlen=window)
+
+    def record(self, timings: Dict[str, float], reused_connection: bool):
+        with self._lock:
+            self.count += 1
+            if not reused_connection:
+                self.new_connections += 1
+            for key in self.totals:
+                self.totals[key] += timings.get(key, 0.0)
+            self.recent.append(timings)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Averages over all calls and p50/p95 over the recent window."""
+        with self._lock:
+            recent = list(self.recent)
+            summary = {
+                'count': self.count,
+                'errors': self.errors,
+                'retries': self.retries,
+                'new_connections': self.new_connections,
+            }
+            for key, total in self.totals.items():
+                summary[f'avg_{key}_ms'] = round(total / self.count * 1000, 1) if self.count else 0.0
+
+        for key in self.totals:
+            values = sorted(sample.get(key, 0.0) for sample in recent)
+            if values:
+                summary[f'p50_{key}_ms'] = round(values[len(values) // 2] * 1000, 1)
+                summary[f'p95_{key}_ms'] = round(values[min(int(len(values) * 0.95), len(values) - 1)] * 1000, 1)
+        return summary
+
+
+class LLMClient:
+    """
+    Pooled, retrying HTTP client shared by all LLM calls in the process.
+
+    requests.Session is safe to share between threads for sending requests;
+    urllib3's pool hands each thread its own connection.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        max_retries: int = None,
+        backoff: float = None,
+        pool_size: int = None
+    ):
+        self.connect_timeout = connect_timeout or getattr(settings, 'LLM_CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = read_timeout or getattr(settings, 'LLM_READ_TIMEOUT', 120)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'LLM_MAX_RETRIES', 2)
+        self.backoff = backoff if backoff is not None else getattr(settings, 'LLM_RETRY_BACKOFF', 0.5)
+        pool_size = pool_size or getattr(settings, 'LLM_POOL_SIZE', 10)
+
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def stats_for(self, name: str) -> LatencyStats:
+        """Latency stats bucket for a backend name (e.g. 'ollama')."""
+        with self._stats_lock:
+            if name not in self._stats:
+                self._stats[name] = LatencyStats()
+            return self._stats[name]
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Latency summary for every backend seen so far."""
+        with self._stats_lock:
+            names = list(self._stats)
+        return {name: self.stats_for(name).snapshot() for name in names}
+
+    def _sleep_before_retry(self, attempt: int):
+        """Exponential backoff with full jitter, capped at 5 seconds."""
+        delay = min(self.backoff * (2 ** attempt), 5.0)
+        time.sleep(random.uniform(0, delay))
+
+    def post_json(
+        self,
+        url: str,
+        payload: Dict,
+        headers: Dict = None,
+        read_timeout: float = None,
+        backend: str = 'ollama'
+    ) -> Tuple[requests.Response, Dict[str, float]]:
+        """
+        POST a JSON payload and read the full response body.
+
+        Connection failures (refused, connect timeout) are retried up to
+        max_retries times; read timeouts are not, since the backend may still
+        be generating.
+
+        Args:
+            url: Endpoint URL
+            payload: JSON body
+            headers: Optional extra headers
+            read_timeout: Override for the read timeout in seconds
+            backend: Name used to bucket latency metrics
+
+        Returns:
+            Tuple of (response, timings) where timings has connect, ttfb and
+            total in seconds
+
+        Raises:
+            requests.exceptions.RequestException once retries are exhausted
+        """
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        stats = self.stats_for(backend)
+
+        for attempt in range(self.max_retries + 1):
+            _connect_timing.seconds = None
+            start = time.perf_counter()
+            try:
+                # stream=True returns once headers arrive, which gives us TTFB
+                response = self.session.post(url, json=payload, headers=headers, timeout=timeout, stream=True)
+                ttfb = time.perf_counter() - start
+                try:
+                    response.content  # read and release the connection back to the pool
+                except requests.exceptions.ConnectionError as e:
+                    # requests reports a read timeout while streaming the body as a
+                    # ConnectionError; the backend may still be generating, so no retry
+                    if _is_read_timeout(e):
+                        raise requests.exceptions.ReadTimeout(e, request=response.request, response=response) from e
+                    raise
+                total = time.perf_counter() - start
+            except requests.exceptions.ConnectionError as e:
+                stats.record_error()
+                if attempt < self.max_retries:
+                    stats.record_retry()
+                    logger.warning(f"{backend} connection failed (attempt {attempt + 1}): {e}")
+                    self._sleep_before_retry(attempt)
+                    continue
+                raise
+            except requests.exceptions.RequestException:
+                stats.record_error()
+                raise
+
+            connect = _connect_timing.seconds
+            timings = {'connect': connect or 0.0, 'ttfb': ttfb, 'total': total}
+            stats.record(timings, reused_connection=connect is None)
+            logger.debug(
+                f"{backend} call: connect={timings['connect'] * 1000:.1f}ms "
+                f"ttfb={ttfb * 1000:.1f}ms total={total * 1000:.1f}ms "
+                f"({'reused' if connect is None else 'new'} connection)"
+            )
+            return response, timings
+
+    def stream_json_lines(
+        self,
+        url: str,
+        payload: Dict,
+        headers: Dict = None,
+        read_timeout: float = None,
+        backend: str = 'ollama'
+    ) -> Iterator[Dict]:
+        """
+        POST a JSON payload and yield each newline-delimited JSON object of
+        a streamed response (Ollama's "stream": true format).
+
+        Connection failures are retried as in post_json; once the first byte
+        has arrived nothing is retried. The read timeout applies between
+        chunks rather than to the whole response.
+
+        Raises:
+            requests.exceptions.RequestException on connection/HTTP errors
+        """
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        stats = self.stats_for(backend)
+
+        for attempt in range(self.max_retries + 1):
+            _connect_timing.seconds = None
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=timeout, stream=True)
+                try:
+                    response.raise_for_status()
+                except requests.exceptions.HTTPError:
+                    # The body is not read, so hand the connection back to the pool now
+                    response.close()
+                    raise
+                break
+            except requests.exceptions.ConnectionError as e:
+                stats.record_error()
+                if attempt < self.max_retries:
+                    stats.record_retry()
+                    logger.warning(f"{backend} connection failed (attempt {attempt + 1}): {e}")
+                    self._sleep_before_retry(attempt)
+                    continue
+                raise
+            except requests.exceptions.RequestException:
+                stats.record_error()
+                raise
+
+        connect = _connect_timing.seconds
+        ttfb = None
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                yield json.loads(line)
+        except (requests.exceptions.RequestException, ValueError):
+            stats.record_error()
+            raise
+        finally:
+            response.close()
+
+        total = time.perf_counter() - start
+        timings = {'connect': connect or 0.0, 'ttfb': ttfb or total, 'total': total}
+        stats.record(timings, reused_connection=connect is None)
+
+
+# Lazy process-wide client, shared across threads
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Get or create the shared LLM HTTP client."""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient()
+    return _llm_client
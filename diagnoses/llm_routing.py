@@ -0,0 +1,210 @@
+"""
+Per-task Ollama model routing
+
+Using one OLLAMA_MODEL for everything makes short jobs pay large-model
+prefill and generation costs. Every LLM call now names a task, and each task
+has a route in settings.LLM_MODEL_ROUTES:
+
+- 'diagnosis': the full differential diagnosis (large model)
+- 'fused_analysis': diagnosis, treatment plan and medications in one answer
+  (LLM_FUSED_ANALYSIS); the diagnosis route with LLM_FUSED_OUTPUT_TOKENS to
+  generate
+- 'explanation': plain-language explanation of a diagnosis (small model)
+- 'triage': short urgency note for quick_triage_ajax (small model)
+
+A route sets the model, its num_ctx / num_predict / keep_alive options and
+how long the call may wait for an LLM scheduler slot. When at least
+LLM_DOWNGRADE_IN_FLIGHT calls are already running or queued (in this process's
+scheduler, or analysis jobs running or due across all workers), a route with a
+downgrade_model switches to it, trading some answer quality for latency. The
+route's token options are kept, so prompts budgeted for the route still fit.
+Cases whose priority is in LLM_DOWNGRADE_EXEMPT_PRIORITIES always get the
+configured model.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any
+
+from django.conf import settings
+
+from .llm_scheduler import get_llm_scheduler, current_llm_priority
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TASK = 'diagnosis'
+
+# Route keys that become Ollama "options"
+OPTION_KEYS = ('num_ctx', 'num_predict')
+
+# Calls per (task, model) and downgrades per task since startup
+_route_lock = threading.Lock()
+_route_calls = Counter()
+_route_downgrades = Counter()
+
+
+def _default_routes() -> Dict[str, Dict[str, Any]]:
+    """Routes used for any task or key not overridden in LLM_MODEL_ROUTES."""
+    model = getattr(settings, 'OLLAMA_MODEL', 'llama3.2')
+    small_model = getattr(settings, 'OLLAMA_SMALL_MODEL', model)
+    return {
+        'diagnosis': {
+            'model': model,
+            'num_ctx': getattr(settings, 'LLM_CONTEXT_TOKENS', 4096),
+            'num_predict': getattr(settings, 'LLM_RESERVED_OUTPUT_TOKENS', 700),
+            'keep_alive': '30m',
+            'downgrade_model': small_model,
+            'queue_timeout': None,  # LLM_QUEUE_TIMEOUT
+        },
+        'explanation': {
+            'model': small_model,
+            'num_ctx': 2048,
+            'num_predict': 256,
+            'keep_alive': '30m',
+            'queue_timeout': 30,
+        },
+        'triage': {
+            'model': small_model,
+            'num_ctx': 1024,
+            'num_predict': 128,
+            'keep_alive': '30m',
+            'queue_timeout': 10,
+        },
+    }
+
+
+def get_route_config(task: str = DEFAULT_TASK) -> Dict[str, Any]:
+    """
+    Configured route for a task (unknown tasks use the diagnosis route).
+
+    Args:
+        task: Route name, e.g. 'diagnosis', 'explanation' or 'triage'
+
+    Returns:
+        Dict: Route settings (model, num_ctx, num_predict, keep_alive, ...)
+    """
+    routes = _default_routes()
+    configured = getattr(settings, 'LLM_MODEL_ROUTES', {})
+    for name, overrides in configured.items():
+        routes[name] = {**routes.get(name, {}), **overrides}
+    # The fused answer is a longer diagnosis answer: same model and overrides
+    routes['fused_analysis'] = {
+        **routes['diagnosis'],
+        'num_predict': getattr(settings, 'LLM_FUSED_OUTPUT_TOKENS', 1400),
+        **configured.get('fused_analysis', {}),
+    }
+    return routes.get(task) or routes[DEFAULT_TASK]
+
+
+# (expires at, count) of the last analysis job count
+_backlog_count = (0.0, 0)
+
+
+def _analysis_backlog() -> int:
+    """The analysis job backlog, counted in the database at most once per LLM_LOAD_CACHE_SECONDS."""
+    global _backlog_count
+    from .jobs import analysis_backlog
+
+    now = time.monotonic()
+    expires, count = _backlog_count
+    if now >= expires:
+        count = analysis_backlog()
+        _backlog_count = (now + getattr(settings, 'LLM_LOAD_CACHE_SECONDS', 1), count)
+    return count
+
+
+def current_load() -> int:
+    """
+    LLM work in flight: the calls running or queued in this process, or the
+    analysis jobs running or due across all workers, whichever is larger.
+    """
+    from django.db import DatabaseError
+
+    in_flight = get_llm_scheduler().in_flight()
+    try:
+        return max(in_flight, _analysis_backlog())
+    except DatabaseError as e:
+        logger.warning(f"Could not count queued analysis jobs: {e}")
+        return in_flight
+
+
+def _under_load() -> bool:
+    """Whether enough LLM work is in flight that non-exempt calls should downgrade."""
+    threshold = getattr(settings, 'LLM_DOWNGRADE_IN_FLIGHT', 4)
+    if not threshold:
+        return False
+    priority, _ = current_llm_priority()
+    if priority in getattr(settings, 'LLM_DOWNGRADE_EXEMPT_PRIORITIES', ['CRITICAL']):
+        return False
+    # The process alone is busy enough; no need to count the jobs
+    if get_llm_scheduler().in_flight() >= threshold:
+        return True
+    return current_load() >= threshold
+
+
+def resolve_model_route(task: str = DEFAULT_TASK) -> Dict[str, Any]:
+    """
+    Pick the model and options for one LLM call.
+
+    Args:
+        task: Route name
+
+    Returns:
+        Dict with 'task', 'model', 'configured_model', 'options',
+        'keep_alive', 'queue_timeout' and 'downgraded'
+    """
+    config = get_route_config(task)
+    configured_model = config.get('model') or getattr(settings, 'OLLAMA_MODEL', 'llama3.2')
+    model = configured_model
+
+    downgrade_model = config.get('downgrade_model')
+    downgraded = bool(downgrade_model) and downgrade_model != configured_model and _under_load()
+    if downgraded:
+        model = downgrade_model
+
+    with _route_lock:
+        _route_calls[(task, model)] += 1
+        if downgraded:
+            _route_downgrades[task] += 1
+
+    return {
+        'task': task,
+        'model': model,
+        'configured_model': configured_model,
+        'options': {key: config[key] for key in OPTION_KEYS if config.get(key) is not None},
+        'keep_alive': config.get('keep_alive'),
+        'queue_timeout': config.get('queue_timeout'),
+        'downgraded': downgraded,
+    }
+
+
+def get_routing_status() -> Dict[str, Any]:
+    """Configured routes, current load and per-route call counts."""
+    tasks = set(_default_routes()) | {'fused_analysis'} | set(getattr(settings, 'LLM_MODEL_ROUTES', {}))
+    routes = {}
+    for task in sorted(tasks):
+        config = get_route_config(task)
+        routes[task] = {
+            'model': config.get('model'),
+            'downgrade_model': config.get('downgrade_model'),
+            'options': {key: config[key] for key in OPTION_KEYS if config.get(key) is not None},
+            'keep_alive': config.get('keep_alive'),
+        }
+
+    with _route_lock:
+        calls = {}
+        for (task, model), count in _route_calls.items():
+            calls.setdefault(task, {})[model] = count
+        downgrades = dict(_route_downgrades)
+
+    return {
+        'in_flight': get_llm_scheduler().in_flight(),
+        'load': current_load(),
+        'downgrade_in_flight': getattr(settings, 'LLM_DOWNGRADE_IN_FLIGHT', 4),
+        'routes': routes,
+        'calls': calls,
+        'downgrades': downgrades,
+    }
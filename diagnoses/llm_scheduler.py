@@ -0,0 +1,250 @@
+"""
+Priority-aware admission control for LLM calls
+
+Ollama on a CPU box can only run one or two generations at a time, so LLM
+calls queue for a slot here instead of piling onto the server. Waiting calls
+are admitted in order of the case priority assigned by
+CoordinatorAgent.route_case (CRITICAL first), then urgency_score, then
+arrival. Aging raises a waiting call's effective priority by one level every
+LLM_SCHEDULER_AGING_SECONDS, so a steady stream of urgent cases cannot starve
+routine ones forever.
+
+Callers declare the priority of the work they are doing with
+`with llm_priority(priority, urgency_score): ...`; LLM calls made inside that
+block (in the same thread) are scheduled accordingly.
+"""
+
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Case.PRIORITY_CHOICES from most to least urgent
+PRIORITY_RANKS = {
+    'CRITICAL': 0,
+    'URGENT': 1,
+    'HIGH': 2,
+    'MEDIUM': 3,
+    'LOW': 4,
+}
+DEFAULT_PRIORITY = 'MEDIUM'
+
+# (priority, urgency_score) of the work running in the current context
+_current_priority = contextvars.ContextVar('llm_priority', default=(DEFAULT_PRIORITY, 0))
+
+
+@contextmanager
+def llm_priority(priority: str, urgency_score: int = 0):
+    """Schedule LLM calls made inside this block at the given case priority."""
+    token = _current_priority.set((priority or DEFAULT_PRIORITY, urgency_score or 0))
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_llm_priority() -> Tuple[str, int]:
+    """(priority, urgency_score) declared by the innermost llm_priority block."""
+    return _current_priority.get()
+
+
+def effective_rank(priority: str, waited_seconds: float, aging_seconds: float) -> float:
+    """Rank of a case priority (lower is more urgent), one level better per aging_seconds waited."""
+    rank = PRIORITY_RANKS.get(priority, PRIORITY_RANKS[DEFAULT_PRIORITY])
+    if aging_seconds:
+        rank -= waited_seconds / aging_seconds
+    return rank
+
+
+class LLMQueueTimeout(Exception):
+    """Raised when a call waited longer than the queue timeout for a slot."""
+
+
+class _Ticket:
+    """A call waiting for (or holding) an LLM slot."""
+
+    __slots__ = ('priority', 'rank', 'urgency_score', 'seq', 'enqueued_at', 'granted')
+
+    def __init__(self, priority: str, urgency_score: int, seq: int):
+        self.priority = priority
+        self.rank = PRIORITY_RANKS.get(priority, PRIORITY_RANKS[DEFAULT_PRIORITY])
+        self.urgency_score = urgency_score
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class _PriorityStats:
+    """Queue metrics for one priority level (caller holds the scheduler lock)."""
+
+    def __init__(self, window: int):
+        self.waiting = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=window)
+
+    def record_wait(self, seconds: float):
+        self.admitted += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.recent_waits.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self.recent_waits)
+        return {
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'timeouts': self.timeouts,
+            'avg_wait_ms': round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0.0,
+            'p95_wait_ms': round(waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000, 1) if waits else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 1),
+        }
+
+
+class LLMScheduler:
+    """
+    Counting semaphore whose waiters are admitted by priority with aging.
+
+    Queues are short (tens of waiters at most), so the next waiter is found
+    with a linear scan of the effective priorities at release time.
+    """
+
+    def __init__(self, max_concurrent: int = 2, aging_seconds: float = 30.0,
+                 queue_timeout: float = 300.0, window: int = 200):
+        self.max_concurrent = max(1, max_concurrent)
+        self.aging_seconds = aging_seconds
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._stats = {priority: _PriorityStats(window) for priority in PRIORITY_RANKS}
+
+    def _effective_key(self, ticket: _Ticket, now: float) -> Tuple[float, int, int]:
+        """Lower sorts first: aged rank, then higher urgency score, then arrival."""
+        rank = effective_rank(ticket.priority, now - ticket.enqueued_at, self.aging_seconds)
+        return (rank, -ticket.urgency_score, ticket.seq)
+
+    def _dispatch(self):
+        """Grant free slots to the best waiters (caller holds the lock)."""
+        granted = False
+        while self._active < self.max_concurrent and self._waiting:
+            now = time.monotonic()
+            ticket = min(self._waiting, key=lambda t: self._effective_key(t, now))
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._active += 1
+            stats = self._stats[ticket.priority]
+            stats.waiting -= 1
+            stats.record_wait(now - ticket.enqueued_at)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, priority: str = None, urgency_score: int = None, timeout: float = None) -> float:
+        """
+        Wait for an LLM slot.
+
+        Args:
+            priority: Case priority (defaults to the current llm_priority block)
+            urgency_score: Coordinator urgency score used to break ties
+            timeout: Maximum seconds to wait (defaults to the queue timeout)
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            LLMQueueTimeout if no slot became free in time
+        """
+        if priority is None:
+            priority, default_score = current_llm_priority()
+            if urgency_score is None:
+                urgency_score = default_score
+        if priority not in PRIORITY_RANKS:
+            priority = DEFAULT_PRIORITY
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        with self._cond:
+            ticket = _Ticket(priority, urgency_score or 0, next(self._seq))
+            self._waiting.append(ticket)
+            self._stats[priority].waiting += 1
+            self._dispatch()
+
+            deadline = ticket.enqueued_at + timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    stats = self._stats[priority]
+                    stats.waiting -= 1
+                    stats.timeouts += 1
+                    raise LLMQueueTimeout(
+                        f"No LLM slot within {timeout:g}s ({priority}, {len(self._waiting)} waiting)"
+                    )
+                self._cond.wait(remaining)
+
+        waited = time.monotonic() - ticket.enqueued_at
+        if waited > 1:
+            logger.info(f"{priority} LLM call waited {waited:.1f}s for a slot")
+        return waited
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: str = None, urgency_score: int = None, timeout: float = None):
+        """Hold an LLM slot for the duration of the block."""
+        self.acquire(priority, urgency_score, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def in_flight(self) -> int:
+        """Calls holding or waiting for a slot."""
+        with self._cond:
+            return self._active + len(self._waiting)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Active calls, total queue depth and per-priority wait metrics."""
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'active': self._active,
+                'queue_depth': len(self._waiting),
+                'aging_seconds': self.aging_seconds,
+                'priorities': {name: stats.snapshot() for name, stats in self._stats.items()},
+            }
+
+
+# Lazy process-wide scheduler shared by all LLM calls
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get or create the shared LLM scheduler."""
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        with _llm_scheduler_lock:
+            if _llm_scheduler is None:
+                _llm_scheduler = LLMScheduler(
+                    max_concurrent=getattr(settings, 'LLM_MAX_CONCURRENT', 2),
+                    aging_seconds=getattr(settings, 'LLM_SCHEDULER_AGING_SECONDS', 30),
+                    queue_timeout=getattr(settings, 'LLM_QUEUE_TIMEOUT', 300),
+                )
+    return _llm_scheduler
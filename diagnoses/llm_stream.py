@@ -0,0 +1,300 @@
+"""
+Streaming LLM output to the browser
+
+Ollama streams the JSON answer token by token. IncrementalJSONParser reads
+that partial JSON and reports top-level fields as they are produced: string
+fields (primary_diagnosis, reasoning, diagnosis_explanation, ...) are reported
+while still being written, other values once complete. stream_diagnosis_events
+turns this into Server-Sent Events for the case page.
+"""
+
+import json
+import logging
+import time
+from typing import Dict, Any, Callable, Iterator, List, Tuple
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a single top-level JSON object.
+
+    feed() returns a list of events:
+        ('partial', key, text)  - string value still being generated
+        ('field', key, value)   - value complete (any JSON type)
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.state = 'start'
+        self.key_start = None
+        self.key = None
+        self.value_start = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.last_partial = None
+        self.fields = {}
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        self.buffer += chunk
+        events = []
+        buffer = self.buffer
+
+        while self.pos < len(buffer):
+            char = buffer[self.pos]
+            state = self.state
+
+            if state == 'start':
+                if char == '{':
+                    self.state = 'key'
+            elif state == 'key':
+                if char == '"':
+                    self.state = 'in_key'
+                    self.key_start = self.pos
+                    self.escaped = False
+                elif char == '}':
+                    self.state = 'done'
+            elif state == 'in_key':
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.key = json.loads(buffer[self.key_start:self.pos + 1])
+                    self.state = 'colon'
+            elif state == 'colon':
+                if char == ':':
+                    self.state = 'value_start'
+            elif state == 'value_start':
+                if not char.isspace():
+                    self.value_start = self.pos
+                    self.last_partial = None
+                    self.escaped = False
+                    if char == '"':
+                        self.state = 'in_string_value'
+                    else:
+                        self.state = 'in_value'
+                        self.depth = 1 if char in '[{' else 0
+                        self.in_string = False
+            elif state == 'in_string_value':
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self._complete(buffer[self.value_start:self.pos + 1], events)
+            elif state == 'in_value':
+                if self.in_string:
+                    if self.escaped:
+                        self.escaped = False
+                    elif char == '\\':
+                        self.escaped = True
+                    elif char == '"':
+                        self.in_string = False
+                elif char == '"':
+                    self.in_string = True
+                elif char in '[{':
+                    self.depth += 1
+                elif char in ']}':
+                    if self.depth == 0:
+                        # Closing brace of the top-level object ends a scalar
+                        self._complete(buffer[self.value_start:self.pos], events)
+                        self.state = 'done'
+                    else:
+                        self.depth -= 1
+                        if self.depth == 0:
+                            self._complete(buffer[self.value_start:self.pos + 1], events)
+                elif char == ',' and self.depth == 0:
+                    self._complete(buffer[self.value_start:self.pos], events)
+                    self.state = 'key'
+            elif state == 'after_value':
+                if char == ',':
+                    self.state = 'key'
+                elif char == '}':
+                    self.state = 'done'
+            self.pos += 1
+
+        if self.state == 'in_string_value':
+            partial = self._partial_string(buffer[self.value_start + 1:self.pos])
+            if partial is not None and partial != self.last_partial:
+                self.last_partial = partial
+                events.append(('partial', self.key, partial))
+
+        return events
+
+    def _complete(self, raw: str, events: List):
+        try:
+            value = json.loads(raw.strip())
+        except json.JSONDecodeError:
+            value = raw.strip()
+        self.fields[self.key] = value
+        events.append(('field', self.key, value))
+        self.state = 'after_value'
+
+    @staticmethod
+    def _partial_string(raw: str):
+        """Decode the body of an unterminated JSON string, ignoring a dangling escape."""
+        for cut in range(0, 7):
+            candidate = raw[:len(raw) - cut] if cut else raw
+            try:
+                return json.loads(f'"{candidate}"')
+            except json.JSONDecodeError:
+                continue
+        return None
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_ollama_fields(payload: Dict, url: str = None) -> Iterator[Tuple[str, str, Any]]:
+    """
+    Stream an Ollama JSON-mode generation (payload with "stream": true) as parser events.
+
+    Args:
+        payload: Generate request body
+        url: Ollama generate endpoint (defaults to OLLAMA_API_URL)
+
+    Yields ('partial'|'field', key, value) events, then ('done', None, fields)
+    with the raw text appended under '_raw'.
+
+    Raises:
+        requests.exceptions.RequestException if Ollama cannot be reached
+    """
+    from .llm_client import get_llm_client
+
+    ollama_url = url or getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434/api/generate')
+
+    parser = IncrementalJSONParser()
+    raw_text = []
+    for chunk in get_llm_client().stream_json_lines(ollama_url, payload, backend='ollama'):
+        token = chunk.get('response', '')
+        if token:
+            raw_text.append(token)
+            for event in parser.feed(token):
+                yield event
+        if chunk.get('done'):
+            break
+
+    fields = dict(parser.fields)
+    fields['_raw'] = ''.join(raw_text)
+    yield ('done', None, fields)
+
+
+def stream_diagnosis_events(
+    engine,
+    symptoms: str,
+    patient_history: Dict,
+    priority: str = None,
+    build_prompt: Callable[[], str] = None,
+    on_complete: Callable[[Dict], None] = None,
+) -> Iterator[str]:
+    """
+    SSE stream of an AI diagnosis for the case page.
+
+    Emits 'partial' and 'field' events as the model writes, a 'fallback'
+    event with rule-based matches if Ollama is unavailable, and a final
+    'done' event. Completed answers are stored in the LLM cache, and a
+    cached answer is replayed immediately. The generation waits for an
+    LLM scheduler slot at the case's priority.
+
+    Args:
+        engine: The diagnostic engine (prompt, payload and rule matching)
+        symptoms: Patient symptoms
+        patient_history: Patient history or PatientContext (rule-based fallback)
+        priority: Case priority for the LLM scheduler and model routing
+        build_prompt: Returns the prompt to stream; defaults to
+            engine.build_diagnosis_prompt(symptoms, patient_history)
+        on_complete: Called with the answer's fields once it is complete
+            (streamed or cached), before the 'done' event
+    """
+    from .ollama_pool import get_ollama_pool
+    from .llm_cache import get_llm_cache, payload_cache_key
+    from .llm_scheduler import get_llm_scheduler, LLMQueueTimeout, llm_priority
+
+    yield sse_event('status', {'message': 'Retrieving medical knowledge...'})
+    if build_prompt is not None:
+        prompt = build_prompt()
+    else:
+        prompt = engine.build_diagnosis_prompt(symptoms, patient_history)
+    with llm_priority(priority):
+        # The case priority decides whether the model may be downgraded under load
+        payload = engine._build_ollama_payload(prompt, stream=True, task=engine.diagnosis_task())
+
+    cache = get_llm_cache()
+    cache_key = payload_cache_key(payload)
+    cached_text = cache.get(cache_key) if cache else None
+    if cached_text is not None:
+        fields = engine._parse_ollama_response(cached_text)
+        for key, value in fields.items():
+            yield sse_event('field', {'field': key, 'value': value})
+        if on_complete is not None:
+            on_complete(fields)
+        yield sse_event('done', {'fields': fields, 'cached': True})
+        return
+
+    scheduler = get_llm_scheduler()
+    yield sse_event('status', {'message': 'Waiting for the AI model...'})
+    try:
+        scheduler.acquire(priority)
+    except LLMQueueTimeout as e:
+        logger.warning(f"Streaming diagnosis not started: {e}")
+        yield from _fallback_events(engine, symptoms, patient_history, 'AI model busy')
+        return
+
+    pool = get_ollama_pool()
+    endpoint = None
+    ok = False
+    resolved = False  # breaker told about the outcome
+    start = time.perf_counter()
+    try:
+        endpoint = pool.acquire(payload['model'])
+        if endpoint is None:
+            yield from _fallback_events(engine, symptoms, patient_history, 'AI model unavailable (circuit open)')
+            return
+        breaker = endpoint.breaker
+
+        yield sse_event('status', {'message': 'AI model is writing...'})
+        try:
+            for kind, key, value in stream_ollama_fields(payload, endpoint.url):
+                if kind == 'partial':
+                    yield sse_event('partial', {'field': key, 'text': value})
+                elif kind == 'field':
+                    yield sse_event('field', {'field': key, 'value': value})
+                else:
+                    breaker.record_success()
+                    ok = resolved = True
+                    raw_text = value.pop('_raw', '')
+                    if cache and raw_text:
+                        cache.set(cache_key, payload['model'], raw_text)
+                    if on_complete is not None:
+                        on_complete(value)
+                    yield sse_event('done', {'fields': value, 'cached': False})
+        except (requests.exceptions.RequestException, ValueError) as e:
+            breaker.record_failure(e.__class__.__name__)
+            resolved = True
+            logger.error(f"Streaming diagnosis failed: {e}")
+            yield from _fallback_events(engine, symptoms, patient_history, 'AI model unavailable')
+    finally:
+        # Also runs when the browser disconnects and the generator is closed
+        if endpoint is not None:
+            if not resolved:
+                # Cut off mid-generation: no verdict on the endpoint, but a
+                # half-open trial must not stay claimed forever
+                endpoint.breaker.release_trial()
+            pool.release(endpoint, payload['model'], time.perf_counter() - start, ok, payload.get('keep_alive'))
+        scheduler.release()
+
+
+def _fallback_events(engine, symptoms: str, patient_history: Dict, reason: str) -> Iterator[str]:
+    """Rule-based matches when the LLM cannot be streamed."""
+    matches = engine._match_condition_rules(symptoms, patient_history)
+    yield sse_event('fallback', {'reason': reason, 'matches': matches[:3]})
+    yield sse_event('done', {'fields': {}, 'cached': False, 'fallback': True})
@@ -0,0 +1 @@
+# diagnoses/management/__init__.py
@@ -0,0 +1 @@
+# diagnoses/management/commands/__init__.py
@@ -0,0 +1,84 @@
+"""
+Management command measuring the fixed per-case cost of the agent pipeline:
+building the agents and rule tables, and evaluating the rules for a case
+"""
+import time
+from django.core.management.base import BaseCommand
+from diagnoses.ai_utils import MedicalAIDiagnosticEngine, diagnostic_engine
+from diagnoses.services import (
+    CoordinatorAgent,
+    RetrieverAgent,
+    DiagnosisAgent,
+    TreatmentAgent,
+    get_agent,
+    reset_agents,
+)
+from .benchmark_fused_analysis import SAMPLE_CASES
+
+
+AGENT_NAMES = ['coordinator', 'retriever', 'diagnosis', 'treatment']
+
+
+def per_call_us(func, iterations: int) -> float:
+    """Mean microseconds per call of func, after one warm-up call."""
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+class Command(BaseCommand):
+    help = 'Measure agent construction (fresh vs registry) and per-case rule evaluation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=2000,
+            help='Calls per measurement (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        def fresh_agents():
+            CoordinatorAgent()
+            RetrieverAgent()
+            DiagnosisAgent()
+            TreatmentAgent()
+
+        def registry_agents():
+            for name in AGENT_NAMES:
+                get_agent(name)
+
+        def first_registry_build():
+            reset_agents()
+            registry_agents()
+
+        coordinator = get_agent('coordinator')
+        diagnosis_agent = get_agent('diagnosis')
+        patient_history = {
+            'medical_history': 'hypertension, smoker',
+            'allergies': 'None',
+            'age': 60,
+            'gender': 'Male',
+        }
+
+        def evaluate_rules():
+            for symptoms, _, _ in SAMPLE_CASES:
+                coordinator._assess_urgency(symptoms, {})
+                diagnosis_agent._identify_red_flags(symptoms)
+                diagnosis_agent._detect_emergency_conditions(symptoms, {})
+                diagnostic_engine._match_condition_rules(symptoms, patient_history)
+                diagnostic_engine._calculate_symptom_severity(symptoms)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Startup'))
+        self.stdout.write(f'  diagnostic engine        {per_call_us(MedicalAIDiagnosticEngine, iterations):9.1f} us')
+        self.stdout.write(f'  registry, first build    {per_call_us(first_registry_build, iterations):9.1f} us')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nPer case'))
+        self.stdout.write(f'  4 agents constructed     {per_call_us(fresh_agents, iterations):9.1f} us')
+        self.stdout.write(f'  4 agents from registry   {per_call_us(registry_agents, iterations):9.1f} us')
+        rules_us = per_call_us(evaluate_rules, iterations) / len(SAMPLE_CASES)
+        self.stdout.write(f'  rule evaluation          {rules_us:9.1f} us (mean of {len(SAMPLE_CASES)} sample cases)')
@@ -0,0 +1,128 @@
+"""
+Management command comparing per-condition loop scoring with the vectorized
+ConditionRuleMatrix across rule-base sizes (that both give identical matches is
+checked by ConditionRuleMatrixTests)
+"""
+import random
+import time
+from django.core.management.base import BaseCommand
+from diagnoses.ai_utils import COMPILED_CONDITION_RULES, diagnostic_engine
+from diagnoses.keyword_engine import scan_symptoms
+from diagnoses.patient_context import PatientContext
+from diagnoses.rule_tables import ConditionRuleMatrix
+from .benchmark_fused_analysis import SAMPLE_CASES
+
+
+PATIENT = PatientContext(
+    medical_history='hypertension, smoker, type 2 diabetes',
+    allergies='None',
+    age=70,
+    gender='Male',
+)
+
+
+def loop_matches(rules, symptoms, patient, threshold):
+    """Reference scoring: one pass per condition (the implementation before ConditionRuleMatrix)."""
+    found = scan_symptoms(symptoms).keywords
+    matched = []
+    for rule in rules:
+        required_count = sum(1 for words in rule.required_words if any(word in found for word in words))
+        if required_count == 0:
+            continue
+        confidence = 0.0
+        confidence += 0.4 * (required_count / len(rule.required_words))
+        supporting_count = sum(1 for words in rule.supporting_words if any(word in found for word in words))
+        supporting_ratio = supporting_count / len(rule.supporting_words) if rule.supporting_words else 0
+        confidence += supporting_ratio * 0.3
+        risk_factor_count = sum(1 for risk_factor in rule.risk_factors if patient.has_risk_factor(risk_factor))
+        if rule.risk_factors:
+            confidence += (risk_factor_count / len(rule.risk_factors)) * 0.2
+        confidence += rule.confidence_boost
+        confidence = min(confidence, 1.0)
+        if confidence >= threshold:
+            matched.append({
+                'condition': rule.condition,
+                'confidence': confidence,
+                'urgency': rule.urgency,
+                'supporting_symptoms': supporting_count,
+                'risk_factors': risk_factor_count,
+            })
+    return sorted(matched, key=lambda x: x['confidence'], reverse=True)
+
+
+def synthetic_rules(size, seed=0):
+    """
+    A rule base of the given size: the real conditions, then variants of them
+    whose symptom phrases are swapped for phrases of other conditions.
+    """
+    rng = random.Random(seed)
+    base = list(COMPILED_CONDITION_RULES)
+    phrases = sorted({words for rule in base for words in rule.required_words + rule.supporting_words})
+    rules = []
+    for index in range(size):
+        rule = base[index % len(base)]
+        if index >= len(base):
+            rule = rule._replace(
+                key=f'{rule.key}_{index}',
+                condition=f'{rule.condition} {index}',
+                required_words=tuple(rng.sample(phrases, len(rule.required_words))),
+                supporting_words=tuple(rng.sample(phrases, len(rule.supporting_words))),
+                confidence_boost=round(rng.uniform(0.0, 0.3), 2),
+            )
+        rules.append(rule)
+    return rules
+
+
+def per_call_us(func, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+class Command(BaseCommand):
+    help = 'Benchmark condition-rule scoring (loop vs vectorized) across rule-base sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='28,100,300,1000',
+            help='Comma-separated rule-base sizes (default: 28,100,300,1000)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Scoring passes over the sample cases per measurement (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        iterations = options['iterations']
+        threshold = diagnostic_engine.confidence_threshold
+
+        self.stdout.write(
+            f'  {"conditions":>10} {"loop us":>10} {"matrix us":>10} {"speed-up":>9} {"build ms":>9}'
+        )
+        for size in sizes:
+            rules = synthetic_rules(size)
+            start = time.perf_counter()
+            matrix = ConditionRuleMatrix(rules)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            def loop():
+                return [loop_matches(rules, symptoms, PATIENT, threshold) for symptoms, _, _ in SAMPLE_CASES]
+
+            def vectorized():
+                return [
+                    matrix.matches(scan_symptoms(symptoms).keywords, PATIENT.has_risk_factor, threshold)
+                    for symptoms, _, _ in SAMPLE_CASES
+                ]
+
+            loop_us = per_call_us(loop, iterations) / len(SAMPLE_CASES)
+            matrix_us = per_call_us(vectorized, iterations) / len(SAMPLE_CASES)
+            self.stdout.write(
+                f'  {size:10} {loop_us:10.1f} {matrix_us:10.1f} {loop_us / matrix_us:8.1f}x {build_ms:9.1f}'
+            )
+        self.stdout.write(f'(per case, mean of {len(SAMPLE_CASES)} sample cases)')
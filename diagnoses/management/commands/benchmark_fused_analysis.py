@@ -0,0 +1,128 @@
+"""
+Management command comparing one fused LLM call per case against separate
+diagnosis, treatment and medication calls
+"""
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from knowledge.rag_utils import search_medical_knowledge
+from diagnoses.ai_utils import diagnostic_engine
+
+
+# Separate-call baseline: what LLM-backed treatment and medication steps would
+# ask for if each were its own generation after the diagnosis call
+SECTION_PROMPT = """
+You are an experienced medical AI assistant helping healthcare workers in rural Zimbabwe.
+
+Patient Information:
+- Age: {age}
+- Gender: {gender}
+- Symptoms: {symptoms}
+- Medical History: {medical_history}
+
+Working diagnosis: {diagnosis}
+
+Relevant Medical Knowledge:
+{retrieved_context}
+
+{instructions}
+"""
+
+TREATMENT_INSTRUCTIONS = (
+    'Return JSON with a "treatment_plan" object containing "immediate_actions", '
+    '"short_term_actions" and "follow_up_actions" lists.'
+)
+
+MEDICATION_INSTRUCTIONS = (
+    'Return JSON with a "medications" list of objects with "name", "dosage", '
+    '"duration" and "instructions". Use WHO Essential Medicines List generic names.'
+)
+
+SAMPLE_CASES = [
+    ('fever, chills, headache, body aches, sweating', 34, 'Male'),
+    ('chest pain, shortness of breath, sweating, nausea', 61, 'Male'),
+    ('cough, fever, difficulty breathing, fast breathing', 4, 'Female'),
+    ('diarrhea, vomiting, dehydration, abdominal pain', 2, 'Male'),
+    ('headache, high blood pressure, dizziness, blurred vision', 55, 'Female'),
+    ('frequent urination, excessive thirst, weight loss, fatigue', 47, 'Female'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure wall-clock time per case for fused vs separate LLM calls (bypasses the LLM cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=1,
+            help='Times to run each sample case in each mode (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        timings = {'separate': [], 'fused': []}
+        calls = {'separate': 0, 'fused': 0}
+
+        for _ in range(options['rounds']):
+            for symptoms, age, gender in SAMPLE_CASES:
+                patient_history = {'age': age, 'gender': gender, 'medical_history': 'None reported'}
+                knowledge = search_medical_knowledge(symptoms, top_k=5)
+
+                elapsed, count = self._run_separate(symptoms, patient_history, knowledge)
+                timings['separate'].append(elapsed)
+                calls['separate'] += count
+
+                elapsed, count = self._run_fused(symptoms, patient_history, knowledge)
+                timings['fused'].append(elapsed)
+                calls['fused'] += count
+
+                self.stdout.write(
+                    f'{symptoms[:45]:45}  separate {timings["separate"][-1]:6.2f}s  '
+                    f'fused {timings["fused"][-1]:6.2f}s'
+                )
+
+        cases = len(timings['fused'])
+        self.stdout.write('')
+        for mode in ['separate', 'fused']:
+            self.stdout.write(
+                f'{mode:8}  mean {statistics.mean(timings[mode]):6.2f}s  '
+                f'median {statistics.median(timings[mode]):6.2f}s  '
+                f'LLM calls/case {calls[mode] / cases:.1f}'
+            )
+
+        separate_mean = statistics.mean(timings['separate'])
+        fused_mean = statistics.mean(timings['fused'])
+        if separate_mean:
+            reduction = (separate_mean - fused_mean) / separate_mean * 100
+            self.stdout.write(self.style.SUCCESS(
+                f'Fused analysis saves {separate_mean - fused_mean:.2f}s per case ({reduction:.0f}%)'
+            ))
+
+    def _run_separate(self, symptoms, patient_history, knowledge):
+        """Diagnosis call, then treatment and medication calls that depend on it."""
+        start = time.perf_counter()
+        prompt = diagnostic_engine._format_medical_prompt(symptoms, patient_history, knowledge, fused=False)
+        response = diagnostic_engine._query_ollama_api(prompt, use_cache=False) or {}
+        diagnosis = response.get('primary_diagnosis', 'Unknown')
+
+        context = '\n'.join(f"- {chunk['content'][:300]}..." for chunk in knowledge[:5])
+        for instructions in [TREATMENT_INSTRUCTIONS, MEDICATION_INSTRUCTIONS]:
+            section_prompt = SECTION_PROMPT.format(
+                age=patient_history['age'],
+                gender=patient_history['gender'],
+                symptoms=symptoms,
+                medical_history=patient_history['medical_history'],
+                diagnosis=diagnosis,
+                retrieved_context=context,
+                instructions=instructions,
+            )
+            diagnostic_engine._query_ollama_api(section_prompt, use_cache=False)
+        return time.perf_counter() - start, 3
+
+    def _run_fused(self, symptoms, patient_history, knowledge):
+        """One generation returning diagnosis, treatment plan and medications."""
+        start = time.perf_counter()
+        prompt = diagnostic_engine._format_medical_prompt(symptoms, patient_history, knowledge, fused=True)
+        response = diagnostic_engine._query_ollama_api(prompt, use_cache=False) or {}
+        diagnostic_engine._parse_fused_sections(response)
+        return time.perf_counter() - start, 1
@@ -0,0 +1,155 @@
+"""
+Management command comparing per-task model routing against a single global
+model, using a simulated Ollama server (or a real one with --ollama-url)
+"""
+import statistics
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from knowledge.rag_utils import search_medical_knowledge
+from diagnoses.ai_utils import diagnostic_engine, EXPLANATION_PROMPT, TRIAGE_PROMPT
+from diagnoses.llm_routing import get_routing_status
+from diagnoses.mock_ollama import MockOllamaServer
+from .benchmark_fused_analysis import SAMPLE_CASES
+
+
+TASKS = ['diagnosis', 'explanation', 'triage']
+
+
+class Command(BaseCommand):
+    help = 'Measure LLM latency per task with tiered model routing vs one model for everything (bypasses the LLM cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=12,
+            help='Calls per task and mode (default: 12)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=6,
+            help='Concurrent diagnosis calls in the load test (default: 6)',
+        )
+        parser.add_argument(
+            '--time-scale',
+            type=float,
+            default=10.0,
+            help='Speed-up factor of the simulated server (default: 10)',
+        )
+        parser.add_argument(
+            '--ollama-url',
+            default='',
+            help='Benchmark a running Ollama generate endpoint instead of the simulated server',
+        )
+
+    def handle(self, *args, **options):
+        server = None
+        ollama_url = options['ollama_url']
+        if not ollama_url:
+            server = MockOllamaServer(time_scale=options['time_scale']).start()
+            ollama_url = server.generate_url
+            self.stdout.write(f'Simulated Ollama at {server.base_url} (time scale x{options["time_scale"]:g})')
+
+        # One model for everything: the configured diagnosis model with the global context size
+        single_model = {
+            task: {
+                'model': settings.OLLAMA_MODEL,
+                'num_ctx': getattr(settings, 'LLM_CONTEXT_TOKENS', 4096),
+                'num_predict': None,
+                'keep_alive': None,
+                'downgrade_model': None,
+            }
+            for task in TASKS
+        }
+
+        try:
+            with override_settings(OLLAMA_API_URL=ollama_url, LLM_CACHE_ENABLED=False):
+                prompts = self._build_prompts()
+
+                self.stdout.write(self.style.MIGRATE_HEADING('\nSequential calls per task'))
+                for task in ['triage', 'explanation', 'diagnosis']:
+                    with override_settings(LLM_MODEL_ROUTES=single_model):
+                        single = self._run_sequential(task, prompts[task], options['requests'])
+                    routed = self._run_sequential(task, prompts[task], options['requests'])
+                    self._report(task, single, routed)
+
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'\nDiagnosis under load ({options["concurrency"]} concurrent callers, '
+                    f'LLM_MAX_CONCURRENT={getattr(settings, "LLM_MAX_CONCURRENT", 2)})'
+                ))
+                with override_settings(LLM_DOWNGRADE_IN_FLIGHT=0):
+                    fixed = self._run_concurrent(prompts['diagnosis'], options['requests'], options['concurrency'])
+                downgrades_before = get_routing_status()['downgrades'].get('diagnosis', 0)
+                adaptive = self._run_concurrent(prompts['diagnosis'], options['requests'], options['concurrency'])
+                downgraded = get_routing_status()['downgrades'].get('diagnosis', 0) - downgrades_before
+                self._report('no downgrade / downgrade', fixed, adaptive)
+                self.stdout.write(
+                    f'  {downgraded} of {len(adaptive)} calls downgraded '
+                    f'(LLM_DOWNGRADE_IN_FLIGHT={getattr(settings, "LLM_DOWNGRADE_IN_FLIGHT", 4)})'
+                )
+        finally:
+            if server:
+                self.stdout.write(f'\nSimulated server: {server.stats()}')
+                server.stop()
+
+    def _build_prompts(self):
+        """One prompt per task, built the way the application builds them."""
+        symptoms, age, gender = SAMPLE_CASES[0]
+        patient_history = {'age': age, 'gender': gender, 'medical_history': 'None reported'}
+        knowledge = search_medical_knowledge(symptoms, top_k=5)
+        return {
+            'diagnosis': diagnostic_engine._format_medical_prompt(symptoms, patient_history, knowledge, fused=True),
+            'explanation': EXPLANATION_PROMPT.format(diagnosis='Malaria', symptoms=symptoms),
+            'triage': TRIAGE_PROMPT.format(symptoms=symptoms),
+        }
+
+    def _call(self, task, prompt):
+        start = time.perf_counter()
+        diagnostic_engine._query_ollama_api(prompt, use_cache=False, task=task)
+        return time.perf_counter() - start
+
+    def _run_sequential(self, task, prompt, requests):
+        # Warm-up call loads the model so the measurement reflects a resident model
+        self._call(task, prompt)
+        return [self._call(task, prompt) for _ in range(requests)]
+
+    def _run_concurrent(self, prompt, requests, concurrency):
+        self._call('diagnosis', prompt)
+        timings = []
+        lock = threading.Lock()
+        remaining = iter(range(requests))
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                elapsed = self._call('diagnosis', prompt)
+                with lock:
+                    timings.append(elapsed)
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings
+
+    def _report(self, label, baseline, routed):
+        def p95(values):
+            ordered = sorted(values)
+            return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+        baseline_mean = statistics.mean(baseline)
+        routed_mean = statistics.mean(routed)
+        self.stdout.write(
+            f'{label:24}  before mean {baseline_mean:6.2f}s p95 {p95(baseline):6.2f}s  '
+            f'after mean {routed_mean:6.2f}s p95 {p95(routed):6.2f}s'
+        )
+        if baseline_mean:
+            change = (baseline_mean - routed_mean) / baseline_mean * 100
+            self.stdout.write(self.style.SUCCESS(f'  {change:.0f}% lower mean latency'))
@@ -0,0 +1,141 @@
+"""
+Management command measuring LLM throughput with one Ollama instance vs a
+load-balanced pool of simulated instances, including failover to a dead one
+"""
+import socket
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from knowledge.rag_utils import search_medical_knowledge
+from diagnoses.ai_utils import diagnostic_engine, TRIAGE_PROMPT
+from diagnoses.mock_ollama import MockOllamaServer
+from diagnoses.ollama_pool import get_ollama_pool, reset_ollama_pool
+from .benchmark_fused_analysis import SAMPLE_CASES
+
+
+def unused_local_url() -> str:
+    """Generate URL of a local port nothing listens on."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f'http://127.0.0.1:{port}/api/generate'
+
+
+class Command(BaseCommand):
+    help = 'Compare one Ollama endpoint against a pool of simulated endpoints (bypasses the LLM cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--instances',
+            type=int,
+            default=3,
+            help='Simulated Ollama instances in the pool (default: 3)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=24,
+            help='Calls per scenario, alternating diagnosis and triage (default: 24)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=6,
+            help='Concurrent callers; also used as LLM_MAX_CONCURRENT (default: 6)',
+        )
+        parser.add_argument(
+            '--time-scale',
+            type=float,
+            default=20.0,
+            help='Speed-up factor of the simulated servers (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        # Each simulated instance runs one generation at a time and has room for one model,
+        # so balancing and model stickiness both show up in the numbers
+        servers = [
+            MockOllamaServer(time_scale=options['time_scale'], num_parallel=1, max_loaded_models=1).start()
+            for _ in range(max(1, options['instances']))
+        ]
+        urls = [server.generate_url for server in servers]
+        scenarios = [
+            ('single endpoint', urls[:1]),
+            (f'{len(urls)} endpoints', urls),
+            (f'{len(urls)} endpoints + 1 down', urls + [unused_local_url()]),
+        ]
+
+        try:
+            with override_settings(
+                LLM_CACHE_ENABLED=False,
+                LLM_HEALTH_PROBE_INTERVAL=0,
+                LLM_DOWNGRADE_IN_FLIGHT=0,
+                LLM_MAX_CONCURRENT=options['concurrency'],
+            ):
+                prompts = self._build_prompts()
+                for label, endpoint_urls in scenarios:
+                    loads_before = [sum(server.loads.values()) for server in servers]
+                    with override_settings(OLLAMA_ENDPOINTS=endpoint_urls):
+                        reset_ollama_pool()
+                        wall, timings, failed = self._run(prompts, options['requests'], options['concurrency'])
+                        pool_status = get_ollama_pool().snapshot()
+                    reloads = sum(sum(server.loads.values()) for server in servers) - sum(loads_before)
+                    self._report(label, wall, timings, failed, reloads, pool_status)
+        finally:
+            reset_ollama_pool()
+            for server in servers:
+                server.stop()
+
+    def _build_prompts(self):
+        symptoms, age, gender = SAMPLE_CASES[0]
+        patient_history = {'age': age, 'gender': gender, 'medical_history': 'None reported'}
+        knowledge = search_medical_knowledge(symptoms, top_k=5)
+        return [
+            ('diagnosis', diagnostic_engine._format_medical_prompt(symptoms, patient_history, knowledge, fused=True)),
+            ('triage', TRIAGE_PROMPT.format(symptoms=symptoms)),
+        ]
+
+    def _run(self, prompts, requests, concurrency):
+        """Run the calls from concurrent threads; returns (wall seconds, latencies, failures)."""
+        timings = []
+        failed = []
+        lock = threading.Lock()
+        remaining = iter(range(requests))
+
+        def worker():
+            while True:
+                with lock:
+                    index = next(remaining, None)
+                if index is None:
+                    return
+                task, prompt = prompts[index % len(prompts)]
+                start = time.perf_counter()
+                result = diagnostic_engine._query_ollama_api(prompt, use_cache=False, task=task)
+                with lock:
+                    timings.append(time.perf_counter() - start)
+                    if result is None:
+                        failed.append(index)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, timings, len(failed)
+
+    def _report(self, label, wall, timings, failed, reloads, pool_status):
+        ordered = sorted(timings)
+        p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+        self.stdout.write(
+            f'  wall {wall:6.2f}s  throughput {len(timings) / wall:5.2f} calls/s  '
+            f'mean {statistics.mean(timings):5.2f}s  p95 {p95:5.2f}s  failed {failed}  model loads {reloads}'
+        )
+        for endpoint in pool_status['endpoints']:
+            self.stdout.write(
+                f'  {endpoint["url"]:40} {endpoint["state"]:9} requests {endpoint["requests"]:3}  '
+                f'failures {endpoint["failures"]:2}  warm {", ".join(endpoint["warm_models"]) or "-"}'
+            )
@@ -0,0 +1,106 @@
+"""
+Management command enforcing the quick triage latency budget: every
+keystroke prefix of the sample cases is sent through quick_triage_ajax, cold
+(caches cleared) and warm, and the command fails if the p99 server time
+exceeds QUICK_TRIAGE_BUDGET_MS or if any request touches the database
+"""
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from diagnoses.keyword_engine import scan_symptoms
+from diagnoses.triage import get_quick_triage
+from diagnoses.views import quick_triage_ajax
+from .benchmark_fused_analysis import SAMPLE_CASES
+from .loadtest_cases import percentile
+
+
+def typing_prefixes(text):
+    """The symptom text as sent after each typed word."""
+    words = text.split()
+    return [' '.join(words[:count]) for count in range(1, len(words) + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Measure quick triage server time per keystroke request and enforce QUICK_TRIAGE_BUDGET_MS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20, help='Passes over all inputs (default: 20)')
+        parser.add_argument(
+            '--budget-ms',
+            type=float,
+            default=None,
+            help='p99 budget in milliseconds (default: settings.QUICK_TRIAGE_BUDGET_MS)',
+        )
+
+    def handle(self, *args, **options):
+        from users.models import User
+
+        budget_ms = options['budget_ms'] or getattr(settings, 'QUICK_TRIAGE_BUDGET_MS', 5)
+        # Unsaved user: authentication without a session or database lookup
+        user = User(username='triage-benchmark', role='NURSE')
+        factory = RequestFactory()
+        url = reverse('diagnoses:quick_triage_ajax')
+        vitals = json.dumps({'temperature': 38.5, 'heart_rate': 96, 'blood_pressure': '120/80'})
+        inputs = [
+            (prefix, vitals if index % 2 else '')
+            for index, (symptoms, _, _) in enumerate(SAMPLE_CASES)
+            for prefix in typing_prefixes(symptoms)
+        ]
+
+        def request_ms(symptoms, vital_signs):
+            request = factory.post(url, {'symptoms': symptoms, 'vital_signs': vital_signs})
+            request.user = user
+            start = time.perf_counter()
+            response = quick_triage_ajax(request)
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise CommandError(f'Triage failed for {symptoms!r}: HTTP {response.status_code}')
+            return elapsed
+
+        triage = get_quick_triage()
+        cold, warm = [], []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(options['rounds']):
+                for symptoms, vital_signs in inputs:
+                    triage.coalescer.clear()
+                    scan_symptoms.cache_clear()
+                    cold.append(request_ms(symptoms, vital_signs))
+                    warm.append(request_ms(symptoms, vital_signs))
+        if queries.captured_queries:
+            raise CommandError(f'Quick triage ran {len(queries.captured_queries)} SQL queries; expected none')
+
+        # Identical concurrent requests are evaluated once
+        triage.coalescer.clear()
+        scan_symptoms.cache_clear()
+        burst = [
+            threading.Thread(target=request_ms, args=(SAMPLE_CASES[0][0], vitals))
+            for _ in range(16)
+        ]
+        for thread in burst:
+            thread.start()
+        for thread in burst:
+            thread.join()
+        coalescing = triage.coalescer.stats()
+
+        self.stdout.write(f'{len(inputs)} keystroke inputs x {options["rounds"]} rounds, budget {budget_ms:g} ms (p99)')
+        self.stdout.write(f'  {"":6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+        for label, values in (('cold', cold), ('warm', warm)):
+            self.stdout.write(
+                f'  {label:6} {percentile(values, 0.5):8.3f} {percentile(values, 0.95):8.3f} '
+                f'{percentile(values, 0.99):8.3f} {max(values):8.3f}'
+            )
+        self.stdout.write(
+            f'  16 identical concurrent requests: {coalescing["misses"]} evaluated, '
+            f'{coalescing["coalesced"]} coalesced, {coalescing["hits"]} cached'
+        )
+
+        p99 = percentile(cold, 0.99)
+        if p99 > budget_ms:
+            raise CommandError(f'Quick triage p99 {p99:.3f} ms exceeds the {budget_ms:g} ms budget')
+        self.stdout.write(self.style.SUCCESS(f'Within budget: p99 {p99:.3f} ms <= {budget_ms:g} ms'))
@@ -0,0 +1,300 @@
+"""
+Management command load-testing the case pipeline end to end: cases are
+submitted through the real CaseCreateView at a target rate, analyzed by
+in-process queue workers against a simulated (or real) Ollama, and the
+throughput, per-stage latency percentiles and error rates are reported.
+
+Runs against a throwaway test database, never the configured one.
+"""
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from diagnoses.jobs import claim_next_job, process_job
+from diagnoses.llm_client import get_llm_client
+from diagnoses.mock_ollama import MockOllamaServer, FAILURE_MODES
+from diagnoses.ollama_pool import get_ollama_pool, reset_ollama_pool
+from .benchmark_fused_analysis import SAMPLE_CASES
+
+
+PIPELINE_STAGES = [
+    'routing', 'protocols', 'cardiac_protocol', 'diagnosis', 'treatment_plan', 'medications', 'first_aid',
+    'coordination', 'total',
+]
+
+_CASE_URL_RE = re.compile(r'/(\d+)/?$')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Submit cases through the real views at a target rate and report pipeline latency and errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=20, help='Cases to submit (default: 20)')
+        parser.add_argument('--rate', type=float, default=1.0, help='Target submissions per second (default: 1)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='In-process analysis workers; 0 analyzes inside the request (default: 2)',
+        )
+        parser.add_argument(
+            '--submitters',
+            type=int,
+            default=4,
+            help='Concurrent HTTP clients submitting cases (default: 4)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=600,
+            help='Seconds to wait for all analyses to finish (default: 600)',
+        )
+        parser.add_argument('--use-cache', action='store_true', help='Allow LLM cache hits (off by default)')
+        parser.add_argument(
+            '--ollama-url',
+            default='',
+            help='Use this Ollama generate endpoint instead of an in-process mock',
+        )
+        parser.add_argument('--time-scale', type=float, default=10.0, help='Mock speed-up factor (default: 10)')
+        parser.add_argument('--latency', type=float, default=None, help='Mock fixed latency in seconds')
+        parser.add_argument('--tokens-per-second', type=float, default=None, help='Mock generation rate')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Mock failure rate, 0-1 (default: 0)')
+        parser.add_argument(
+            '--failure-mode',
+            choices=list(FAILURE_MODES) + ['mixed'],
+            default='error',
+            help='Mock failure mode (default: error)',
+        )
+
+    def handle(self, *args, **options):
+        server = None
+        ollama_url = options['ollama_url']
+        if not ollama_url:
+            server = MockOllamaServer(
+                time_scale=options['time_scale'],
+                latency=options['latency'],
+                tokens_per_second=options['tokens_per_second'],
+                failure_rate=options['failure_rate'],
+                failure_mode=options['failure_mode'],
+                hang_seconds=5.0,
+            ).start()
+            ollama_url = server.generate_url
+
+        test_dir = None
+        if connection.vendor == 'sqlite':
+            # A file rather than shared in-memory SQLite, so worker threads can write concurrently
+            test_dir = tempfile.mkdtemp(prefix='loadtest-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(test_dir, 'loadtest.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+
+        try:
+            with override_settings(
+                OLLAMA_API_URL=ollama_url,
+                OLLAMA_ENDPOINTS=[],
+                LLM_CACHE_ENABLED=options['use_cache'],
+                ANALYSIS_JOBS_INLINE=options['workers'] == 0,
+            ):
+                reset_ollama_pool()
+                self.stdout.write(
+                    f'Submitting {options["cases"]} cases at {options["rate"]:g}/s '
+                    f'to {ollama_url} ({options["workers"]} worker(s))'
+                )
+                results = self._run(options)
+                llm_requests = self._report(results, server)
+                if not llm_requests and results['submissions']:
+                    # get_ai_diagnosis only calls the LLM when the knowledge search finds something
+                    raise CommandError(
+                        'No LLM calls were made: the knowledge search returned no results, so LLM latency '
+                        'and failure injection were not exercised. Build the FAISS knowledge index first '
+                        '(knowledge.rag_utils.process_all_documents()).'
+                    )
+        finally:
+            reset_ollama_pool()
+            teardown_test_environment()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if test_dir:
+                os.rmdir(test_dir)
+            if server:
+                server.stop()
+
+    def _run(self, options):
+        from users.models import User
+        from patients.models import Patient
+        from diagnoses.models import Case
+
+        nurse = User.objects.create_user('loadtest_nurse', 'loadtest@example.com', 'loadtest', role='NURSE')
+        patients = [
+            Patient.objects.create(
+                first_name='Load',
+                last_name=f'Test {i}',
+                date_of_birth=datetime.date.today() - datetime.timedelta(days=365 * age),
+                gender='M' if gender == 'Male' else 'F',
+            )
+            for i, (_, age, gender) in enumerate(SAMPLE_CASES)
+        ]
+        create_url = reverse('diagnoses:case_create')
+
+        local = threading.local()
+        lock = threading.Lock()
+        submissions = []
+
+        def submit(index):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(nurse)
+            symptoms = SAMPLE_CASES[index % len(SAMPLE_CASES)][0]
+            data = {
+                'patient': patients[index % len(patients)].pk,
+                # Vary the wording so --use-cache runs see a realistic mix of hits and misses
+                'symptoms': f'{symptoms}, onset {index % 7 + 1} days ago',
+                'priority': 'MEDIUM',
+                'vital_signs': json.dumps({'temperature': 38.5, 'heart_rate': 96}),
+            }
+            start = time.perf_counter()
+            try:
+                response = local.client.post(create_url, data)
+                error = None if response.status_code == 302 else f'HTTP {response.status_code}'
+                match = _CASE_URL_RE.search(response.get('Location', ''))
+            except Exception as e:
+                error, match = f'{e.__class__.__name__}: {e}', None
+            elapsed = time.perf_counter() - start
+            connection.close()
+            with lock:
+                submissions.append({
+                    'submit': elapsed,
+                    'case_id': int(match.group(1)) if match and not error else None,
+                    'error': error,
+                })
+
+        stop = threading.Event()
+
+        def worker(number):
+            worker_id = f'loadtest-{number}'
+            try:
+                while not stop.is_set():
+                    job = claim_next_job(worker_id)
+                    if job is None:
+                        stop.wait(0.05)
+                        continue
+                    process_job(job)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(options['workers'])]
+        for thread in workers:
+            thread.start()
+
+        # Open-loop arrivals: submission i is due at i / rate regardless of how the system keeps up
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options['submitters'])) as submitters:
+            for index in range(options['cases']):
+                delay = started + index / options['rate'] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                submitters.submit(submit, index)
+        submit_seconds = time.perf_counter() - started
+
+        case_ids = [s['case_id'] for s in submissions if s['case_id']]
+        deadline = time.monotonic() + options['timeout']
+        while time.monotonic() < deadline:
+            pending = Case.objects.filter(
+                pk__in=case_ids, analysis_jobs__status__in=['QUEUED', 'RUNNING']
+            ).exists()
+            if not pending:
+                break
+            time.sleep(0.2)
+        stop.set()
+        for thread in workers:
+            thread.join(timeout=5)
+
+        cases = Case.objects.filter(pk__in=case_ids).prefetch_related('analysis_jobs')
+        return {'submissions': submissions, 'cases': list(cases), 'submit_seconds': submit_seconds}
+
+    def _report(self, results, server):
+        """Print the report; returns the number of LLM requests made."""
+        submissions = results['submissions']
+        # 'total' is the pipeline's wall time: its critical path, not the sum of the steps
+        stages = {name: [] for name in ['submit', 'queue_wait', 'analysis'] + PIPELINE_STAGES + ['end_to_end']}
+        stages['submit'] = [s['submit'] for s in submissions]
+
+        finished = failed = retried = unfinished = 0
+        first_created = last_finished = None
+        for case in results['cases']:
+            job = case.analysis_jobs.first()
+            if job is None or job.status in ['QUEUED', 'RUNNING']:
+                unfinished += 1
+                continue
+            retried += job.attempts > 1
+            if job.status == 'FAILED':
+                failed += 1
+                continue
+            finished += 1
+            stages['queue_wait'].append((job.started_at - job.created_at).total_seconds())
+            stages['analysis'].append(job.duration_seconds)
+            stages['end_to_end'].append((job.finished_at - job.created_at).total_seconds())
+            first_created = min(first_created or job.created_at, job.created_at)
+            last_finished = max(last_finished or job.finished_at, job.finished_at)
+            try:
+                timings = json.loads(case.ai_diagnosis).get('stage_timings_ms', {})
+            except (TypeError, ValueError):
+                timings = {}
+            for name in PIPELINE_STAGES:
+                # Skipped steps (no cardiac protocol, no first aid) have no timing
+                if name in timings:
+                    stages[name].append(timings[name] / 1000)
+
+        total = len(submissions)
+        submit_errors = [s['error'] for s in submissions if s['error']]
+        self.stdout.write(self.style.MIGRATE_HEADING('\nThroughput'))
+        self.stdout.write(f'  offered   {total / results["submit_seconds"]:6.2f} cases/s')
+        if first_created and last_finished > first_created:
+            elapsed = (last_finished - first_created).total_seconds()
+            self.stdout.write(f'  completed {finished / elapsed:6.2f} cases/s ({finished} cases in {elapsed:.1f}s)')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nLatency (seconds)'))
+        self.stdout.write(f'  {"stage":16} {"count":>5} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+        for name, values in stages.items():
+            if values:
+                self.stdout.write(
+                    f'  {name:16} {len(values):5} {percentile(values, 0.5):8.3f} {percentile(values, 0.95):8.3f} '
+                    f'{percentile(values, 0.99):8.3f} {max(values):8.3f}'
+                )
+        llm = get_llm_client().metrics().get('ollama')
+        if llm:
+            self.stdout.write(
+                f'  {"llm call":16} {llm["count"]:5} {llm.get("p50_total_ms", 0) / 1000:8.3f} '
+                f'{llm.get("p95_total_ms", 0) / 1000:8.3f}'
+            )
+
+        pool = get_ollama_pool().snapshot()
+        llm_requests = sum(e['requests'] for e in pool['endpoints'])
+        llm_failures = sum(e['failures'] for e in pool['endpoints'])
+        self.stdout.write(self.style.MIGRATE_HEADING('\nErrors'))
+        self.stdout.write(f'  submit errors  {len(submit_errors):4} / {total} ({len(submit_errors) / max(total, 1):.1%})')
+        self.stdout.write(f'  failed jobs    {failed:4} / {total} ({failed / max(total, 1):.1%})')
+        self.stdout.write(f'  retried jobs   {retried:4}')
+        self.stdout.write(f'  unfinished     {unfinished:4}')
+        self.stdout.write(
+            f'  LLM failures   {llm_failures:4} / {llm_requests} ({llm_failures / max(llm_requests, 1):.1%}), '
+            f'rule-based fallback used'
+        )
+        for error in sorted(set(submit_errors))[:5]:
+            self.stdout.write(self.style.ERROR(f'  {error}'))
+        if server:
+            self.stdout.write(f'\nMock Ollama: {server.stats()}')
+        return llm_requests
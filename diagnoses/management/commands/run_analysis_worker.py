@@ -0,0 +1,82 @@
+"""
+Management command that processes queued case analysis jobs
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from diagnoses.jobs import (
+    claim_next_job,
+    default_worker_id,
+    process_job,
+    requeue_stale_jobs,
+)
+from diagnoses.metrics import start_metrics_server
+
+
+class Command(BaseCommand):
+    help = 'Run the multi-agent analysis for queued cases (several processes share LLM_MAX_CONCURRENT running jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs that are due now, then exit',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty (default: 2)',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=0,
+            help='Exit after processing this many jobs (default: no limit)',
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=0,
+            help='Serve stage latency histograms at http://127.0.0.1:PORT/metrics (default: off)',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = default_worker_id()
+        processed = 0
+        self.stdout.write(f'Analysis worker {worker_id} started')
+        if options['metrics_port']:
+            start_metrics_server(options['metrics_port'])
+            self.stdout.write(f'Metrics at http://127.0.0.1:{options["metrics_port"]}/metrics')
+
+        try:
+            while True:
+                close_old_connections()
+                requeue_stale_jobs()
+
+                job = claim_next_job(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'Job #{job.id}: analyzing case #{job.case_id} (attempt {job.attempts})')
+                if process_job(job):
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Job #{job.id}: done in {job.duration_seconds:.1f}s'
+                    ))
+                elif job.status == 'QUEUED':
+                    self.stdout.write(self.style.WARNING(
+                        f'Job #{job.id}: {job.last_error} - retrying after {job.run_after:%H:%M:%S}'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f'Job #{job.id}: failed - {job.last_error}'))
+
+                processed += 1
+                if options['max_jobs'] and processed >= options['max_jobs']:
+                    break
+        except KeyboardInterrupt:
+            self.stdout.write('Interrupted')
+
+        self.stdout.write(f'Analysis worker {worker_id} processed {processed} job(s)')
@@ -0,0 +1,97 @@
+"""
+Management command running a simulated Ollama server for load tests and
+development without a real LLM
+"""
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from diagnoses.mock_ollama import MockOllamaServer, CANNED_ANSWERS, FAILURE_MODES
+
+
+class Command(BaseCommand):
+    help = 'Serve a simulated Ollama /api/generate with configurable latency, token rate and failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=11434, help='Port to listen on (default: 11434)')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=None,
+            help='Fixed seconds before generation starts (default: model load + prefill time)',
+        )
+        parser.add_argument(
+            '--tokens-per-second',
+            type=float,
+            default=None,
+            help='Generation rate (default: based on the model size)',
+        )
+        parser.add_argument(
+            '--time-scale',
+            type=float,
+            default=1.0,
+            help='Divide every delay by this factor (default: 1)',
+        )
+        parser.add_argument('--num-parallel', type=int, default=1, help='Concurrent generations (default: 1)')
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests that fail, 0-1 (default: 0)',
+        )
+        parser.add_argument(
+            '--failure-mode',
+            choices=list(FAILURE_MODES) + ['mixed'],
+            default='error',
+            help='How injected failures look (default: error)',
+        )
+        parser.add_argument(
+            '--canned',
+            default='',
+            help='JSON file with answers keyed by prompt template '
+                 f'({", ".join(CANNED_ANSWERS)}), or a single diagnosis answer object',
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for failure injection')
+
+    def handle(self, *args, **options):
+        server = MockOllamaServer(
+            host=options['host'],
+            port=options['port'],
+            time_scale=options['time_scale'],
+            num_parallel=options['num_parallel'],
+            latency=options['latency'],
+            tokens_per_second=options['tokens_per_second'],
+            failure_rate=options['failure_rate'],
+            failure_mode=options['failure_mode'],
+            canned=self._load_canned(options['canned']),
+            seed=options['seed'],
+        ).start()
+
+        self.stdout.write(self.style.SUCCESS(f'Mock Ollama listening on {server.generate_url}'))
+        self.stdout.write(f"Point the app at it with OLLAMA_API_URL = '{server.generate_url}'")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.stdout.write(f'Stats: {server.stats()}')
+
+    def _load_canned(self, path):
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read canned answers from {path}: {e}')
+        if not isinstance(data, dict):
+            raise CommandError('Canned answers must be a JSON object')
+        if 'primary_diagnosis' in data:
+            # A single answer serves both diagnosis templates
+            return {'fused': data, 'diagnosis': data}
+        unknown = set(data) - set(CANNED_ANSWERS)
+        if unknown:
+            raise CommandError(f'Unknown prompt templates in canned answers: {", ".join(sorted(unknown))}')
+        return data
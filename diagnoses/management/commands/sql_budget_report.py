@@ -0,0 +1,126 @@
+"""
+Management command listing the endpoints that run the most SQL queries:
+the main pages and APIs are requested as a nurse and as a doctor against a
+seeded throwaway test database, and QueryBudgetMiddleware's per-view totals
+are reported worst first, with each view's budget and repeated query
+shapes (N+1).
+
+Runs against a throwaway test database, never the configured one.
+"""
+import datetime
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from diagnoses.query_budget import query_stats
+from .benchmark_fused_analysis import SAMPLE_CASES
+
+
+class Command(BaseCommand):
+    help = 'Request the main endpoints on seeded data and list the worst SQL query counts per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=25, help='Patients to seed, two cases each (default: 25)')
+        parser.add_argument('--top', type=int, default=15, help='Views to list (default: 15)')
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Fail if any view exceeds its budget or repeats a query shape',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+        try:
+            # Overruns are collected for the report rather than raised
+            with override_settings(SQL_BUDGET_RAISE=False, ANALYSIS_JOBS_INLINE=False):
+                requests = self._requests(self._seed(options['patients']))
+                query_stats.reset()
+                for user, method, url, data in requests:
+                    client = Client(raise_request_exception=False)
+                    client.force_login(user)
+                    if method == 'POST':
+                        response = client.post(url, json.dumps(data), content_type='application/json')
+                    else:
+                        response = client.get(url, data)
+                    if response.status_code >= 400:
+                        self.stderr.write(f'{method} {url}: HTTP {response.status_code}')
+                views = query_stats.snapshot()
+        finally:
+            teardown_test_environment()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(views, options['top'])
+        failing = [entry['view'] for entry in views if entry['over_budget'] or entry['repeated_shapes']]
+        if options['strict'] and failing:
+            raise CommandError(f'Over budget or N+1: {", ".join(failing)}')
+
+    def _seed(self, patient_count):
+        from users.models import User
+        from patients.models import Patient, MedicalRecord
+        from diagnoses.models import Case
+
+        nurse = User.objects.create_user('budget_nurse', 'nurse@example.com', 'budget', role='NURSE')
+        doctor = User.objects.create_user('budget_doctor', 'doctor@example.com', 'budget', role='DOCTOR')
+        statuses = ['PENDING', 'IN_PROGRESS', 'DOCTOR_REVIEW', 'COMPLETED']
+        priorities = ['LOW', 'MEDIUM', 'URGENT', 'CRITICAL']
+        cases = []
+        for index in range(patient_count):
+            symptoms, age, gender = SAMPLE_CASES[index % len(SAMPLE_CASES)]
+            patient = Patient.objects.create(
+                first_name='Budget',
+                last_name=f'Patient {index}',
+                date_of_birth=datetime.date.today() - datetime.timedelta(days=365 * age),
+                gender='M' if gender == 'Male' else 'F',
+            )
+            MedicalRecord.objects.create(
+                patient=patient, user=nurse, visit_date=timezone.now(), symptoms=symptoms,
+            )
+            for offset in range(2):
+                status = statuses[(index + offset) % len(statuses)]
+                reviewed = status == 'COMPLETED'
+                cases.append(Case.objects.create(
+                    patient=patient,
+                    nurse=nurse,
+                    symptoms=symptoms,
+                    status=status,
+                    priority=priorities[(index + offset) % len(priorities)],
+                    vital_signs={'temperature': 38.5, 'heart_rate': 96},
+                    doctor_review='Reviewed' if reviewed else '',
+                    reviewed_by=doctor if reviewed else None,
+                ))
+        return {'nurse': nurse, 'doctor': doctor, 'case': cases[0], 'patient': cases[0].patient}
+
+    def _requests(self, seeded):
+        nurse, doctor, case, patient = seeded['nurse'], seeded['doctor'], seeded['case'], seeded['patient']
+        return [
+            (nurse, 'GET', reverse('home'), {}),
+            (nurse, 'GET', reverse('nurse_dashboard'), {}),
+            (nurse, 'GET', reverse('diagnoses:case_list'), {}),
+            (nurse, 'GET', reverse('diagnoses:case_detail', args=[case.pk]), {}),
+            (nurse, 'GET', reverse('diagnoses:analysis_status', args=[case.pk]), {}),
+            (nurse, 'GET', reverse('patients:patient_list'), {}),
+            (nurse, 'GET', reverse('patients:patient_detail', args=[patient.pk]), {}),
+            (nurse, 'GET', reverse('patients:patient_search_api'), {'q': 'Budget'}),
+            (nurse, 'GET', reverse('patients:recent_patients_api'), {}),
+            (nurse, 'GET', reverse('patients:dashboard_stats_api'), {}),
+            (doctor, 'GET', reverse('doctor_dashboard'), {}),
+            (doctor, 'GET', reverse('diagnoses:case_detail', args=[case.pk]), {}),
+            (doctor, 'POST', reverse('diagnoses:save_diagnosis_comments', args=[case.pk]), {'comments': 'Agreed'}),
+        ]
+
+    def _report(self, views, top):
+        self.stdout.write(
+            f'  {"view":42} {"requests":>8} {"avg q":>6} {"max q":>6} {"budget":>6} {"avg ms":>7}'
+        )
+        for entry in views[:top]:
+            flag = ' OVER' if entry['over_budget'] else ''
+            self.stdout.write(
+                f'  {entry["view"][:42]:42} {entry["requests"]:8} {entry["avg_queries"]:6.1f} '
+                f'{entry["max_queries"]:6} {entry["budget"]:6} {entry["avg_ms"]:7.1f}{flag}'
+            )
+            for shape, count in sorted(entry['repeated_shapes'].items(), key=lambda item: -item[1]):
+                self.stdout.write(self.style.WARNING(f'      N+1 {count}x {shape[:110]}'))
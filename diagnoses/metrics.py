@@ -0,0 +1,237 @@
+"""
+Latency spans, histograms and the Prometheus text exposition
+
+Each agent method (route_case, search_protocols, analyze_symptoms,
+create_action_plan, recommend_medications), the Ollama call, the report
+serialization and save, and every view are timed. Durations are aggregated
+per process into histograms, exposed in the Prometheus text format at
+/metrics (and, for analysis workers, on --metrics-port).
+
+Spans recorded while a case is analyzed are also collected for that case
+(collect_timings()), so the stored report shows where its time went. The
+collector lives in a context variable, which the agent pipeline copies into
+its worker threads, so spans of concurrent steps land in the same case.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds in seconds: from rule-only steps (milliseconds) to LLM calls (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with one series per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (non-cumulative, last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+        """Per label combination: count, sum and cumulative bucket counts."""
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        snapshot = {}
+        for key, (counts, total, count) in series.items():
+            cumulative, running = [], 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                running += bucket_count
+                cumulative.append((bound, running))
+            snapshot[key] = {'count': count, 'sum': total, 'buckets': cumulative}
+        return snapshot
+
+    def expose(self) -> List[str]:
+        """Exposition lines for this histogram."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, series in sorted(self.snapshot().items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in series['buckets']:
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {series["sum"]!r}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {series["count"]}')
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    'medical_ai_stage_duration_seconds',
+    'Duration of instrumented analysis stages (agent methods, LLM calls, report writes).',
+    ('stage', 'outcome'),
+)
+REQUEST_DURATION = Histogram(
+    'medical_ai_request_duration_seconds',
+    'Duration of HTTP requests by view.',
+    ('view', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'medical_ai_request_sql_queries',
+    'SQL queries run per HTTP request by view (see query_budget.py).',
+    ('view',),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+HISTOGRAMS = (STAGE_DURATION, REQUEST_DURATION, REQUEST_QUERIES)
+
+
+class CaseTimings:
+    """Span durations collected while one case is analyzed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}  # stage -> [calls, total seconds]
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """{stage: {'calls': n, 'total_ms': ms}}, slowest stage first."""
+        with self._lock:
+            stages = {stage: (calls, total) for stage, (calls, total) in self._stages.items()}
+        return {
+            stage: {'calls': calls, 'total_ms': round(total * 1000, 1)}
+            for stage, (calls, total) in sorted(stages.items(), key=lambda item: item[1][1], reverse=True)
+        }
+
+
+_case_timings: contextvars.ContextVar[Optional[CaseTimings]] = contextvars.ContextVar(
+    'case_timings', default=None
+)
+
+
+@contextmanager
+def collect_timings() -> Iterator[CaseTimings]:
+    """Collect the spans recorded inside the block (including pipeline steps) for one case."""
+    timings = CaseTimings()
+    token = _case_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _case_timings.reset(token)
+
+
+def record_span(stage: str, seconds: float, outcome: str = 'ok'):
+    """Record a measured duration in the stage histogram and the current case."""
+    STAGE_DURATION.observe(seconds, stage=stage, outcome=outcome)
+    timings = _case_timings.get()
+    if timings is not None:
+        timings.record(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the block as one stage (outcome 'error' if it raises)."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        record_span(stage, time.perf_counter() - start, outcome)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator timing every call of a function as the given stage."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_metrics() -> str:
+    """All histograms in the Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics {self.address_string()} {format % args}")
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Serve /metrics from a daemon thread, for processes without a web server
+    (the analysis worker).
+
+    Args:
+        port: Port to listen on
+        host: Interface to bind (loopback by default)
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,135 @@
+"""
+Request middleware for the diagnoses app
+"""
+
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import REQUEST_DURATION, REQUEST_QUERIES
+from .profiling import RequestProfile, get_profile_store
+from .query_budget import QueryBudgetExceeded, QueryRecorder, query_budget_for, query_stats
+
+logger = logging.getLogger(__name__)
+
+
+def _view_name(request) -> str:
+    """Resolved view name of a request ('unresolved' for 404s before routing)."""
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match._func_path) if match else 'unresolved'
+
+
+class RequestTimingMiddleware:
+    """
+    Record the duration of every request in the request histogram, labelled
+    by the resolved view name (so URL parameters such as case ids do not
+    create new series). For streaming responses this is the time until the
+    response starts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            view=_view_name(request),
+            method=request.method,
+            status=response.status_code,
+        )
+        return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL queries of every request against the view's budget and
+    flag repeated query shapes (N+1); see query_budget.py.
+
+    Only queries run by the request thread are seen: pipeline steps run on
+    their own threads and connections, and a streaming response's queries
+    run after the middleware has returned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        view = _view_name(request)
+        budget = query_budget_for(view)
+        repeated = recorder.repeated_shapes(getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 5))
+        query_stats.record(view, recorder, budget, repeated)
+        REQUEST_QUERIES.observe(recorder.count, view=view)
+
+        problems = []
+        if recorder.count > budget:
+            problems.append(f"{recorder.count} queries (budget {budget}, {recorder.seconds * 1000:.1f} ms)")
+        problems.extend(f"N+1: {count}x {shape[:200]}" for shape, count in repeated)
+        if problems:
+            message = f"{request.method} {request.path} ({view}): " + '; '.join(problems)
+            if getattr(settings, 'SQL_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(f"SQL budget: {message}")
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request when a staff user sends the X-Profile header, or for a
+    random PROFILING_SAMPLE_RATE fraction of requests; see profiling.py.
+
+    Must come after AuthenticationMiddleware (the header is only honoured
+    for staff). The profile id is returned in the X-Profile-Id header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with RequestProfile(
+            interval=getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005),
+            deterministic=getattr(settings, 'PROFILING_DETERMINISTIC', True),
+        ) as profile:
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            profile_id = get_profile_store().save(profile, {
+                'view': _view_name(request),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 1),
+                'trigger': trigger,
+                'user': request.user.get_username() if request.user.is_authenticated else None,
+            })
+        except OSError as e:
+            logger.warning(f"Could not save the profile of {request.method} {request.path}: {e}")
+        else:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+    def _trigger(self, request):
+        """'header', 'sampled' or None (not profiled)."""
+        if request.META.get('HTTP_X_PROFILE') and request.user.is_staff:
+            return 'header'
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        if rate and random.random() < rate:
+            return 'sampled'
+        return None
@@ -0,0 +1,115 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diagnoses", "0008_case_diagnosis_comments_case_diagnosis_comments_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("QUEUED", "Queued"),
+                            ("RUNNING", "Running"),
+                            ("SUCCEEDED", "Succeeded"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="QUEUED",
+                        help_text="Current state of the job",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "use_cache",
+                    models.BooleanField(
+                        default=True,
+                        help_text="Whether cached LLM answers may be reused",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text="Number of times a worker has started this job",
+                    ),
+                ),
+                (
+                    "max_attempts",
+                    models.PositiveSmallIntegerField(
+                        default=3,
+                        help_text="Attempts allowed before the job is marked failed",
+                    ),
+                ),
+                (
+                    "run_after",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="Earliest time a worker may pick up the job (used for retry backoff)",
+                    ),
+                ),
+                (
+                    "locked_by",
+                    models.CharField(
+                        blank=True,
+                        help_text="Worker currently processing the job",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "locked_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the current worker claimed the job",
+                        null=True,
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(
+                        blank=True,
+                        help_text="Error from the most recent failed attempt",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "case",
+                    models.ForeignKey(
+                        help_text="Case to analyze",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="analysis_jobs",
+                        to="diagnoses.case",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_after"],
+                        name="diagnoses_a_status_dbbea5_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,322 @@
+"""
+Simulated Ollama server for benchmarks
+
+Answers /api/generate and /api/tags like a CPU-bound Ollama without running a
+model. Each generate call costs:
+
+- model load time, unless the model is still resident (keep_alive)
+- prefill time proportional to prompt tokens
+- generation time proportional to min(num_predict, answer tokens)
+
+Speeds scale with the model's parameter count (parsed from the tag, e.g.
+'llama3.2:1b'), and at most num_parallel generations run at once, as on a
+real server. The answer is a canned JSON object matching whichever prompt
+template was sent. time_scale divides every delay to keep benchmarks short.
+
+For load tests, a fixed latency and token rate can replace the model-based
+speeds, canned answers can be supplied per prompt template, and a fraction
+of requests can be made to fail:
+
+- 'error': HTTP 500
+- 'timeout': the server stalls for hang_seconds, then drops the connection
+- 'malformed': HTTP 200 whose response is not valid JSON
+- 'mixed': one of the above at random
+
+`python manage.py run_mock_ollama` runs one as a standalone server.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Tuple
+
+from .ollama_pool import parse_keep_alive
+from .prompt_budget import count_tokens
+
+
+# Parameter counts (billions) for tags without an explicit size
+MODEL_SIZES = {
+    'llama3.2': 3,
+    'llama3.1': 8,
+    'llama3': 8,
+    'mistral': 7,
+    'meditron': 7,
+}
+DEFAULT_MODEL_SIZE = 3
+
+_SIZE_RE = re.compile(r'[:\-](\d+(?:\.\d+)?)b\b', re.IGNORECASE)
+
+FUSED_ANSWER = {
+    'primary_diagnosis': 'Malaria',
+    'diagnosis_explanation': 'Malaria is an infection spread by mosquito bites that causes fever and chills.',
+    'differential_diagnoses': [{'condition': 'Typhoid fever', 'confidence': 0.3}],
+    'confidence_score': 80,
+    'reasoning': 'Fever with chills and headache in an endemic area.',
+    'red_flags': ['confusion', 'inability to drink'],
+    'treatment_plan': {
+        'immediate_actions': ['Do a malaria rapid diagnostic test', 'Give paracetamol for fever'],
+        'short_term_actions': ['Start artemether-lumefantrine if the test is positive'],
+        'follow_up_actions': ['Review in 3 days'],
+    },
+    'medications': [
+        {'name': 'Artemether + lumefantrine', 'dosage': '80/480 mg twice daily',
+         'duration': '3 days', 'instructions': 'Take with food'},
+    ],
+    'follow_up_recommendations': 'Return immediately if symptoms worsen.',
+}
+
+# (answer, tokens a real model typically writes for it) per prompt template
+CANNED_ANSWERS = {
+    'fused': (FUSED_ANSWER, 450),
+    'diagnosis': ({key: FUSED_ANSWER[key] for key in [
+        'primary_diagnosis', 'diagnosis_explanation', 'differential_diagnoses',
+        'confidence_score', 'reasoning', 'red_flags', 'follow_up_recommendations',
+    ]}, 300),
+    'explanation': ({'diagnosis_explanation': FUSED_ANSWER['diagnosis_explanation']}, 120),
+    'triage': ({'urgency_level': 'high', 'reason': 'Fever with chills needs same-day testing.'}, 40),
+}
+
+
+def model_size(model: str) -> float:
+    """Parameter count in billions, from the tag or MODEL_SIZES."""
+    match = _SIZE_RE.search(model)
+    if match:
+        return float(match.group(1))
+    return MODEL_SIZES.get(model.split(':')[0], DEFAULT_MODEL_SIZE)
+
+
+def model_speed(model: str) -> Tuple[float, float, float]:
+    """(prefill tokens/s, generated tokens/s, load seconds) of a model on a CPU box."""
+    size = max(model_size(model), 0.1)
+    return 300.0 / size, 30.0 / size ** 0.8, 0.5 * size
+
+
+FAILURE_MODES = ('error', 'timeout', 'malformed')
+
+
+def classify_prompt(prompt: str) -> str:
+    """Which prompt template a request came from."""
+    if '"urgency_level"' in prompt:
+        return 'triage'
+    if '{"diagnosis_explanation"' in prompt:
+        return 'explanation'
+    if '"treatment_plan": {' in prompt:
+        return 'fused'
+    return 'diagnosis'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/api/tags':
+            self._send_json({'models': [{'name': name} for name in self.server.mock.loaded_models()]})
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/api/generate':
+            self._send_json({'error': 'not found'}, status=404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        mock = self.server.mock
+
+        failure = mock.pick_failure()
+        if failure == 'error':
+            self._send_json({'error': 'injected failure'}, status=500)
+            return
+        if failure == 'timeout':
+            time.sleep(mock.hang_seconds)
+            self.close_connection = True
+            return
+        if failure == 'malformed':
+            payload['_malformed'] = True
+
+        if payload.get('stream', True):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for chunk in mock.generate(payload, stream=True):
+                self.wfile.write(json.dumps(chunk).encode('utf-8') + b'\n')
+                self.wfile.flush()
+            self.close_connection = True
+        else:
+            self._send_json(next(mock.generate(payload, stream=False)))
+
+    def _send_json(self, data: Dict, status: int = 200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockOllamaServer:
+    """
+    In-process simulated Ollama server.
+
+    Usage:
+        server = MockOllamaServer(time_scale=10).start()
+        settings.OLLAMA_API_URL = server.generate_url
+        ...
+        server.stop()
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, time_scale: float = 1.0,
+                 num_parallel: int = 1, max_loaded_models: int = 2, latency: float = None,
+                 tokens_per_second: float = None, failure_rate: float = 0.0, failure_mode: str = 'error',
+                 hang_seconds: float = 30.0, canned: Dict[str, Dict] = None, seed: int = None):
+        """
+        Args:
+            host, port: Address to listen on (port 0 picks a free one)
+            time_scale: Divides every simulated delay
+            num_parallel: Generations that may run at once
+            max_loaded_models: Models resident at once (LRU eviction)
+            latency: Fixed seconds per request instead of load + prefill time
+            tokens_per_second: Generation rate instead of the model-based one
+            failure_rate: Fraction of generate requests that fail (0-1)
+            failure_mode: 'error', 'timeout', 'malformed' or 'mixed'
+            hang_seconds: How long a 'timeout' failure stalls (not scaled)
+            canned: Answers by prompt template ('fused', 'diagnosis',
+                'explanation', 'triage'), replacing the built-in ones
+            seed: Random seed for reproducible failure injection
+        """
+        if failure_mode != 'mixed' and failure_mode not in FAILURE_MODES:
+            raise ValueError(f"Unknown failure mode: {failure_mode}")
+        self.time_scale = max(time_scale, 1e-6)
+        self.max_loaded_models = max(1, max_loaded_models)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.hang_seconds = hang_seconds
+        self.answers = dict(CANNED_ANSWERS)
+        for kind, answer in (canned or {}).items():
+            self.answers[kind] = (answer, self.answers.get(kind, (None, 300))[1])
+        self._random = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(max(1, num_parallel))
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()  # model -> expiry (monotonic), least recently used first
+        self.calls = Counter()
+        self.loads = Counter()
+        self.busy_seconds = Counter()
+        self.failures = Counter()
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def generate_url(self) -> str:
+        return f"{self.base_url}/api/generate"
+
+    def start(self) -> 'MockOllamaServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='mock-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def loaded_models(self):
+        now = time.monotonic()
+        with self._lock:
+            return [model for model, expires in self._loaded.items() if expires < 0 or expires > now]
+
+    def pick_failure(self):
+        """Failure to inject into the next request, or None."""
+        with self._lock:
+            if not self.failure_rate or self._random.random() >= self.failure_rate:
+                return None
+            mode = self.failure_mode
+            if mode == 'mixed':
+                mode = self._random.choice(FAILURE_MODES)
+            self.failures[mode] += 1
+            return mode
+
+    def _ensure_loaded(self, model: str, keep_alive: float) -> bool:
+        """Mark the model resident until its (scaled) keep_alive expires; True if it had to be loaded."""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._loaded.pop(model, None)
+            cold = expires is None or 0 <= expires <= now
+            while len(self._loaded) >= self.max_loaded_models:
+                self._loaded.popitem(last=False)
+            if keep_alive != 0:
+                self._loaded[model] = -1 if keep_alive < 0 else now + keep_alive / self.time_scale
+            if cold:
+                self.loads[model] += 1
+        return cold
+
+    def generate(self, payload: Dict[str, Any], stream: bool = False):
+        """Simulate one generate call; yields Ollama response objects."""
+        model = payload.get('model', 'llama3.2')
+        prompt = payload.get('prompt', '')
+        options = payload.get('options') or {}
+        answer, answer_tokens = self.answers[classify_prompt(prompt)]
+        prompt_tokens = min(count_tokens(prompt), options.get('num_ctx') or 2048)
+        eval_tokens = min(answer_tokens, options.get('num_predict') or answer_tokens)
+        prefill_tps, generate_tps, load_seconds = model_speed(model)
+        if self.tokens_per_second:
+            generate_tps = self.tokens_per_second
+
+        with self._slots:
+            started = time.monotonic()
+            cold = self._ensure_loaded(model, parse_keep_alive(payload.get('keep_alive')))
+            if self.latency is not None:
+                time.sleep(self.latency / self.time_scale)
+            else:
+                if cold:
+                    time.sleep(load_seconds / self.time_scale)
+                time.sleep(prompt_tokens / prefill_tps / self.time_scale)
+
+            text = json.dumps(answer)
+            if payload.get('_malformed'):
+                text = text[:len(text) // 2]  # truncated mid-object
+            generate_seconds = eval_tokens / generate_tps / self.time_scale
+            if stream:
+                pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+                for piece in pieces:
+                    time.sleep(generate_seconds / len(pieces))
+                    yield {'model': model, 'response': piece, 'done': False}
+            else:
+                time.sleep(generate_seconds)
+
+            with self._lock:
+                self.calls[model] += 1
+                self.busy_seconds[model] += time.monotonic() - started
+
+        final = {
+            'model': model,
+            'response': '' if stream else text,
+            'done': True,
+            'prompt_eval_count': prompt_tokens,
+            'eval_count': eval_tokens,
+        }
+        yield final
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'loads': dict(self.loads),
+                'busy_seconds': {model: round(seconds, 2) for model, seconds in self.busy_seconds.items()},
+                'injected_failures': dict(self.failures),
+            }
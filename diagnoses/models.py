@@ -1,6 +1,6 @@
 from django.db import models
 from django.conf import settings
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import post_init, pre_save, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
@@ -243,17 +243,102 @@ class Notification(models.Model):
         return self.read_at is not None
 
 
+class AnalysisJob(models.Model):
+    """
+    Queued multi-agent analysis of a case, processed by the
+    run_analysis_worker management command instead of inside the request.
+    """
+    
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    case = models.ForeignKey(
+        'Case',
+        on_delete=models.CASCADE,
+        related_name='analysis_jobs',
+        help_text='Case to analyze'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='QUEUED',
+        help_text='Current state of the job'
+    )
+    use_cache = models.BooleanField(
+        default=True,
+        help_text='Whether cached LLM answers may be reused'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Number of times a worker has started this job'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        help_text='Attempts allowed before the job is marked failed'
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        help_text='Earliest time a worker may pick up the job (used for retry backoff)'
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Worker currently processing the job'
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the current worker claimed the job'
+    )
+    last_error = models.TextField(
+        blank=True,
+        help_text='Error from the most recent failed attempt'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+    
+    def __str__(self):
+        return f"Analysis job #{self.id} for Case #{self.case_id} ({self.get_status_display()})"
+    
+    @property
+    def is_pending(self):
+        """Queued or running - the case is still waiting for its AI analysis."""
+        return self.status in ['QUEUED', 'RUNNING']
+    
+    @property
+    def duration_seconds(self):
+        """Run time of the last attempt, if it has finished."""
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+
 # Signals: notify doctors when a case becomes DOCTOR_REVIEW
+@receiver(post_init, sender=Case)
+def remember_loaded_status(sender, instance, **kwargs):
+    """Remember the status a case was loaded with, so saving it needs no extra SELECT."""
+    # Read __dict__ directly: touching a deferred status here would query once per row
+    instance._previous_status = instance.__dict__.get('status') if instance.pk else None
+
+
 @receiver(pre_save, sender=Case)
 def capture_previous_status(sender, instance, **kwargs):
     """Store previous status on the instance so post_save can compare."""
-    if instance.pk:
-        try:
-            previous = sender.objects.get(pk=instance.pk)
-            instance._previous_status = previous.status
-        except sender.DoesNotExist:
-            instance._previous_status = None
-    else:
+    if instance.pk and 'status' in instance.get_deferred_fields():
+        # Loaded without its status (.only()/.defer()): look it up
+        instance._previous_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    elif not instance.pk:
         instance._previous_status = None
 
 
@@ -294,3 +379,9 @@ def notify_doctors_on_review_status(sender, instance, created, **kwargs):
     except Exception as e:
         # Non-fatal: log and continue
         print(f"Error creating review notifications: {e}")
+
+
+@receiver(post_save, sender=Case)
+def remember_saved_status(sender, instance, **kwargs):
+    """The saved status is the previous one for the next save of this instance."""
+    instance._previous_status = instance.__dict__.get('status')
@@ -0,0 +1,232 @@
+"""
+Load balancing across several Ollama instances
+
+One Ollama process saturates long before the machine's CPU cores do, so
+OLLAMA_ENDPOINTS may list several instances (different ports or NUMA nodes).
+Every generate call borrows an endpoint from the pool:
+
+- Endpoints whose circuit breaker is open are skipped; each endpoint has its
+  own breaker and /api/tags health probe.
+- Among the rest, the one with the fewest outstanding requests wins.
+- Sticky by model: an endpoint that served the model within its keep_alive
+  (so the weights are probably still loaded) is preferred, unless it has more
+  than LLM_ENDPOINT_STICKY_SLACK requests more than the least-loaded one.
+  Ties go to the model's "home" endpoint (rendezvous hash of model and URL),
+  so each model settles on the same instance instead of being loaded on all.
+
+With a single endpoint (the default, OLLAMA_API_URL) this behaves exactly
+like one circuit breaker in front of one server.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from .circuit_breaker import CircuitBreaker, HealthProbe, ollama_tags_url
+
+
+# Ollama unloads a model this long after its last request unless told otherwise
+DEFAULT_KEEP_ALIVE = 300.0
+
+_DURATION_RE = re.compile(r'^(-?\d+(?:\.\d+)?)([smh]?)$')
+
+
+def parse_keep_alive(value) -> float:
+    """Seconds a model stays loaded for an Ollama keep_alive value; negative means forever."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION_RE.match(str(value).strip())
+    if not match:
+        return DEFAULT_KEEP_ALIVE
+    amount, unit = float(match.group(1)), match.group(2)
+    return amount * {'': 1, 's': 1, 'm': 60, 'h': 3600}[unit]
+
+
+class OllamaEndpoint:
+    """One Ollama instance: its breaker, load and the models it has warm (pool lock held)."""
+
+    def __init__(self, url: str, breaker: CircuitBreaker):
+        self.url = url
+        self.name = urlsplit(url).netloc or url
+        self.breaker = breaker
+        self.outstanding = 0
+        self.warm_until = {}  # model -> monotonic expiry (-1 = forever)
+        self.requests = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+
+    def is_warm(self, model: str, now: float) -> bool:
+        expires = self.warm_until.get(model)
+        return expires is not None and (expires < 0 or expires > now)
+
+    def affinity(self, model: str) -> int:
+        """Rendezvous hash score; the highest-scoring endpoint is the model's home."""
+        digest = hashlib.md5(f'{model}|{self.url}'.encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big')
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        breaker = self.breaker.snapshot()
+        return {
+            'url': self.url,
+            'state': breaker['state'],
+            'available': breaker['available'],
+            'retry_in_seconds': breaker['retry_in_seconds'],
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'avg_seconds': round(self.total_seconds / self.requests, 3) if self.requests else 0.0,
+            'warm_models': sorted(model for model in self.warm_until if self.is_warm(model, now)),
+            'last_failure': breaker['last_failure'],
+        }
+
+
+class OllamaPool:
+    """Least-outstanding-requests balancer with model stickiness over Ollama endpoints."""
+
+    def __init__(self, urls: List[str], failure_threshold: int = 3, recovery_timeout: float = 30.0,
+                 sticky_slack: int = 1):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one endpoint URL")
+        self.sticky_slack = sticky_slack
+        self._lock = threading.Lock()
+        self._probes = []
+        self.endpoints = []
+        for url in urls:
+            name = 'ollama' if len(urls) == 1 else f'ollama@{urlsplit(url).netloc or url}'
+            breaker = CircuitBreaker(name, failure_threshold=failure_threshold, recovery_timeout=recovery_timeout)
+            self.endpoints.append(OllamaEndpoint(url, breaker))
+
+    def start_health_probes(self, interval: float):
+        """Probe every endpoint's /api/tags in the background (0 disables)."""
+        if not interval:
+            return
+        for endpoint in self.endpoints:
+            probe = HealthProbe(endpoint.breaker, ollama_tags_url(endpoint.url), interval)
+            probe.start()
+            self._probes.append(probe)
+
+    def stop_health_probes(self):
+        for probe in self._probes:
+            probe.stop()
+        self._probes = []
+
+    def available(self) -> bool:
+        """Whether any endpoint would accept a request now."""
+        return any(endpoint.breaker.is_available() for endpoint in self.endpoints)
+
+    def acquire(self, model: str, exclude: List[OllamaEndpoint] = None) -> Optional[OllamaEndpoint]:
+        """
+        Pick an endpoint for a generate call and count it as outstanding.
+
+        Args:
+            model: Model the call will use
+            exclude: Endpoints already tried for this call
+
+        Returns:
+            The endpoint (pass it to release() afterwards), or None when every
+            remaining endpoint's circuit is open
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [
+                endpoint for endpoint in self.endpoints
+                if endpoint not in (exclude or []) and endpoint.breaker.is_available()
+            ]
+            while candidates:
+                least = min(endpoint.outstanding for endpoint in candidates)
+                warm = [
+                    endpoint for endpoint in candidates
+                    if endpoint.is_warm(model, now) and endpoint.outstanding <= least + self.sticky_slack
+                ]
+                chosen = min(
+                    warm or candidates,
+                    key=lambda endpoint: (endpoint.outstanding, -endpoint.affinity(model))
+                )
+                # allow_request claims the half-open trial slot, so it can still say no
+                if chosen.breaker.allow_request():
+                    chosen.outstanding += 1
+                    if not chosen.is_warm(model, now):
+                        # The model is being loaded there; later calls should follow it
+                        chosen.warm_until[model] = now + DEFAULT_KEEP_ALIVE
+                    return chosen
+                candidates.remove(chosen)
+        return None
+
+    def release(self, endpoint: OllamaEndpoint, model: str, seconds: float, ok: bool, keep_alive=None):
+        """
+        Return an endpoint after a call and record its outcome.
+
+        The breaker itself is updated by the caller (record_success/record_failure),
+        which knows why a call failed.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            endpoint.total_seconds += seconds
+            if ok:
+                keep_seconds = parse_keep_alive(keep_alive)
+                if keep_seconds == 0:
+                    endpoint.warm_until.pop(model, None)
+                else:
+                    endpoint.warm_until[model] = -1 if keep_seconds < 0 else time.monotonic() + keep_seconds
+            else:
+                endpoint.failures += 1
+                endpoint.warm_until.pop(model, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Overall availability (as the single-breaker snapshot had it) plus per-endpoint state."""
+        now = time.monotonic()
+        with self._lock:
+            endpoints = [endpoint.snapshot(now) for endpoint in self.endpoints]
+        retry_times = [e['retry_in_seconds'] for e in endpoints if e['retry_in_seconds'] is not None]
+        available = any(e['available'] for e in endpoints)
+        return {
+            'available': available,
+            'available_endpoints': sum(1 for e in endpoints if e['available']),
+            'retry_in_seconds': None if available or not retry_times else min(retry_times),
+            'endpoints': endpoints,
+        }
+
+
+# Lazy process-wide pool (and its health probes)
+_ollama_pool = None
+_ollama_pool_lock = threading.Lock()
+
+
+def ollama_endpoint_urls() -> List[str]:
+    """Configured generate URLs: OLLAMA_ENDPOINTS, or just OLLAMA_API_URL."""
+    urls = list(getattr(settings, 'OLLAMA_ENDPOINTS', None) or [])
+    return urls or [getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434/api/generate')]
+
+
+def get_ollama_pool() -> OllamaPool:
+    """Get or create the shared Ollama endpoint pool, starting its health probes."""
+    global _ollama_pool
+    if _ollama_pool is None:
+        with _ollama_pool_lock:
+            if _ollama_pool is None:
+                pool = OllamaPool(
+                    ollama_endpoint_urls(),
+                    failure_threshold=getattr(settings, 'LLM_BREAKER_FAILURE_THRESHOLD', 3),
+                    recovery_timeout=getattr(settings, 'LLM_BREAKER_RECOVERY_TIMEOUT', 30),
+                    sticky_slack=getattr(settings, 'LLM_ENDPOINT_STICKY_SLACK', 1),
+                )
+                pool.start_health_probes(getattr(settings, 'LLM_HEALTH_PROBE_INTERVAL', 15))
+                _ollama_pool = pool
+    return _ollama_pool
+
+
+def reset_ollama_pool():
+    """Drop the shared pool so the next call rebuilds it from current settings (benchmarks)."""
+    global _ollama_pool
+    with _ollama_pool_lock:
+        if _ollama_pool is not None:
+            _ollama_pool.stop_health_probes()
+        _ollama_pool = None
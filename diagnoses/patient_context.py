@@ -0,0 +1,162 @@
+"""
+Per-case patient features shared by the rule engine, the agents and the prompt builder
+
+Several steps of one case look at the same patient data: the condition rules
+check risk factors against the medical history, the Diagnosis Agent
+summarizes history, allergies and vitals, and the prompt builder formats age,
+gender, history and vitals into the prompt. PatientContext is built once per
+case and does that work once: the history and allergies are tokenized with
+the keyword engine's tokenizer, risk factors are resolved to a set, and the
+vital signs (a VitalSigns) are formatted.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from .keyword_engine import tokenize, normalize_keyword
+from .rule_tables import freeze
+from .vital_signs import VitalSigns
+
+
+# Risk factors the condition rules can check in a patient's history, with
+# the history keywords that indicate them (other rule risk factors never match).
+# Keywords match whole words of the history and allergies only, so
+# "chronically ill" does not indicate 'chronic disease'.
+RISK_FACTOR_KEYWORDS = freeze({
+    'diabetes': ['diabetes', 'diabetic'],
+    'hypertension': ['hypertension', 'high blood pressure'],
+    'smoking': ['smoking', 'smoker', 'tobacco'],
+    'family history': ['family history', 'hereditary'],
+    'immunocompromised': ['immunocompromised', 'immune deficiency'],
+    'chronic disease': ['chronic', 'long-term condition'],
+})
+_RISK_FACTOR_PHRASES = {
+    risk_factor: tuple(f' {normalize_keyword(keyword)} ' for keyword in keywords)
+    for risk_factor, keywords in RISK_FACTOR_KEYWORDS.items()
+}
+
+# Age above which the 'age > 65' risk factor applies
+ELDERLY_AGE = 65
+
+
+class PatientContext:
+    """
+    Immutable patient features for one case.
+
+    Use PatientContext.for_patient() in the pipeline, or coerce() where a
+    legacy patient_history dict may still be passed in.
+    """
+
+    __slots__ = (
+        'age', 'gender', 'medical_history', 'allergies', 'vital_signs', 'reference_chunks', 'patient_id',
+        'terms', 'allergy_terms', 'risk_factors', 'vital_signs_text',
+    )
+
+    def __init__(
+        self,
+        medical_history: str = '',
+        allergies: str = '',
+        age: Any = None,
+        gender: Optional[str] = None,
+        vital_signs: Any = None,
+        reference_chunks: Iterable[Dict] = (),
+        patient_id: Any = None,
+    ):
+        """
+        Args:
+            medical_history: Free-text medical history
+            allergies: Free-text allergies
+            age: Age in years (None or a placeholder string when unknown)
+            gender: Display gender
+            vital_signs: VitalSigns (or a dict of readings)
+            reference_chunks: Retriever Agent references for the prompt's evidence budget
+            patient_id: Patient primary key, reported back in the diagnosis
+        """
+        self.medical_history = medical_history or ''
+        self.allergies = allergies or ''
+        self.age = age
+        self.gender = gender
+        self.vital_signs = VitalSigns.coerce(vital_signs)
+        self.reference_chunks = tuple(reference_chunks or ())
+        self.patient_id = patient_id
+
+        history_tokens = tokenize(self.medical_history)
+        self.allergy_terms = frozenset(tokenize(self.allergies))
+        self.terms = frozenset(history_tokens) | self.allergy_terms
+
+        # Risk factors are phrase matches on the tokenized history and allergies
+        token_text = f" {' '.join(history_tokens + tuple(tokenize(self.allergies)))} "
+        risk_factors = {
+            risk_factor for risk_factor, phrases in _RISK_FACTOR_PHRASES.items()
+            if any(phrase in token_text for phrase in phrases)
+        }
+        if isinstance(age, (int, float)) and age > ELDERLY_AGE:
+            risk_factors.add(f'age > {ELDERLY_AGE}')
+        self.risk_factors = frozenset(risk_factors)
+
+        self.vital_signs_text = self.vital_signs.describe()
+
+    @classmethod
+    def for_patient(cls, patient, vital_signs: VitalSigns = None, reference_chunks: Iterable[Dict] = ()) -> 'PatientContext':
+        """Build the context of a case from its Patient and vital signs."""
+        return cls(
+            medical_history=patient.medical_history,
+            allergies=patient.allergies,
+            age=patient.get_age(),
+            gender=patient.get_gender_display(),
+            vital_signs=vital_signs,
+            reference_chunks=reference_chunks,
+            patient_id=patient.pk,
+        )
+
+    @classmethod
+    def from_history(cls, patient_history: Dict) -> 'PatientContext':
+        """Build a context from a patient_history dict (medical_history, allergies, age, ...)."""
+        return cls(
+            medical_history=patient_history.get('medical_history', ''),
+            allergies=patient_history.get('allergies', ''),
+            age=patient_history.get('age'),
+            gender=patient_history.get('gender'),
+            vital_signs=patient_history.get('vital_signs'),
+            reference_chunks=patient_history.get('reference_chunks', ()),
+            patient_id=patient_history.get('patient_id'),
+        )
+
+    @classmethod
+    def coerce(cls, patient: Any) -> 'PatientContext':
+        """Return a PatientContext as-is; build one from a patient_history dict (or None)."""
+        if isinstance(patient, cls):
+            return patient
+        return cls.from_history(patient or {})
+
+    def with_references(self, reference_chunks: Iterable[Dict]) -> 'PatientContext':
+        """Same patient, with the given Retriever Agent references."""
+        return PatientContext(
+            self.medical_history, self.allergies, self.age, self.gender, self.vital_signs,
+            reference_chunks, self.patient_id,
+        )
+
+    def has_risk_factor(self, risk_factor: str) -> bool:
+        """Whether a condition rule's risk factor is present."""
+        return risk_factor in self.risk_factors
+
+    def history_summary(self) -> str:
+        """Medical history and allergies, as given to the LLM."""
+        parts = [self.medical_history] if self.medical_history else []
+        if self.allergies:
+            parts.append(f"Allergies: {self.allergies}")
+        return '; '.join(parts)
+
+    def describe(self) -> str:
+        """Multi-line patient summary (demographics if known, history, allergies, vitals)."""
+        lines: List[str] = []
+        if self.age is not None or self.gender is not None:
+            age = self.age if self.age is not None else 'unknown'
+            gender = self.gender if self.gender is not None else 'unknown'
+            lines.append(f"Patient: {age} year old {gender}")
+        if self.medical_history:
+            lines.append(f"Medical History: {self.medical_history}")
+        if self.allergies:
+            lines.append(f"Allergies: {self.allergies}")
+        if self.vital_signs_text:
+            lines.append(f"Vital Signs: {self.vital_signs_text}")
+        return "\n".join(lines) if lines else "No additional patient context available"
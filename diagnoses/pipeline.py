@@ -0,0 +1,173 @@
+"""
+Dependency-graph executor for the multi-agent pipeline
+
+analyze_case declares its agent steps (coordinator routing, protocol search,
+cardiac protocol lookup, diagnosis, treatment plan, medications, ...) with the
+steps each one needs. Steps whose requirements are met run concurrently on a
+shared thread pool, so a case takes as long as its critical path rather than
+the sum of its steps.
+
+Each step runs in a copy of the caller's contextvars context (so
+llm_priority() set around the pipeline still applies to LLM calls made inside
+it) and closes its thread's database connection when it finishes.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Callable, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+
+class PipelineStep:
+    """One node of the pipeline: a callable taking the results of the steps it requires."""
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], requires: Iterable[str] = (),
+                 when: Callable[[Dict[str, Any]], bool] = None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.when = when
+
+
+class AgentPipeline:
+    """
+    Run named steps in dependency order, independent steps in parallel.
+
+    Usage:
+        pipeline = AgentPipeline()
+        pipeline.add('routing', lambda r: route(case))
+        pipeline.add('protocols', lambda r: search(symptoms))
+        pipeline.add('diagnosis', lambda r: diagnose(r['protocols']), requires=['protocols'])
+        results, timings = pipeline.run()
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor = None):
+        self.executor = executor
+        self.steps = {}
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], requires: Iterable[str] = (),
+            when: Callable[[Dict[str, Any]], bool] = None) -> 'AgentPipeline':
+        """
+        Declare a step.
+
+        Args:
+            name: Step name; its return value is stored in results[name]
+            func: Called with the results dict once every required step is done
+            requires: Names of steps that must finish first
+            when: Optional predicate on the results of the required steps; when
+                it returns False the step is skipped and results[name] is None
+
+        Returns:
+            The pipeline, so calls can be chained
+        """
+        if name in self.steps:
+            raise ValueError(f"Duplicate pipeline step '{name}'")
+        self.steps[name] = PipelineStep(name, func, requires, when)
+        return self
+
+    def _check_graph(self):
+        """Reject unknown requirements and cycles before anything runs."""
+        for step in self.steps.values():
+            unknown = [r for r in step.requires if r not in self.steps]
+            if unknown:
+                raise ValueError(f"Step '{step.name}' requires unknown step(s): {', '.join(unknown)}")
+        remaining = {name: set(step.requires) for name, step in self.steps.items()}
+        while remaining:
+            ready = [name for name, requires in remaining.items() if not requires]
+            if not ready:
+                raise ValueError(f"Pipeline steps form a cycle: {', '.join(sorted(remaining))}")
+            for name in ready:
+                del remaining[name]
+            for requires in remaining.values():
+                requires.difference_update(ready)
+
+    def run(self) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Execute every step.
+
+        The first step that raises cancels the steps not yet started, and the
+        exception is re-raised here once the running ones have finished.
+
+        Returns:
+            (results by step name, timings in milliseconds by step name plus
+            'total' for the wall time of the whole pipeline)
+        """
+        self._check_graph()
+        executor = self.executor or get_pipeline_executor()
+        results = {}
+        timings = {}
+        done = set()
+        running = {}
+        error = None
+        start = time.perf_counter()
+
+        def ready_steps() -> List[PipelineStep]:
+            return [
+                step for name, step in self.steps.items()
+                if name not in done and name not in running.values()
+                and all(r in done for r in step.requires)
+            ]
+
+        while len(done) < len(self.steps):
+            # Skipping a step can make others ready, so schedule until nothing new is ready
+            ready = ready_steps() if error is None else []
+            while ready:
+                for step in ready:
+                    if step.when is not None and not step.when(results):
+                        results[step.name] = None
+                        done.add(step.name)
+                        continue
+                    # Copy the context per step: a Context can only be entered by one thread at a time
+                    context = contextvars.copy_context()
+                    future = executor.submit(context.run, _run_step, step, dict(results))
+                    running[future] = step.name
+                ready = ready_steps()
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name], timings[name] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                done.add(name)
+
+        if error is not None:
+            raise error
+        timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+        return results, timings
+
+
+def _run_step(step: PipelineStep, results: Dict[str, Any]) -> Tuple[Any, float]:
+    """Run one step in a pool thread; returns (value, milliseconds)."""
+    start = time.perf_counter()
+    try:
+        value = step.func(results)
+    finally:
+        # Pool threads outlive the request; don't leave their connections open
+        connections.close_all()
+    return value, round((time.perf_counter() - start) * 1000, 1)
+
+
+# Lazy process-wide thread pool shared by all pipelines
+_pipeline_executor = None
+_pipeline_executor_lock = threading.Lock()
+
+
+def get_pipeline_executor() -> ThreadPoolExecutor:
+    """Get or create the shared pipeline thread pool (AGENT_PIPELINE_WORKERS threads)."""
+    global _pipeline_executor
+    if _pipeline_executor is None:
+        with _pipeline_executor_lock:
+            if _pipeline_executor is None:
+                _pipeline_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'AGENT_PIPELINE_WORKERS', 8),
+                    thread_name_prefix='agent-pipeline',
+                )
+    return _pipeline_executor
@@ -0,0 +1,181 @@
+"""
+On-demand request profiling
+
+ProfilingMiddleware profiles a request when a staff user sends the
+X-Profile header, or for a random PROFILING_SAMPLE_RATE fraction of all
+requests, so slow case submissions can be profiled in production without
+a redeploy. Each profiled request is captured two ways:
+
+- a stack sampler thread reading the request thread's stack every
+  PROFILING_SAMPLE_INTERVAL seconds, written as collapsed stacks
+  ("frame;frame;frame count" lines, the input of flamegraph.pl and
+  speedscope)
+- cProfile (deterministic; PROFILING_DETERMINISTIC = False skips it to
+  keep the overhead down), written as a pstats file
+
+Profiles go to PROFILING_DIR with a JSON summary each; only the newest
+PROFILING_MAX_PROFILES are kept. The staff page at
+/system-admin/profiles/ lists them by endpoint and duration.
+"""
+
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+
+# File suffix per downloadable profile kind
+PROFILE_FILES = {
+    'pstats': '.prof',
+    'collapsed': '.collapsed',
+}
+
+_PROFILE_ID_RE = re.compile(r'^\d{8}-\d{9}-[0-9a-f]{8}$')
+
+
+class StackSampler(threading.Thread):
+    """Daemon thread counting the collapsed stacks of one thread at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, most frequent first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# cProfile can only be active once at a time (one sys.monitoring profiler per
+# interpreter since Python 3.12): concurrent profiles are sampled only
+_deterministic_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Profile the calling thread inside a with block (sampler, plus cProfile if deterministic)."""
+
+    def __init__(self, interval: float, deterministic: bool = True):
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.deterministic = deterministic
+        self.profiler = None
+
+    def __enter__(self) -> 'RequestProfile':
+        self.sampler.start()
+        if self.deterministic and _deterministic_lock.acquire(blocking=False):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _deterministic_lock.release()
+        self.sampler.stop()
+
+
+class ProfileStore:
+    """Directory of captured profiles, rotated to the newest max_profiles."""
+
+    def __init__(self, directory: Path, max_profiles: int):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profile: RequestProfile, summary: Dict[str, Any]) -> str:
+        """
+        Write a profile and its summary, then drop the oldest beyond max_profiles.
+
+        Args:
+            profile: The finished RequestProfile
+            summary: Request details (view, method, path, status, duration_ms, ...)
+
+        Returns:
+            The profile id
+        """
+        # Ids sort by capture time (to the millisecond), which is what rotation relies on
+        now = time.time()
+        captured = time.localtime(now)
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S', captured)}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+        summary = dict(
+            summary,
+            id=profile_id,
+            captured_at=time.strftime('%Y-%m-%d %H:%M:%S', captured),
+            samples=sum(profile.sampler.stacks.values()),
+            files=['collapsed'] + (['pstats'] if profile.profiler is not None else []),
+        )
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f"{profile_id}.collapsed").write_text(profile.sampler.collapsed(), encoding='utf-8')
+            if profile.profiler is not None:
+                profile.profiler.dump_stats(str(self.directory / f"{profile_id}.prof"))
+            # Written last: a profile is listed once its summary exists
+            (self.directory / f"{profile_id}.json").write_text(json.dumps(summary), encoding='utf-8')
+            self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        summaries = sorted(self.directory.glob('*.json'))
+        for stale in summaries[:max(0, len(summaries) - self.max_profiles)]:
+            for suffix in ('.json',) + tuple(PROFILE_FILES.values()):
+                stale.with_suffix(suffix).unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored profiles, newest first."""
+        profiles = []
+        for path in sorted(self.directory.glob('*.json'), reverse=True):
+            try:
+                profiles.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue  # Rotated away or half-written
+        return profiles
+
+    def path(self, profile_id: str, kind: str) -> Optional[Path]:
+        """File of a stored profile, or None for an unknown id or kind."""
+        if kind not in PROFILE_FILES or not _PROFILE_ID_RE.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}{PROFILE_FILES[kind]}"
+        return path if path.exists() else None
+
+
+# Lazy process-wide profile store
+_profile_store = None
+_profile_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    """Get or create the profile store (PROFILING_DIR, PROFILING_MAX_PROFILES)."""
+    global _profile_store
+    if _profile_store is None:
+        with _profile_store_lock:
+            if _profile_store is None:
+                _profile_store = ProfileStore(
+                    getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'),
+                    getattr(settings, 'PROFILING_MAX_PROFILES', 200),
+                )
+    return _profile_store
@@ -0,0 +1,229 @@
+"""
+Token-budgeted evidence selection for LLM prompts
+
+Prompt prefill dominates latency on CPU, so rather than pasting the first
+300 characters of every retrieved chunk into the prompt, the diagnosis prompt
+is built against a token budget:
+
+1. Retrieved chunks are split into sentences.
+2. Every sentence is scored against the query (the symptoms) by cosine
+   similarity of normalized embeddings, computed in one matrix product.
+3. Sentences are packed greedily by value per token until the evidence
+   budget is spent, then re-assembled per chunk in document order.
+
+The evidence budget is the smaller of LLM_EVIDENCE_TOKEN_BUDGET and whatever
+is left of the model's context window (LLM_CONTEXT_TOKENS) after the rest of
+the prompt and LLM_RESERVED_OUTPUT_TOKENS for the answer. Raising the budget
+buys evidence coverage at the cost of prefill time.
+"""
+
+import logging
+import re
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r'(?<=[.!?;])\s+|\n\s*\n|\n(?=\s*(?:[-•*]|\d+[.)])\s)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Sentences shorter than this carry little evidence (headers, page numbers)
+MIN_SENTENCE_CHARS = 25
+
+# Warn only once if the embedding model cannot be used
+_embedding_warning_logged = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in text.
+
+    Word pieces and punctuation each count as one token, plus one extra for
+    every 6 characters of long words, which subword tokenizers split. Close
+    enough to llama-family tokenizers for budgeting; Ollama's own
+    prompt_eval_count is logged after each call for comparison.
+    """
+    tokens = 0
+    for piece in _TOKEN_RE.findall(text):
+        tokens += 1 + (len(piece) - 1) // 6
+    return tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a chunk into sentences/bullet items, dropping fragments."""
+    sentences = []
+    for part in _SENTENCE_RE.split(text):
+        sentence = _WHITESPACE_RE.sub(' ', part).strip()
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            sentences.append(sentence)
+    return sentences
+
+
+def score_sentences(query: str, sentences: List[str]) -> np.ndarray:
+    """
+    Cosine similarity of each sentence to the query.
+
+    Uses the knowledge base embedding model (normalized vectors, so a single
+    matrix-vector product gives all similarities). Falls back to word overlap
+    if the model cannot be loaded.
+    """
+    if not sentences:
+        return np.zeros(0)
+
+    try:
+        from knowledge.rag_utils import get_embedding_model
+
+        model = get_embedding_model()
+        vectors = np.asarray(model.embed_documents([query] + sentences), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+        return vectors[1:] @ vectors[0]
+    except Exception as e:
+        global _embedding_warning_logged
+        if not _embedding_warning_logged:
+            _embedding_warning_logged = True
+            logger.warning(f"Embedding model unavailable, scoring evidence by word overlap: {e}")
+
+    query_words = set(w.lower() for w in _TOKEN_RE.findall(query) if len(w) > 2)
+    scores = np.zeros(len(sentences))
+    if query_words:
+        for i, sentence in enumerate(sentences):
+            words = set(w.lower() for w in _TOKEN_RE.findall(sentence))
+            scores[i] = len(query_words & words) / len(query_words)
+    return scores
+
+
+def select_evidence(query: str, chunks: List[Dict], budget_tokens: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Pick the most query-relevant sentences from retrieved chunks within a token budget.
+
+    Args:
+        query: Text the evidence should support (the patient's symptoms)
+        chunks: Retrieved chunks with 'content' and optional 'source'
+        budget_tokens: Maximum tokens of evidence text
+
+    Returns:
+        Tuple of (evidence text with one "- [source] ..." line per chunk, stats)
+    """
+    min_similarity = getattr(settings, 'LLM_EVIDENCE_MIN_SIMILARITY', 0.2)
+
+    # Deduplicate chunks (the retriever and the engine often fetch the same ones)
+    unique_chunks = []
+    seen = set()
+    for chunk in chunks:
+        content = (chunk.get('content') or '').strip()
+        if content and content not in seen:
+            seen.add(content)
+            unique_chunks.append(chunk)
+
+    # Split into sentences, keeping the first occurrence of repeated ones
+    sentences = []
+    owners = []
+    seen_sentences = set()
+    for chunk_index, chunk in enumerate(unique_chunks):
+        for sentence in split_sentences(chunk['content']):
+            key = sentence.lower()
+            if key not in seen_sentences:
+                seen_sentences.add(key)
+                sentences.append(sentence)
+                owners.append(chunk_index)
+
+    stats = {
+        'chunks': len(unique_chunks),
+        'candidate_sentences': len(sentences),
+        'selected_sentences': 0,
+        'evidence_tokens': 0,
+        'budget_tokens': budget_tokens,
+    }
+    if not sentences or budget_tokens <= 0:
+        return '', stats
+
+    similarities = score_sentences(query, sentences)
+    token_counts = np.array([count_tokens(sentence) + 1 for sentence in sentences])
+
+    # Value per token: similarity above the floor, with a small bonus for
+    # chunks the retriever ranked higher
+    rank_prior = 1.0 - 0.05 * np.asarray(owners, dtype=np.float32)
+    value = np.clip(similarities - min_similarity, 0.0, None) * rank_prior
+    density = value / token_counts
+
+    # Each chunk that contributes a sentence also costs its "- [source]" prefix
+    prefixes = [
+        f"- [{chunk['source']}] " if chunk.get('source') else '- '
+        for chunk in unique_chunks
+    ]
+    prefix_tokens = [count_tokens(prefix) for prefix in prefixes]
+
+    selected = []
+    opened = set()
+    remaining = budget_tokens
+    for i in np.argsort(-density, kind='stable'):
+        if value[i] <= 0:
+            break
+        cost = token_counts[i] + (0 if owners[i] in opened else prefix_tokens[owners[i]])
+        if cost <= remaining:
+            selected.append(i)
+            opened.add(owners[i])
+            remaining -= cost
+
+    # Re-assemble in chunk and document order so the evidence reads naturally
+    by_chunk = {}
+    for i in sorted(selected):
+        by_chunk.setdefault(owners[i], []).append(sentences[i])
+
+    evidence = '\n'.join(
+        prefixes[chunk_index] + ' '.join(by_chunk[chunk_index])
+        for chunk_index in sorted(by_chunk)
+    )
+
+    stats['selected_sentences'] = len(selected)
+    stats['evidence_tokens'] = count_tokens(evidence)
+    return evidence, stats
+
+
+def evidence_budget(fixed_prompt: str, context_tokens: int = None, reserved_tokens: int = None) -> int:
+    """Tokens available for evidence once the rest of the prompt and the answer are accounted for."""
+    if context_tokens is None:
+        context_tokens = getattr(settings, 'LLM_CONTEXT_TOKENS', 4096)
+    reserved = reserved_tokens
+    if reserved is None:
+        reserved = getattr(settings, 'LLM_RESERVED_OUTPUT_TOKENS', 700)
+    cap = getattr(settings, 'LLM_EVIDENCE_TOKEN_BUDGET', 600)
+    return max(0, min(cap, context_tokens - reserved - count_tokens(fixed_prompt)))
+
+
+def build_budgeted_prompt(template: str, fields: Dict[str, Any], query: str, chunks: List[Dict],
+                          context_field: str = 'retrieved_context', context_tokens: int = None,
+                          reserved_tokens: int = None) -> str:
+    """
+    Format a prompt template, filling context_field with budgeted evidence.
+
+    Args:
+        template: str.format template
+        fields: Values for every placeholder except context_field
+        query: Text the evidence is scored against
+        chunks: Retrieved knowledge chunks
+        context_field: Placeholder that receives the evidence
+        context_tokens: Model context window (defaults to LLM_CONTEXT_TOKENS)
+        reserved_tokens: Tokens kept free for the answer
+            (defaults to LLM_RESERVED_OUTPUT_TOKENS)
+
+    Returns:
+        str: The formatted prompt
+    """
+    fixed_prompt = template.format(**fields, **{context_field: ''})
+    budget = evidence_budget(fixed_prompt, context_tokens, reserved_tokens)
+    evidence, stats = select_evidence(query, chunks, budget)
+    prompt = template.format(**fields, **{context_field: evidence})
+
+    logger.info(
+        f"Prompt size: ~{count_tokens(prompt)} tokens "
+        f"({stats['evidence_tokens']}/{budget} evidence tokens, "
+        f"{stats['selected_sentences']}/{stats['candidate_sentences']} sentences "
+        f"from {stats['chunks']} chunks)"
+    )
+    return prompt
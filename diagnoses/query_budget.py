@@ -0,0 +1,123 @@
+"""
+Per-request SQL query accounting
+
+QueryBudgetMiddleware records every query a request runs (through
+connection.execute_wrapper), so views that quietly issue dozens of queries
+show up: the count and time per request, query shapes repeated within one
+request (the N+1 pattern: the same SELECT once per row of a list), and
+requests over their budget.
+
+Budgets are per view name (SQL_QUERY_BUDGETS, falling back to
+SQL_QUERY_BUDGET). Overruns and N+1 shapes are logged, or raised as
+QueryBudgetExceeded with SQL_BUDGET_RAISE = True (meant for development).
+Per-view totals are kept in process for the sql_budget_report command.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (with SQL_BUDGET_RAISE) when a request overruns its query budget or repeats a query shape."""
+
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def query_shape(sql: str) -> str:
+    """
+    SQL with the variable parts collapsed, so the queries of one N+1 loop
+    share a shape: parameters are already %s placeholders, IN lists of any
+    length become IN (%s...), and inlined numbers (LIMIT 21) become N.
+    """
+    shape = _IN_LIST_RE.sub('(%s...)', sql)
+    shape = _NUMBER_RE.sub('N', shape)
+    return _WHITESPACE_RE.sub(' ', shape).strip()
+
+
+class QueryRecorder:
+    """connection.execute_wrapper callable collecting (sql, seconds) for one request."""
+
+    def __init__(self):
+        self.queries: List[Tuple[str, float]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds in self.queries)
+
+    def repeated_shapes(self, threshold: int) -> List[Tuple[str, int]]:
+        """(shape, times run) for shapes run at least threshold times, most repeated first."""
+        counts = Counter(query_shape(sql) for sql, _ in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+
+def query_budget_for(view: str) -> int:
+    """Query budget of a view name (SQL_QUERY_BUDGETS, else SQL_QUERY_BUDGET)."""
+    budgets = getattr(settings, 'SQL_QUERY_BUDGETS', {})
+    if view in budgets:
+        return budgets[view]
+    # Views are also reachable without their namespace (e.g. patients.urls included twice)
+    short_name = view.rsplit(':', 1)[-1]
+    return budgets.get(short_name, getattr(settings, 'SQL_QUERY_BUDGET', 30))
+
+
+class QueryStats:
+    """Thread-safe per-view query totals since process start (or the last reset())."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, view: str, recorder: QueryRecorder, budget: int, repeated: List[Tuple[str, int]]):
+        with self._lock:
+            entry = self._views.get(view)
+            if entry is None:
+                entry = self._views[view] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'seconds': 0.0,
+                    'over_budget': 0, 'budget': budget, 'repeated_shapes': {},
+                }
+            entry['requests'] += 1
+            entry['queries'] += recorder.count
+            entry['max_queries'] = max(entry['max_queries'], recorder.count)
+            entry['seconds'] += recorder.seconds
+            entry['over_budget'] += recorder.count > budget
+            for shape, count in repeated:
+                entry['repeated_shapes'][shape] = max(entry['repeated_shapes'].get(shape, 0), count)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One dict per view, worst first (most queries per request, then most time)."""
+        with self._lock:
+            views = [
+                dict(entry, view=view, repeated_shapes=dict(entry['repeated_shapes']))
+                for view, entry in self._views.items()
+            ]
+        for entry in views:
+            entry['avg_queries'] = entry['queries'] / entry['requests']
+            entry['avg_ms'] = entry['seconds'] * 1000 / entry['requests']
+        return sorted(views, key=lambda entry: (entry['max_queries'], entry['avg_ms']), reverse=True)
+
+
+# Process-wide totals (read by sql_budget_report)
+query_stats = QueryStats()
@@ -0,0 +1,225 @@
+"""
+Immutable, precompiled rule tables for the diagnostic engine and agents
+
+The rule dictionaries are written as plain dicts and lists for readability.
+They are frozen once per process, so agents shared across threads (see
+services.registry) cannot modify them by accident. The condition rules are
+also compiled into tuples that already hold the split keyword words (in the
+keyword engine's normalized form), the display name and the weights, so
+matching a case does not rebuild them.
+
+For scoring, the compiled rules are further packed into a ConditionRuleMatrix:
+sparse condition x symptom-phrase and phrase x word incidence matrices (kept
+as coordinate index arrays), so one case is scored against every condition
+with a handful of NumPy operations instead of a Python loop per condition.
+"""
+
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+
+from .keyword_engine import normalize_keyword
+
+
+def freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only mappings and lists/sets into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class CompiledConditionRule(NamedTuple):
+    """One condition of MedicalAIDiagnosticEngine.condition_rules, ready for matching."""
+    key: str
+    condition: str  # Display name, e.g. 'Acute Coronary Syndrome'
+    required_words: Tuple[Tuple[str, ...], ...]  # Normalized words of each required symptom
+    supporting_words: Tuple[Tuple[str, ...], ...]
+    risk_factors: Tuple[str, ...]
+    urgency: str
+    confidence_boost: float
+
+
+class CompiledSymptomPattern(NamedTuple):
+    """One category of MedicalAIDiagnosticEngine.symptom_patterns."""
+    category: str
+    keywords: Tuple[str, ...]
+    severity_indicators: Tuple[str, ...]
+    weight: float
+
+
+def _phrase_words(phrases) -> Tuple[Tuple[str, ...], ...]:
+    """Normalized words of each symptom phrase (a rule matches on any one of them)."""
+    return tuple(tuple(normalize_keyword(word) for word in phrase.split()) for phrase in phrases)
+
+
+def compile_condition_rules(condition_rules: Dict[str, Dict]) -> Tuple[CompiledConditionRule, ...]:
+    """Precompute what _match_condition_rules needs for every condition."""
+    return tuple(
+        CompiledConditionRule(
+            key=key,
+            condition=key.replace('_', ' ').title(),
+            required_words=_phrase_words(rules['required_symptoms']),
+            supporting_words=_phrase_words(rules['supporting_symptoms']),
+            risk_factors=tuple(rules['risk_factors']),
+            urgency=rules['urgency'],
+            confidence_boost=rules['confidence_boost'],
+        )
+        for key, rules in condition_rules.items()
+    )
+
+
+def compile_symptom_patterns(symptom_patterns: Dict[str, Dict]) -> Tuple[CompiledSymptomPattern, ...]:
+    """Flatten the symptom pattern dicts for _calculate_symptom_severity."""
+    return tuple(
+        CompiledSymptomPattern(
+            category=category,
+            keywords=tuple(data['keywords']),
+            severity_indicators=tuple(data['severity_indicators']),
+            weight=data['weight'],
+        )
+        for category, data in symptom_patterns.items()
+    )
+
+
+class ConditionScores(NamedTuple):
+    """Per-condition scoring of one case, aligned with ConditionRuleMatrix.rules."""
+    required_count: np.ndarray
+    supporting_count: np.ndarray
+    risk_factor_count: np.ndarray
+    confidence: np.ndarray
+
+
+class ConditionRuleMatrix:
+    """
+    Condition rules compiled into sparse incidence matrices.
+
+    A symptom phrase is present when any of its words is present, and a
+    condition's required/supporting counts are the number of its phrases
+    present, so scoring is two sparse products:
+
+        phrase_hits = (phrase x word) @ words > 0
+        required    = (condition x required phrase) @ phrase_hits
+        supporting  = (condition x supporting phrase) @ phrase_hits
+        risk        = (condition x risk factor) @ risk_factors
+
+    Each matrix is stored as (row, column) index arrays and multiplied with
+    np.bincount, which keeps memory proportional to the number of entries as
+    the rule base grows.
+    """
+
+    def __init__(self, rules: Iterable[CompiledConditionRule]):
+        self.rules = tuple(rules)
+        self.word_index = {}  # normalized word -> column
+        self.risk_factors = []  # risk factor -> column, in first-seen order
+        risk_index = {}
+        phrase_index = {}  # tuple of words -> row of the phrase matrix
+        phrase_rows, phrase_cols = [], []
+        required_rows, required_cols = [], []
+        supporting_rows, supporting_cols = [], []
+        risk_rows, risk_cols = [], []
+
+        def phrase_id(words: Tuple[str, ...]) -> int:
+            if words not in phrase_index:
+                phrase_index[words] = len(phrase_index)
+                for word in set(words):
+                    phrase_rows.append(phrase_index[words])
+                    phrase_cols.append(self.word_index.setdefault(word, len(self.word_index)))
+            return phrase_index[words]
+
+        for row, rule in enumerate(self.rules):
+            for words in rule.required_words:
+                required_rows.append(row)
+                required_cols.append(phrase_id(words))
+            for words in rule.supporting_words:
+                supporting_rows.append(row)
+                supporting_cols.append(phrase_id(words))
+            for risk_factor in rule.risk_factors:
+                if risk_factor not in risk_index:
+                    risk_index[risk_factor] = len(self.risk_factors)
+                    self.risk_factors.append(risk_factor)
+                risk_rows.append(row)
+                risk_cols.append(risk_index[risk_factor])
+
+        index = lambda values: np.asarray(values, dtype=np.intp)
+        self._phrase_rows, self._phrase_cols = index(phrase_rows), index(phrase_cols)
+        self._required_rows, self._required_cols = index(required_rows), index(required_cols)
+        self._supporting_rows, self._supporting_cols = index(supporting_rows), index(supporting_cols)
+        self._risk_rows, self._risk_cols = index(risk_rows), index(risk_cols)
+        self.phrase_count = len(phrase_index)
+
+        self._required_total = np.array([len(rule.required_words) for rule in self.rules], dtype=np.float64)
+        self._supporting_total = np.array([len(rule.supporting_words) for rule in self.rules], dtype=np.float64)
+        self._risk_total = np.array([len(rule.risk_factors) for rule in self.rules], dtype=np.float64)
+        self._confidence_boost = np.array([rule.confidence_boost for rule in self.rules], dtype=np.float64)
+
+    def _product(self, rows: np.ndarray, cols: np.ndarray, vector: np.ndarray, size: int) -> np.ndarray:
+        """Sparse 0/1 matrix (given by its entries) times a vector."""
+        return np.bincount(rows, weights=vector[cols], minlength=size)
+
+    def word_vector(self, words: Iterable[str]) -> np.ndarray:
+        """0/1 feature vector of the normalized words present in a case."""
+        vector = np.zeros(len(self.word_index))
+        columns = [self.word_index[word] for word in words if word in self.word_index]
+        vector[columns] = 1.0
+        return vector
+
+    def score(self, words: Iterable[str], has_risk_factor: Callable[[str], bool]) -> ConditionScores:
+        """
+        Score every condition for one case.
+
+        Args:
+            words: Normalized words present in the symptoms (KeywordScan.keywords)
+            has_risk_factor: Called once per distinct risk factor of the
+                conditions with at least one required symptom
+
+        Returns:
+            ConditionScores; confidence is computed exactly as the per-condition
+            loop did (same operations in the same order), and is only
+            meaningful where required_count > 0
+        """
+        conditions = len(self.rules)
+        phrase_hits = self._product(
+            self._phrase_rows, self._phrase_cols, self.word_vector(words), self.phrase_count
+        ) > 0
+        phrase_hits = phrase_hits.astype(np.float64)
+        required = self._product(self._required_rows, self._required_cols, phrase_hits, conditions)
+        supporting = self._product(self._supporting_rows, self._supporting_cols, phrase_hits, conditions)
+
+        # Risk factors are looked up in the patient history, so only check the
+        # ones that can still matter
+        candidates = required > 0
+        risk_vector = np.zeros(len(self.risk_factors))
+        for column in np.unique(self._risk_cols[candidates[self._risk_rows]]):
+            risk_vector[column] = 1.0 if has_risk_factor(self.risk_factors[column]) else 0.0
+        risk = self._product(self._risk_rows, self._risk_cols, risk_vector, conditions)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = 0.4 * (required / self._required_total)
+            confidence += np.where(self._supporting_total > 0, supporting / self._supporting_total, 0.0) * 0.3
+            confidence += np.where(self._risk_total > 0, risk / self._risk_total, 0.0) * 0.2
+        confidence += self._confidence_boost
+        np.minimum(confidence, 1.0, out=confidence)
+        return ConditionScores(required, supporting, risk, confidence)
+
+    def matches(self, words: Iterable[str], has_risk_factor: Callable[[str], bool],
+                threshold: float) -> List[Dict]:
+        """
+        Conditions with at least one required symptom and confidence >= threshold,
+        in the format of MedicalAIDiagnosticEngine._match_condition_rules.
+        """
+        scores = self.score(words, has_risk_factor)
+        rows = np.flatnonzero((scores.required_count > 0) & (scores.confidence >= threshold))
+        matched = [
+            {
+                'condition': self.rules[row].condition,
+                'confidence': float(scores.confidence[row]),
+                'urgency': self.rules[row].urgency,
+                'supporting_symptoms': int(scores.supporting_count[row]),
+                'risk_factors': int(scores.risk_factor_count[row]),
+            }
+            for row in rows
+        ]
+        return sorted(matched, key=lambda x: x['confidence'], reverse=True)
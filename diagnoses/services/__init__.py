@@ -6,16 +6,22 @@ This package contains the 4 specialized AI agents:
 - RetrieverAgent: Searches medical knowledge base
 - DiagnosisAgent: Analyzes symptoms and generates diagnoses
 - TreatmentAgent: Creates treatment plans and recommendations
+
+Use get_agent(name) to share one instance of each agent per process.
 """
 
 from .coordinator_agent import CoordinatorAgent
 from .retriever_agent import RetrieverAgent
 from .diagnosis_agent import DiagnosisAgent
 from .treatment_agent import TreatmentAgent
+from .registry import get_agent, get_agents, reset_agents
 
 __all__ = [
     'CoordinatorAgent',
     'RetrieverAgent',
     'DiagnosisAgent',
     'TreatmentAgent',
+    'get_agent',
+    'get_agents',
+    'reset_agents',
 ]
@@ -13,6 +13,11 @@ import logging
 from typing import Dict, Any, Tuple
 from django.utils import timezone
 
+from diagnoses.keyword_engine import scan_symptoms
+from diagnoses.metrics import timed
+from diagnoses.rule_tables import freeze
+from diagnoses.vital_signs import VitalSigns
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,45 +27,47 @@ class CoordinatorAgent:
     Acts as the central orchestrator for the multi-agent system.
     """
     
-    PRIORITY_LEVELS = {
+    PRIORITY_LEVELS = freeze({
         'LOW': 1,
         'MEDIUM': 2,
         'HIGH': 3,
         'URGENT': 4,
         'CRITICAL': 5,
-    }
+    })
     
-    CRITICAL_KEYWORDS = [
+    CRITICAL_KEYWORDS = (
         'chest pain', 'heart attack', 'cardiac arrest', 'stroke',
         'severe bleeding', 'unconscious', 'not breathing', 'seizure',
         'anaphylaxis', 'severe allergic reaction', 'difficulty breathing',
         'severe head injury', 'overdose', 'poisoning'
-    ]
+    )
     
-    URGENT_KEYWORDS = [
+    URGENT_KEYWORDS = (
         'severe pain', 'high fever', 'vomiting blood', 'confusion',
         'severe headache', 'blurred vision', 'rapid heartbeat',
         'shortness of breath', 'severe abdominal pain'
-    ]
+    )
     
     def __init__(self):
         """Initialize the Coordinator Agent."""
         self.name = "Coordinator Agent"
         logger.info(f"{self.name} initialized")
     
-    def route_case(self, case, symptoms: str, vital_signs: Dict = None) -> Dict[str, Any]:
+    @timed('coordinator.route_case')
+    def route_case(self, case, symptoms: str, vital_signs: VitalSigns = None) -> Dict[str, Any]:
         """
         Route a patient case based on symptoms and vital signs.
         
         Args:
             case: The Case model instance
             symptoms: Patient symptoms description
-            vital_signs: Dictionary of vital signs
+            vital_signs: Parsed vital signs (a plain dict is also accepted)
             
         Returns:
             Dict with routing decision, priority, and required agents
         """
         logger.info(f"Routing case #{case.id} for patient {case.patient.first_name} {case.patient.last_name}")
+        vital_signs = VitalSigns.coerce(vital_signs)
         
         # Analyze urgency
         urgency_score, urgency_level = self._assess_urgency(symptoms, vital_signs)
@@ -90,23 +97,23 @@ class CoordinatorAgent:
         
         return routing_decision
     
-    def _assess_urgency(self, symptoms: str, vital_signs: Dict = None) -> Tuple[int, str]:
+    def _assess_urgency(self, symptoms: str, vital_signs: VitalSigns = None) -> Tuple[int, str]:
         """
         Assess the urgency level based on symptoms and vital signs.
         
         Returns:
             Tuple of (urgency_score, urgency_level)
         """
-        symptoms_lower = symptoms.lower()
+        scan = scan_symptoms(symptoms)
         urgency_score = 0
         
         # Check for critical keywords
-        critical_count = sum(1 for keyword in self.CRITICAL_KEYWORDS if keyword in symptoms_lower)
+        critical_count = len(scan.found('critical'))
         if critical_count > 0:
             urgency_score += critical_count * 30
         
         # Check for urgent keywords
-        urgent_count = sum(1 for keyword in self.URGENT_KEYWORDS if keyword in symptoms_lower)
+        urgent_count = len(scan.found('urgent'))
         if urgent_count > 0:
             urgency_score += urgent_count * 15
         
@@ -127,56 +134,54 @@ class CoordinatorAgent:
         
         return urgency_score, urgency_level
     
-    def _analyze_vital_signs(self, vital_signs: Dict) -> int:
+    def _analyze_vital_signs(self, vital_signs: VitalSigns) -> int:
         """
         Analyze vital signs and return urgency score contribution.
         
         Returns:
             Urgency score (0-40)
         """
+        vital_signs = VitalSigns.coerce(vital_signs)
         score = 0
         
-        # Temperature analysis
-        if 'temperature' in vital_signs:
-            temp = float(vital_signs['temperature'])
+        # Temperature analysis (thresholds in Fahrenheit)
+        temp = vital_signs.temperature_f
+        if temp is not None:
             if temp >= 103 or temp <= 95:  # Very high or very low
                 score += 20
             elif temp >= 101 or temp <= 96:  # High or low
                 score += 10
         
         # Heart rate analysis
-        if 'heart_rate' in vital_signs:
-            hr = int(vital_signs['heart_rate'])
+        hr = vital_signs.heart_rate
+        if hr is not None:
             if hr >= 120 or hr <= 50:  # Tachycardia or bradycardia
                 score += 15
             elif hr >= 100 or hr <= 60:  # Elevated or low
                 score += 8
         
         # Blood pressure analysis
-        if 'blood_pressure' in vital_signs:
-            bp = vital_signs['blood_pressure']
-            if isinstance(bp, str) and '/' in bp:
-                systolic, diastolic = bp.split('/')
-                systolic = int(systolic)
-                diastolic = int(diastolic)
-                
-                # Hypertensive crisis or hypotension
-                if systolic >= 180 or diastolic >= 120 or systolic <= 90:
-                    score += 20
-                elif systolic >= 140 or diastolic >= 90 or systolic <= 100:
-                    score += 10
+        if vital_signs.systolic is not None:
+            systolic = vital_signs.systolic
+            diastolic = vital_signs.diastolic
+            
+            # Hypertensive crisis or hypotension
+            if systolic >= 180 or diastolic >= 120 or systolic <= 90:
+                score += 20
+            elif systolic >= 140 or diastolic >= 90 or systolic <= 100:
+                score += 10
         
         # Oxygen saturation
-        if 'oxygen_saturation' in vital_signs:
-            o2 = int(vital_signs['oxygen_saturation'])
+        o2 = vital_signs.oxygen_saturation
+        if o2 is not None:
             if o2 <= 90:  # Hypoxemia
                 score += 25
             elif o2 <= 94:
                 score += 12
         
         # Respiratory rate
-        if 'respiratory_rate' in vital_signs:
-            rr = int(vital_signs['respiratory_rate'])
+        rr = vital_signs.respiratory_rate
+        if rr is not None:
             if rr >= 30 or rr <= 10:  # Abnormal respiratory rate
                 score += 15
             elif rr >= 24 or rr <= 12:
@@ -184,7 +189,7 @@ class CoordinatorAgent:
         
         return min(score, 40)  # Cap at 40
     
-    def _assign_priority(self, urgency_level: str, vital_signs: Dict = None) -> str:
+    def _assign_priority(self, urgency_level: str, vital_signs: VitalSigns = None) -> str:
         """
         Assign case priority based on urgency level.
         
@@ -14,6 +14,12 @@ import json
 from typing import Dict, List, Any, Tuple
 from datetime import datetime
 
+from diagnoses.keyword_engine import scan_symptoms
+from diagnoses.metrics import timed
+from diagnoses.patient_context import PatientContext
+from diagnoses.rule_tables import freeze
+from diagnoses.vital_signs import VitalSigns
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,14 +30,32 @@ class DiagnosisAgent:
     """
     
     # Red flag symptoms requiring immediate attention
-    RED_FLAGS = {
+    RED_FLAGS = freeze({
         'cardiac': ['chest pain', 'chest pressure', 'crushing pain', 'radiating pain to arm'],
         'neurological': ['severe headache', 'confusion', 'loss of consciousness', 'slurred speech', 'weakness one side'],
         'respiratory': ['severe difficulty breathing', 'unable to speak', 'blue lips', 'gasping'],
         'abdominal': ['severe abdominal pain', 'rigid abdomen', 'vomiting blood', 'blood in stool'],
         'trauma': ['severe bleeding', 'compound fracture', 'head injury with confusion'],
         'allergic': ['severe allergic reaction', 'swelling throat', 'difficulty swallowing', 'hives with breathing difficulty']
-    }
+    })
+    
+    # Symptom indicators of each emergency condition, in reporting order
+    EMERGENCY_INDICATORS = freeze({
+        'CARDIAC EMERGENCY': ['chest pain', 'heart attack', 'cardiac arrest', 'crushing chest pain'],
+        'STROKE': ['stroke', 'facial drooping', 'arm weakness', 'speech difficulty'],
+        'RESPIRATORY DISTRESS': ['cannot breathe', 'severe breathing difficulty', 'turning blue'],
+        'SEVERE HEMORRHAGE': ['severe bleeding', 'uncontrolled bleeding'],
+        'ANAPHYLAXIS': ['anaphylaxis', 'severe allergic reaction', 'throat swelling'],
+    })
+    
+    # Keywords behind the rule-based symptom patterns (_analyze_symptom_patterns)
+    PATTERN_KEYWORDS = freeze({
+        'respiratory_infection': ['cough', 'fever', 'sore throat'],
+        'influenza': ['fever', 'body aches', 'fatigue'],
+        'gastroenteritis': ['vomiting', 'diarrhea', 'nausea'],
+        'headache': ['headache'],
+        'migraine_features': ['nausea', 'light sensitivity', 'aura'],
+    })
     
     def __init__(self):
         """Initialize the Diagnosis Agent."""
@@ -50,13 +74,16 @@ class DiagnosisAgent:
             logger.error(f"Failed to load AI model: {e}")
             self.ai_model = None
     
+    @timed('diagnosis.analyze_symptoms')
     def analyze_symptoms(
         self,
         symptoms: str,
         patient_history: Dict = None,
         demographics: Dict = None,
-        vital_signs: Dict = None,
-        retriever_context: Dict = None
+        vital_signs: VitalSigns = None,
+        retriever_context: Dict = None,
+        use_cache: bool = True,
+        patient_context: PatientContext = None
     ) -> Dict[str, Any]:
         """
         Analyze symptoms and generate differential diagnoses.
@@ -67,6 +94,9 @@ class DiagnosisAgent:
             demographics: Patient age, gender, etc.
             vital_signs: Current vital signs
             retriever_context: Context from RetrieverAgent
+            use_cache: Allow a cached LLM answer (False forces a fresh one)
+            patient_context: The case's PatientContext, if already built
+                (replaces patient_history and demographics)
             
         Returns:
             Dict containing diagnosis analysis with confidence scores
@@ -79,14 +109,15 @@ class DiagnosisAgent:
         # Check for emergency conditions
         emergency_conditions = self._detect_emergency_conditions(symptoms, vital_signs)
         
-        # Build comprehensive patient context
-        patient_context = self._build_patient_context(
-            patient_history, demographics, vital_signs
-        )
+        # Build comprehensive patient context (once per case)
+        if patient_context is None:
+            patient_context = self._build_patient_context(
+                patient_history, demographics, vital_signs
+            )
         
         # Generate AI diagnosis
         ai_diagnosis = self._generate_ai_diagnosis(
-            symptoms, patient_context, retriever_context
+            symptoms, patient_context, retriever_context, use_cache=use_cache
         )
         
         # Generate differential diagnoses
@@ -112,6 +143,9 @@ class DiagnosisAgent:
             'diagnostic_reasoning': ai_diagnosis.get('reasoning', ''),
             'recommended_tests': self._recommend_diagnostic_tests(differential_diagnoses),
             'clinical_notes': self._generate_clinical_notes(symptoms, ai_diagnosis),
+            # Fused LLM answer sections, consumed by the Treatment Agent
+            'ai_treatment_plan': ai_diagnosis.get('ai_treatment_plan', {}),
+            'ai_medications': ai_diagnosis.get('ai_medications', []),
             'ai_raw_response': ai_diagnosis,
         }
         
@@ -126,12 +160,12 @@ class DiagnosisAgent:
         Returns:
             List of red flags with category and description
         """
-        symptoms_lower = symptoms.lower()
+        scan = scan_symptoms(symptoms)
         identified_flags = []
         
         for category, flag_list in self.RED_FLAGS.items():
             for flag in flag_list:
-                if flag in symptoms_lower:
+                if flag in scan:
                     identified_flags.append({
                         'category': category,
                         'flag': flag,
@@ -141,47 +175,28 @@ class DiagnosisAgent:
         
         return identified_flags
     
-    def _detect_emergency_conditions(self, symptoms: str, vital_signs: Dict = None) -> List[str]:
+    def _detect_emergency_conditions(self, symptoms: str, vital_signs: VitalSigns = None) -> List[str]:
         """
         Detect potential emergency conditions.
         
         Returns:
             List of potential emergency conditions
         """
-        emergencies = []
-        symptoms_lower = symptoms.lower()
-        
-        # Cardiac emergencies
-        cardiac_indicators = ['chest pain', 'heart attack', 'cardiac arrest', 'crushing chest pain']
-        if any(indicator in symptoms_lower for indicator in cardiac_indicators):
-            emergencies.append('CARDIAC EMERGENCY')
-        
-        # Stroke indicators
-        stroke_indicators = ['stroke', 'facial drooping', 'arm weakness', 'speech difficulty']
-        if any(indicator in symptoms_lower for indicator in stroke_indicators):
-            emergencies.append('STROKE')
+        scan = scan_symptoms(symptoms)
         
-        # Respiratory distress
-        respiratory_indicators = ['cannot breathe', 'severe breathing difficulty', 'turning blue']
-        if any(indicator in symptoms_lower for indicator in respiratory_indicators):
-            emergencies.append('RESPIRATORY DISTRESS')
-        
-        # Severe bleeding
-        if 'severe bleeding' in symptoms_lower or 'uncontrolled bleeding' in symptoms_lower:
-            emergencies.append('SEVERE HEMORRHAGE')
-        
-        # Anaphylaxis
-        anaphylaxis_indicators = ['anaphylaxis', 'severe allergic reaction', 'throat swelling']
-        if any(indicator in symptoms_lower for indicator in anaphylaxis_indicators):
-            emergencies.append('ANAPHYLAXIS')
+        # Cardiac, stroke, respiratory distress, severe bleeding, anaphylaxis
+        emergencies = [
+            emergency for emergency, indicators in self.EMERGENCY_INDICATORS.items()
+            if scan.found(('emergency', emergency))
+        ]
         
         # Check vital signs for emergency indicators
-        if vital_signs:
-            if vital_signs.get('oxygen_saturation') and int(vital_signs['oxygen_saturation']) < 90:
-                emergencies.append('HYPOXEMIA')
-            
-            if vital_signs.get('temperature') and float(vital_signs['temperature']) > 103:
-                emergencies.append('HYPERTHERMIA')
+        vital_signs = VitalSigns.coerce(vital_signs)
+        if vital_signs.oxygen_saturation is not None and vital_signs.oxygen_saturation < 90:
+            emergencies.append('HYPOXEMIA')
+        
+        if vital_signs.temperature_f is not None and vital_signs.temperature_f > 103:
+            emergencies.append('HYPERTHERMIA')
         
         return emergencies
     
@@ -189,41 +204,36 @@ class DiagnosisAgent:
         self,
         patient_history: Dict = None,
         demographics: Dict = None,
-        vital_signs: Dict = None
-    ) -> str:
+        vital_signs: VitalSigns = None
+    ) -> PatientContext:
         """
         Build comprehensive patient context for AI diagnosis.
         
         Returns:
-            Formatted patient context string
+            PatientContext (its describe() is the formatted summary)
         """
-        context_parts = []
-        
-        if demographics:
-            age = demographics.get('age', 'unknown')
-            gender = demographics.get('gender', 'unknown')
-            context_parts.append(f"Patient: {age} year old {gender}")
-        
-        if patient_history:
-            medical_history = patient_history.get('medical_history', '')
-            if medical_history:
-                context_parts.append(f"Medical History: {medical_history}")
-            
-            allergies = patient_history.get('allergies', '')
-            if allergies:
-                context_parts.append(f"Allergies: {allergies}")
-        
-        if vital_signs:
-            vital_str = ", ".join([f"{k}: {v}" for k, v in vital_signs.items()])
-            context_parts.append(f"Vital Signs: {vital_str}")
-        
-        return "\n".join(context_parts) if context_parts else "No additional patient context available"
+        patient_history = patient_history or {}
+        demographics = demographics or {}
+        return PatientContext(
+            medical_history=patient_history.get('medical_history', ''),
+            allergies=patient_history.get('allergies', ''),
+            age=demographics.get('age'),
+            gender=demographics.get('gender'),
+            vital_signs=vital_signs,
+            patient_id=patient_history.get('patient_id'),
+        )
+    
+    @staticmethod
+    def prompt_references(retriever_context: Dict = None) -> List[Dict]:
+        """The Retriever results that go into the diagnosis prompt."""
+        return retriever_context.get('results', [])[:3] if retriever_context else []
     
     def _generate_ai_diagnosis(
         self,
         symptoms: str,
-        patient_context: str,
-        retriever_context: Dict = None
+        patient_context: PatientContext,
+        retriever_context: Dict = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Generate AI-powered diagnosis using LLM with RAG context from medical documents.
@@ -240,29 +250,12 @@ class DiagnosisAgent:
             }
         
         try:
-            # Build enhanced context with RAG results
-            enhanced_context = patient_context
-            
-            if retriever_context and retriever_context.get('results'):
-                # Add medical knowledge from loaded documents
-                enhanced_context += "\n\n--- MEDICAL KNOWLEDGE BASE REFERENCES ---\n"
-                for idx, result in enumerate(retriever_context['results'][:3], 1):
-                    source = result.get('source', 'Unknown')
-                    content = result.get('content', '')[:500]  # Limit to 500 chars per excerpt
-                    enhanced_context += f"\n[Reference {idx} from {source}]:\n{content}\n"
-                
-                enhanced_context += f"\n\nBased on {len(retriever_context['results'])} medical guidelines, "
-                enhanced_context += f"from sources: {', '.join(retriever_context.get('sources', [])[:3])}"
-            
-            # Build patient history dict for AI model
-            patient_history_dict = {
-                'medical_history': enhanced_context,
-                'age': 'unknown',
-                'gender': 'unknown'
-            }
+            # The Retriever's references go to the prompt builder, which selects
+            # the most relevant sentences within the prompt's token budget
+            references = self.prompt_references(retriever_context)
             
             # Call AI diagnosis engine with enhanced context
-            ai_result = self.ai_model(symptoms, patient_history_dict)
+            ai_result = self.ai_model(symptoms, patient_context.with_references(references), use_cache=use_cache)
             
             # Parse the result from diagnostic engine
             if isinstance(ai_result, dict):
@@ -300,6 +293,8 @@ class DiagnosisAgent:
                     'severity_score': ai_result.get('severity_score', 0.5),
                     'rag_sources': retriever_context.get('sources', []) if retriever_context else [],
                     'knowledge_base_used': retriever_context.get('knowledge_base_used', False) if retriever_context else False,
+                    'ai_treatment_plan': ai_result.get('ai_treatment_plan', {}),
+                    'ai_medications': ai_result.get('ai_medications', []),
                     'ai_raw_response': ai_result
                 }
             else:
@@ -326,7 +321,7 @@ class DiagnosisAgent:
     def _generate_differential_diagnoses(
         self,
         symptoms: str,
-        patient_context: str,
+        patient_context: PatientContext,
         ai_diagnosis: Dict
     ) -> List[Dict[str, Any]]:
         """
@@ -372,10 +367,11 @@ class DiagnosisAgent:
             List of potential diagnoses based on patterns
         """
         patterns = []
-        symptoms_lower = symptoms.lower()
+        scan = scan_symptoms(symptoms)
+        keywords = self.PATTERN_KEYWORDS
         
         # Respiratory infections
-        if any(s in symptoms_lower for s in ['cough', 'fever', 'sore throat']):
+        if scan.any(keywords['respiratory_infection']):
             patterns.append({
                 'condition': 'Upper Respiratory Infection',
                 'confidence': 0.65,
@@ -384,7 +380,7 @@ class DiagnosisAgent:
             })
         
         # Influenza
-        if all(s in symptoms_lower for s in ['fever', 'body aches', 'fatigue']):
+        if scan.all(keywords['influenza']):
             patterns.append({
                 'condition': 'Influenza',
                 'confidence': 0.70,
@@ -393,7 +389,7 @@ class DiagnosisAgent:
             })
         
         # Gastroenteritis
-        if any(s in symptoms_lower for s in ['vomiting', 'diarrhea', 'nausea']):
+        if scan.any(keywords['gastroenteritis']):
             patterns.append({
                 'condition': 'Gastroenteritis',
                 'confidence': 0.68,
@@ -402,7 +398,7 @@ class DiagnosisAgent:
             })
         
         # Migraine
-        if 'headache' in symptoms_lower and any(s in symptoms_lower for s in ['nausea', 'light sensitivity', 'aura']):
+        if scan.all(keywords['headache']) and scan.any(keywords['migraine_features']):
             patterns.append({
                 'condition': 'Migraine',
                 'confidence': 0.72,
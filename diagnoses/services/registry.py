@@ -0,0 +1,61 @@
+"""
+Process-wide agent registry
+
+The agents keep no per-case state (everything a case needs is passed to
+their methods, and their rule tables are frozen), so one instance of each
+can serve every case and every pipeline thread. The registry builds each
+agent on first use and hands out the same instance afterwards, instead of
+constructing four agents for every case.
+"""
+
+import threading
+from typing import Dict
+
+from .coordinator_agent import CoordinatorAgent
+from .retriever_agent import RetrieverAgent
+from .diagnosis_agent import DiagnosisAgent
+from .treatment_agent import TreatmentAgent
+
+
+AGENT_CLASSES = {
+    'coordinator': CoordinatorAgent,
+    'retriever': RetrieverAgent,
+    'diagnosis': DiagnosisAgent,
+    'treatment': TreatmentAgent,
+}
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+
+def get_agent(name: str):
+    """
+    Get the shared instance of an agent, building it on first use.
+
+    Args:
+        name: 'coordinator', 'retriever', 'diagnosis' or 'treatment'
+
+    Returns:
+        The agent instance
+    """
+    agent = _agents.get(name)
+    if agent is None:
+        if name not in AGENT_CLASSES:
+            raise KeyError(f"Unknown agent '{name}' (expected one of: {', '.join(AGENT_CLASSES)})")
+        with _agents_lock:
+            agent = _agents.get(name)
+            if agent is None:
+                agent = AGENT_CLASSES[name]()
+                _agents[name] = agent
+    return agent
+
+
+def get_agents() -> Dict[str, object]:
+    """All agents by name (builds any that are missing)."""
+    return {name: get_agent(name) for name in AGENT_CLASSES}
+
+
+def reset_agents():
+    """Drop the shared agents so the next get_agent() builds new ones (benchmarks)."""
+    with _agents_lock:
+        _agents.clear()
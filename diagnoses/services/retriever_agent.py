@@ -12,6 +12,8 @@ RESPONSIBILITIES:
 import logging
 from typing import List, Dict, Any
 
+from diagnoses.metrics import timed
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,11 +23,15 @@ class RetrieverAgent:
     Integrates with FAISS vector database for semantic search across loaded medical documents.
     """
     
+    # Symptom keywords that call for the cardiac emergency protocol
+    CARDIAC_PROTOCOL_TRIGGERS = ('cardiac', 'chest pain')
+    
     def __init__(self):
         """Initialize the Retriever Agent."""
         self.name = "Retriever Agent"
         logger.info(f"{self.name} initialized with RAG capabilities")
     
+    @timed('retriever.search_protocols')
     def search_protocols(self, query: str, symptoms: List[str] = None, top_k: int = 5) -> Dict[str, Any]:
         """
         Search medical protocols and diagnostic guidelines from loaded documents.
@@ -12,9 +12,15 @@ RESPONSIBILITIES:
 import logging
 from typing import Dict, List, Any
 from datetime import datetime
+from itertools import zip_longest
+
+from diagnoses.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# Source label for medications suggested by the fused LLM answer
+AI_MEDICATION_SOURCE = 'AI analysis (verify against WHO EML)'
+
 
 class TreatmentAgent:
     """
@@ -22,11 +28,21 @@ class TreatmentAgent:
     References loaded WHO, ESPGHAN, and Uganda MoH documents for treatment recommendations.
     """
     
+    # Common medication keywords to look for in retrieved guidelines
+    MEDICATION_KEYWORDS = (
+        'paracetamol', 'acetaminophen', 'ibuprofen', 'aspirin',
+        'amoxicillin', 'antibiotics', 'antibiotic', 'penicillin',
+        'metformin', 'insulin', 'lisinopril', 'amlodipine',
+        'omeprazole', 'ranitidine', 'salbutamol', 'inhaler',
+        'diazepam', 'lorazepam', 'sertraline', 'fluoxetine'
+    )
+    
     def __init__(self):
         """Initialize the Treatment Agent."""
         self.name = "Treatment Agent"
         logger.info(f"{self.name} initialized with RAG capabilities")
     
+    @timed('treatment.create_action_plan')
     def create_action_plan(
         self,
         diagnosis: Dict,
@@ -62,6 +78,11 @@ class TreatmentAgent:
             urgency_level, treatment_guidelines, diagnosis
         )
         
+        # Steps from the fused LLM answer come first, guideline steps follow
+        ai_plan = diagnosis.get('ai_treatment_plan') or {}
+        if ai_plan:
+            action_steps = self._merge_ai_action_steps(action_steps, ai_plan)
+        
         # Create timeline
         timeline = self._create_action_timeline(urgency_level, action_steps)
         
@@ -76,7 +97,8 @@ class TreatmentAgent:
             'warnings': self._generate_warnings(red_flags, emergency_conditions),
             'success_criteria': self._define_success_criteria(diagnosis),
             'evidence_sources': treatment_guidelines.get('sources', []),
-            'knowledge_base_used': treatment_guidelines.get('knowledge_base_used', False)
+            'knowledge_base_used': treatment_guidelines.get('knowledge_base_used', False),
+            'ai_generated_steps': bool(ai_plan)
         }
         
         logger.info(f"Action plan created with {len(action_steps['immediate'])} immediate actions from {len(treatment_guidelines.get('sources', []))} medical sources")
@@ -125,6 +147,7 @@ class TreatmentAgent:
                 'error': str(e)
             }
     
+    @timed('treatment.recommend_medications')
     def recommend_medications(
         self,
         diagnosis: Dict,
@@ -148,11 +171,25 @@ class TreatmentAgent:
         
         primary_diagnosis = diagnosis.get('primary_diagnosis', '').lower()
         
-        # Query knowledge base for medication recommendations
-        medication_guidelines = self._query_medication_guidelines(primary_diagnosis, symptoms or [])
-        
-        # Extract medications from guidelines
-        medications = self._extract_medications_from_guidelines(medication_guidelines)
+        # Medications suggested in the fused LLM answer, checked against the EML
+        ai_medications = self._annotate_ai_medications(diagnosis.get('ai_medications') or [])
+        
+        # Structured EML lookup first; vector search only when neither has an answer
+        medication_guidelines = self._lookup_essential_medicines(primary_diagnosis)
+        if medication_guidelines['medications']:
+            medications = self._merge_ai_medications(medication_guidelines['medications'], ai_medications)
+        elif ai_medications:
+            medications = ai_medications
+            medication_guidelines = {
+                'sources': [AI_MEDICATION_SOURCE],
+                'knowledge_base_used': False
+            }
+        else:
+            # Query knowledge base for medication recommendations
+            medication_guidelines = self._query_medication_guidelines(primary_diagnosis, symptoms or [])
+            
+            # Extract medications from guidelines
+            medications = self._extract_medications_from_guidelines(medication_guidelines)
         
         # Filter based on allergies
         if allergies:
@@ -171,6 +208,97 @@ class TreatmentAgent:
         
         return medication_plan
     
+    def _annotate_ai_medications(self, medications: List[Dict]) -> List[Dict]:
+        """
+        Tag medications from the fused LLM answer with their source and, when
+        the medicine is on the WHO EML, its EML section.
+        """
+        if not medications:
+            return []
+        
+        try:
+            from knowledge.eml_utils import get_essential_medicines_index
+            index = get_essential_medicines_index()
+        except Exception as e:
+            logger.error(f"Error loading essential medicines index: {e}")
+            index = None
+        
+        annotated = []
+        for med in medications:
+            med = dict(med, source=AI_MEDICATION_SOURCE)
+            rows = index.get(med['name']) if index else []
+            if rows:
+                med['eml_section'] = f"{rows[0]['section_code']} {rows[0]['section']}"
+            annotated.append(med)
+        return annotated
+    
+    def _merge_ai_medications(self, medications: List[Dict], ai_medications: List[Dict]) -> List[Dict]:
+        """
+        Combine EML and LLM medications before they are cut to the primary and
+        alternative lists: EML entries the LLM also named come first, then the
+        other EML and LLM-only medications alternate.
+        """
+        suggested = {med['name'].lower() for med in ai_medications}
+        listed = {med['name'].lower() for med in medications}
+        merged = [med for med in medications if med['name'].lower() in suggested]
+        eml_only = [med for med in medications if med['name'].lower() not in suggested]
+        ai_only = [med for med in ai_medications if med['name'].lower() not in listed]
+        for pair in zip_longest(eml_only, ai_only):
+            merged.extend(med for med in pair if med is not None)
+        return merged
+    
+    def _merge_ai_action_steps(self, action_steps: Dict[str, List[str]], ai_plan: Dict) -> Dict[str, List[str]]:
+        """Put the LLM's action steps ahead of the guideline steps, without duplicates."""
+        merged = {}
+        for key in ['immediate', 'short_term', 'follow_up']:
+            steps = []
+            seen = set()
+            for step in (ai_plan.get(f'{key}_actions') or []) + action_steps[key]:
+                if step.lower() not in seen:
+                    seen.add(step.lower())
+                    steps.append(step)
+            merged[key] = steps[:8]
+        return merged
+    
+    def _lookup_essential_medicines(self, diagnosis: str) -> Dict[str, Any]:
+        """
+        Look up medications for a diagnosis in the structured WHO EML table.
+        
+        Returns:
+            Dict with medication entries (empty when the table is not loaded
+            or the diagnosis is not covered)
+        """
+        try:
+            from knowledge.eml_utils import get_essential_medicines_index, EML_SOURCE
+            
+            index = get_essential_medicines_index()
+            rows = index.for_condition(diagnosis) if index and diagnosis else []
+            
+            medications = [{
+                'name': row['name'],
+                # The EML lists strengths and dosage forms, not doses
+                'dosage': 'As per clinical guidelines',
+                'formulation': row['formulation'],
+                'duration': 'As prescribed by healthcare provider',
+                'instructions': row['indications'] or 'Follow healthcare provider instructions. Take as directed.',
+                'source': EML_SOURCE,
+                'eml_section': f"{row['section_code']} {row['section']}"
+            } for row in rows]
+            
+            return {
+                'medications': medications,
+                'sources': [EML_SOURCE] if medications else [],
+                'knowledge_base_used': bool(medications)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error looking up essential medicines: {e}")
+            return {
+                'medications': [],
+                'sources': [],
+                'knowledge_base_used': False
+            }
+    
     def _query_medication_guidelines(self, diagnosis: str, symptoms: List[str]) -> Dict[str, Any]:
         """
         Query knowledge base for medication guidelines from WHO Essential Medicines List.
@@ -216,15 +344,6 @@ class TreatmentAgent:
         """
         medications = []
         
-        # Common medication keywords to look for
-        medication_keywords = [
-            'paracetamol', 'acetaminophen', 'ibuprofen', 'aspirin',
-            'amoxicillin', 'antibiotics', 'antibiotic', 'penicillin',
-            'metformin', 'insulin', 'lisinopril', 'amlodipine',
-            'omeprazole', 'ranitidine', 'salbutamol', 'inhaler',
-            'diazepam', 'lorazepam', 'sertraline', 'fluoxetine'
-        ]
-        
         # Parse guidelines for medication mentions
         for guideline in guidelines.get('guidelines', []):
             content = guideline.get('content', '').lower()
@@ -234,7 +353,7 @@ class TreatmentAgent:
                 continue
             
             # Look for specific medications mentioned
-            for med_name in medication_keywords:
+            for med_name in self.MEDICATION_KEYWORDS:
                 if med_name in content:
                     # Extract context around the medication
                     sentences = content.split('.')
@@ -656,11 +775,25 @@ class TreatmentAgent:
     def _filter_by_allergies(self, medications: List[Dict], allergies: List[str]) -> List[Dict]:
         """Filter medications based on known allergies."""
         filtered = []
-        allergies_lower = [a.lower() for a in allergies]
+        try:
+            from knowledge.eml_utils import get_essential_medicines_index, split_allergies
+            
+            allergies_lower = [a.lower() for a in split_allergies(allergies)]
+            # Resolve allergy terms (and drug classes) to EML names once per call
+            index = get_essential_medicines_index()
+        except Exception as e:
+            logger.error(f"Error loading essential medicines index: {e}")
+            allergies_lower = [str(a).lower() for a in allergies if a]
+            index = None
+        blocked = index.blocked_by_allergies(allergies_lower) if index else set()
         
         for med in medications:
             med_name_lower = med['name'].lower()
-            if not any(allergy in med_name_lower for allergy in allergies_lower):
+            is_blocked = index.is_blocked(med_name_lower, blocked) if index else None
+            if is_blocked is None:
+                # Not in the EML table - fall back to substring matching
+                is_blocked = any(allergy in med_name_lower for allergy in allergies_lower)
+            if not is_blocked:
                 filtered.append(med)
             else:
                 logger.warning(f"Filtered out {med['name']} due to allergy")
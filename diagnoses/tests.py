@@ -1,3 +1,898 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+
+from patients.models import Patient
+from users.models import User
+
+from .ai_utils import COMPILED_CONDITION_RULES, diagnostic_engine
+from .circuit_breaker import CircuitBreaker
+from .jobs import claim_job, claim_next_job, process_job, requeue_stale_jobs
+from . import llm_routing
+from .middleware import QueryBudgetMiddleware
+from .llm_cache import LLMResponseCache, payload_cache_key
+from .keyword_engine import KeywordAutomaton, normalize_keyword, scan_symptoms
+from .llm_stream import IncrementalJSONParser
+from .management.commands.benchmark_condition_rules import synthetic_rules
+from .management.commands.benchmark_fused_analysis import SAMPLE_CASES
+from .services.coordinator_agent import CoordinatorAgent
+from .services.diagnosis_agent import DiagnosisAgent
+from .models import AnalysisJob, Case
+from .patient_context import PatientContext
+from .pipeline import AgentPipeline
+from .query_budget import QueryBudgetExceeded, query_stats
+from .profiling import ProfileStore
+from .prompt_budget import count_tokens, evidence_budget, score_sentences, select_evidence
+from .rule_tables import ConditionRuleMatrix
+from .triage import RequestCoalescer, quick_triage
+from .vital_signs import VitalSigns, VitalSignsError
+
+
+def safety_keywords():
+    """(category, keyword) pairs that were matched as substrings before the keyword engine."""
+    pairs = [('critical', keyword) for keyword in CoordinatorAgent.CRITICAL_KEYWORDS]
+    pairs += [('urgent', keyword) for keyword in CoordinatorAgent.URGENT_KEYWORDS]
+    for category, flags in DiagnosisAgent.RED_FLAGS.items():
+        pairs += [(('red_flag', category), flag) for flag in flags]
+    for emergency, indicators in DiagnosisAgent.EMERGENCY_INDICATORS.items():
+        pairs += [(('emergency', emergency), indicator) for indicator in indicators]
+    return pairs
+
+
+class SafetyKeywordTests(SimpleTestCase):
+    TEXTS = [
+        'episodes of unconsciousness',
+        'overdosed on pills',
+        'seizures since this morning',
+        'chest pains radiating to the jaw',
+        'high fevers and confusion',
+        'difficulty breathing, blue lips',
+        'lips turning blue',
+        'throat swelling and hives',
+        'uncontrolled bleeding after a fall',
+        'slurred speech and arm weakness',
+        'rapid heartbeats, shortness of breath',
+        'loss of consciousness, blood in stools',
+        'severe headaches and blurred visions',
+        'severe allergic reactions to peanuts',
+    ]
+
+    def test_matches_what_substring_checks_matched(self):
+        for text in self.TEXTS:
+            scan = scan_symptoms(text)
+            substring = {(category, keyword) for category, keyword in safety_keywords() if keyword in text.lower()}
+            scanned = {
+                (category, keyword) for category, keyword in safety_keywords()
+                if normalize_keyword(keyword) in scan.found(category)
+            }
+            self.assertEqual(scanned, substring, text)
+
+    def test_inflected_critical_keywords_keep_urgency(self):
+        coordinator = CoordinatorAgent()
+        self.assertEqual(coordinator._assess_urgency('episodes of unconsciousness')[0], 30)
+        self.assertEqual(coordinator._assess_urgency('overdosed on pills')[0], 30)
+
+    def test_prefix_matches_only_for_prefix_categories(self):
+        automaton = KeywordAutomaton(
+            [('overdose', 'critical'), ('overdose', 'pattern'), ('chest pain', 'critical')],
+            prefix_categories=['critical'],
+        )
+        scan = automaton.scan('overdosed, chest painful')
+        self.assertEqual(scan.found('critical'), {'overdos', 'chest pain'})
+        self.assertEqual(scan.found('pattern'), frozenset())
+        self.assertEqual(automaton.scan('overdose').found('pattern'), {'overdos'})
+
+    def test_prefix_match_respects_word_start(self):
+        automaton = KeywordAutomaton([('stroke', 'critical')], prefix_categories=['critical'])
+        self.assertEqual(automaton.scan('heatstroke').found('critical'), frozenset())
+
+
+class VitalSignsParseTests(SimpleTestCase):
+    def problems(self, data):
+        with self.assertRaises(VitalSignsError) as raised:
+            VitalSigns.parse(data)
+        return raised.exception.problems
+
+    def test_aliases_and_extra_readings(self):
+        vitals = VitalSigns.parse({'HR': '88', 'spo2': '97%', 'RR': 18, 'pain score': 6})
+        self.assertEqual((vitals.heart_rate, vitals.oxygen_saturation, vitals.respiratory_rate), (88, 97, 18))
+        self.assertEqual(vitals.extra, {'pain score': 6})
+
+    def test_unit_conversion(self):
+        vitals = VitalSigns.parse({'temp': '101 F', 'weight': '154 lb'})
+        self.assertEqual(vitals.temperature, 38.33)
+        self.assertEqual(vitals.temperature_f, 101.0)
+        self.assertEqual(vitals.weight, 69.85)
+        # A unitless temperature above 50 is Fahrenheit
+        self.assertEqual(VitalSigns.parse({'temperature': 98.6}).temperature, 37.0)
+
+    def test_fractional_oxygen_saturation(self):
+        self.assertEqual(VitalSigns.parse({'oxygen_saturation': '0.95'}).oxygen_saturation, 95)
+        self.assertEqual(VitalSigns.parse({'spo2': 1}).oxygen_saturation, 100)
+
+    def test_blood_pressure(self):
+        vitals = VitalSigns.parse({'bp': '120 / 80 mmHg'})
+        self.assertEqual((vitals.systolic, vitals.diastolic), (120, 80))
+        self.assertEqual(vitals.as_dict(), {'blood_pressure': '120/80'})
+        vitals = VitalSigns.parse({'blood_pressure_systolic': '135', 'blood_pressure_diastolic': '85'})
+        self.assertEqual(vitals.blood_pressure, '135/85')
+        self.assertIn('expected systolic/diastolic', self.problems({'bp': '120-80'})[0])
+
+    def test_range_errors_report_the_entered_value(self):
+        self.assertEqual(self.problems({'spo2': '0.3'}), ['oxygen saturation 0.3 is outside 50-100'])
+        self.assertEqual(self.problems({'spo2': '100.4'}), ['oxygen saturation 100.4 is outside 50-100'])
+        self.assertEqual(self.problems({'temp': '120 F'}), ['temperature 120 F is outside 25-45'])
+
+    def test_every_problem_is_reported(self):
+        problems = self.problems({'hr': 'fast', 'bp': '80/120', 'weight': '70 stone'})
+        self.assertEqual(len(problems), 3)
+        self.assertIn('diastolic blood pressure must be lower than systolic', problems)
+        self.assertEqual(
+            self.problems({'systolic': 120}), ['blood pressure needs both systolic and diastolic values']
+        )
+
+    def test_lenient_parse_drops_invalid_readings(self):
+        with self.assertLogs('diagnoses.vital_signs', 'WARNING'):
+            vitals = VitalSigns.parse({'hr': 500, 'spo2': 96}, strict=False)
+        self.assertIsNone(vitals.heart_rate)
+        self.assertEqual(vitals.oxygen_saturation, 96)
+
+
+class VitalSignsCoerceTests(SimpleTestCase):
+    def test_instance_is_returned_as_is(self):
+        vitals = VitalSigns(heart_rate=70)
+        self.assertIs(VitalSigns.coerce(vitals), vitals)
+
+    def test_json_string(self):
+        vitals = VitalSigns.coerce('{"temperature": "39.2", "bp": "150/95"}')
+        self.assertEqual(vitals.as_dict(), {'temperature': 39.2, 'blood_pressure': '150/95'})
+
+    def test_bad_input_gives_empty_readings(self):
+        with self.assertLogs('diagnoses.vital_signs', 'WARNING'):
+            for value in ['{not json', '', '[1, 2]', None, 42]:
+                self.assertFalse(VitalSigns.coerce(value), value)
+            self.assertEqual(VitalSigns.coerce({'hr': 'fast', 'rr': 20}).as_dict(), {'respiratory_rate': 20})
+
+
+@override_settings(ANALYSIS_JOB_HEARTBEAT_INTERVAL=60, ANALYSIS_JOB_RETRY_BACKOFF=30)
+class AnalysisJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.nurse = User.objects.create_user(username='nurse', password='pw', role='NURSE')
+        cls.patient = Patient.objects.create(
+            first_name='Ada', last_name='Lovelace', date_of_birth=date(1960, 5, 1), gender='F',
+            phone_number='555-0100', address='1 Main St',
+        )
+
+    def queue_job(self, priority='MEDIUM', **fields):
+        case = Case.objects.create(patient=self.patient, nurse=self.nurse, symptoms='cough', priority=priority)
+        return AnalysisJob.objects.create(case=case, **fields)
+
+    def test_second_claim_of_a_job_fails(self):
+        job = self.queue_job()
+        self.assertIsNotNone(claim_job(AnalysisJob(pk=job.pk), 'worker-1'))
+        self.assertIsNone(claim_job(AnalysisJob(pk=job.pk), 'worker-2'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('RUNNING', 'worker-1', 1))
+
+    def test_claims_stop_at_max_running(self):
+        first, second = self.queue_job(), self.queue_job()
+        self.assertIsNotNone(claim_job(first, 'worker-1', max_running=1))
+        self.assertIsNone(claim_job(second, 'worker-2', max_running=1))
+        self.assertIsNotNone(claim_job(second, 'worker-2', max_running=2))
+
+    @override_settings(LLM_MAX_CONCURRENT=1)
+    def test_claim_next_job_takes_the_most_urgent_until_the_cap(self):
+        self.queue_job(priority='LOW')
+        urgent = self.queue_job(priority='URGENT')
+        self.assertEqual(claim_next_job('worker-1').pk, urgent.pk)
+        self.assertIsNone(claim_next_job('worker-2'))
+
+    def test_failed_attempt_is_retried_then_failed(self):
+        job = self.queue_job(max_attempts=2)
+        with mock.patch('diagnoses.jobs.analyze_case', side_effect=RuntimeError('model unavailable')):
+            with self.assertLogs('diagnoses.jobs', 'WARNING'):
+                self.assertFalse(process_job(claim_job(job, 'worker-1')))
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'QUEUED')
+            self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+            self.assertIsNone(claim_next_job('worker-1'))  # Not due yet
+
+            with self.assertLogs('diagnoses.jobs', 'ERROR'):
+                self.assertFalse(process_job(claim_job(job, 'worker-1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertEqual(job.last_error, 'RuntimeError: model unavailable')
+        report = json.loads(job.case.ai_diagnosis)
+        self.assertEqual(report['error'], 'model unavailable')
+        self.assertTrue(report['manual_review_required'])
+
+    def test_stale_running_job_is_requeued(self):
+        stale = claim_job(self.queue_job(), 'dead-worker')
+        live = claim_job(self.queue_job(), 'live-worker')
+        AnalysisJob.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(minutes=10))
+        with self.assertLogs('diagnoses.jobs', 'WARNING'):
+            self.assertEqual(requeue_stale_jobs(timeout=60), 1)
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), ('QUEUED', ''))
+        self.assertIn('dead-worker', stale.last_error)
+        self.assertEqual(live.status, 'RUNNING')
+
+
+class AgentPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+        self.calls = []
+
+    def step(self, name, value=None, error=None):
+        """Step callable that records its call and the results it was given."""
+        def func(results):
+            self.calls.append((name, sorted(results)))
+            if error is not None:
+                raise error
+            return value if value is not None else name.upper()
+        return func
+
+    def test_steps_run_after_their_requirements(self):
+        pipeline = AgentPipeline(self.executor)
+        pipeline.add('diagnosis', lambda r: r['protocols'] + '+' + r['routing'], requires=['protocols', 'routing'])
+        pipeline.add('treatment', self.step('treatment'), requires=['diagnosis'])
+        pipeline.add('routing', self.step('routing'))
+        pipeline.add('protocols', self.step('protocols'))
+        results, timings = pipeline.run()
+        self.assertEqual(results['diagnosis'], 'PROTOCOLS+ROUTING')
+        self.assertEqual(self.calls[-1], ('treatment', ['diagnosis', 'protocols', 'routing']))
+        self.assertEqual(set(timings), {'routing', 'protocols', 'diagnosis', 'treatment', 'total'})
+
+    def test_independent_steps_run_concurrently(self):
+        # Each step waits for the other; run one after the other they would time out
+        barrier = threading.Barrier(2, timeout=5)
+        pipeline = AgentPipeline(self.executor)
+        pipeline.add('a', lambda r: barrier.wait())
+        pipeline.add('b', lambda r: barrier.wait())
+        results, _ = pipeline.run()
+        self.assertEqual(sorted(results.values()), [0, 1])
+
+    def test_graph_errors_are_raised_before_anything_runs(self):
+        pipeline = AgentPipeline(self.executor)
+        pipeline.add('a', self.step('a'), requires=['b'])
+        pipeline.add('b', self.step('b'), requires=['a'])
+        pipeline.add('c', self.step('c'))
+        with self.assertRaisesMessage(ValueError, 'cycle: a, b'):
+            pipeline.run()
+
+        pipeline = AgentPipeline(self.executor).add('a', self.step('a'), requires=['missing'])
+        with self.assertRaisesMessage(ValueError, "requires unknown step(s): missing"):
+            pipeline.run()
+        with self.assertRaisesMessage(ValueError, "Duplicate pipeline step 'a'"):
+            pipeline.add('a', self.step('a'))
+        self.assertEqual(self.calls, [])
+
+    def test_skipped_step_leaves_none_for_its_dependents(self):
+        pipeline = AgentPipeline(self.executor)
+        pipeline.add('routing', self.step('routing', value={'cardiac': False}))
+        pipeline.add('cardiac', self.step('cardiac'), requires=['routing'], when=lambda r: r['routing']['cardiac'])
+        pipeline.add('diagnosis', lambda r: r['cardiac'], requires=['cardiac'])
+        results, timings = pipeline.run()
+        self.assertEqual((results['cardiac'], results['diagnosis']), (None, None))
+        self.assertNotIn('cardiac', timings)
+        self.assertEqual(self.calls, [('routing', [])])
+
+    def test_failed_step_stops_its_dependents(self):
+        pipeline = AgentPipeline(self.executor)
+        pipeline.add('protocols', self.step('protocols', error=RuntimeError('search failed')))
+        pipeline.add('diagnosis', self.step('diagnosis'), requires=['protocols'])
+        pipeline.add('treatment', self.step('treatment'), requires=['diagnosis'])
+        with self.assertRaisesMessage(RuntimeError, 'search failed'):
+            pipeline.run()
+        self.assertEqual(self.calls, [('protocols', [])])
+
+
+class RequestCoalescerTests(SimpleTestCase):
+    FOLLOWERS = 3
+
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail('timed out')
+
+    def start(self, coalescer, compute, results):
+        def call():
+            try:
+                results.append(coalescer.get('key', compute))
+            except Exception as e:
+                results.append(e)
+        thread = threading.Thread(target=call)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        return thread
+
+    def test_concurrent_callers_share_one_evaluation(self):
+        coalescer = RequestCoalescer(max_entries=10)
+        release = threading.Event()
+        evaluations = []
+
+        def compute():
+            evaluations.append(1)
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [self.start(coalescer, compute, results)]
+        self.wait_for(lambda: evaluations)
+        threads += [self.start(coalescer, compute, results) for _ in range(self.FOLLOWERS)]
+        self.wait_for(lambda: coalescer.stats()['coalesced'] == self.FOLLOWERS)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, ['result'] * (self.FOLLOWERS + 1))
+        self.assertEqual(len(evaluations), 1)
+        self.assertEqual(coalescer.get('key', compute), 'result')
+        self.assertEqual(coalescer.stats(), {'entries': 1, 'hits': 1, 'coalesced': self.FOLLOWERS, 'misses': 1})
+
+    def test_followers_compute_when_the_leader_fails(self):
+        coalescer = RequestCoalescer(max_entries=10)
+        release = threading.Event()
+        started = threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise RuntimeError('leader failed')
+
+        leader_results, follower_results = [], []
+        leader = self.start(coalescer, failing, leader_results)
+        started.wait(5)
+        follower = self.start(coalescer, lambda: 'recomputed', follower_results)
+        self.wait_for(lambda: coalescer.stats()['coalesced'] == 1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertIsInstance(leader_results[0], RuntimeError)
+        self.assertEqual(follower_results, ['recomputed'])
+        # A failed computation is not cached
+        self.assertEqual(coalescer.get('key', lambda: 'next'), 'next')
+
+    def test_least_recently_used_entry_is_evicted(self):
+        coalescer = RequestCoalescer(max_entries=2)
+        coalescer.get('a', lambda: 1)
+        coalescer.get('b', lambda: 2)
+        coalescer.get('a', lambda: None)
+        coalescer.get('c', lambda: 3)
+        self.assertEqual(coalescer.get('a', lambda: None), 1)
+        self.assertEqual(coalescer.get('b', lambda: 'recomputed'), 'recomputed')
+
+
+class QuickTriageTests(SimpleTestCase):
+    def test_red_flag_offsets_slice_the_matched_text(self):
+        symptoms = 'Sudden CHEST PAIN, then Vomiting   Blood; chest pain again'
+        red_flags = quick_triage(symptoms)['red_flags']
+        self.assertEqual(
+            [(flag['category'], flag['flag'], flag['text']) for flag in red_flags],
+            [('cardiac', 'chest pain', 'CHEST PAIN'), ('abdominal', 'vomiting blood', 'Vomiting   Blood')],
+        )
+        for flag in red_flags:
+            self.assertEqual(symptoms[flag['start']:flag['end']], flag['text'])
+
+    def test_red_flag_raises_urgency(self):
+        self.assertEqual(quick_triage('vomiting blood')['urgency_level'], 'high')
+        self.assertEqual(quick_triage('chest pain')['recommended_priority'], 'CRITICAL')
+
+
+def reference_condition_matches(rules, symptoms, patient, threshold):
+    """
+    The per-condition loop _match_condition_rules used before ConditionRuleMatrix.
+
+    Synthetic rules have no keyword category of their own; for a real rule the
+    category holds exactly the words of its symptom phrases.
+    """
+    scan = scan_symptoms(symptoms)
+    matched_conditions = []
+    for rule in rules:
+        confidence = 0.0
+        found = scan.found(('condition', rule.key)) or scan.keywords & {
+            word for words in rule.required_words + rule.supporting_words for word in words
+        }
+        required_count = sum(
+            1 for words in rule.required_words
+            if any(word in found for word in words)
+        )
+        if required_count == 0:
+            continue
+        required_ratio = required_count / len(rule.required_words)
+        confidence += 0.4 * required_ratio
+        supporting_count = sum(1 for words in rule.supporting_words
+                               if any(word in found for word in words))
+        supporting_ratio = supporting_count / len(rule.supporting_words) if rule.supporting_words else 0
+        confidence += supporting_ratio * 0.3
+        risk_factor_count = 0
+        for risk_factor in rule.risk_factors:
+            if patient.has_risk_factor(risk_factor):
+                risk_factor_count += 1
+        if rule.risk_factors:
+            risk_ratio = risk_factor_count / len(rule.risk_factors)
+            confidence += risk_ratio * 0.2
+        confidence += rule.confidence_boost
+        confidence = min(confidence, 1.0)
+        if confidence >= threshold:
+            matched_conditions.append({
+                'condition': rule.condition,
+                'confidence': confidence,
+                'urgency': rule.urgency,
+                'supporting_symptoms': supporting_count,
+                'risk_factors': risk_factor_count
+            })
+    return sorted(matched_conditions, key=lambda x: x['confidence'], reverse=True)
+
+
+class ConditionRuleMatrixTests(SimpleTestCase):
+    SYMPTOMS = [symptoms for symptoms, _, _ in SAMPLE_CASES] + [
+        'persistent cough for three weeks, night sweats, weight loss, coughing blood',
+        'painful burning urination, lower abdominal pain',
+        'itchy rash, red skin, swelling',
+        '',
+    ]
+    PATIENTS = [
+        {'age': 70, 'gender': 'Male', 'medical_history': 'hypertension, smoker, type 2 diabetes'},
+        {'age': 30, 'gender': 'Female', 'medical_history': 'None reported', 'allergies': 'penicillin'},
+    ]
+
+    def assert_same_matches(self, rules, match):
+        threshold = diagnostic_engine.confidence_threshold
+        for history in self.PATIENTS:
+            patient = PatientContext.from_history(history)
+            for symptoms in self.SYMPTOMS:
+                with self.subTest(rules=len(rules), symptoms=symptoms, history=history):
+                    self.assertEqual(
+                        match(symptoms, history),
+                        reference_condition_matches(rules, symptoms, patient, threshold),
+                    )
+
+    def test_engine_matches_the_per_condition_loop(self):
+        self.assert_same_matches(COMPILED_CONDITION_RULES, diagnostic_engine._match_condition_rules)
+        self.assertTrue(diagnostic_engine._match_condition_rules(self.SYMPTOMS[0], self.PATIENTS[0]))
+
+    def test_synthetic_rule_bases_match_the_per_condition_loop(self):
+        for size in (50, 300):
+            matrix = ConditionRuleMatrix(synthetic_rules(size))
+            self.assert_same_matches(matrix.rules, lambda symptoms, history: matrix.matches(
+                scan_symptoms(symptoms).keywords,
+                PatientContext.from_history(history).has_risk_factor,
+                diagnostic_engine.confidence_threshold,
+            ))
+
+
+class IncrementalJSONParserTests(SimpleTestCase):
+    # Escaped quotes, a \uXXXX escape, brackets and braces inside strings of a
+    # nested array, and scalars ended by a comma and by the closing brace
+    ANSWER = (
+        '{"diagnosis": "Patient said \\"it burns\\" \\u00e9 } ]",\n'
+        ' "differentials": [["flu", "a}b"], {"note": "]} \\" {"}],\n'
+        ' "confidence": 0.85, "urgent": true}'
+    )
+
+    def feed(self, size):
+        parser = IncrementalJSONParser()
+        events = []
+        for start in range(0, len(self.ANSWER), size):
+            events += parser.feed(self.ANSWER[start:start + size])
+        return parser, events
+
+    def test_any_chunk_size_gives_the_same_fields(self):
+        expected = json.loads(self.ANSWER)
+        for size in range(1, len(self.ANSWER) + 1):
+            parser, events = self.feed(size)
+            with self.subTest(size=size):
+                self.assertEqual(parser.fields, expected)
+                fields = [(key, value) for kind, key, value in events if kind == 'field']
+                self.assertEqual(fields, list(expected.items()))
+                self.assertEqual(parser.state, 'done')
+
+    def test_partials_grow_and_precede_their_field(self):
+        expected = json.loads(self.ANSWER)['diagnosis']
+        for size in (1, 2, 3, 5, 7):
+            _, events = self.feed(size)
+            with self.subTest(size=size):
+                diagnosis = [(kind, value) for kind, key, value in events if key == 'diagnosis']
+                self.assertEqual(diagnosis[-1], ('field', expected))
+                partials = [value for kind, value in diagnosis[:-1]]
+                self.assertTrue(all(kind == 'partial' for kind, _ in diagnosis[:-1]))
+                # A split escape (\\" or \\u00e9) is held back, never decoded half-way
+                for previous, partial in zip([''] + partials, partials):
+                    self.assertTrue(partial.startswith(previous))
+                    self.assertTrue(expected.startswith(partial))
+                # No partial after a field completes
+                first_field = next(i for i, event in enumerate(events) if event[0] == 'field')
+                self.assertNotIn('partial', [kind for kind, _, _ in events[first_field:]])
+
+    def test_unicode_escape_split_across_chunks(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"note": "caf'), [('partial', 'note', 'caf')])
+        self.assertEqual(parser.feed('\\u00'), [])
+        self.assertEqual(parser.feed('e9 au'), [('partial', 'note', 'café au')])
+        self.assertEqual(parser.feed(' lait"}'), [('field', 'note', 'café au lait')])
+
+
+class LLMResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'llm_cache.sqlite3')
+        self.now = 1000.0
+        clock = mock.patch('diagnoses.llm_cache.time.time', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def cache(self, **options):
+        cache = LLMResponseCache(self.path, **options)
+        self.addCleanup(lambda: cache._connection().close())
+        return cache
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = self.cache(ttl=60)
+        cache.set('key', 'model', 'answer')
+        self.now += 60
+        self.assertEqual(cache.get('key'), 'answer')
+        self.now += 1
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_entries_are_evicted_over_max_bytes(self):
+        cache = self.cache(max_bytes=25)
+        for key in 'abc':
+            cache.set(key, 'model', key * 10)
+            self.now += 1
+            if key == 'b':
+                cache.get('a')  # a is now more recently used than b
+                self.now += 1
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'a' * 10)
+        self.assertEqual(cache.get('c'), 'c' * 10)
+        self.assertEqual(cache.stats()['bytes'], 20)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_survives_a_new_instance(self):
+        self.cache().set('key', 'model', 'answer')
+        self.assertEqual(self.cache().get('key'), 'answer')
+
+
+class QueryOllamaCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = LLMResponseCache(os.path.join(directory.name, 'llm_cache.sqlite3'))
+        self.addCleanup(lambda: self.cache._connection().close())
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'response': '{"diagnosis": "fresh"}'}
+        client = mock.Mock()
+        client.post_json.return_value = (response, {})
+        self.post_json = client.post_json
+        for target, value in [('get_llm_cache', self.cache), ('get_llm_client', client)]:
+            patcher = mock.patch(f'diagnoses.ai_utils.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_use_cache_false_bypasses_a_stored_answer(self):
+        prompt = 'Symptoms: cough'
+        key = payload_cache_key(diagnostic_engine._build_ollama_payload(prompt))
+        self.cache.set(key, 'model', '{"diagnosis": "cached"}')
+
+        self.assertEqual(diagnostic_engine._query_ollama_api(prompt), {'diagnosis': 'cached'})
+        self.post_json.assert_not_called()
+
+        self.assertEqual(diagnostic_engine._query_ollama_api(prompt, use_cache=False), {'diagnosis': 'fresh'})
+        self.post_json.assert_called_once()
+        # The fresh answer replaces the stored one
+        self.assertEqual(self.cache.get(key), '{"diagnosis": "fresh"}')
+
+
+@override_settings(LLM_EVIDENCE_MIN_SIMILARITY=0.2)
+class SelectEvidenceTests(SimpleTestCase):
+    CHUNKS = [
+        {'source': 'WHO malaria guidelines', 'content': (
+            'Fever with chills in an endemic area suggests malaria. Confirm with a rapid diagnostic test. '
+            'Treat uncomplicated malaria with artemisinin-based combination therapy.'
+        )},
+        {'source': 'Pneumonia handbook', 'content': (
+            'Cough with fast breathing in a child suggests pneumonia. '
+            'Fever with chills in an endemic area suggests malaria.\n\n'
+            '- Give oral amoxicillin for fast-breathing pneumonia.'
+        )},
+        {'source': 'WHO malaria guidelines', 'content': (
+            'Fever with chills in an endemic area suggests malaria. Confirm with a rapid diagnostic test. '
+            'Treat uncomplicated malaria with artemisinin-based combination therapy.'
+        )},
+    ]
+
+    def setUp(self):
+        patcher = mock.patch(
+            'diagnoses.prompt_budget.score_sentences',
+            side_effect=lambda query, sentences: np.full(len(sentences), 0.9),
+        )
+        self.score_sentences = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evidence_fits_the_budget_including_prefixes(self):
+        for budget in range(0, 120, 3):
+            evidence, stats = select_evidence('fever chills', self.CHUNKS, budget)
+            with self.subTest(budget=budget):
+                self.assertLessEqual(count_tokens(evidence), budget)
+                self.assertEqual(stats['evidence_tokens'], count_tokens(evidence))
+        evidence, stats = select_evidence('fever chills', self.CHUNKS, 1000)
+        self.assertEqual(stats['selected_sentences'], stats['candidate_sentences'])
+        self.assertEqual(evidence.count('- [WHO malaria guidelines] '), 1)
+
+    def test_duplicate_chunks_and_sentences_are_dropped(self):
+        evidence, stats = select_evidence('fever chills', self.CHUNKS, 1000)
+        self.assertEqual((stats['chunks'], stats['candidate_sentences']), (2, 5))
+        self.assertEqual(evidence.count('suggests malaria'), 1)
+        self.assertEqual(evidence.splitlines(), [
+            '- [WHO malaria guidelines] Fever with chills in an endemic area suggests malaria. '
+            'Confirm with a rapid diagnostic test. '
+            'Treat uncomplicated malaria with artemisinin-based combination therapy.',
+            '- [Pneumonia handbook] Cough with fast breathing in a child suggests pneumonia. '
+            '- Give oral amoxicillin for fast-breathing pneumonia.',
+        ])
+
+    def test_sentences_below_the_similarity_floor_are_left_out(self):
+        self.score_sentences.side_effect = lambda query, sentences: np.array([0.9, 0.1, 0.9, 0.1, 0.1])
+        evidence, stats = select_evidence('fever chills', self.CHUNKS, 1000)
+        self.assertEqual(stats['selected_sentences'], 2)
+        self.assertEqual(evidence.count('\n'), 0)
+
+    def test_empty_budget_or_chunks(self):
+        self.assertEqual(select_evidence('fever', self.CHUNKS, 0)[0], '')
+        self.assertEqual(select_evidence('fever', [{'content': '  '}], 100)[1]['chunks'], 0)
+        self.score_sentences.assert_not_called()
+
+
+class ScoreSentencesTests(SimpleTestCase):
+    def test_word_overlap_when_the_embedding_model_fails(self):
+        sentences = ['Fever with chills suggests malaria.', 'Cough suggests pneumonia.']
+        with mock.patch('knowledge.rag_utils.get_embedding_model', side_effect=RuntimeError('no model')), \
+                mock.patch('diagnoses.prompt_budget._embedding_warning_logged', False), \
+                self.assertLogs('diagnoses.prompt_budget', 'WARNING'):
+            scores = score_sentences('fever and chills', sentences)
+        # "fever", "and", "chills": two of the three query words occur in the first sentence
+        self.assertEqual(list(scores), [2 / 3, 0.0])
+
+
+@override_settings(LLM_CONTEXT_TOKENS=4096, LLM_RESERVED_OUTPUT_TOKENS=700, LLM_EVIDENCE_TOKEN_BUDGET=600)
+class EvidenceBudgetTests(SimpleTestCase):
+    def test_capped_by_setting_and_by_the_context_left(self):
+        prompt = 'word ' * 100
+        self.assertEqual(evidence_budget(prompt), 600)
+        self.assertEqual(evidence_budget(prompt, context_tokens=1000), 200)
+        self.assertEqual(evidence_budget(prompt, context_tokens=1000, reserved_tokens=850), 50)
+        self.assertEqual(evidence_budget(prompt, context_tokens=500), 0)
+
+
+class PatientContextRiskFactorTests(SimpleTestCase):
+    def risk_factors(self, **history):
+        return PatientContext.from_history(history).risk_factors
+
+    def test_history_keywords_are_whole_word_phrases(self):
+        self.assertEqual(
+            self.risk_factors(medical_history='High  Blood Pressure; ex-smoker. Family history of diabetes'),
+            {'hypertension', 'smoking', 'family history', 'diabetes'},
+        )
+        self.assertEqual(self.risk_factors(medical_history='chronically ill, nonsmoker, prediabetes'), set())
+        self.assertEqual(self.risk_factors(medical_history='chronic kidney disease'), {'chronic disease'})
+
+    def test_allergies_count_but_other_fields_do_not(self):
+        self.assertEqual(self.risk_factors(allergies='tobacco smoke'), {'smoking'})
+        self.assertEqual(self.risk_factors(gender='diabetic', patient_id='smoker'), set())
+
+    def test_age_over_65(self):
+        self.assertEqual(self.risk_factors(age=66), {'age > 65'})
+        self.assertEqual(self.risk_factors(age=65), set())
+        self.assertEqual(self.risk_factors(age='Unknown'), set())
+        self.assertTrue(PatientContext(age=80.5).has_risk_factor('age > 65'))
+
+    def test_coerce_builds_from_a_history_dict(self):
+        context = PatientContext.coerce({'medical_history': 'Diabetic', 'age': 70, 'gender': 'Female'})
+        self.assertEqual(context.risk_factors, {'diabetes', 'age > 65'})
+        self.assertIs(PatientContext.coerce(context), context)
+        self.assertEqual(PatientContext.coerce(None).risk_factors, set())
+
+
+class CurrentLoadTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(llm_routing, '_backlog_count', (0.0, 0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(LLM_LOAD_CACHE_SECONDS=60)
+    def test_job_count_is_reused_between_calls(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(llm_routing.current_load(), 0)
+            self.assertEqual(llm_routing.current_load(), 0)
+
+    @override_settings(LLM_DOWNGRADE_IN_FLIGHT=2)
+    def test_busy_process_skips_the_job_count(self):
+        scheduler = mock.Mock()
+        scheduler.in_flight.return_value = 2
+        with mock.patch('diagnoses.llm_routing.get_llm_scheduler', return_value=scheduler), \
+                self.assertNumQueries(0):
+            self.assertTrue(llm_routing._under_load())
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=30, clock=lambda: self.now)
+
+    def open_breaker(self):
+        with self.assertLogs('diagnoses.circuit_breaker', 'WARNING'):
+            self.breaker.record_failure('timeout')
+            self.breaker.record_failure('timeout')
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure('timeout')
+        self.breaker.record_success()
+        self.breaker.record_failure('timeout')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.open_breaker()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()['retry_in_seconds'], 30)
+        self.assertEqual((self.breaker.rejected_count, self.breaker.open_count), (1, 1))
+
+    def test_recovery_timeout_lets_a_single_trial_through(self):
+        self.open_breaker()
+        self.now += 29.9
+        self.assertFalse(self.breaker.is_available())
+        self.now += 0.1
+        self.assertTrue(self.breaker.is_available())
+        with self.assertLogs('diagnoses.circuit_breaker', 'INFO'):
+            self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertFalse(self.breaker.is_available())
+        with self.assertLogs('diagnoses.circuit_breaker', 'INFO'):
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_trial_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        with self.assertLogs('diagnoses.circuit_breaker', 'INFO'):
+            self.breaker.allow_request()
+            self.breaker.record_failure('connection error')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.open_count, 2)
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_released_trial_can_be_retried(self):
+        self.open_breaker()
+        with self.assertLogs('diagnoses.circuit_breaker', 'INFO'):
+            self.breaker.record_probe(True)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.release_trial()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+
+class MetricsViewTests(TestCase):
+    def test_local_clients_get_the_histograms(self):
+        self.client.get('/metrics')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('view="metrics"', response.content.decode())
+
+    def test_other_clients_are_forbidden(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+@override_settings(SQL_QUERY_BUDGETS={'metrics': 3}, SQL_N_PLUS_ONE_THRESHOLD=5, SQL_BUDGET_RAISE=False)
+class QueryBudgetMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.nurse = User.objects.create_user(username='nurse', password='pw', role='NURSE')
+
+    def setUp(self):
+        query_stats.reset()
+        self.addCleanup(query_stats.reset)
+
+    def get(self, queries):
+        """Run a request to the 'metrics' view whose handler looks the user up `queries` times."""
+        def view(request):
+            for _ in range(queries):
+                User.objects.get(pk=self.nurse.pk)
+            return HttpResponse()
+        request = RequestFactory().get('/metrics')
+        request.resolver_match = resolve('/metrics')
+        return QueryBudgetMiddleware(view)(request)
+
+    def test_request_within_budget_is_not_flagged(self):
+        with self.assertNoLogs('diagnoses.middleware', 'WARNING'):
+            self.get(3)
+        self.assertEqual(query_stats.snapshot()[0]['over_budget'], 0)
+
+    def test_request_over_budget_is_flagged(self):
+        with self.assertLogs('diagnoses.middleware', 'WARNING') as logs:
+            self.get(4)
+        self.assertIn('GET /metrics (metrics): 4 queries (budget 3', logs.output[0])
+        self.assertNotIn('N+1', logs.output[0])
+        stats = query_stats.snapshot()[0]
+        self.assertEqual((stats['view'], stats['max_queries'], stats['over_budget']), ('metrics', 4, 1))
+
+    def test_repeated_query_shape_is_reported_as_n_plus_one(self):
+        with self.assertLogs('diagnoses.middleware', 'WARNING') as logs:
+            self.get(5)
+        self.assertIn('N+1: 5x SELECT', logs.output[0])
+        self.assertEqual(list(query_stats.snapshot()[0]['repeated_shapes'].values()), [5])
+
+    @override_settings(SQL_BUDGET_RAISE=True)
+    def test_overrun_raises_in_development(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '4 queries (budget 3'):
+            self.get(4)
+
+
+class ProfileDownloadTests(TestCase):
+    PROFILE_ID = '20261019-120000123-0123abcd'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='pw', role='DOCTOR', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = ProfileStore(os.path.join(directory.name, 'profiles'), max_profiles=10)
+        os.makedirs(self.store.directory)
+        (self.store.directory / f'{self.PROFILE_ID}.collapsed').write_text('main;view 3\n')
+        # A file beside the store that traversal would reach
+        with open(os.path.join(directory.name, 'secret.collapsed'), 'w') as f:
+            f.write('secret')
+        patcher = mock.patch('diagnoses.views.get_profile_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.staff)
+
+    def download(self, profile_id, kind='collapsed'):
+        return self.client.get(f'/system-admin/profiles/{profile_id}/{kind}/')
+
+    def test_downloads_a_stored_profile(self):
+        response = self.download(self.PROFILE_ID)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'main;view 3\n')
+        self.assertIn(f'{self.PROFILE_ID}.collapsed', response['Content-Disposition'])
+
+    def test_unknown_kind_or_missing_file_is_404(self):
+        self.assertEqual(self.download(self.PROFILE_ID, 'pstats').status_code, 404)
+        self.assertEqual(self.download(self.PROFILE_ID, 'json').status_code, 404)
+
+    def test_ids_outside_the_store_are_rejected(self):
+        for profile_id in ['..', '..%2Fsecret', '%2E%2E%2Fsecret', 'secret', f'{self.PROFILE_ID}.x']:
+            with self.subTest(profile_id=profile_id):
+                self.assertEqual(self.download(profile_id).status_code, 404)
+        self.assertIsNone(self.store.path('../secret', 'collapsed'))
+        self.assertIsNone(self.store.path(f'../profiles/{self.PROFILE_ID}', 'collapsed'))
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create_user(username='nurse', password='pw', role='NURSE'))
+        self.assertEqual(self.download(self.PROFILE_ID).status_code, 302)
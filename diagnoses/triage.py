@@ -0,0 +1,214 @@
+"""
+Fast-path quick triage for the case form
+
+quick_triage_ajax is called as the nurse types, so it must answer within a
+few milliseconds (QUICK_TRIAGE_BUDGET_MS, checked by the
+benchmark_quick_triage command). The triage here only uses rules compiled
+once per process: the shared keyword automaton (symptom severity, red flags,
+emergency indicators) and the vital-sign thresholds. It never touches the
+database, the embedding model or the LLM; the optional AI note (ai=1) stays
+outside this path.
+
+Identical inputs are coalesced: concurrent requests for the same symptoms
+and vitals wait for one evaluation, and recent results are kept in a small
+LRU (QUICK_TRIAGE_CACHE_SIZE entries).
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List
+
+from django.conf import settings
+
+from .ai_utils import diagnostic_engine
+from .keyword_engine import get_symptom_automaton, normalize_keyword, scan_symptoms, token_spans
+from .rule_tables import freeze
+from .services import get_agent
+from .services.diagnosis_agent import DiagnosisAgent
+from .vital_signs import VitalSigns
+
+
+URGENCY_ORDER = ('low', 'moderate', 'high', 'critical')
+
+# Triage urgency -> Case priority
+URGENCY_PRIORITY = freeze({
+    'critical': 'CRITICAL',
+    'high': 'URGENT',
+    'moderate': 'HIGH',
+    'low': 'MEDIUM',
+})
+
+
+class RequestCoalescer:
+    """
+    Compute each key once: concurrent callers with the same key share one
+    computation, and the most recent results are kept (LRU).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._pending = {}  # key -> Event set when the leader finishes
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached result for key, else wait for the caller computing it, else compute it."""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            event = self._pending.get(key)
+            leader = event is None
+            if leader:
+                event = self._pending[key] = threading.Event()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            event.wait()
+            with self._lock:
+                if key in self._results:
+                    return self._results[key]
+            # The leader failed; compute (and raise) for this caller too
+            return compute()
+
+        try:
+            result = compute()
+            with self._lock:
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+            return result
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = self.coalesced = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._results),
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+            }
+
+
+class QuickTriage:
+    """Keyword and vital-sign triage rules, compiled once per process."""
+
+    def __init__(self):
+        # Build the shared automaton now rather than on the first keystroke
+        get_symptom_automaton()
+        self.diagnosis_agent = get_agent('diagnosis')
+        # Normalized red flag -> (category, flag as written in DiagnosisAgent.RED_FLAGS)
+        self.red_flags = {}
+        for category, flags in DiagnosisAgent.RED_FLAGS.items():
+            for flag in flags:
+                self.red_flags.setdefault(normalize_keyword(flag), (category, flag))
+        self.coalescer = RequestCoalescer(getattr(settings, 'QUICK_TRIAGE_CACHE_SIZE', 1024))
+
+    def evaluate(self, symptoms: str, vital_signs: VitalSigns) -> Dict[str, Any]:
+        """
+        Rule-based triage of one symptom text (uncached; see triage()).
+
+        Urgency starts from the symptom severity score (as analyze_case_urgency)
+        and is raised to 'high' by a red flag and to 'critical' by an
+        emergency condition from the symptoms or the vital signs, the same
+        escalation the Diagnosis Agent applies.
+
+        Returns:
+            Dict with urgency_level, recommended_priority, severity_score,
+            red_flags (category, flag, and the matched text with its
+            character offsets, for highlighting) and emergency_conditions
+        """
+        severity = diagnostic_engine._calculate_symptom_severity(symptoms)
+        urgency_level = diagnostic_engine._determine_urgency(severity, [])
+        red_flags = self._find_red_flags(symptoms)
+        emergency_conditions = self.diagnosis_agent._detect_emergency_conditions(symptoms, vital_signs)
+
+        if emergency_conditions:
+            urgency_level = max(urgency_level, 'critical', key=URGENCY_ORDER.index)
+        elif red_flags:
+            urgency_level = max(urgency_level, 'high', key=URGENCY_ORDER.index)
+
+        priority = URGENCY_PRIORITY[urgency_level]
+        return {
+            'urgency_level': urgency_level,
+            'recommended_priority': priority,
+            'severity_score': round(severity, 2),
+            'red_flags': red_flags,
+            'emergency_conditions': emergency_conditions,
+            'message': f"Recommended priority: {priority} (Urgency: {urgency_level})",
+        }
+
+    def _find_red_flags(self, symptoms: str) -> List[Dict[str, Any]]:
+        """Red flags in order of appearance, each with the span of its first occurrence."""
+        scan = scan_symptoms(symptoms)
+        found = []
+        seen = set()
+        spans = None
+        for hit in scan.hits:
+            if hit.keyword in seen or hit.keyword not in self.red_flags:
+                continue
+            seen.add(hit.keyword)
+            if spans is None:
+                spans = token_spans(symptoms)
+            start, end = spans[hit.start][0], spans[hit.end - 1][1]
+            category, flag = self.red_flags[hit.keyword]
+            found.append({
+                'category': category,
+                'flag': flag,
+                'text': symptoms[start:end],
+                'start': start,
+                'end': end,
+            })
+        return found
+
+    def triage(self, symptoms: str, vital_signs: Any = None) -> Dict[str, Any]:
+        """
+        Triage symptoms (and optional vital signs) on the fast path.
+
+        Args:
+            symptoms: Symptom text as typed so far
+            vital_signs: VitalSigns, a dict or a JSON string (invalid readings are ignored)
+
+        Returns:
+            A new dict (callers may add to it), see evaluate()
+        """
+        vital_signs = VitalSigns.coerce(vital_signs)
+        # Exact text: the red flag offsets refer to it
+        key = (symptoms, json.dumps(vital_signs.as_dict(), sort_keys=True))
+        result = self.coalescer.get(key, lambda: self.evaluate(symptoms, vital_signs))
+        return dict(result)
+
+
+# Lazy process-wide triage rules
+_quick_triage = None
+_quick_triage_lock = threading.Lock()
+
+
+def get_quick_triage() -> QuickTriage:
+    """Get or build the shared QuickTriage."""
+    global _quick_triage
+    if _quick_triage is None:
+        with _quick_triage_lock:
+            if _quick_triage is None:
+                _quick_triage = QuickTriage()
+    return _quick_triage
+
+
+def quick_triage(symptoms: str, vital_signs: Any = None) -> Dict[str, Any]:
+    """Triage with the shared rules; see QuickTriage.triage."""
+    return get_quick_triage().triage(symptoms, vital_signs)
@@ -21,6 +21,9 @@ urlpatterns = [
     path('ajax/quick-triage/', 
          views.quick_triage_ajax, 
          name='quick_triage_ajax'),
+    path('api/llm-status/', views.llm_status_api, name='llm_status'),
+    path('api/diagnosis-stream/<int:pk>/', views.diagnosis_stream, name='diagnosis_stream'),
+    path('api/analysis-status/<int:pk>/', views.analysis_status_api, name='analysis_status'),
     path('api/search-patients/', views.search_patients, name='search_patients'),
     path('api/regenerate-diagnosis/<int:pk>/', views.regenerate_diagnosis, name='regenerate_diagnosis'),
     path('api/doctor-review/<int:case_id>/', views.submit_doctor_review, name='submit_doctor_review'),
@@ -1,5 +1,7 @@
 import json
 import base64
+import logging
+import time
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import CreateView, ListView, DetailView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -7,7 +9,9 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.http import JsonResponse
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.forms import ModelForm
 from django import forms
@@ -15,16 +19,20 @@ from django.db import models
 from django.db.models import Q
 
 from .models import Case
-from .ai_utils import get_ai_diagnosis, analyze_case_urgency
+from .ai_utils import get_ai_diagnosis, diagnostic_engine
+from .llm_stream import stream_diagnosis_events
+from .circuit_breaker import get_llm_status
+from .ollama_pool import get_ollama_pool
+from .analysis import build_case_prompt, report_phase, save_preliminary_assessment
+from .jobs import enqueue_case_analysis, ensure_final_analysis
+from .patient_context import PatientContext
+from .vital_signs import VitalSigns, VitalSignsError
+from .triage import quick_triage
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from .profiling import get_profile_store
 from patients.models import Patient, MedicalRecord
 
-# Import Multi-Agent System
-from .services import (
-    CoordinatorAgent,
-    RetrieverAgent,
-    DiagnosisAgent,
-    TreatmentAgent
-)
+logger = logging.getLogger(__name__)
 
 
 class CaseForm(ModelForm):
@@ -54,8 +62,15 @@ class CaseForm(ModelForm):
         }
     
     def clean_vital_signs(self):
-        """Validate and clean vital signs JSON data."""
+        """
+        Validate vital signs JSON data and normalize it to canonical units.
+        
+        The parsed VitalSigns is kept on the form as `vitals` (so the case's
+        first assessment does not parse it again); the canonical dict is
+        what gets stored on the case.
+        """
         vital_signs = self.cleaned_data.get('vital_signs', '{}')
+        self.vitals = VitalSigns()
         
         # Handle None or empty values
         if vital_signs is None or (isinstance(vital_signs, str) and not vital_signs.strip()):
@@ -72,10 +87,13 @@ class CaseForm(ModelForm):
             if not isinstance(parsed_data, dict):
                 raise forms.ValidationError("Vital signs must be in JSON format")
             
-            return parsed_data
+            self.vitals = VitalSigns.parse(parsed_data)
+            return self.vitals.as_dict()
             
         except json.JSONDecodeError:
             raise forms.ValidationError("Invalid JSON format for vital signs")
+        except VitalSignsError as e:
+            raise forms.ValidationError([f"Invalid vital signs - {problem}" for problem in e.problems])
     
     def clean_symptom_image(self):
         """Convert symptom image to base64."""
@@ -115,6 +133,7 @@ class CaseCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Create New Diagnostic Case'
         context['patients'] = Patient.objects.all().order_by('last_name', 'first_name')
+        context['llm_status'] = get_ollama_pool().snapshot()
         
         # Handle pre-selected patient from search
         selected_patient_id = self.request.GET.get('patient')
@@ -145,190 +164,54 @@ class CaseCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     
     def form_valid(self, form):
         """
-        Process form and generate AI diagnosis using Multi-Agent System.
+        Save the case and queue the Multi-Agent System analysis.
+        
+        The analysis (including the LLM call) runs in a background worker
+        (`python manage.py run_analysis_worker`), so the request returns
+        immediately and the case page shows the job's progress. Meanwhile the
+        page shows a preliminary rule-based report (urgency, red flags),
+        which the worker replaces with the full report.
         """
+        # Save the case with commit=False to get instance with image
+        self.object = form.save(commit=False)
+        
+        # Now set the nurse
+        self.object.nurse = self.request.user
+        
+        # Save to database
+        self.object.save()
+        
+        # Rule-based triage first, so critical flags are visible without waiting for the LLM
         try:
-            # Get patient and symptoms from form
-            patient = form.cleaned_data['patient']
-            symptoms = form.cleaned_data['symptoms']
-            vital_signs = form.cleaned_data.get('vital_signs', {})
-            
-            # Save the case with commit=False to get instance with image
-            self.object = form.save(commit=False)
-            
-            # Now set the nurse
-            self.object.nurse = self.request.user
-            
-            # Save to database
-            self.object.save()
-            
-            # ===== MULTI-AGENT SYSTEM WORKFLOW =====
-            
-            # 1. Initialize all agents
-            coordinator = CoordinatorAgent()
-            retriever = RetrieverAgent()
-            diagnosis_agent = DiagnosisAgent()
-            treatment_agent = TreatmentAgent()
-            
-            # 2. COORDINATOR: Route the case and assess urgency
-            routing_decision = coordinator.route_case(self.object, symptoms, vital_signs)
-            
-            # 3. RETRIEVER: Search medical knowledge base with symptoms
-            # Convert symptoms to list format
-            symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
-            retriever_results = retriever.search_protocols(
-                query=symptoms, 
-                symptoms=symptom_list,
-                top_k=5
-            )
-            
-            # Get cardiac emergency protocol if needed
-            if 'cardiac' in symptoms.lower() or 'chest pain' in symptoms.lower():
-                cardiac_protocol = retriever.retrieve_cardiac_emergency_protocol()
-                retriever_results['cardiac_protocol'] = cardiac_protocol
-            
-            # 4. DIAGNOSIS: Analyze symptoms and generate diagnoses
-            patient_history = {
-                'medical_history': patient.medical_history,
-                'allergies': patient.allergies,
-            }
-            
-            demographics = {
-                'age': getattr(patient, 'age', 'unknown'),
-                'gender': patient.get_gender_display(),
-            }
-            
-            diagnosis_results = diagnosis_agent.analyze_symptoms(
-                symptoms=symptoms,
-                patient_history=patient_history,
-                demographics=demographics,
-                vital_signs=vital_signs,
-                retriever_context=retriever_results
-            )
-            
-            # 5. TREATMENT: Create action plan and recommendations
-            # Always generate treatment recommendations for all urgency levels
-            treatment_results = treatment_agent.create_action_plan(
-                diagnosis=diagnosis_results,
-                urgency_level=routing_decision['urgency_level'],
-                symptoms=symptom_list,
-                red_flags=diagnosis_results.get('red_flags', []),
-                emergency_conditions=diagnosis_results.get('emergency_conditions', [])
-            )
-            
-            # Get medication recommendations with symptoms
-            medication_plan = treatment_agent.recommend_medications(
-                diagnosis=diagnosis_results,
-                symptoms=symptom_list,
-                patient_history=patient_history,
-                allergies=[patient.allergies] if patient.allergies else []
-            )
-            treatment_results['medications'] = medication_plan
-            
-            # Get first aid instructions if critical
-            if routing_decision['urgency_level'] == 'critical':
-                first_aid = treatment_agent.provide_first_aid(
-                    diagnosis_results['primary_diagnosis']
-                )
-                treatment_results['first_aid'] = first_aid
-            
-            # 6. COORDINATOR: Coordinate all agent results
-            coordinated_result = coordinator.coordinate_agents(
-                self.object,
-                retriever_results,
-                diagnosis_results,
-                treatment_results
-            )
-            
-            # ===== UPDATE CASE WITH AGENT RESULTS =====
-            
-            # Compile comprehensive AI diagnosis
-            # Ensure confidence is a percentage (0-100)
-            confidence_percentage = diagnosis_results['confidence_score']
-            if confidence_percentage <= 1.0:
-                confidence_percentage = confidence_percentage * 100
-            
-            comprehensive_diagnosis = {
-                'multi_agent_system': 'HealthFlow DMS v1.0',
-                'timestamp': timezone.now().isoformat(),
-                'routing': routing_decision,
-                'retriever': {
-                    'knowledge_base_results': retriever_results.get('results', []),
-                    'sources': retriever_results.get('sources', []),
-                    'total_documents': retriever_results.get('total_found', 0)
-                },
-                'diagnosis': {
-                    'primary_diagnosis': diagnosis_results['primary_diagnosis'],
-                    'confidence': round(confidence_percentage, 1),  # Ensure percentage format
-                    'explanation': diagnosis_results.get('explanation', ''),  # Plain language explanation
-                    'differential_diagnoses': diagnosis_results['differential_diagnoses'],
-                    'red_flags': diagnosis_results['red_flags'],
-                    'emergency_conditions': diagnosis_results['emergency_conditions'],
-                    'recommended_tests': diagnosis_results['recommended_tests'],
-                },
-                'treatment': treatment_results,
-                'coordination': coordinated_result,
-            }
-            
-            # Save to case
-            self.object.ai_diagnosis = json.dumps(comprehensive_diagnosis, indent=2)
-            self.object.priority = routing_decision['priority']
-            self.object.status = routing_decision['recommended_status']
-            self.object.save()
-            
-            # ===== USER FEEDBACK =====
-            
-            # Display appropriate message based on urgency
-            if routing_decision['urgency_level'] == 'critical':
-                messages.error(
-                    self.request,
-                    f"🚨 CRITICAL CASE! {routing_decision['routing_reason']} - "
-                    f"Emergency Conditions: {', '.join(diagnosis_results.get('emergency_conditions', ['Unknown']))}"
-                )
-            elif routing_decision['urgency_level'] == 'high':
-                messages.warning(
-                    self.request,
-                    f"⚠️ HIGH PRIORITY: {diagnosis_results['primary_diagnosis']} - "
-                    f"Doctor review recommended."
-                )
-            else:
-                messages.success(
-                    self.request,
-                    f"✅ Case created successfully! AI Diagnosis: {diagnosis_results['primary_diagnosis']} "
-                    f"(Confidence: {diagnosis_results['confidence_score']:.1%})"
-                )
-            
-            # Additional red flag warnings
-            if diagnosis_results.get('red_flags'):
-                for flag in diagnosis_results['red_flags'][:3]:  # Show top 3
-                    messages.warning(
-                        self.request,
-                        f"⚠️ Red Flag Detected: {flag['flag'].upper()} - {flag['action']}"
-                    )
-            
-            # Redirect to AI Report instead of case list
-            messages.info(
+            save_preliminary_assessment(self.object, vital_signs=getattr(form, 'vitals', None))
+        except Exception as e:
+            logger.warning(f"Preliminary assessment failed for case #{self.object.pk}: {e}")
+        
+        try:
+            job = enqueue_case_analysis(self.object)
+        except Exception as e:
+            messages.error(
                 self.request,
-                "📊 View the complete AI-generated medical report below."
+                f"Case created but multi-agent analysis could not be queued: {str(e)}. "
+                "Please review manually."
             )
             return redirect('diagnoses:case_detail', pk=self.object.pk)
-            
-        except Exception as e:
-            # Handle errors gracefully
+        
+        if job.status == 'SUCCEEDED':
+            messages.success(self.request, "✅ Case created and analyzed by the AI agents.")
+        elif job.status == 'FAILED':
             messages.error(
                 self.request,
-                f"Case created but multi-agent analysis failed: {str(e)}. "
+                f"Case created but multi-agent analysis failed: {job.last_error}. "
                 "Please review manually."
             )
-            
-            # Save basic case info
-            if not self.object.ai_diagnosis:
-                self.object.ai_diagnosis = json.dumps({
-                    'error': str(e),
-                'timestamp': timezone.now().isoformat(),
-                'manual_review_required': True
-            })
-            return super().form_valid(form)
+        else:
+            messages.info(
+                self.request,
+                "✅ Case created! The AI agents are analyzing it - "
+                "the report will appear on this page when ready."
+            )
+        return redirect('diagnoses:case_detail', pk=self.object.pk)
     
     def _prepare_patient_history(self, patient, vital_signs):
         """
@@ -453,6 +336,7 @@ class CaseDetailView(LoginRequiredMixin, DetailView):
                 ai_diagnosis_data = {'error': 'Invalid AI diagnosis format'}
         
         context['ai_diagnosis_data'] = ai_diagnosis_data
+        context['analysis_job'] = self.object.analysis_jobs.first()
         return context
 
 
@@ -492,29 +376,145 @@ def get_patient_history_ajax(request, patient_id):
 
 def quick_triage_ajax(request):
     """
-    AJAX endpoint for quick symptom triage analysis.
+    AJAX endpoint for quick symptom triage analysis, called as the form is typed.
+    
+    Uses the rule-only fast path (see triage.py): urgency, recommended
+    priority, and the red flags with their position in the text so the form
+    can highlight them. Optional POST vital_signs (JSON) can escalate the
+    urgency. The server time is reported in a Server-Timing header.
+    
+    Pass ai=1 to also get a one-line urgency note from the small triage model
+    (an LLM call, outside the fast path's latency budget).
     """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required'}, status=401)
     
+    start = time.perf_counter()
     symptoms = request.POST.get('symptoms', '').strip()
     if not symptoms:
         return JsonResponse({'error': 'Symptoms required'}, status=400)
     
     try:
-        urgency_level = analyze_case_urgency(symptoms)
-        priority = CaseCreateView()._map_urgency_to_priority(urgency_level)
+        result = quick_triage(symptoms, request.POST.get('vital_signs'))
+        triage_ms = (time.perf_counter() - start) * 1000
+        if request.POST.get('ai') == '1':
+            result['ai_triage'] = diagnostic_engine.quick_ai_triage(symptoms)
         
-        return JsonResponse({
-            'urgency_level': urgency_level,
-            'recommended_priority': priority,
-            'message': f"Recommended priority: {priority} (Urgency: {urgency_level})"
-        })
+        response = JsonResponse(result)
+        response['Server-Timing'] = f'triage;dur={triage_ms:.2f}'
+        return response
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+def diagnosis_stream(request, pk):
+    """
+    Server-Sent Events endpoint streaming the LLM diagnosis for a case as it is generated.
+    """
+    if request.user.role not in ['NURSE', 'DOCTOR']:
+        return JsonResponse({'error': 'Insufficient permissions'}, status=403)
+    
+    case = get_object_or_404(Case.objects.select_related('patient'), pk=pk)
+    patient = case.patient
+    patient_context = PatientContext.for_patient(patient, case.vital_signs)
+    
+    # Same prompt as the analysis job, and a finished stream queues the job
+    # (if the case has no final report) so the answer is saved on the case
+    response = StreamingHttpResponse(
+        stream_diagnosis_events(
+            diagnostic_engine, case.symptoms, patient_context, priority=case.priority,
+            build_prompt=lambda: build_case_prompt(case),
+            on_complete=lambda fields: ensure_final_analysis(case),
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering so tokens arrive immediately
+    return response
+
+
+@login_required
+def analysis_status_api(request, pk):
+    """
+    Status of the latest queued analysis job for a case (polled by the case page).
+    """
+    case = get_object_or_404(Case, pk=pk)
+    job = case.analysis_jobs.first()
+    if job is None:
+        return JsonResponse({'status': None})
+    
+    return JsonResponse({
+        'job_id': job.id,
+        'analysis_phase': report_phase(case),
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'last_error': job.last_error,
+        'run_after': job.run_after.isoformat(),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    })
+
+
+def llm_status_api(request):
+    """
+    AJAX endpoint exposing the LLM circuit breaker state and latency metrics.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    return JsonResponse(get_llm_status())
+
+
+def metrics_view(request):
+    """
+    Stage and view latency histograms in the Prometheus text format.
+
+    Scraped without a login, so only answered for local clients
+    (METRICS_ALLOWED_IPS).
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden('Metrics are only available locally')
+    
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+@staff_member_required
+def profile_list(request):
+    """
+    Admin page listing captured request profiles (see profiling.py), newest
+    first, or slowest first with ?sort=duration; ?view= filters by endpoint.
+    """
+    all_profiles = get_profile_store().list()
+    view = request.GET.get('view', '')
+    profiles = [profile for profile in all_profiles if not view or profile.get('view') == view]
+    sort = request.GET.get('sort', '')
+    if sort == 'duration':
+        profiles.sort(key=lambda profile: profile.get('duration_ms', 0), reverse=True)
+    
+    return render(request, 'diagnoses/profile_list.html', {
+        'title': 'Request profiles',
+        'profiles': profiles,
+        'views': sorted({profile.get('view') for profile in all_profiles} - {None}),
+        'selected_view': view,
+        'sort': sort,
+    })
+
+
+@staff_member_required
+def profile_download(request, profile_id, kind):
+    """Download a captured profile: kind 'pstats' (cProfile) or 'collapsed' (flame graph stacks)."""
+    path = get_profile_store().path(profile_id, kind)
+    if path is None:
+        raise Http404('Profile not found')
+    
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
 class CaseReviewView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     """
     View for doctors to review and approve/modify/reject AI diagnoses.
@@ -776,113 +776,21 @@ def regenerate_diagnosis(request, pk):
         if request.user.role not in ['NURSE', 'DOCTOR']:
             return JsonResponse({'error': 'Insufficient permissions'}, status=403)
         
-        # Get patient data
-        patient = case.patient
-        symptoms = case.symptoms
-        vital_signs = case.vital_signs or {}
-        
-        # ===== MULTI-AGENT SYSTEM WORKFLOW =====
-        
-        # 1. Initialize all agents
-        coordinator = CoordinatorAgent()
-        retriever = RetrieverAgent()
-        diagnosis_agent = DiagnosisAgent()
-        treatment_agent = TreatmentAgent()
-        
-        # 2. COORDINATOR: Route the case and assess urgency
-        routing_decision = coordinator.route_case(case, symptoms, vital_signs)
-        
-        # 3. RETRIEVER: Search medical knowledge base
-        symptom_list = [s.strip() for s in symptoms.split(',') if s.strip()]
-        retriever_results = retriever.search_protocols(
-            query=symptoms,
-            symptoms=symptom_list,
-            top_k=5
-        )
-        
-        # 4. DIAGNOSIS: Analyze symptoms
-        patient_history = {
-            'medical_history': patient.medical_history,
-            'allergies': patient.allergies,
-        }
-        
-        demographics = {
-            'age': patient.get_age(),
-            'gender': patient.get_gender_display(),
-        }
-        
-        diagnosis_results = diagnosis_agent.analyze_symptoms(
-            symptoms=symptoms,
-            patient_history=patient_history,
-            demographics=demographics,
-            vital_signs=vital_signs,
-            retriever_context=retriever_results
-        )
-        
-        # 5. TREATMENT: Create action plan
-        # Always generate treatment recommendations for all urgency levels
-        treatment_results = treatment_agent.create_action_plan(
-            diagnosis=diagnosis_results,
-            urgency_level=routing_decision['urgency_level'],
-            symptoms=symptom_list,
-            red_flags=diagnosis_results.get('red_flags', []),
-            emergency_conditions=diagnosis_results.get('emergency_conditions', [])
-        )
-        
-        medication_plan = treatment_agent.recommend_medications(
-            diagnosis=diagnosis_results,
-            symptoms=symptom_list,
-            patient_history=patient_history,
-            allergies=[patient.allergies] if patient.allergies else []
-        )
-        treatment_results['medications'] = medication_plan
-        
-        # 6. COORDINATOR: Coordinate all results
-        coordinated_result = coordinator.coordinate_agents(
-            case,
-            retriever_results,
-            diagnosis_results,
-            treatment_results
-        )
-        
-        # Compile comprehensive diagnosis
-        # Ensure confidence is a percentage (0-100)
-        confidence_percentage = diagnosis_results['confidence_score']
-        if confidence_percentage <= 1.0:
-            confidence_percentage = confidence_percentage * 100
-        
-        comprehensive_diagnosis = {
-            'multi_agent_system': 'HealthFlow DMS v1.0',
-            'timestamp': timezone.now().isoformat(),
-            'routing': routing_decision,
-            'retriever': {
-                'knowledge_base_results': retriever_results.get('results', []),
-                'sources': retriever_results.get('sources', []),
-                'total_documents': retriever_results.get('total_found', 0)
-            },
-            'diagnosis': {
-                'primary_diagnosis': diagnosis_results['primary_diagnosis'],
-                'confidence': round(confidence_percentage, 1),  # Ensure percentage format
-                'explanation': diagnosis_results.get('explanation', ''),
-                'differential_diagnoses': diagnosis_results['differential_diagnoses'],
-                'red_flags': diagnosis_results['red_flags'],
-                'emergency_conditions': diagnosis_results['emergency_conditions'],
-                'recommended_tests': diagnosis_results['recommended_tests'],
-            },
-            'treatment': treatment_results,
-            'coordination': coordinated_result,
-        }
+        # A doctor can ask for a fresh LLM answer instead of the cached one
+        try:
+            options = json.loads(request.body or '{}')
+        except json.JSONDecodeError:
+            options = {}
+        use_cache = not (options.get('fresh') and request.user.role == 'DOCTOR')
         
-        # Update case
-        case.ai_diagnosis = json.dumps(comprehensive_diagnosis, indent=2)
-        case.priority = routing_decision['priority']
-        case.status = routing_decision['recommended_status']
-        case.save()
+        # Re-analysis goes through the job queue like a new case
+        job = enqueue_case_analysis(case, use_cache=use_cache)
         
         return JsonResponse({
             'success': True,
-            'message': 'Diagnosis regenerated successfully',
-            'diagnosis': diagnosis_results['primary_diagnosis']
+            'message': 'Diagnosis regeneration queued',
+            'job_id': job.id,
+            'status': job.status,
         })
         
     except Exception as e:
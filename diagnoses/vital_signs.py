@@ -0,0 +1,271 @@
+"""
+Typed vital signs, parsed and validated once
+
+Vital signs are entered as a JSON dict on the case form. VitalSigns parses
+that dict once in CaseForm.clean_vital_signs: it accepts common key aliases
+("bp", "hr", "spo2", ...) and values with units ("101 F", "154 lb",
+"120/80 mmHg"), normalizes everything to one unit per sign, and rejects
+implausible readings with a form error. A unitless SpO2 of at most 1 is a
+fraction ("0.95" is 95%). The canonical dict (as_dict()) is what is stored
+on the case; the analysis pipeline rebuilds the object once per case and
+hands the same instance to every agent.
+
+Canonical units: temperature in degrees Celsius, weight in kg, heart and
+respiratory rate per minute, blood pressure in mmHg, oxygen saturation in %.
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class VitalSignsError(ValueError):
+    """Raised by VitalSigns.parse for invalid readings; .problems lists them all."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+
+# Accepted input keys -> canonical field
+KEY_ALIASES = {
+    'temperature': 'temperature', 'temp': 'temperature',
+    'heart_rate': 'heart_rate', 'hr': 'heart_rate', 'pulse': 'heart_rate',
+    'blood_pressure': 'blood_pressure', 'bp': 'blood_pressure',
+    'blood_pressure_systolic': 'systolic', 'systolic': 'systolic',
+    'blood_pressure_diastolic': 'diastolic', 'diastolic': 'diastolic',
+    'respiratory_rate': 'respiratory_rate', 'rr': 'respiratory_rate', 'resp_rate': 'respiratory_rate',
+    'oxygen_saturation': 'oxygen_saturation', 'spo2': 'oxygen_saturation', 'o2_sat': 'oxygen_saturation',
+    'sao2': 'oxygen_saturation',
+    'weight': 'weight', 'wt': 'weight',
+}
+
+# Plausible range per canonical field (outside it the reading is rejected)
+VALID_RANGES = {
+    'temperature': (25.0, 45.0),
+    'heart_rate': (20, 300),
+    'systolic': (40, 300),
+    'diastolic': (20, 200),
+    'respiratory_rate': (4, 80),
+    'oxygen_saturation': (50, 100),
+    'weight': (0.3, 400.0),
+}
+
+# Unit suffixes accepted per field, with the conversion to the canonical unit
+_UNIT_CONVERSIONS = {
+    'temperature': {'': None, 'c': None, '°c': None, 'f': 'f_to_c', '°f': 'f_to_c'},
+    'weight': {'': None, 'kg': None, 'kgs': None, 'lb': 0.45359237, 'lbs': 0.45359237},
+    'heart_rate': {'': None, 'bpm': None, '/min': None},
+    'respiratory_rate': {'': None, 'bpm': None, '/min': None},
+    'oxygen_saturation': {'': None, '%': None},
+    'systolic': {'': None, 'mmhg': None},
+    'diastolic': {'': None, 'mmhg': None},
+}
+
+# Above this, a temperature without a unit is taken to be in Fahrenheit
+_FAHRENHEIT_ABOVE = 50.0
+
+_VALUE_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*([a-z°%/]*)\s*$')
+_BLOOD_PRESSURE_RE = re.compile(r'^\s*(\d{2,3})\s*/\s*(\d{2,3})\s*(mmhg)?\s*$')
+
+_INTEGER_FIELDS = ('heart_rate', 'systolic', 'diastolic', 'respiratory_rate', 'oxygen_saturation')
+
+
+class VitalSigns:
+    """One set of vital sign readings in canonical units (None when not taken)."""
+
+    __slots__ = (
+        'temperature', 'heart_rate', 'systolic', 'diastolic', 'respiratory_rate', 'oxygen_saturation',
+        'weight', 'extra',
+    )
+
+    def __init__(
+        self,
+        temperature: Optional[float] = None,
+        heart_rate: Optional[int] = None,
+        systolic: Optional[int] = None,
+        diastolic: Optional[int] = None,
+        respiratory_rate: Optional[int] = None,
+        oxygen_saturation: Optional[int] = None,
+        weight: Optional[float] = None,
+        extra: Dict[str, Any] = None,
+    ):
+        self.temperature = temperature
+        self.heart_rate = heart_rate
+        self.systolic = systolic
+        self.diastolic = diastolic
+        self.respiratory_rate = respiratory_rate
+        self.oxygen_saturation = oxygen_saturation
+        self.weight = weight
+        self.extra = dict(extra or {})  # Readings without a canonical field, kept as entered
+
+    @classmethod
+    def parse(cls, data: Dict[str, Any], strict: bool = True) -> 'VitalSigns':
+        """
+        Parse a vital signs dict.
+
+        Args:
+            data: Readings keyed by canonical name or alias; values are
+                numbers or strings with an optional unit
+            strict: Raise VitalSignsError listing every invalid reading;
+                otherwise invalid readings are logged and dropped
+
+        Returns:
+            VitalSigns in canonical units
+        """
+        values = {}
+        entered = {}  # Field -> reading as entered, for error messages
+        problems = []
+        extra = {}
+        for key, raw in data.items():
+            field = KEY_ALIASES.get(str(key).strip().lower().replace(' ', '_'))
+            if field is None:
+                extra[key] = raw
+                continue
+            if raw is None or raw == '':
+                continue
+            try:
+                if field == 'blood_pressure':
+                    values['systolic'], values['diastolic'] = _parse_blood_pressure(raw)
+                else:
+                    values[field] = _parse_reading(field, raw)
+                    entered[field] = raw
+            except ValueError as e:
+                problems.append(f"{key}: {e}")
+
+        # Ranges are checked before rounding, on the converted value
+        for field, value in list(values.items()):
+            low, high = VALID_RANGES[field]
+            if not low <= value <= high:
+                reading = entered.get(field, value)
+                if isinstance(reading, float):
+                    reading = f"{reading:g}"
+                problems.append(f"{field.replace('_', ' ')} {reading} is outside {low:g}-{high:g}")
+                del values[field]
+            elif field in _INTEGER_FIELDS:
+                values[field] = int(round(value))
+            else:
+                # Two decimals, so a Fahrenheit reading converts back exactly (see temperature_f)
+                values[field] = round(value, 2)
+        if ('systolic' in values) != ('diastolic' in values):
+            problems.append('blood pressure needs both systolic and diastolic values')
+            values.pop('systolic', None)
+            values.pop('diastolic', None)
+        elif 'systolic' in values and values['diastolic'] >= values['systolic']:
+            problems.append('diastolic blood pressure must be lower than systolic')
+            del values['systolic'], values['diastolic']
+
+        if problems:
+            if strict:
+                raise VitalSignsError(problems)
+            logger.warning(f"Ignoring invalid vital signs: {'; '.join(problems)}")
+        return cls(extra=extra, **values)
+
+    @classmethod
+    def coerce(cls, value: Any) -> 'VitalSigns':
+        """
+        VitalSigns from whatever a caller holds: an instance (returned as-is),
+        a dict or JSON string (parsed leniently), or nothing.
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            try:
+                value = json.loads(value) if value.strip() else {}
+            except ValueError:
+                logger.warning("Ignoring vital signs that are not a JSON object")
+                return cls()
+        if not isinstance(value, dict):
+            return cls()
+        return cls.parse(value, strict=False)
+
+    @property
+    def blood_pressure(self) -> Optional[str]:
+        """Blood pressure as "systolic/diastolic"."""
+        if self.systolic is None:
+            return None
+        return f"{self.systolic}/{self.diastolic}"
+
+    @property
+    def temperature_f(self) -> Optional[float]:
+        """Temperature in degrees Fahrenheit (the unit the urgency thresholds are written in)."""
+        if self.temperature is None:
+            return None
+        return round(self.temperature * 9 / 5 + 32, 1)
+
+    def __bool__(self) -> bool:
+        return bool(self.as_dict())
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-serializable readings in canonical units, as stored on the case."""
+        readings = {
+            'temperature': self.temperature,
+            'heart_rate': self.heart_rate,
+            'blood_pressure': self.blood_pressure,
+            'respiratory_rate': self.respiratory_rate,
+            'oxygen_saturation': self.oxygen_saturation,
+            'weight': self.weight,
+        }
+        readings = {name: value for name, value in readings.items() if value is not None}
+        readings.update(self.extra)
+        return readings
+
+    def describe(self) -> str:
+        """One-line summary with units, e.g. for prompts."""
+        parts = []
+        if self.temperature is not None:
+            parts.append(f"temperature: {self.temperature:g} °C")
+        if self.heart_rate is not None:
+            parts.append(f"heart rate: {self.heart_rate} bpm")
+        if self.systolic is not None:
+            parts.append(f"blood pressure: {self.blood_pressure} mmHg")
+        if self.respiratory_rate is not None:
+            parts.append(f"respiratory rate: {self.respiratory_rate}/min")
+        if self.oxygen_saturation is not None:
+            parts.append(f"oxygen saturation: {self.oxygen_saturation}%")
+        if self.weight is not None:
+            parts.append(f"weight: {self.weight:g} kg")
+        parts.extend(f"{name}: {value}" for name, value in self.extra.items())
+        return ', '.join(parts)
+
+    def __repr__(self) -> str:
+        return f"VitalSigns({self.describe()})"
+
+
+def _parse_reading(field: str, raw: Any) -> float:
+    """One numeric reading converted to the field's canonical unit (not yet rounded)."""
+    if isinstance(raw, bool):
+        raise ValueError(f"expected a number, got {raw!r}")
+    if isinstance(raw, (int, float)):
+        value, unit = float(raw), ''
+    else:
+        match = _VALUE_RE.match(str(raw).lower())
+        if not match:
+            raise ValueError(f"expected a number, got {raw!r}")
+        value, unit = float(match.group(1)), match.group(2)
+
+    conversions = _UNIT_CONVERSIONS[field]
+    if unit not in conversions:
+        raise ValueError(f"unknown unit {unit!r}")
+    conversion = conversions[unit]
+    if field == 'temperature' and unit == '' and value > _FAHRENHEIT_ABOVE:
+        conversion = 'f_to_c'
+    if field == 'oxygen_saturation' and unit == '' and 0 < value <= 1:
+        # Pulse oximeter exports give SpO2 as a fraction (0.95)
+        conversion = 100
+    if conversion == 'f_to_c':
+        value = (value - 32) * 5 / 9
+    elif conversion is not None:
+        value *= conversion
+    return value
+
+
+def _parse_blood_pressure(raw: Any) -> Tuple[int, int]:
+    """"120/80" (optionally with mmHg) -> (systolic, diastolic)."""
+    match = _BLOOD_PRESSURE_RE.match(str(raw).lower())
+    if not match:
+        raise ValueError(f"expected systolic/diastolic such as 120/80, got {raw!r}")
+    return int(match.group(1)), int(match.group(2))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import KnowledgeDocument
+from .models import KnowledgeDocument, EssentialMedicine
 
 
 @admin.register(KnowledgeDocument)
@@ -250,3 +250,13 @@ KnowledgeDocumentAdmin.actions = [
 
 # Import required modules for custom filters
 from django.db import models
+
+
+@admin.register(EssentialMedicine)
+class EssentialMedicineAdmin(admin.ModelAdmin):
+    """Admin configuration for EssentialMedicine model."""
+    
+    list_display = ['name', 'section_code', 'section', 'is_complementary']
+    list_filter = ['is_complementary', 'section_code']
+    search_fields = ['name', 'normalized_name', 'section', 'indications']
+    ordering = ['section_code', 'id']
@@ -0,0 +1,542 @@
+"""
+WHO Essential Medicines List (EML) utilities
+
+Parses the WHO Model List of Essential Medicines into structured rows
+(name, section, formulation, indications) and serves them from in-memory
+hash and prefix indexes so medication lookups do not need a vector search.
+"""
+
+import bisect
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EML_FILENAME = 'WHO-MHP-HPS-EML-2023.02-eng.pdf'
+EML_SOURCE = 'WHO Essential Medicines List 2023'
+
+# Dosage-form words that open a formulation entry in the EML tables
+FORMULATION_KEYWORDS = [
+    'Tablet', 'Capsule', 'Injection', 'Oral liquid', 'Oral powder', 'Oily injection',
+    'Powder for', 'Solution', 'Concentrate', 'Cream', 'Ointment', 'Eye drops',
+    'Vaginal', 'Lozenge', 'Pessary', 'Infusion', 'Inhalation', 'Suppository',
+    'Solid oral dosage form', 'Granules', 'Gel', 'Lotion', 'Patch', 'Implant',
+    'Spray', 'Drops', 'Rectal', 'Sachet', 'Topical', 'Shampoo', 'Mouthrinse',
+    'Mouthwash', 'Chewing gum', 'Transdermal', 'Intrauterine', 'Suspension',
+    'Nasal spray', 'Ear drops', 'Liquid', 'Paste', 'Varnish', 'Syrup',
+]
+
+# Map of diagnosis keywords to the EML section codes that treat them.
+# Keys are matched as whole words (plurals included) of the diagnosis name;
+# a trailing '*' matches any word starting with the key. Longer keys are
+# matched first and consume their words, so an entry without sections (such
+# as 'chest pain') stops a shorter key ('pain') from matching inside it.
+CONDITION_SECTIONS = {
+    'malaria': ['6.5.3.1'],
+    'tuberculosis': ['6.2.5'],
+    'hiv': ['6.4.2.5', '6.4.2.1'],
+    'meningitis': ['6.2.2', '6.2.1'],
+    'pneumonia': ['6.2.1'],
+    'bronchitis': ['6.2.1'],
+    'typhoid': ['6.2.1', '6.2.2'],
+    'urinary tract infection': ['6.2.1'],
+    'bacterial': ['6.2.1'],
+    'chickenpox': ['6.4.1'],
+    'measles': ['27'],
+    'asthma': ['25.1'],
+    'ketoacidosis': ['18.5.1', '26.2'],
+    'diabetes': ['18.5.2', '18.5.1'],
+    'hypertensi*': ['12.3'],
+    'coronary': ['12.5.1', '12.1'],
+    'stroke': ['12.5.1'],
+    'diarrh*': ['17.5.1', '17.5.2'],
+    'gastroenteritis': ['17.5.1', '17.5.2'],
+    'dehydration': ['17.5.1', '26.1'],
+    'ulcer': ['17.1'],
+    'seizure': ['5.1'],
+    'epilep*': ['5.1'],
+    'migraine': ['7.1', '2.1'],
+    'anaemia': ['10.1'],
+    'anemia': ['10.1'],
+    'malnutrition': ['9', '27'],
+    'anaphylaxis': ['3'],
+    'allergic': ['3'],
+    'febrile': ['2.1'],
+    'fever': ['2.1'],
+    'respiratory infection': ['2.1'],
+    'chest pain': [],  # cardiac until shown otherwise, not an analgesic indication
+    'pain': ['2.1'],
+    'headache': ['2.1'],
+}
+
+# Allergy terms that cover a whole drug class rather than a single name
+ALLERGY_CLASS_MEMBERS = {
+    'penicillin': [
+        'amoxicillin', 'ampicillin', 'benzylpenicillin', 'benzathine benzylpenicillin',
+        'procaine benzylpenicillin', 'phenoxymethylpenicillin', 'cloxacillin', 'piperacillin',
+    ],
+    'sulfa': ['sulfamethoxazole', 'sulfadiazine', 'sulfadoxine', 'sulfasalazine'],
+    'sulfonamide': ['sulfamethoxazole', 'sulfadiazine', 'sulfadoxine', 'sulfasalazine'],
+    'nsaid': ['ibuprofen', 'acetylsalicylic acid'],
+    'aspirin': ['acetylsalicylic acid'],
+}
+
+# Diagnosis words too generic to match against antibiotic indication lists
+_GENERIC_CONDITION_WORDS = {
+    'acute', 'chronic', 'severe', 'mild', 'upper', 'lower', 'related', 'illness',
+    'disease', 'disorder', 'syndrome', 'infection', 'infections', 'fever', 'febrile',
+    'pain',
+}
+
+
+def _condition_pattern(keyword: str):
+    if keyword.endswith('*'):
+        return re.compile(r'\b' + re.escape(keyword[:-1]) + r'[a-z]*')
+    return re.compile(r'\b' + re.escape(keyword) + r's?\b')
+
+
+# (keyword, pattern) pairs, longest keyword first
+_CONDITION_PATTERNS = [
+    (keyword, _condition_pattern(keyword))
+    for keyword in sorted(CONDITION_SECTIONS, key=len, reverse=True)
+]
+
+_SECTION_RE = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+([A-Z][^:]*)$')
+_FORMULATION_RE = re.compile(
+    r'(?:^|\s)(' + '|'.join(re.escape(k) for k in FORMULATION_KEYWORDS) + r')\b'
+)
+_PAGE_HEADER_RE = re.compile(r'^.*?WHO Model List of Essential Medicines.*?(?:page\s+\d+|$)')
+_MARKER_RE = re.compile(r'\*+|\[c\]|†|\s[ab]$')
+_ALTERNATIVE_MARKERS = '−–-\uf06f'
+
+
+def normalize_medicine_name(name: str) -> str:
+    """
+    Normalize a medicine name for index keys
+
+    Lower-cases, drops footnote markers and parenthesised salts/aliases, and
+    repairs the "anti -infective" style spacing produced by PDF extraction.
+    """
+    name = _MARKER_RE.sub('', name.lower())
+    name = re.sub(r'\([^)]*\)', '', name)
+    name = re.sub(r'\s*-\s*', '-', name)
+    return re.sub(r'\s+', ' ', name).strip(' ,.')
+
+
+def _clean_text(text: str) -> str:
+    text = re.sub(r'\s*-\s+', '-', text.replace('\uf06f', ''))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _split_name(prefix: str) -> Optional[str]:
+    """Return a cleaned medicine name if the prefix looks like one."""
+    prefix = prefix.strip().lstrip(_ALTERNATIVE_MARKERS).strip()
+    if not prefix or not prefix[0].islower() or prefix.endswith('.'):
+        return None
+    name = _MARKER_RE.sub('', prefix).strip()
+    if not name or len(name.split()) > 6 or ':' in name:
+        return None
+    if name.count('(') != name.count(')') or re.match(r'^[ab] [^a-z]', name):
+        # Fragment of a wrapped note ("inhibitors, plain) (for lisinopril)")
+        return None
+    return _clean_text(name)
+
+
+def _page_lines(text: str) -> List[str]:
+    """Extracted EML lines with page headers, blanks and index leaders removed."""
+    lines = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if 'WHO Model List of Essential Medicines' in line:
+            line = _PAGE_HEADER_RE.sub('', line).strip()
+        if line and '....' not in line:
+            lines.append(line)
+    return lines
+
+
+def parse_essential_medicines(text: str) -> List[Dict[str, str]]:
+    """
+    Parse extracted EML text into structured medicine rows
+
+    The list is laid out as a two-column table: the medicine name (with
+    footnote markers and therapeutic alternatives) on the left and one or
+    more dosage forms on the right. Antibiotics additionally carry
+    FIRST CHOICE / SECOND CHOICE indication lists.
+
+    Args:
+        text: Full text extracted from the WHO Model List PDF
+
+    Returns:
+        List of dicts with name, normalized_name, section_code, section,
+        formulation, indications and is_complementary keys
+    """
+    lines = _page_lines(text)
+    medicines = []
+    current = None
+    section_code = ''
+    section_title = ''
+    complementary = False
+    mode = None  # None, 'footnote', 'alternatives' or 'indications'
+    pending_name = ''
+    started = False
+
+    def start_medicine(name, alternative_to=None):
+        entry = {
+            'name': name,
+            'normalized_name': normalize_medicine_name(name),
+            'section_code': section_code,
+            'section': section_title,
+            'formulations': [],
+            'first_choice': [],
+            'second_choice': [],
+            'choice': 'first_choice',
+            'notes': [f"Therapeutic alternative to {alternative_to}"] if alternative_to else [],
+            'is_complementary': complementary,
+        }
+        medicines.append(entry)
+        return entry
+
+    def next_starts_formulation(index):
+        return index + 1 < len(lines) and _FORMULATION_RE.match(lines[index + 1]) is not None
+
+    for index, line in enumerate(lines):
+        section_match = _SECTION_RE.match(line)
+        if section_match:
+            if section_match.group(1) == '1':
+                started = True
+            if started:
+                section_code = section_match.group(1)
+                section_title = _clean_text(section_match.group(2).replace('[c]', ''))
+                complementary = False
+                current = None
+                mode = None
+            continue
+        if not started:
+            continue
+        if line.startswith('Table 1.1'):
+            break
+        if line.lower().startswith('complementary list'):
+            complementary = True
+            current = None
+            mode = None
+            continue
+        if line.startswith('Therapeutic alternatives'):
+            mode = 'alternatives'
+            continue
+
+        # Antibiotic indication lists
+        if 'FIRST CHOICE' in line or 'SECOND CHOICE' in line or (
+            mode == 'indications' and line[0] in _ALTERNATIVE_MARKERS
+        ):
+            if current is None:
+                continue
+            mode = 'indications'
+            for part in re.split(r'(FIRST CHOICE|SECOND CHOICE)', line):
+                if part == 'FIRST CHOICE':
+                    current['choice'] = 'first_choice'
+                elif part == 'SECOND CHOICE':
+                    current['choice'] = 'second_choice'
+                else:
+                    item = _clean_text(part.strip().lstrip(_ALTERNATIVE_MARKERS).replace('[c]', ''))
+                    if item:
+                        current[current['choice']].append(item)
+            continue
+        if mode == 'indications' and current is not None and not (
+            _FORMULATION_RE.search(line) or next_starts_formulation(index)
+        ):
+            # Wrapped indication ("(mild to moderate)", "malnutrition [c]")
+            choices = current[current['choice']]
+            wrapped = _clean_text(line.replace('[c]', ''))
+            if choices:
+                choices[-1] += ' ' + wrapped
+            else:
+                choices.append(wrapped)
+            continue
+
+        if line.startswith('*') or re.match(r'^[ab] [A-Z]', line):
+            mode = 'footnote'
+            if current is not None:
+                current['notes'].append(line.lstrip('*ab ').strip())
+            continue
+
+        is_alternative = line[0] in _ALTERNATIVE_MARKERS
+        form_match = _FORMULATION_RE.search(line)
+        prefix = line[:form_match.start()] if form_match else line
+        name = _split_name(prefix) if prefix.strip() else None
+        if mode == 'footnote' and prefix.strip().endswith('.'):
+            name = None
+
+        if name and pending_name:
+            name = f"{pending_name} {name}"
+            pending_name = ''
+        if name and name.endswith('+'):
+            # Combination product wrapped over two lines
+            pending_name = name
+            continue
+
+        if form_match:
+            formulation = _clean_text(line[form_match.start():])
+            if name:
+                if is_alternative and current is not None:
+                    start_medicine(name, alternative_to=current['name'])
+                else:
+                    current = start_medicine(name)
+                    mode = None
+            elif current is not None and mode == 'footnote' and prefix.strip() and current['notes']:
+                current['notes'][-1] += ' ' + prefix.strip()
+            if current is not None:
+                current['formulations'].append(formulation)
+            if mode == 'footnote':
+                mode = None
+            continue
+
+        if mode == 'footnote':
+            if current is not None and current['notes']:
+                current['notes'][-1] += ' ' + line
+            continue
+
+        if name:
+            if is_alternative and current is not None:
+                start_medicine(name, alternative_to=current['name'])
+            else:
+                current = start_medicine(name)
+                mode = None
+        elif current is not None and current['formulations']:
+            # Wrapped formulation line ("bag.", "(any type).")
+            current['formulations'][-1] += ' ' + _clean_text(line)
+
+    rows = []
+    for entry in medicines:
+        if not entry['normalized_name']:
+            continue
+        indications = [entry['section']]
+        if entry['first_choice']:
+            indications.append('First choice: ' + '; '.join(entry['first_choice']))
+        if entry['second_choice']:
+            indications.append('Second choice: ' + '; '.join(entry['second_choice']))
+        indications.extend(_clean_text(note) for note in entry['notes'])
+        rows.append({
+            'name': entry['name'],
+            'normalized_name': entry['normalized_name'],
+            'section_code': entry['section_code'],
+            'section': entry['section'],
+            'formulation': '; '.join(entry['formulations']),
+            'indications': '. '.join(i.rstrip('. ') for i in indications if i),
+            'is_complementary': entry['is_complementary'],
+        })
+    return rows
+
+
+def load_essential_medicines(document=None, text: str = None, file_path: str = None) -> int:
+    """
+    Parse the EML and (re)build the EssentialMedicine table
+
+    Args:
+        document: Optional KnowledgeDocument the rows were extracted from
+        text: Already-extracted EML text (preferred; avoids re-reading the PDF)
+        file_path: Path to the EML PDF, used when text is not given
+
+    Returns:
+        Number of medicine rows stored
+    """
+    from django.db import transaction
+    from .models import EssentialMedicine
+
+    if text is None:
+        from .rag_utils import extract_text_from_file
+        text = extract_text_from_file(file_path) if file_path else None
+    if not text:
+        logger.warning("No EML text available; essential medicines table not rebuilt")
+        return 0
+
+    rows = parse_essential_medicines(text)
+    with transaction.atomic():
+        EssentialMedicine.objects.all().delete()
+        EssentialMedicine.objects.bulk_create(
+            EssentialMedicine(source_document=document, **row) for row in rows
+        )
+
+    reset_essential_medicines_index()
+    logger.info(f"Loaded {len(rows)} essential medicine entries")
+    return len(rows)
+
+
+class EssentialMedicinesIndex:
+    """
+    In-memory hash and prefix indexes over EssentialMedicine rows.
+
+    - by_name: normalized name (and parenthesised alias) -> rows
+    - by_section: section code -> rows, in list order
+    - sorted names for prefix search with bisect
+    """
+
+    def __init__(self, rows: Iterable[Dict]):
+        self.by_name: Dict[str, List[Dict]] = {}
+        self.by_section: Dict[str, List[Dict]] = {}
+        self.by_indication: Dict[str, List[Tuple[int, Dict]]] = {}
+
+        for row in rows:
+            self.by_name.setdefault(row['normalized_name'], []).append(row)
+            for alias in re.findall(r'\(([^)]*)\)', row['name'].lower()):
+                alias = normalize_medicine_name(alias)
+                if alias and alias != row['normalized_name']:
+                    self.by_name.setdefault(alias, []).append(row)
+            self.by_section.setdefault(row['section_code'], []).append(row)
+            for rank, words in enumerate(self._choice_words(row['indications'])):
+                for word in words:
+                    self.by_indication.setdefault(word, []).append((rank, row))
+
+        for entries in self.by_indication.values():
+            entries.sort(key=lambda entry: entry[0])
+        self._sorted_names = sorted(self.by_name)
+
+    @staticmethod
+    def _choice_words(indications: str) -> Tuple[set, set]:
+        """Words from the first-choice and second-choice indication lists."""
+        first = second = ''
+        match = re.search(r'First choice: ([^.]*)', indications)
+        if match:
+            first = match.group(1)
+        match = re.search(r'Second choice: ([^.]*)', indications)
+        if match:
+            second = match.group(1)
+        return (
+            set(re.findall(r'[a-z]{4,}', first.lower())),
+            set(re.findall(r'[a-z]{4,}', second.lower())),
+        )
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def get(self, name: str) -> List[Dict]:
+        """Exact (normalized) name lookup."""
+        return self.by_name.get(normalize_medicine_name(name), [])
+
+    def names_with_prefix(self, prefix: str) -> List[str]:
+        """All indexed names starting with prefix."""
+        prefix = normalize_medicine_name(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        end = bisect.bisect_left(self._sorted_names, prefix + '\uffff')
+        return self._sorted_names[start:end]
+
+    def sections_for_condition(self, diagnosis: str) -> List[str]:
+        """EML section codes relevant to a diagnosis name (see CONDITION_SECTIONS)."""
+        # Condition keys ("hiv_related_illness") match like the spelled-out name
+        text = re.sub(r'[^a-z]+', ' ', diagnosis.lower())
+        matched = set()
+        for keyword, pattern in _CONDITION_PATTERNS:
+            for match in pattern.finditer(text):
+                matched.add(keyword)
+                # Blank the match out so shorter keys cannot match inside it
+                text = text[:match.start()] + ' ' * (match.end() - match.start()) + text[match.end():]
+        codes = []
+        for keyword, sections in CONDITION_SECTIONS.items():
+            if keyword in matched:
+                codes.extend(code for code in sections if code not in codes)
+        return codes
+
+    def for_condition(self, diagnosis: str, limit: int = 6) -> List[Dict]:
+        """
+        Core-list medicines for a diagnosis, one row per medicine.
+
+        Antibiotics listed as first/second choice for the condition come
+        first, followed by the medicines of the mapped EML sections.
+        """
+        candidates = []
+        words = set(re.findall(r'[a-z]{4,}', diagnosis.lower())) - _GENERIC_CONDITION_WORDS
+        indication_hits = []
+        for word in words:
+            indication_hits.extend(self.by_indication.get(word, []))
+        indication_hits.sort(key=lambda entry: entry[0])
+        candidates.extend(row for _, row in indication_hits)
+        for code in self.sections_for_condition(diagnosis):
+            candidates.extend(self.by_section.get(code, []))
+
+        results = []
+        seen = set()
+        for row in candidates:
+            if row['is_complementary'] or row['normalized_name'] in seen:
+                continue
+            seen.add(row['normalized_name'])
+            results.append(row)
+            if len(results) >= limit:
+                break
+        return results
+
+    def blocked_by_allergies(self, allergies: Iterable[str]) -> set:
+        """
+        Normalized names excluded by a list of allergy terms.
+
+        Each term blocks its exact name, names it prefixes, and the members
+        of its drug class (so "penicillin" also blocks amoxicillin).
+        """
+        blocked = set()
+        for allergy in allergies:
+            term = normalize_medicine_name(allergy)
+            if not term:
+                continue
+            for name in [term] + ALLERGY_CLASS_MEMBERS.get(term.rstrip('s'), []):
+                blocked.add(name)
+                blocked.update(self.names_with_prefix(name))
+        return blocked
+
+    def is_blocked(self, medicine_name: str, blocked: set) -> Optional[bool]:
+        """
+        Whether a medicine is excluded by a blocked-name set.
+
+        Returns None when the medicine is not in the index, so callers can
+        fall back to free-text matching.
+        """
+        normalized = normalize_medicine_name(medicine_name)
+        components = [c.strip() for c in normalized.split('+')]
+        if normalized in blocked or any(c in blocked for c in components):
+            return True
+        if normalized in self.by_name or any(c in self.by_name for c in components):
+            return False
+        return None
+
+
+# Lazy-loaded index, mirrors the vector_store pattern in rag_utils
+essential_medicines_index = None
+
+
+def get_essential_medicines_index() -> Optional[EssentialMedicinesIndex]:
+    """
+    Get or build the essential medicines index
+
+    An empty table gives an empty (falsy) index, which is cached like any
+    other until load_essential_medicines() resets it. None is returned only
+    when the table cannot be read.
+    """
+    global essential_medicines_index
+    if essential_medicines_index is None:
+        try:
+            from .models import EssentialMedicine
+            rows = list(EssentialMedicine.objects.values(
+                'name', 'normalized_name', 'section_code', 'section',
+                'formulation', 'indications', 'is_complementary'
+            ))
+        except Exception as e:
+            logger.error(f"Error loading essential medicines: {e}")
+            return None
+        essential_medicines_index = EssentialMedicinesIndex(rows)
+    return essential_medicines_index
+
+
+def reset_essential_medicines_index():
+    """Drop the cached index so the next lookup reloads from the database."""
+    global essential_medicines_index
+    essential_medicines_index = None
+
+
+def split_allergies(allergies: Iterable[str]) -> List[str]:
+    """Split free-text allergy entries ("Penicillin, sulfa") into terms."""
+    terms = []
+    for allergy in allergies or []:
+        if not allergy:
+            continue
+        terms.extend(t.strip() for t in re.split(r'[,;/\n]', str(allergy)) if t.strip())
+    return terms
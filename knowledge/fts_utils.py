@@ -0,0 +1,198 @@
+"""
+Full-text search over KnowledgeDocument using SQLite FTS5.
+
+The FTS table is an external-content index over knowledge_knowledgedocument,
+installed and kept in sync by triggers created in migration 0004. SQLite drops
+those triggers whenever a migration rebuilds the document table, so they are
+re-created after every migrate (see KnowledgeConfig.ready). On other database
+backends (or when FTS5 is unavailable) callers fall back to icontains filtering.
+"""
+
+import logging
+import re
+from typing import Dict, List, Tuple
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'knowledge_knowledgedocument_fts'
+DOCUMENT_TABLE = 'knowledge_knowledgedocument'
+
+# Column order in the FTS table; snippet() addresses columns by position
+FTS_COLUMNS = ['title', 'content', 'source', 'author']
+
+CREATE_FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content, source, author,
+        content='{DOCUMENT_TABLE}', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content, source, author)
+        VALUES (new.id, new.title, new.content, new.source, new.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content, source, author)
+        VALUES ('delete', old.id, old.title, old.content, old.source, old.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF title, content, source, author ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content, source, author)
+        VALUES ('delete', old.id, old.title, old.content, old.source, old.author);
+        INSERT INTO {FTS_TABLE}(rowid, title, content, source, author)
+        VALUES (new.id, new.title, new.content, new.source, new.author);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_FTS_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+FTS_TRIGGERS = [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+
+
+def ensure_fts_index(using='default', **kwargs):
+    """
+    Re-install the FTS table and triggers if a table rebuild removed them.
+
+    Connected to post_migrate; the index is rebuilt from the document table
+    whenever a trigger had to be re-created.
+    """
+    from django.db import connections
+
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [DOCUMENT_TABLE]
+        )
+        if not cursor.fetchone():
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        if all(trigger in existing for trigger in FTS_TRIGGERS):
+            return
+        logger.info("Re-installing knowledge document full-text index")
+        for statement in CREATE_FTS_SQL:
+            cursor.execute(statement)
+
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(search_query: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Each word is quoted (so FTS operators in user input are literal) and
+    prefix-matched, and all words must appear: "chest pai" -> "chest"* "pai"*
+    """
+    tokens = _TOKEN_RE.findall(search_query or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+# Cached once the table has been seen, so searches skip the introspection query
+_fts_table_exists = False
+
+
+def fts_available() -> bool:
+    """Check whether the FTS table exists on the current database."""
+    global _fts_table_exists
+    if connection.vendor != 'sqlite':
+        return False
+    if _fts_table_exists:
+        return True
+    try:
+        _fts_table_exists = FTS_TABLE in connection.introspection.table_names()
+    except Exception as e:
+        logger.error(f"Error checking FTS table: {e}")
+    return _fts_table_exists
+
+
+def search_document_ids(search_query: str, document_type: str = None) -> List[int]:
+    """
+    Ranked ids of documents matching a query (best match first).
+
+    Only ids are read, so the full document text is never loaded.
+    """
+    match = build_match_query(search_query)
+    if not match:
+        return []
+
+    sql = (
+        f"SELECT d.id FROM {FTS_TABLE} "
+        f"JOIN {DOCUMENT_TABLE} d ON d.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [match]
+    if document_type:
+        sql += " AND d.document_type = %s"
+        params.append(document_type)
+    # Title hits weigh more than body hits
+    sql += f" ORDER BY bm25({FTS_TABLE}, 10.0, 1.0, 2.0, 2.0)"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_snippets(search_query: str, document_ids: List[int], tokens: int = 32) -> Dict[int, str]:
+    """
+    Highlighted content snippets for a page of matching documents.
+
+    Snippets use <mark> tags around matched terms; the surrounding text is
+    HTML-escaped by the caller before the tags are applied.
+    """
+    match = build_match_query(search_query)
+    if not match or not document_ids:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(document_ids))
+    sql = (
+        f"SELECT rowid, snippet({FTS_TABLE}, 1, char(2), char(3), '…', %s) "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tokens, match] + list(document_ids))
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def highlight_snippet(snippet: str) -> str:
+    """Escape a raw FTS snippet and wrap matched terms in <mark> tags."""
+    escaped = escape(snippet or '')
+    return mark_safe(escaped.replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+
+def search_documents(search_query: str, document_type: str = None) -> Tuple[List[int], bool]:
+    """
+    Search documents with FTS5 when available.
+
+    Returns:
+        Tuple of (ranked document ids, whether FTS was used). When FTS was
+        not used the id list is empty and callers should fall back to
+        icontains filtering.
+    """
+    if not fts_available():
+        return [], False
+    try:
+        return search_document_ids(search_query, document_type), True
+    except Exception as e:
+        logger.error(f"Full-text search failed, falling back to icontains: {e}")
+        return [], False
@@ -4,8 +4,9 @@ Management command to load sample medical documents into the Knowledge Base
 import os
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from knowledge.models import KnowledgeDocument
-from knowledge.rag_utils import extract_text_from_file
+from knowledge.models import KnowledgeDocument, EssentialMedicine
+from knowledge.rag_utils import extract_pages_from_file, join_pages
+from knowledge.eml_utils import EML_FILENAME, load_essential_medicines
 from datetime import date
 
 User = get_user_model()
@@ -130,25 +131,31 @@ class Command(BaseCommand):
             metadata = document_metadata.get(pdf_file, {})
             title = metadata.get('title', pdf_file.replace('.pdf', '').replace('_', ' '))
             
-            if KnowledgeDocument.objects.filter(title=title).exists():
+            existing_doc = KnowledgeDocument.objects.filter(title=title).first()
+            if existing_doc:
                 self.stdout.write(self.style.WARNING(f'  ⏭️  Skipped: {title} (already exists)'))
                 skipped_count += 1
+                if pdf_file == EML_FILENAME and not EssentialMedicine.objects.exists():
+                    self._load_essential_medicines(existing_doc, file_path=file_path)
                 continue
             
             try:
                 self.stdout.write(f'  📄 Processing: {pdf_file}...')
                 
-                # Extract text from PDF
-                content = extract_text_from_file(file_path)
+                # Extract text from PDF page by page so page boundaries can be recorded
+                pages = extract_pages_from_file(file_path) or []
+                content, page_offsets = join_pages(pages)
                 
                 if not content or len(content.strip()) < 100:
                     self.stdout.write(self.style.WARNING(f'     ⚠️  Warning: Little/no text extracted from {pdf_file}'))
                     content = f"Medical document: {title}\n\nNote: Text extraction may be limited for this document."
+                    page_offsets = []
                 
                 # Create document
                 doc = KnowledgeDocument.objects.create(
                     title=title,
                     content=content[:50000],  # Limit to 50k chars for database
+                    page_offsets=page_offsets,
                     document_type=metadata.get('document_type', 'REFERENCE'),
                     source=metadata.get('source', 'Unknown'),
                     author=metadata.get('author', 'Unknown'),
@@ -159,6 +166,10 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS(f'     ✅ Loaded: {title}'))
                 self.stdout.write(f'        Words: {len(content.split())} | Chars: {len(content)}')
                 
+                # Build the structured EML table from the full (untruncated) text
+                if pdf_file == EML_FILENAME:
+                    self._load_essential_medicines(doc, text=content)
+                
             except Exception as e:
                 error_count += 1
                 self.stdout.write(self.style.ERROR(f'     ❌ Error loading {pdf_file}: {str(e)}'))
@@ -180,3 +191,11 @@ class Command(BaseCommand):
         self.stdout.write('  1. View documents at: http://127.0.0.1:8001/knowledge/documents/')
         self.stdout.write('  2. To enable AI search, run: python manage.py process_faiss_index')
         self.stdout.write('     (This will index documents into the FAISS vector database)')
+
+    def _load_essential_medicines(self, document, text=None, file_path=None):
+        """Parse the WHO Essential Medicines List into the EssentialMedicine table."""
+        try:
+            count = load_essential_medicines(document=document, text=text, file_path=file_path)
+            self.stdout.write(self.style.SUCCESS(f'        💊 Indexed {count} essential medicine entries'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'        ❌ Error indexing essential medicines: {str(e)}'))
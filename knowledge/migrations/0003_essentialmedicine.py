@@ -0,0 +1,96 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EssentialMedicine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Medicine name as listed in the EML", max_length=255
+                    ),
+                ),
+                (
+                    "normalized_name",
+                    models.CharField(
+                        db_index=True,
+                        help_text="Lower-cased name without salts or footnote markers, used for lookups",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "section_code",
+                    models.CharField(
+                        help_text="EML section number (e.g. 6.2.1)", max_length=20
+                    ),
+                ),
+                (
+                    "section",
+                    models.CharField(
+                        help_text="EML section title (e.g. Access group antibiotics)",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "formulation",
+                    models.TextField(
+                        blank=True, help_text="Dosage forms and strengths"
+                    ),
+                ),
+                (
+                    "indications",
+                    models.TextField(
+                        blank=True,
+                        help_text="Section, first/second choice indications and footnotes",
+                    ),
+                ),
+                (
+                    "is_complementary",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Whether the entry is on the complementary list",
+                    ),
+                ),
+                (
+                    "source_document",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Knowledge document the entry was parsed from",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="essential_medicines",
+                        to="knowledge.knowledgedocument",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Essential Medicine",
+                "verbose_name_plural": "Essential Medicines",
+                "ordering": ["section_code", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["section_code"], name="knowledge_e_section_011169_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+def backfill_word_count(apps, schema_editor):
+    KnowledgeDocument = apps.get_model("knowledge", "KnowledgeDocument")
+    for document in KnowledgeDocument.objects.only("id", "content").iterator():
+        KnowledgeDocument.objects.filter(pk=document.pk).update(
+            word_count=len(document.content.split()) if document.content else 0
+        )
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    from knowledge.fts_utils import CREATE_FTS_SQL
+
+    for statement in CREATE_FTS_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    from knowledge.fts_utils import DROP_FTS_SQL
+
+    for statement in DROP_FTS_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0003_essentialmedicine"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="knowledgedocument",
+            name="word_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Number of words in the content (kept so list pages need not load it)",
+            ),
+        ),
+        migrations.RunPython(backfill_word_count, migrations.RunPython.noop),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+VIRTUAL_PAGE_CHARS = 5000
+
+
+def backfill_page_offsets(apps, schema_editor):
+    """Split existing documents into virtual pages (no page boundaries were recorded)."""
+    KnowledgeDocument = apps.get_model("knowledge", "KnowledgeDocument")
+    for document in KnowledgeDocument.objects.only("id", "content").iterator():
+        content = document.content or ""
+        length = len(content)
+        starts = []
+        position = 0
+        while position < length:
+            starts.append(position)
+            end = position + VIRTUAL_PAGE_CHARS
+            if end < length:
+                paragraph_break = content.rfind("\n", position + VIRTUAL_PAGE_CHARS // 2, end)
+                if paragraph_break != -1:
+                    end = paragraph_break + 1
+            position = end
+        KnowledgeDocument.objects.filter(pk=document.pk).update(
+            page_offsets=starts + [length] if length else [0]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0004_knowledgedocument_word_count_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="knowledgedocument",
+            name="page_offsets",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Character offset where each page of content starts, plus the total length",
+            ),
+        ),
+        migrations.RunPython(backfill_page_offsets, migrations.RunPython.noop),
+    ]
@@ -76,6 +76,15 @@ class KnowledgeDocument(models.Model):
         blank=True,
         help_text='Date when the document was last reviewed for accuracy'
     )
+    page_offsets = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Character offset where each page of content starts, plus the total length'
+    )
+    word_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of words in the content (kept so list pages need not load it)'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -92,6 +101,75 @@ class KnowledgeDocument(models.Model):
     def __str__(self):
         return f"{self.title} ({self.get_document_type_display()})"
     
+    # Size of the virtual pages used when no page boundaries were recorded
+    VIRTUAL_PAGE_CHARS = 5000
+    
+    def save(self, *args, **kwargs):
+        """Keep word_count and page_offsets in sync with content."""
+        if 'content' in self.__dict__:
+            content = self.content or ''
+            self.word_count = len(content.split())
+            self.page_offsets = self.build_page_offsets(content, self.page_offsets)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def build_page_offsets(cls, content, page_starts=None):
+        """
+        Normalise page start offsets for content and append the total length.
+        
+        Starts recorded at extraction time (e.g. PDF pages) are kept, clipped
+        to the content; without them content is split into virtual pages of
+        about VIRTUAL_PAGE_CHARS, preferring paragraph breaks.
+        """
+        length = len(content)
+        if not length:
+            return [0]
+        
+        starts = sorted({
+            offset for offset in (page_starts or [])
+            if isinstance(offset, int) and 0 <= offset < length
+        })
+        if not starts or starts[0] != 0:
+            starts = []
+            position = 0
+            while position < length:
+                starts.append(position)
+                end = position + cls.VIRTUAL_PAGE_CHARS
+                if end < length:
+                    paragraph_break = content.rfind('\n', position + cls.VIRTUAL_PAGE_CHARS // 2, end)
+                    if paragraph_break != -1:
+                        end = paragraph_break + 1
+                position = end
+        
+        return starts + [length]
+    
+    @property
+    def page_count(self):
+        """Number of content pages."""
+        return max(len(self.page_offsets) - 1, 1)
+    
+    def get_page_content(self, page_number):
+        """
+        Load the text of a single page without reading the rest of the content.
+        
+        Args:
+            page_number: 1-based page number (clamped to the valid range)
+            
+        Returns:
+            Tuple of (page_number, page text)
+        """
+        from django.db.models.functions import Substr
+        
+        page_number = min(max(int(page_number), 1), self.page_count)
+        if len(self.page_offsets) < 2:
+            return page_number, ''
+        start = self.page_offsets[page_number - 1]
+        end = self.page_offsets[page_number]
+        text = KnowledgeDocument.objects.filter(pk=self.pk).annotate(
+            page_text=Substr('content', start + 1, end - start)
+        ).values_list('page_text', flat=True).first()
+        return page_number, text or ''
+    
     @property
     def is_recent(self):
         """Check if document was uploaded in the last 30 days."""
@@ -128,3 +206,56 @@ class KnowledgeDocument(models.Model):
         """Mark the document as reviewed today."""
         self.last_reviewed = timezone.now().date()
         self.save()
+
+
+class EssentialMedicine(models.Model):
+    """Structured entry parsed from the WHO Model List of Essential Medicines."""
+    
+    name = models.CharField(
+        max_length=255,
+        help_text='Medicine name as listed in the EML'
+    )
+    normalized_name = models.CharField(
+        max_length=255,
+        db_index=True,
+        help_text='Lower-cased name without salts or footnote markers, used for lookups'
+    )
+    section_code = models.CharField(
+        max_length=20,
+        help_text='EML section number (e.g. 6.2.1)'
+    )
+    section = models.CharField(
+        max_length=255,
+        help_text='EML section title (e.g. Access group antibiotics)'
+    )
+    formulation = models.TextField(
+        blank=True,
+        help_text='Dosage forms and strengths'
+    )
+    indications = models.TextField(
+        blank=True,
+        help_text='Section, first/second choice indications and footnotes'
+    )
+    is_complementary = models.BooleanField(
+        default=False,
+        help_text='Whether the entry is on the complementary list'
+    )
+    source_document = models.ForeignKey(
+        KnowledgeDocument,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='essential_medicines',
+        help_text='Knowledge document the entry was parsed from'
+    )
+    
+    class Meta:
+        ordering = ['section_code', 'id']
+        verbose_name = 'Essential Medicine'
+        verbose_name_plural = 'Essential Medicines'
+        indexes = [
+            models.Index(fields=['section_code']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.section_code} {self.section})"
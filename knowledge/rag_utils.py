@@ -84,27 +84,24 @@ def load_knowledge_base():
         print(f"Error loading knowledge base: {e}")
     return False
 
-def extract_text_from_file(file_path):
-    """Extract text from various file types"""
+def extract_pages_from_file(file_path):
+    """Extract text from various file types as a list of pages (PDF) or a single entry"""
     try:
         if file_path.endswith('.pdf'):
             with open(file_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text()
-                return text
+                return [page.extract_text() or "" for page in reader.pages]
                 
         elif file_path.endswith('.docx'):
             doc = Document(file_path)
             text = ""
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
-            return text
+            return [text]
             
         elif file_path.endswith('.txt'):
             with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+                return [file.read()]
                 
         else:
             print(f"Unsupported file type: {file_path}")
@@ -113,6 +110,22 @@ def extract_text_from_file(file_path):
         print(f"Error reading {file_path}: {e}")
         return None
 
+def join_pages(pages):
+    """Join extracted pages into one text and record the character offset where each page starts"""
+    offsets = []
+    position = 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page)
+    return "".join(pages), offsets
+
+def extract_text_from_file(file_path):
+    """Extract text from various file types"""
+    pages = extract_pages_from_file(file_path)
+    if pages is None:
+        return None
+    return "".join(pages)
+
 def process_all_documents():
     """Process all documents in the sample_documents folder"""
     global vector_store
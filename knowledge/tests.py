@@ -1,3 +1,251 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from users.models import User
+
+from .eml_utils import (
+    EssentialMedicinesIndex,
+    get_essential_medicines_index,
+    load_essential_medicines,
+    parse_essential_medicines,
+    reset_essential_medicines_index,
+    split_allergies,
+)
+from .fts_utils import FTS_TABLE, search_document_ids, search_documents
+from .models import KnowledgeDocument
+from .rag_utils import join_pages
+
+
+# Excerpt of the extracted WHO Model List text: page headers, a therapeutic
+# alternative, footnotes, a complementary list, antibiotic FIRST/SECOND CHOICE
+# indications and the Table 1.1 appendix that ends the list
+EML_FIXTURE = """\
+Introduction text that is skipped.
+WHO Model List of Essential Medicines – 23rd List (2023) page 1 1. ANAESTHETICS , PREOPERATIVE MEDICINES AND MEDICAL GASES
+1.1 General anaesthetics and oxygen
+ketamine  Injection: 50 mg/ mL (as hydrochloride)  in 10  mL vial.
+ propofol
+Therapeutic alternatives:
+- thiopental  Injection: 10 mg/mL; 20 mg/mL.
+2. MEDICINES FOR PAIN AND PALLIATIVE CARE
+2.1 Non -opioids and non-steroidal anti -inflammatory medicines (NSAIMs)
+ibuprofen  a Oral liquid:  100 mg/5 mL [c], 200 mg/5  mL.
+Tablet:  200 mg; 400 mg; 600 mg.
+a Not in children less than 3 months.
+paracetamol  (acetaminophen) * Oral liquid:  120 mg/5 mL [c].
+Tablet:  250 mg, 325 mg,  500 mg.
+*Not recommended for anti-inflammatory use.
+Complementary list
+methadone*  Tablet: 5 mg ; 10 mg (hydrochloride)
+WHO Model List of Essential Medicines – 23rd List (2023) page 9 6.2.1 Access  group antibiotics
+amoxicillin
+ Powder for injection : 250 mg; 500 mg; 1 g (as sodium) in vial.
+Tablet (dispersible, scored): 250 mg ; 500 mg (as trihydrate)  [c].
+FIRST CHOICE
+− Community acquired pneumonia
+(mild to moderate)
+− Otitis media
+ SECOND CHOICE
+− Acute bacterial meningitis
+amoxicillin + clavulanic acid
+ Tablet:  500 mg (as trihydrate) + 125 mg (as potassium salt).
+FIRST CHOICE
+− Hospital acquired pneumonia
+6.4.2.1 Nucleoside/nucleotide reverse transcriptase inhibitors
+zidovudine  Tablet:  300 mg.
+Table 1.1: Medicines with age or weight restrictions
+atazanavir  Tablet: 300 mg.
+"""
+
+
+class ParseEssentialMedicinesTests(SimpleTestCase):
+    def setUp(self):
+        self.rows = {row['normalized_name']: row for row in parse_essential_medicines(EML_FIXTURE)}
+
+    def test_rows_between_first_section_and_appendix(self):
+        self.assertEqual(list(self.rows), [
+            'ketamine', 'propofol', 'thiopental', 'ibuprofen', 'paracetamol', 'methadone',
+            'amoxicillin', 'amoxicillin + clavulanic acid', 'zidovudine',
+        ])
+
+    def test_sections_and_formulations(self):
+        ibuprofen = self.rows['ibuprofen']
+        self.assertEqual(ibuprofen['section_code'], '2.1')
+        self.assertEqual(ibuprofen['formulation'], 'Oral liquid: 100 mg/5 mL [c], 200 mg/5 mL.; Tablet: 200 mg; 400 mg; 600 mg.')
+        self.assertIn('Not in children less than 3 months', ibuprofen['indications'])
+        self.assertEqual(self.rows['zidovudine']['section_code'], '6.4.2.1')
+
+    def test_name_markers_and_aliases(self):
+        self.assertEqual(self.rows['paracetamol']['name'], 'paracetamol (acetaminophen)')
+        self.assertIn('Not recommended for anti-inflammatory use', self.rows['paracetamol']['indications'])
+        self.assertEqual(self.rows['methadone']['name'], 'methadone')
+
+    def test_therapeutic_alternative(self):
+        self.assertIn('Therapeutic alternative to propofol', self.rows['thiopental']['indications'])
+
+    def test_complementary_list(self):
+        self.assertTrue(self.rows['methadone']['is_complementary'])
+        self.assertFalse(self.rows['paracetamol']['is_complementary'])
+        self.assertNotIn('Complementary', self.rows['paracetamol']['indications'])
+
+    def test_antibiotic_choices(self):
+        self.assertEqual(
+            self.rows['amoxicillin']['indications'],
+            'Access group antibiotics. '
+            'First choice: Community acquired pneumonia (mild to moderate); Otitis media. '
+            'Second choice: Acute bacterial meningitis',
+        )
+
+
+class EssentialMedicinesIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = EssentialMedicinesIndex(parse_essential_medicines(EML_FIXTURE))
+
+    def names(self, diagnosis):
+        return [row['normalized_name'] for row in self.index.for_condition(diagnosis)]
+
+    def test_lookup_by_name_alias_and_prefix(self):
+        self.assertEqual(self.index.get('Paracetamol')[0]['section_code'], '2.1')
+        self.assertEqual(self.index.get('acetaminophen'), self.index.get('paracetamol'))
+        self.assertEqual(self.index.names_with_prefix('amox'), ['amoxicillin', 'amoxicillin + clavulanic acid'])
+
+    def test_first_choice_antibiotics_first(self):
+        self.assertEqual(self.names('Community acquired pneumonia'), ['amoxicillin', 'amoxicillin + clavulanic acid'])
+
+    def test_complementary_medicines_excluded(self):
+        self.assertEqual(self.names('acute_febrile_illness'), ['ibuprofen', 'paracetamol'])
+
+    def test_condition_keys_match_whole_words(self):
+        self.assertEqual(self.index.sections_for_condition('hiv_related_illness'), ['6.4.2.5', '6.4.2.1'])
+        self.assertEqual(self.index.sections_for_condition('Hives'), [])
+        self.assertEqual(self.index.sections_for_condition('Recurrent seizures'), ['5.1'])
+        self.assertEqual(self.index.sections_for_condition('hypertensive_crisis'), ['12.3'])
+
+    def test_chest_pain_is_not_an_analgesic_indication(self):
+        self.assertEqual(self.names('Chest pain'), [])
+        self.assertEqual(self.index.sections_for_condition('Abdominal pain'), ['2.1'])
+
+    def test_allergy_class_blocks_members(self):
+        blocked = self.index.blocked_by_allergies([a.lower() for a in split_allergies(['Penicillins, sulfa'])])
+        self.assertTrue(self.index.is_blocked('Amoxicillin', blocked))
+        self.assertTrue(self.index.is_blocked('amoxicillin + clavulanic acid', blocked))
+        self.assertFalse(self.index.is_blocked('Paracetamol', blocked))
+        self.assertIsNone(self.index.is_blocked('Unlisted medicine', blocked))
+
+
+class EssentialMedicinesIndexCacheTests(TestCase):
+    def setUp(self):
+        reset_essential_medicines_index()
+        self.addCleanup(reset_essential_medicines_index)
+
+    def test_empty_table_is_cached(self):
+        index = get_essential_medicines_index()
+        self.assertEqual(len(index), 0)
+        with self.assertNumQueries(0):
+            self.assertIs(get_essential_medicines_index(), index)
+
+    def test_load_rebuilds_the_index(self):
+        self.assertFalse(get_essential_medicines_index())
+        self.assertEqual(load_essential_medicines(text=EML_FIXTURE), 9)
+        self.assertEqual(get_essential_medicines_index().get('zidovudine')[0]['section_code'], '6.4.2.1')
+
+
+class KnowledgeDocumentFTSTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(username='doctor', password='pw', role='DOCTOR')
+
+    def add_document(self, title, content, **fields):
+        return KnowledgeDocument.objects.create(title=title, content=content, uploaded_by=self.doctor, **fields)
+
+    def test_sqlite_has_fts5(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertIn(FTS_TABLE, connection.introspection.table_names())
+
+    def test_insert_is_indexed(self):
+        malaria = self.add_document('Malaria guideline', 'Artemisinin combination therapy for fever.')
+        cough = self.add_document('Cough', 'Fever and cough in children.', document_type='PROTOCOL')
+        self.assertEqual(search_documents('artemis'), ([malaria.pk], True))
+        # Title matches rank first
+        self.assertEqual(search_document_ids('malaria fever'), [malaria.pk])
+        self.assertCountEqual(search_document_ids('fever'), [malaria.pk, cough.pk])
+        self.assertEqual(search_document_ids('fever', document_type='PROTOCOL'), [cough.pk])
+
+    def test_update_replaces_the_indexed_text(self):
+        document = self.add_document('Dengue', 'Paracetamol for fever.')
+        document.content = 'Avoid ibuprofen in dengue.'
+        document.save()
+        self.assertEqual(search_document_ids('paracetamol'), [])
+        self.assertEqual(search_document_ids('ibuprofen'), [document.pk])
+        KnowledgeDocument.objects.filter(pk=document.pk).update(author='Ministry of Health')
+        self.assertEqual(search_document_ids('ministry'), [document.pk])
+
+    def test_delete_removes_the_document(self):
+        document = self.add_document('Cholera', 'Oral rehydration salts.')
+        self.add_document('Diarrhoea', 'Oral rehydration and zinc.')
+        document.delete()
+        self.assertEqual(len(search_document_ids('rehydration')), 1)
+        # Raises if the external-content index no longer matches the table
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('integrity-check')")
+
+    def test_user_input_is_not_fts_syntax(self):
+        document = self.add_document('Chest pain', 'Aspirin for suspected heart attack.')
+        self.assertEqual(search_document_ids('chest AND NOT "pain'), [])
+        self.assertEqual(search_document_ids('chest pai'), [document.pk])
+        self.assertEqual(search_document_ids('  '), [])
+
+
+class DocumentPageTests(TestCase):
+    PAGES = ['First page: triage.\n', 'Second page: malaria.\n', 'Third page: dosing.']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(username='doctor', password='pw', role='DOCTOR')
+        content, page_offsets = join_pages(cls.PAGES)
+        cls.document = KnowledgeDocument.objects.create(
+            title='Handbook', content=content, page_offsets=page_offsets, uploaded_by=cls.doctor
+        )
+
+    def test_page_offsets_end_with_the_content_length(self):
+        self.assertEqual(self.document.page_offsets, [0, 20, 42, 61])
+        self.assertEqual(self.document.page_count, 3)
+
+    def test_get_page_content_reads_one_page(self):
+        document = KnowledgeDocument.objects.only('id', 'page_offsets').get(pk=self.document.pk)
+        for number, page in enumerate(self.PAGES, start=1):
+            with self.assertNumQueries(1):
+                self.assertEqual(document.get_page_content(number), (number, page))
+        # Out-of-range page numbers are clamped
+        self.assertEqual(document.get_page_content(0), (1, self.PAGES[0]))
+        self.assertEqual(document.get_page_content(9), (3, self.PAGES[2]))
+
+    def test_virtual_pages_without_recorded_offsets(self):
+        paragraph = 'x' * 999 + '\n'
+        document = KnowledgeDocument.objects.create(title='Long', content=paragraph * 12, uploaded_by=self.doctor)
+        self.assertEqual(document.page_offsets, [0, 5000, 10000, 12000])
+        self.assertEqual(document.get_page_content(3), (3, paragraph * 2))
+        self.assertEqual(KnowledgeDocument.build_page_offsets(''), [0])
+
+    def test_document_page_api(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('knowledge:document_page_api', args=[self.document.pk, 2]))
+        self.assertEqual(response.json(), {
+            'document_id': self.document.pk,
+            'page': 2,
+            'page_count': 3,
+            'content': self.PAGES[1],
+            'has_next': True,
+            'has_previous': True,
+        })
+        self.assertEqual(
+            self.client.get(reverse('knowledge:document_page_api', args=[self.document.pk, 7])).json()['page'], 3
+        )
+
+    def test_document_page_api_is_for_doctors(self):
+        self.client.force_login(User.objects.create_user(username='nurse', password='pw', role='NURSE'))
+        response = self.client.get(reverse('knowledge:document_page_api', args=[self.document.pk, 1]))
+        self.assertEqual(response.status_code, 403)
@@ -8,6 +8,7 @@ urlpatterns = [
     path('documents/', views.document_list, name='document_list'),
     path('documents/<int:pk>/', views.document_detail, name='document_detail'),
     path('documents/<int:pk>/delete/', views.document_delete, name='document_delete'),
+    path('api/documents/<int:pk>/pages/<int:page>/', views.document_page_api, name='document_page_api'),
     path('upload/', views.document_upload, name='document_upload'),
     path('search/', views.search_knowledge, name='search'),
 ]
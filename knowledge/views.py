@@ -3,9 +3,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import HttpResponseForbidden
+from django.db.models.functions import Substr
+from django.http import HttpResponseForbidden, JsonResponse
 from .models import KnowledgeDocument
-from .rag_utils import extract_text_from_file, query_knowledge_base, search_medical_knowledge
+from .rag_utils import (
+    extract_text_from_file, extract_pages_from_file, join_pages,
+    query_knowledge_base, search_medical_knowledge
+)
+from .fts_utils import search_documents, get_snippets, highlight_snippet
 import os
 
 
@@ -23,7 +28,7 @@ def knowledge_base_dashboard(request):
     
     # Get statistics
     total_documents = KnowledgeDocument.objects.count()
-    recent_documents = KnowledgeDocument.objects.order_by('-upload_date')[:5]
+    recent_documents = KnowledgeDocument.objects.defer('content').order_by('-upload_date')[:5]
     
     # Document type breakdown
     doc_types = {}
@@ -51,27 +56,51 @@ def document_list(request):
         messages.error(request, 'Access denied. Knowledge Base is only available to doctors.')
         return redirect('home')
     
-    documents = KnowledgeDocument.objects.all().order_by('-upload_date')
+    # Never load full content on the list page - only a short excerpt
+    documents = KnowledgeDocument.objects.defer('content').select_related(
+        'uploaded_by'
+    ).annotate(excerpt=Substr('content', 1, 500)).order_by('-upload_date')
     
-    # Search functionality
     search_query = request.GET.get('q', '')
+    doc_type = request.GET.get('type', '')
+    
+    # Search functionality (ranked FTS5 when available)
+    used_fts = False
     if search_query:
-        documents = documents.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(source__icontains=search_query) |
-            Q(author__icontains=search_query)
-        )
+        ranked_ids, used_fts = search_documents(search_query, doc_type)
+        if not used_fts:
+            documents = documents.filter(
+                Q(title__icontains=search_query) |
+                Q(content__icontains=search_query) |
+                Q(source__icontains=search_query) |
+                Q(author__icontains=search_query)
+            )
     
     # Filter by document type
-    doc_type = request.GET.get('type', '')
-    if doc_type:
+    if doc_type and not used_fts:
         documents = documents.filter(document_type=doc_type)
     
     # Pagination
-    paginator = Paginator(documents, 10)  # 10 documents per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if used_fts:
+        # Paginate the ranked ids, then load only the current page's rows
+        paginator = Paginator(ranked_ids, 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_ids = list(page_obj.object_list)
+        documents_by_id = documents.in_bulk(page_ids)
+        snippets = get_snippets(search_query, page_ids)
+        page_documents = []
+        for document_id in page_ids:
+            document = documents_by_id.get(document_id)
+            if document is None:
+                continue
+            if snippets.get(document_id):
+                document.snippet = highlight_snippet(snippets[document_id])
+            page_documents.append(document)
+        page_obj.object_list = page_documents
+    else:
+        paginator = Paginator(documents, 10)  # 10 documents per page
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
@@ -89,20 +118,56 @@ def document_detail(request, pk):
         messages.error(request, 'Access denied. Knowledge Base is only available to doctors.')
         return redirect('home')
     
-    document = get_object_or_404(KnowledgeDocument, pk=pk)
+    # Content is loaded one page at a time, never in full
+    document = get_object_or_404(
+        KnowledgeDocument.objects.defer('content').select_related('uploaded_by'), pk=pk
+    )
+    page_number, page_content = document.get_page_content(_get_page_number(request))
     
     # Get related documents (same type)
-    related_documents = KnowledgeDocument.objects.filter(
+    related_documents = KnowledgeDocument.objects.defer('content').filter(
         document_type=document.document_type
     ).exclude(pk=pk)[:5]
     
     context = {
         'document': document,
+        'page_number': page_number,
+        'page_content': page_content,
+        'page_count': document.page_count,
         'related_documents': related_documents,
     }
     return render(request, 'knowledge/document_detail.html', context)
 
 
+@login_required
+def document_page_api(request, pk, page):
+    """API endpoint returning a single page of document content - Doctor only"""
+    if not check_doctor_access(request.user):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    document = get_object_or_404(
+        KnowledgeDocument.objects.only('id', 'page_offsets'), pk=pk
+    )
+    page_number, page_content = document.get_page_content(page)
+    
+    return JsonResponse({
+        'document_id': document.pk,
+        'page': page_number,
+        'page_count': document.page_count,
+        'content': page_content,
+        'has_next': page_number < document.page_count,
+        'has_previous': page_number > 1,
+    })
+
+
+def _get_page_number(request):
+    """Read a 1-based page number from the query string"""
+    try:
+        return int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        return 1
+
+
 @login_required
 def document_upload(request):
     """Upload new knowledge documents - Doctor only"""
@@ -116,13 +181,13 @@ def document_upload(request):
         document_type = request.POST.get('document_type')
         source = request.POST.get('source', '')
         author = request.POST.get('author', '')
+        page_offsets = []
         
         # Handle file upload if provided
         uploaded_file = request.FILES.get('file')
         if uploaded_file:
             # Save file temporarily and extract text
             try:
-                from .rag_utils import extract_text_from_file
                 import tempfile
                 
                 # Save uploaded file temporarily
@@ -131,8 +196,8 @@ def document_upload(request):
                         tmp_file.write(chunk)
                     tmp_path = tmp_file.name
                 
-                # Extract text from file
-                extracted_content = extract_text_from_file(tmp_path)
+                # Extract text from file, recording page boundaries
+                extracted_content, page_offsets = join_pages(extract_pages_from_file(tmp_path) or [])
                 if extracted_content:
                     content = extracted_content
                     if not title:
@@ -150,6 +215,7 @@ def document_upload(request):
             document = KnowledgeDocument.objects.create(
                 title=title,
                 content=content,
+                page_offsets=page_offsets,
                 document_type=document_type,
                 source=source,
                 author=author,
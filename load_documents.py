@@ -11,7 +11,7 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from knowledge.models import KnowledgeDocument
-from knowledge.rag_utils import extract_text_from_file
+from knowledge.rag_utils import extract_pages_from_file, join_pages
 
 User = get_user_model()
 
@@ -123,17 +123,20 @@ for pdf_file in pdf_files:
     try:
         print(f"📄 Processing: {pdf_file[:50]}...")
         
-        # Extract text
-        content = extract_text_from_file(file_path)
+        # Extract text page by page so page boundaries can be recorded
+        pages = extract_pages_from_file(file_path) or []
+        content, page_offsets = join_pages(pages)
         
         if not content or len(content.strip()) < 50:
             content = f"Medical Document: {title}\n\nThis is a medical guideline/reference document."
+            page_offsets = []
             print(f"   ⚠️  Warning: Limited text extracted")
         
         # Create document
         doc = KnowledgeDocument.objects.create(
             title=title,
             content=content[:50000],
+            page_offsets=page_offsets,
             document_type=metadata.get('document_type', 'REFERENCE'),
             source=metadata.get('source', 'Unknown'),
             author=metadata.get('author', 'Unknown'),
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "diagnoses.middleware.RequestTimingMiddleware",
+    "diagnoses.middleware.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "diagnoses.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "medical_ai.urls"
@@ -149,6 +152,122 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 # Ollama Configuration (Local LLM)
 OLLAMA_API_URL = 'http://localhost:11434/api/generate'
 OLLAMA_MODEL = 'llama3.2'  # Options: llama3.2, llama3.1, mistral, meditron, etc.
+OLLAMA_SMALL_MODEL = 'llama3.2:1b'  # Fast model for triage notes and explanations
+
+# Several Ollama instances (ports or NUMA nodes) behind the app; empty = OLLAMA_API_URL only.
+# Calls go to the endpoint with the fewest outstanding requests, preferring one where the
+# model is still warm unless it has more than LLM_ENDPOINT_STICKY_SLACK extra requests.
+# Raise LLM_MAX_CONCURRENT to match the combined capacity.
+#   OLLAMA_ENDPOINTS = ['http://localhost:11434/api/generate', 'http://localhost:11435/api/generate']
+OLLAMA_ENDPOINTS = []
+LLM_ENDPOINT_STICKY_SLACK = 1
+
+# Shared LLM HTTP client (connection pool, timeouts in seconds, retries on connection errors)
+LLM_CONNECT_TIMEOUT = 3.05
+LLM_READ_TIMEOUT = 120
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BACKOFF = 0.5
+LLM_POOL_SIZE = 10
+
+# Ollama circuit breaker (one per endpoint): open after N consecutive failures, retry after the timeout
+# (or as soon as the /api/tags health probe succeeds). Probe interval 0 disables it.
+LLM_BREAKER_FAILURE_THRESHOLD = 3
+LLM_BREAKER_RECOVERY_TIMEOUT = 30
+LLM_HEALTH_PROBE_INTERVAL = 15
+
+# Disk-backed LLM response cache keyed on hash(model, options, prompt)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = BASE_DIR / 'llm_cache.sqlite3'
+LLM_CACHE_TTL = 60 * 60 * 24  # 24 hours
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024  # 50 MB
+
+# Ask the LLM for diagnosis, treatment plan and medications in one generation
+# (FUSED_ANALYSIS_PROMPT) instead of the diagnosis-only DIAGNOSIS_PROMPT. The longer
+# answer gets LLM_FUSED_OUTPUT_TOKENS (num_predict, also kept free in the prompt budget).
+LLM_FUSED_ANALYSIS = False
+LLM_FUSED_OUTPUT_TOKENS = 1400
+
+# Prompt token budget: the model's context window (num_ctx), tokens kept free for
+# the answer, and a cap on retrieved evidence. Evidence sentences are chosen by
+# embedding similarity to the symptoms (below LLM_EVIDENCE_MIN_SIMILARITY they are
+# dropped). A larger evidence budget improves coverage but lengthens prefill.
+LLM_CONTEXT_TOKENS = 4096
+LLM_RESERVED_OUTPUT_TOKENS = 700
+LLM_EVIDENCE_TOKEN_BUDGET = 600
+LLM_EVIDENCE_MIN_SIMILARITY = 0.2
+
+# Per-task model routing (diagnoses/llm_routing.py). 'diagnosis' uses OLLAMA_MODEL with
+# LLM_CONTEXT_TOKENS / LLM_RESERVED_OUTPUT_TOKENS ('fused_analysis' follows it with
+# LLM_FUSED_OUTPUT_TOKENS); 'explanation' and 'triage' use
+# OLLAMA_SMALL_MODEL with smaller num_ctx / num_predict. Override any route key here, e.g.
+#   LLM_MODEL_ROUTES = {'diagnosis': {'model': 'llama3.1:8b', 'keep_alive': '1h'}}
+# With LLM_DOWNGRADE_IN_FLIGHT or more LLM calls running or queued (in the process, or
+# analysis jobs running or due across all workers), routes with a
+# downgrade_model switch to it (0 disables); exempt priorities keep the large model.
+# The job count is a database query, reused for LLM_LOAD_CACHE_SECONDS.
+LLM_MODEL_ROUTES = {}
+LLM_DOWNGRADE_IN_FLIGHT = 4
+LLM_LOAD_CACHE_SECONDS = 1
+LLM_DOWNGRADE_EXEMPT_PRIORITIES = ['CRITICAL']
+
+# LLM scheduler: at most LLM_MAX_CONCURRENT generations at once; waiting calls are
+# admitted by case priority (CRITICAL first) and gain one priority level per
+# LLM_SCHEDULER_AGING_SECONDS waited. Calls waiting longer than LLM_QUEUE_TIMEOUT
+# fall back to rule-based diagnosis. Analysis workers claim queued jobs in the same
+# order, and at most LLM_MAX_CONCURRENT jobs run at once across all worker processes.
+LLM_MAX_CONCURRENT = 2
+LLM_SCHEDULER_AGING_SECONDS = 30
+LLM_QUEUE_TIMEOUT = 300
+
+# Multi-agent pipeline (diagnoses/pipeline.py): independent agent steps of a case run
+# concurrently on a shared pool of this many threads.
+AGENT_PIPELINE_WORKERS = 8
+
+# Quick triage fast path (diagnoses/triage.py), called as the case form is typed.
+# benchmark_quick_triage fails if its p99 server time exceeds QUICK_TRIAGE_BUDGET_MS;
+# results for the last QUICK_TRIAGE_CACHE_SIZE distinct inputs are kept.
+QUICK_TRIAGE_BUDGET_MS = 5
+QUICK_TRIAGE_CACHE_SIZE = 1024
+
+# Latency metrics (diagnoses/metrics.py): per-stage and per-view histograms in the
+# Prometheus text format at /metrics, answered only for these client addresses.
+# Analysis workers serve their own with `run_analysis_worker --metrics-port`.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# SQL query budget per request (diagnoses/query_budget.py). Views default to
+# SQL_QUERY_BUDGET queries; SQL_QUERY_BUDGETS overrides it by view name. A query shape
+# run SQL_N_PLUS_ONE_THRESHOLD or more times in one request is reported as N+1.
+# Overruns are logged; SQL_BUDGET_RAISE turns them into errors (for development).
+# `python manage.py sql_budget_report` lists the worst endpoints.
+SQL_QUERY_BUDGET = 30
+SQL_QUERY_BUDGETS = {
+    'nurse_dashboard': 12,
+    'recent_patients_api': 6,
+}
+SQL_N_PLUS_ONE_THRESHOLD = 5
+SQL_BUDGET_RAISE = False
+
+# On-demand request profiling (diagnoses/profiling.py): requests from staff users with an
+# "X-Profile: 1" header, plus a random PROFILING_SAMPLE_RATE fraction of all requests
+# (0 = header only), are profiled with a stack sampler (collapsed stacks for flame graphs)
+# and, unless PROFILING_DETERMINISTIC is False, cProfile (pstats). The newest
+# PROFILING_MAX_PROFILES are kept in PROFILING_DIR and listed at /system-admin/profiles/.
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_DETERMINISTIC = True
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_PROFILES = 200
+
+# Case analysis job queue (processed by `python manage.py run_analysis_worker`).
+# ANALYSIS_JOBS_INLINE runs jobs inside the request instead, for development without a worker.
+ANALYSIS_JOBS_INLINE = False
+ANALYSIS_JOB_MAX_ATTEMPTS = 3
+ANALYSIS_JOB_RETRY_BACKOFF = 30  # seconds, doubled after each failed attempt
+# A running job's worker refreshes its lock every ANALYSIS_JOB_HEARTBEAT_INTERVAL seconds;
+# a RUNNING job without a heartbeat for ANALYSIS_JOB_STALE_TIMEOUT seconds (its worker
+# died) is re-queued. Keep the timeout several heartbeat intervals long.
+ANALYSIS_JOB_HEARTBEAT_INTERVAL = 30
+ANALYSIS_JOB_STALE_TIMEOUT = 180
 
 # HuggingFace API (Optional fallback)
 HUGGINGFACE_API_KEY = None  # Set to your API key if using HuggingFace
@@ -30,6 +30,7 @@ from django.conf.urls.static import static
 from patients.views import nurse_dashboard, doctor_dashboard
 from patients.models import Patient
 from diagnoses.models import Case
+from diagnoses.views import metrics_view, profile_list, profile_download
 from knowledge.models import KnowledgeDocument
 
 
@@ -241,10 +242,16 @@ urlpatterns = [
         # Add more API endpoints here as needed
     ])),
     
+    # Prometheus latency metrics (local clients only)
+    path("metrics", metrics_view, name="metrics"),
+    
     # Django Admin interface - Separate from app login
     # Use /system-admin/ for admin access (more secure than /admin/)
     # Admin login is SEPARATE - uses Django's default admin login
     # App users (nurse/doctor) should use /accounts/login/ NOT /system-admin/
+    # Captured request profiles (staff only, see diagnoses/profiling.py)
+    path("system-admin/profiles/", profile_list, name="profile_list"),
+    path("system-admin/profiles/<str:profile_id>/<str:kind>/", profile_download, name="profile_download"),
     path("system-admin/", admin.site.urls),
 ]
 
@@ -4,7 +4,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, OuterRef, Subquery
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.http import JsonResponse
@@ -361,33 +361,25 @@ def nurse_dashboard(request):
     # Get current nurse's cases
     nurse_cases = Case.objects.filter(nurse=request.user).order_by('-created_at')
     
-    # Statistics for the nurse
-    my_cases_count = nurse_cases.filter(
-        status__in=['PENDING', 'IN_PROGRESS', 'DOCTOR_REVIEW']
-    ).count()
-    
-    # Count cases that have been reviewed by a doctor
-    doctor_reviewed_count = nurse_cases.filter(
-        doctor_review__isnull=False,
-        reviewed_by__isnull=False
-    ).count()
-    
-    urgent_cases_count = Case.objects.filter(
-        priority__in=['URGENT', 'CRITICAL'],
-        status__in=['PENDING', 'IN_PROGRESS']
-    ).count()
-    
-    pending_cases_count = nurse_cases.filter(status='PENDING').count()
-    
-    # Cases completed today
+    # Statistics for the nurse, counted in one query
     today = timezone.now().date()
-    completed_today = nurse_cases.filter(
-        status='COMPLETED',
-        updated_at__date=today
-    ).count()
-    
-    # Recent cases (last 20 for the nurse)
-    recent_cases = nurse_cases[:20]
+    mine = Q(nurse=request.user)
+    case_counts = Case.objects.aggregate(
+        my_cases_count=Count('id', filter=mine & Q(status__in=['PENDING', 'IN_PROGRESS', 'DOCTOR_REVIEW'])),
+        # Cases that have been reviewed by a doctor
+        doctor_reviewed_count=Count(
+            'id', filter=mine & Q(doctor_review__isnull=False, reviewed_by__isnull=False)
+        ),
+        urgent_cases_count=Count(
+            'id', filter=Q(priority__in=['URGENT', 'CRITICAL'], status__in=['PENDING', 'IN_PROGRESS'])
+        ),
+        pending_cases_count=Count('id', filter=mine & Q(status='PENDING')),
+        # Cases completed today
+        completed_today=Count('id', filter=mine & Q(status='COMPLETED', updated_at__date=today)),
+    )
+    
+    # Recent cases (last 20 for the nurse), with what the table shows of each
+    recent_cases = nurse_cases.select_related('patient', 'reviewed_by')[:20]
     
     # Paginate recent cases
     paginator = Paginator(recent_cases, 10)
@@ -412,11 +404,7 @@ def nurse_dashboard(request):
 
     context = {
         'recent_cases': page_obj,
-        'my_cases_count': my_cases_count,
-        'doctor_reviewed_count': doctor_reviewed_count,
-        'urgent_cases_count': urgent_cases_count,
-        'pending_cases_count': pending_cases_count,
-        'completed_today': completed_today,
+        **case_counts,
         'total_patients': Patient.objects.count(),
         'unread_notifications_count': unread_notifications_count,
         'recent_notifications': recent_notifications,
@@ -764,10 +752,12 @@ def recent_patients_api(request):
         # Get patients with recent activity (cases or medical records)
         recent_limit = timezone.now() - timedelta(days=30)
         
+        # Date of each patient's latest case, fetched with the patients
+        latest_case = Case.objects.filter(patient=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
         patients_qs = Patient.objects.filter(
             Q(cases__created_at__gte=recent_limit) |
             Q(medical_records__created_at__gte=recent_limit)
-        ).distinct().order_by('-created_at')[:10]
+        ).distinct().annotate(last_activity=Subquery(latest_case)).order_by('-created_at')[:10]
         
         patients_data = []
         for patient in patients_qs:
@@ -775,7 +765,7 @@ def recent_patients_api(request):
                 'id': patient.id,
                 'first_name': patient.first_name,
                 'last_name': patient.last_name,
-                'last_activity': patient.cases.first().created_at.isoformat() if patient.cases.first() else None
+                'last_activity': patient.last_activity.isoformat() if patient.last_activity else None
             })
         
         return JsonResponse({